@@ -0,0 +1,65 @@
+"""Store knowledge embedding vectors as packed float32 bytes.
+
+Revision ID: 0011_binary_embedding_vectors
+Revises: 0010_password_reset_tokens
+Create Date: 2026-10-17 09:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0011_binary_embedding_vectors"
+down_revision: Union[str, None] = "0010_password_reset_tokens"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if insp.has_table("knowledge_embeddings"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_embeddings")]
+        if "vector_data" not in columns:
+            op.add_column("knowledge_embeddings", sa.Column("vector_data", sa.LargeBinary(), nullable=True))
+        if "dim" not in columns:
+            op.add_column("knowledge_embeddings", sa.Column("dim", sa.Integer(), nullable=True))
+        if "dtype" not in columns:
+            op.add_column("knowledge_embeddings", sa.Column("dtype", sa.String(length=16), nullable=True))
+        # JSON vectors are kept only until scripts/backfill_embedding_vectors.py has converted them
+        if bind.dialect.name == "sqlite":
+            with op.batch_alter_table("knowledge_embeddings") as batch_op:
+                batch_op.alter_column("vector", existing_type=sa.JSON(), nullable=True)
+        else:
+            op.alter_column("knowledge_embeddings", "vector", existing_type=sa.JSON(), nullable=True)
+
+    if insp.has_table("knowledge_chunks"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_chunks")]
+        if "embedding" in columns:
+            if bind.dialect.name == "sqlite":
+                with op.batch_alter_table("knowledge_chunks") as batch_op:
+                    batch_op.drop_column("embedding")
+            else:
+                op.drop_column("knowledge_chunks", "embedding")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if insp.has_table("knowledge_chunks"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_chunks")]
+        if "embedding" not in columns:
+            op.add_column("knowledge_chunks", sa.Column("embedding", sa.JSON(), nullable=True))
+
+    if insp.has_table("knowledge_embeddings"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_embeddings")]
+        if "dtype" in columns:
+            op.drop_column("knowledge_embeddings", "dtype")
+        if "dim" in columns:
+            op.drop_column("knowledge_embeddings", "dim")
+        if "vector_data" in columns:
+            op.drop_column("knowledge_embeddings", "vector_data")
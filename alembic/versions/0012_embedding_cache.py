@@ -0,0 +1,44 @@
+"""Add embedding cache keyed by model and chunk checksum.
+
+Revision ID: 0012_embedding_cache
+Revises: 0011_binary_embedding_vectors
+Create Date: 2026-10-17 12:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0012_embedding_cache"
+down_revision: Union[str, None] = "0011_binary_embedding_vectors"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if not insp.has_table("embedding_cache"):
+        op.create_table(
+            "embedding_cache",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("model", sa.String(length=100), nullable=False),
+            sa.Column("checksum", sa.String(length=64), nullable=False),
+            sa.Column("vector_data", sa.LargeBinary(), nullable=False),
+            sa.Column("dim", sa.Integer(), nullable=False),
+            sa.Column("dtype", sa.String(length=16), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.UniqueConstraint("model", "checksum", name="uq_embedding_cache_model_checksum"),
+        )
+        op.create_index("ix_embedding_cache_id", "embedding_cache", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("embedding_cache"):
+        op.drop_index("ix_embedding_cache_id", table_name="embedding_cache")
+        op.drop_table("embedding_cache")
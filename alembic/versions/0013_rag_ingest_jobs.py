@@ -0,0 +1,49 @@
+"""Add RAG ingestion jobs table.
+
+Revision ID: 0013_rag_ingest_jobs
+Revises: 0012_embedding_cache
+Create Date: 2026-10-17 14:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0013_rag_ingest_jobs"
+down_revision: Union[str, None] = "0012_embedding_cache"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if not insp.has_table("rag_ingest_jobs"):
+        op.create_table(
+            "rag_ingest_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False, index=True),
+            sa.Column("document_id", sa.Integer(), sa.ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True),
+            sa.Column("status", sa.String(length=20), nullable=False, server_default="queued", index=True),
+            sa.Column("stage", sa.String(length=20), nullable=False, server_default="queued"),
+            sa.Column("chunks_total", sa.Integer(), nullable=True),
+            sa.Column("chunks_stored", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_rag_ingest_jobs_id", "rag_ingest_jobs", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("rag_ingest_jobs"):
+        op.drop_index("ix_rag_ingest_jobs_id", table_name="rag_ingest_jobs")
+        op.drop_table("rag_ingest_jobs")
@@ -0,0 +1,46 @@
+"""Add source character offsets to knowledge chunks.
+
+Revision ID: 0014_chunk_offsets
+Revises: 0013_rag_ingest_jobs
+Create Date: 2026-10-17 16:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0014_chunk_offsets"
+down_revision: Union[str, None] = "0013_rag_ingest_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if insp.has_table("knowledge_chunks"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_chunks")]
+        if "start_offset" not in columns:
+            op.add_column("knowledge_chunks", sa.Column("start_offset", sa.Integer(), nullable=True))
+        if "end_offset" not in columns:
+            op.add_column("knowledge_chunks", sa.Column("end_offset", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if insp.has_table("knowledge_chunks"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_chunks")]
+        if bind.dialect.name == "sqlite":
+            with op.batch_alter_table("knowledge_chunks") as batch_op:
+                for name in ("end_offset", "start_offset"):
+                    if name in columns:
+                        batch_op.drop_column(name)
+        else:
+            for name in ("end_offset", "start_offset"):
+                if name in columns:
+                    op.drop_column("knowledge_chunks", name)
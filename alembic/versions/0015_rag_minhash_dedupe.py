@@ -0,0 +1,80 @@
+"""Add MinHash signatures and LSH band buckets for RAG near-duplicate detection.
+
+Revision ID: 0015_rag_minhash_dedupe
+Revises: 0014_chunk_offsets
+Create Date: 2026-10-17 18:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0015_rag_minhash_dedupe"
+down_revision: Union[str, None] = "0014_chunk_offsets"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_DOCUMENT_COLUMNS = ("minhash", "duplicate_of", "chunks_deduplicated")
+_CHUNK_COLUMNS = ("minhash", "duplicate_of")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if insp.has_table("knowledge_documents"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_documents")]
+        if "minhash" not in columns:
+            op.add_column("knowledge_documents", sa.Column("minhash", sa.LargeBinary(), nullable=True))
+        if "duplicate_of" not in columns:
+            op.add_column("knowledge_documents", sa.Column("duplicate_of", sa.Integer(), nullable=True))
+        if "chunks_deduplicated" not in columns:
+            op.add_column(
+                "knowledge_documents", sa.Column("chunks_deduplicated", sa.Integer(), nullable=False, server_default="0")
+            )
+
+    if insp.has_table("knowledge_chunks"):
+        columns = [col["name"] for col in insp.get_columns("knowledge_chunks")]
+        if "minhash" not in columns:
+            op.add_column("knowledge_chunks", sa.Column("minhash", sa.LargeBinary(), nullable=True))
+        if "duplicate_of" not in columns:
+            op.add_column("knowledge_chunks", sa.Column("duplicate_of", sa.Integer(), nullable=True))
+
+    if not insp.has_table("knowledge_minhash_bands"):
+        op.create_table(
+            "knowledge_minhash_bands",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False, index=True),
+            sa.Column("document_id", sa.Integer(), sa.ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True),
+            sa.Column("chunk_id", sa.Integer(), sa.ForeignKey("knowledge_chunks.id", ondelete="CASCADE"), nullable=True, index=True),
+            sa.Column("bucket", sa.BigInteger(), nullable=False),
+        )
+        op.create_index("ix_knowledge_minhash_bands_id", "knowledge_minhash_bands", ["id"], unique=False)
+        op.create_index("ix_knowledge_minhash_bands_tenant_bucket", "knowledge_minhash_bands", ["tenant_id", "bucket"], unique=False)
+
+
+def _drop_columns(bind, insp, table: str, names) -> None:
+    if not insp.has_table(table):
+        return
+    columns = [col["name"] for col in insp.get_columns(table)]
+    present = [name for name in names if name in columns]
+    if bind.dialect.name == "sqlite":
+        with op.batch_alter_table(table) as batch_op:
+            for name in present:
+                batch_op.drop_column(name)
+    else:
+        for name in present:
+            op.drop_column(table, name)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("knowledge_minhash_bands"):
+        op.drop_index("ix_knowledge_minhash_bands_tenant_bucket", table_name="knowledge_minhash_bands")
+        op.drop_index("ix_knowledge_minhash_bands_id", table_name="knowledge_minhash_bands")
+        op.drop_table("knowledge_minhash_bands")
+    _drop_columns(bind, insp, "knowledge_chunks", _CHUNK_COLUMNS)
+    _drop_columns(bind, insp, "knowledge_documents", _DOCUMENT_COLUMNS)
@@ -0,0 +1,71 @@
+"""Add AI usage accounting: per-call events and daily rollups.
+
+Revision ID: 0016_ai_usage
+Revises: 0015_rag_minhash_dedupe
+Create Date: 2026-10-17 20:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0016_ai_usage"
+down_revision: Union[str, None] = "0015_rag_minhash_dedupe"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if not insp.has_table("ai_usage_events"):
+        op.create_table(
+            "ai_usage_events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=True, index=True),
+            sa.Column("provider", sa.String(length=20), nullable=False),
+            sa.Column("model", sa.String(length=100), nullable=False, server_default=""),
+            sa.Column("endpoint", sa.String(length=100), nullable=False, server_default=""),
+            sa.Column("status", sa.String(length=16), nullable=False, server_default="success"),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("completion_tokens", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("estimated", sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column("latency_ms", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now(), index=True),
+        )
+        op.create_index("ix_ai_usage_events_id", "ai_usage_events", ["id"], unique=False)
+
+    if not insp.has_table("ai_usage_daily"):
+        op.create_table(
+            "ai_usage_daily",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=True),
+            sa.Column("provider", sa.String(length=20), nullable=False),
+            sa.Column("model", sa.String(length=100), nullable=False, server_default=""),
+            sa.Column("endpoint", sa.String(length=100), nullable=False, server_default=""),
+            sa.Column("calls", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("errors", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("estimated_calls", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("completion_tokens", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("latency_ms_total", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("latency_ms_max", sa.Float(), nullable=False, server_default="0"),
+        )
+        op.create_index("ix_ai_usage_daily_id", "ai_usage_daily", ["id"], unique=False)
+        op.create_index("ix_ai_usage_daily_day_tenant", "ai_usage_daily", ["day", "tenant_id"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("ai_usage_daily"):
+        op.drop_index("ix_ai_usage_daily_day_tenant", table_name="ai_usage_daily")
+        op.drop_index("ix_ai_usage_daily_id", table_name="ai_usage_daily")
+        op.drop_table("ai_usage_daily")
+    if insp.has_table("ai_usage_events"):
+        op.drop_index("ix_ai_usage_events_id", table_name="ai_usage_events")
+        op.drop_table("ai_usage_events")
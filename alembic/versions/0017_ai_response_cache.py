@@ -0,0 +1,47 @@
+"""Add the AI suite response cache table.
+
+Revision ID: 0017_ai_response_cache
+Revises: 0016_ai_usage
+Create Date: 2026-10-17 22:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0017_ai_response_cache"
+down_revision: Union[str, None] = "0016_ai_usage"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if not insp.has_table("ai_response_cache"):
+        op.create_table(
+            "ai_response_cache",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("key", sa.String(length=64), nullable=False),
+            sa.Column("operation", sa.String(length=100), nullable=False),
+            sa.Column("model", sa.String(length=100), nullable=False, server_default=""),
+            sa.Column("response", sa.Text(), nullable=False),
+            sa.Column("latency_ms", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False, index=True),
+        )
+        op.create_index("ix_ai_response_cache_id", "ai_response_cache", ["id"], unique=False)
+        op.create_index("ix_ai_response_cache_tenant_key", "ai_response_cache", ["tenant_id", "key"], unique=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("ai_response_cache"):
+        op.drop_index("ix_ai_response_cache_tenant_key", table_name="ai_response_cache")
+        op.drop_index("ix_ai_response_cache_id", table_name="ai_response_cache")
+        op.drop_table("ai_response_cache")
@@ -0,0 +1,37 @@
+"""Add a lease to RAG ingest jobs so each job is run by one worker at a time.
+
+Revision ID: 0018_rag_ingest_job_lease
+Revises: 0017_ai_response_cache
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0018_rag_ingest_job_lease"
+down_revision: Union[str, None] = "0017_ai_response_cache"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+
+    if insp.has_table("rag_ingest_jobs"):
+        columns = [col["name"] for col in insp.get_columns("rag_ingest_jobs")]
+        if "lease_expires_at" not in columns:
+            op.add_column("rag_ingest_jobs", sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("rag_ingest_jobs"):
+        columns = [col["name"] for col in insp.get_columns("rag_ingest_jobs")]
+        if "lease_expires_at" in columns:
+            with op.batch_alter_table("rag_ingest_jobs") as batch_op:
+                batch_op.drop_column("lease_expires_at")
@@ -2,9 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 import asyncio
 import time
 import logging
-import httpx
-import os
-from typing import Any
+from typing import Any, Optional
 from pydantic import ValidationError
 
 from sqlalchemy import select, func
@@ -19,6 +17,7 @@ from app.db.models.tenant import Tenant
 from app.db.models.user import User
 from app.middleware.rate_limit import rate_limit
 from app.models.ai import GDPRAnalyzeRequest, GDPRAnalyzeResponse
+from app.services import ai_bulkhead, ai_transport
 from app.services.ai_service import (
     analyze_gdpr_text,
     get_circuit_breaker_status,
@@ -27,6 +26,7 @@ from app.services.ai_service import (
 )
 from app.schemas.ai_suite import (
     AIAuditV2Request,
+    AIBatchRequest,
     AIAuditV2Response,
     AIDocumentAutofillRequest,
     AIDocumentAutofillResponse,
@@ -47,15 +47,25 @@ from app.schemas.ai_suite import (
     AITomsRecommendRequest,
     AITomsRecommendResponse,
 )
+from app.services.ai_batch import batch_lines, ndjson_response
+from app.services.ai_stream import completion_events, event_stream_response
 from app.services.ai_suite_service import (
     autofill_document,
     classify_incident,
+    dpia_messages,
+    dpia_result,
     evaluate_risk,
+    explain_messages,
+    explain_result,
     explain_text,
     generate_dpia,
     map_modules,
     recommend_toms,
+    ropa_messages,
+    ropa_result,
     run_audit_v2,
+    summarize_messages,
+    summarize_result,
     summarize_text,
     suggest_ropa,
 )
@@ -178,7 +188,10 @@ async def analyze_gdpr(
     # Validate input length (defensive); GDPRAnalyzeRequest includes a pydantic max_length, but return 400 instead of 422
     if req.text is None or len(req.text) == 0:
         raise HTTPException(status_code=400, detail="Missing or empty text field")
-    max_chars = int(settings.AI_MAX_INPUT_CHARS or 50000)
+    if settings.AI_ANALYZE_LONG_INPUT:
+        max_chars = int(settings.AI_ANALYZE_LONG_INPUT_MAX_CHARS or 1000000)
+    else:
+        max_chars = int(settings.AI_MAX_INPUT_CHARS or 50000)
     if len(req.text) > max_chars:
         raise HTTPException(status_code=400, detail=f"Text exceeds maximum length of {max_chars} characters")
 
@@ -187,7 +200,7 @@ async def analyze_gdpr(
     logger.info("AI analyze requested: ip=%s tenant=%s user=%s model=%s input_size=%d", ip, tenant_id, user_id, settings.AI_MODEL, len(req.text))
     # Perform analysis by delegating to the service layer
     try:
-        result = await analyze_gdpr_text(req.text)
+        result = await analyze_gdpr_text(req.text, tenant_id=tenant_id)
     except HTTPException as e:
         logger.error("AI analyze failed for ip=%s: %s", ip, e.detail)
         # audit error
@@ -230,12 +243,12 @@ async def analyze_gdpr(
 async def ollama_health(request: Request):
     """Return Ollama basic health (tags/models)."""
     provider = (settings.AI_PROVIDER or "ollama").lower()
-    base = (os.environ.get("OLLAMA_BASE_URL") or settings.AI_BASE_URL or settings.OLLAMA_BASE_URL or "http://127.0.0.1:11434").rstrip("/")
+    base = ai_transport.ollama_base_url()
     if provider != "ollama":
         return {"status": "ok", "provider": provider, "detail": "health check available only for Ollama provider"}
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(f"{base}/api/tags")
+        client = await ai_transport.get_client("ollama")
+        resp = await client.get(f"{base}/api/tags", timeout=5.0)
         if resp.status_code == 200:
             models = resp.json()
             return {"status": "ok", "models": models}
@@ -249,7 +262,7 @@ async def ollama_health(request: Request):
 @router.get("/circuit", summary="AI circuit status", description="Return circuit breaker status for AI calls.")
 @rate_limit("ai", limit=20, window_seconds=60)
 async def ai_circuit_status(request: Request):
-    """Return circuit breaker status for AI/Ollama calls."""
+    """Return circuit breaker status for AI calls: the configured provider's breaker, every provider's, the retry budget and hedging."""
     status = await get_circuit_breaker_status()
     return status
 
@@ -262,21 +275,35 @@ async def ai_circuit_history(request: Request):
     return {"history": history}
 
 
-@router.post("/circuit/reset", summary="Reset AI circuit", description="Reset AI circuit breaker (admin/owner only).")
+@router.post("/circuit/reset", summary="Reset AI circuit", description="Reset AI circuit breakers (admin/owner only).")
 @rate_limit("ai", limit=20, window_seconds=60)
-async def ai_circuit_reset(request: Request, ctx: CurrentContext = Depends(ai_context)):
-    """Reset the circuit breaker state (clear failure history and counters). Admin only."""
+async def ai_circuit_reset(request: Request, provider: Optional[str] = None, ctx: CurrentContext = Depends(ai_context)):
+    """Reset circuit breaker state (clear failure history and counters), for one provider or all. Admin only."""
     from app.core.roles import Role
 
     if ctx.role not in (Role.ADMIN.value, Role.OWNER.value):
         raise HTTPException(status_code=403, detail="Forbidden")
-    await reset_circuit_breaker()
+    await reset_circuit_breaker(provider)
     return {"status": "ok"}
 
 
+@router.get("/bulkhead", summary="AI admission status", description="Return AI call concurrency, queue depth and wait-time metrics.")
+@rate_limit("ai", limit=20, window_seconds=60)
+async def ai_bulkhead_status(request: Request, ctx: CurrentContext = Depends(ai_context)):
+    """Global bulkhead metrics plus the caller's tenant in-flight and queued calls."""
+    return ai_bulkhead.bulkhead_status(ctx.tenant_id)
+
+
 # === GDPR AI Suite ===
 
 
+def _completion_stream(ctx: CurrentContext, request: Request, messages: list[dict], finalize):
+    """text/event-stream response for a suite endpoint; the final "result" event carries its usual JSON body."""
+    return event_stream_response(
+        completion_events(messages, tenant_id=ctx.tenant_id, user_id=ctx.user.id, endpoint=request.url.path, finalize=finalize)
+    )
+
+
 @router.post("/dpia/generate", response_model=AIDPIAGenerateResponse, tags=["AI"], summary="Generate DPIA", description="Generate a DPIA draft using AI.")
 @rate_limit("ai", limit=20, window_seconds=60)
 async def ai_generate_dpia(
@@ -287,6 +314,16 @@ async def ai_generate_dpia(
     return await generate_dpia(ctx.tenant_id, payload)
 
 
+@router.post("/dpia/generate/stream", tags=["AI"], summary="Generate DPIA (streamed)", description="Stream a DPIA draft as server-sent events.")
+@rate_limit("ai", limit=20, window_seconds=60)
+async def ai_generate_dpia_stream(
+    payload: AIDPIAGenerateRequest,
+    request: Request,
+    ctx: CurrentContext = Depends(ai_context),
+):
+    return _completion_stream(ctx, request, dpia_messages(payload), lambda raw: dpia_result(payload, raw))
+
+
 @router.post("/incidents/classify", response_model=AIIncidentClassifyResponse, tags=["AI"], summary="Classify incident", description="Classify an incident using AI.")
 @rate_limit("ai", limit=20, window_seconds=60)
 async def ai_incident_classify(
@@ -307,6 +344,16 @@ async def ai_ropa_suggest(
     return await suggest_ropa(ctx.tenant_id, payload)
 
 
+@router.post("/ropa/suggest/stream", tags=["AI"], summary="Suggest ROPA (streamed)", description="Stream ROPA suggestions as server-sent events.")
+@rate_limit("ai", limit=20, window_seconds=60)
+async def ai_ropa_suggest_stream(
+    payload: AIRopaSuggestRequest,
+    request: Request,
+    ctx: CurrentContext = Depends(ai_context),
+):
+    return _completion_stream(ctx, request, ropa_messages(payload), lambda raw: ropa_result(payload, raw))
+
+
 @router.post("/toms/recommend", response_model=AITomsRecommendResponse, tags=["AI"], summary="Recommend TOMs", description="Recommend technical and organisational measures.")
 @rate_limit("ai", limit=20, window_seconds=60)
 async def ai_toms_recommend(
@@ -368,6 +415,16 @@ async def ai_explain(
     return await explain_text(ctx.tenant_id, payload)
 
 
+@router.post("/explain/stream", tags=["AI"], summary="Explain text (streamed)", description="Stream an explanation as server-sent events.")
+@rate_limit("ai", limit=20, window_seconds=60)
+async def ai_explain_stream(
+    payload: AIExplainRequest,
+    request: Request,
+    ctx: CurrentContext = Depends(ai_context),
+):
+    return _completion_stream(ctx, request, explain_messages(payload), explain_result)
+
+
 @router.post("/summarize", response_model=AISummarizeResponse, tags=["AI"], summary="Summarize text", description="Summarize text using AI.")
 @rate_limit("ai", limit=20, window_seconds=60)
 async def ai_summarize(
@@ -376,3 +433,26 @@ async def ai_summarize(
     ctx: CurrentContext = Depends(ai_context),
 ):
     return await summarize_text(ctx.tenant_id, payload)
+
+
+@router.post("/summarize/stream", tags=["AI"], summary="Summarize text (streamed)", description="Stream a summary as server-sent events.")
+@rate_limit("ai", limit=20, window_seconds=60)
+async def ai_summarize_stream(
+    payload: AISummarizeRequest,
+    request: Request,
+    ctx: CurrentContext = Depends(ai_context),
+):
+    return _completion_stream(ctx, request, summarize_messages(payload), summarize_result)
+
+
+@router.post("/batch", tags=["AI"], summary="Batch AI operations", description="Run several AI suite operations concurrently and stream each result as NDJSON.")
+@rate_limit("ai", limit=20, window_seconds=60)
+async def ai_batch(
+    payload: AIBatchRequest,
+    request: Request,
+    ctx: CurrentContext = Depends(ai_context),
+):
+    max_items = int(settings.AI_BATCH_MAX_ITEMS or 50)
+    if len(payload.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds maximum of {max_items} items")
+    return ndjson_response(batch_lines(payload.items, tenant_id=ctx.tenant_id, user_id=ctx.user.id, endpoint=request.url.path))
@@ -3,27 +3,92 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import CurrentContext, current_context
 from app.db.database import get_db
-from app.models.rag import CreateKnowledgeDocumentRequest, KnowledgeDocumentResponse
+from app.models.rag import (
+    CreateKnowledgeDocumentRequest,
+    IngestJobAccepted,
+    IngestJobResponse,
+    KnowledgeDocumentResponse,
+    KnowledgeDocumentUpdateResponse,
+    UpdateKnowledgeDocumentRequest,
+)
 from app.models.rag_search import RAGAnswer, RAGSearchRequest, RAGSearchResult
+from app.services.embedding_client import get_embedding_metrics
+from app.services.rag_dedupe import dedupe_stats
+from app.services.rag_jobs import chunk_document, enqueue_document, get_job
 from app.services.rag_pipeline import normalize_text
-from app.services.rag_service import create_document, list_documents, search
+from app.services.rag_service import add_document, list_documents, search, update_document
 
 router = APIRouter(prefix="/api/rag", tags=["RAG"])
 
+# enforce input length to avoid huge documents
+MAX_DOCUMENT_CHARS = 200000
 
-@router.post("/documents", response_model=KnowledgeDocumentResponse)
+
+def _check_length(content: str) -> None:
+    if len(content) > MAX_DOCUMENT_CHARS:
+        raise HTTPException(status_code=400, detail=f"Content exceeds max length {MAX_DOCUMENT_CHARS}")
+
+
+@router.post("/documents", response_model=IngestJobAccepted, status_code=202)
 async def create_document_route(
     payload: CreateKnowledgeDocumentRequest,
     db: AsyncSession = Depends(get_db),
     ctx: CurrentContext = Depends(current_context),
 ):
-    # enforce input length to avoid huge documents
-    max_len = 200000
-    content = payload.content
-    if len(content) > max_len:
-        raise HTTPException(status_code=400, detail=f"Content exceeds max length {max_len}")
-    doc = await create_document(db, ctx.tenant_id, payload.title, content, payload.source, payload.language, payload.tags)
-    return KnowledgeDocumentResponse.from_orm(doc)
+    _check_length(payload.content)
+    doc = await add_document(db, ctx.tenant_id, payload.title, payload.content, payload.source, payload.language, payload.tags)
+    # chunking and embedding run in the ingest worker pool; poll GET /api/rag/jobs/{job_id}
+    job = await enqueue_document(db, doc, ctx.tenant_id)
+    return IngestJobAccepted(job_id=job.id, document_id=doc.id, status=job.status)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(job_id: int, db: AsyncSession = Depends(get_db), ctx: CurrentContext = Depends(current_context)):
+    job = await get_job(db, ctx.tenant_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return IngestJobResponse.model_validate(job)
+
+
+async def _update_document(db: AsyncSession, tenant_id: int, document_id: int, fields: dict) -> KnowledgeDocumentUpdateResponse:
+    pending = None
+    if fields.get("content") is not None:
+        _check_length(fields["content"])
+        # chunk off the event loop; only chunks with new checksums are embedded
+        pending = await chunk_document(fields["content"])
+    updated = await update_document(db, tenant_id, document_id, fields, pending=pending)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    doc, stats = updated
+    return KnowledgeDocumentUpdateResponse(
+        document=KnowledgeDocumentResponse.model_validate(doc),
+        chunks_added=stats["added"],
+        chunks_removed=stats["removed"],
+        chunks_kept=stats["kept"],
+    )
+
+
+@router.put("/documents/{document_id}", response_model=KnowledgeDocumentUpdateResponse)
+async def replace_document_route(
+    document_id: int,
+    payload: CreateKnowledgeDocumentRequest,
+    db: AsyncSession = Depends(get_db),
+    ctx: CurrentContext = Depends(current_context),
+):
+    return await _update_document(db, ctx.tenant_id, document_id, payload.model_dump())
+
+
+@router.patch("/documents/{document_id}", response_model=KnowledgeDocumentUpdateResponse)
+async def patch_document_route(
+    document_id: int,
+    payload: UpdateKnowledgeDocumentRequest,
+    db: AsyncSession = Depends(get_db),
+    ctx: CurrentContext = Depends(current_context),
+):
+    fields = payload.model_dump(exclude_unset=True)
+    if "content" in fields and fields["content"] is None:
+        raise HTTPException(status_code=400, detail="Content cannot be null")
+    return await _update_document(db, ctx.tenant_id, document_id, fields)
 
 
 @router.get("/documents", response_model=list[KnowledgeDocumentResponse])
@@ -34,7 +99,17 @@ async def get_documents(db: AsyncSession = Depends(get_db), ctx: CurrentContext
 
 @router.post("/search", response_model=RAGAnswer)
 async def search_rag(payload: RAGSearchRequest, db: AsyncSession = Depends(get_db), ctx: CurrentContext = Depends(current_context)):
-    results = await search(db, ctx.tenant_id, normalize_text(payload.query), payload.top_k)
+    filters = payload.filters.model_dump(exclude_none=True) if payload.filters else None
+    results = await search(
+        db,
+        ctx.tenant_id,
+        normalize_text(payload.query),
+        payload.top_k,
+        payload.mode,
+        filters=filters,
+        diversity=payload.diversity,
+        max_per_document=payload.max_per_document,
+    )
     items = []
     for score, chunk, emb in results:
         items.append(
@@ -46,6 +121,8 @@ async def search_rag(payload: RAGSearchRequest, db: AsyncSession = Depends(get_d
                 chunk_index=chunk.chunk_index,
                 model=emb.model or "hash-embed",
                 section_title=chunk.section_title,
+                start_offset=chunk.start_offset,
+                end_offset=chunk.end_offset,
             )
         )
     answer_text = "Insufficient context"
@@ -54,3 +131,15 @@ async def search_rag(payload: RAGSearchRequest, db: AsyncSession = Depends(get_d
         context = "\n".join([i.content for i in items])
         answer_text = f"Relevant context:\n{context}"
     return RAGAnswer(answer=answer_text, citations=items)
+
+
+@router.get("/dedupe/stats")
+async def dedupe_stats_route(db: AsyncSession = Depends(get_db), ctx: CurrentContext = Depends(current_context)):
+    """Near-duplicate documents and chunks flagged or skipped for this tenant."""
+    return await dedupe_stats(db, ctx.tenant_id)
+
+
+@router.get("/embeddings/metrics")
+async def embedding_metrics(ctx: CurrentContext = Depends(current_context)):
+    """Embedding cache hit rate and provider throughput for this process."""
+    return get_embedding_metrics()
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import CurrentContext, current_context
 from app.core.roles import Role
 from app.db.database import get_db
 from app.schemas.ai_policies import PolicyGenerateRequest, PolicyGenerateResponse
-from app.services.ai_policy_service import generate_policy
+from app.services.ai_policy_service import generate_policy, policy_messages, policy_result
+from app.services.ai_stream import completion_events, event_stream_response
 
 router = APIRouter(prefix="/api/ai/policies", tags=["AI Policies"])
 
@@ -24,3 +25,17 @@ async def generate(
     _assert_policy_role(ctx)
     # db currently unused but kept for future audit/logging hooks
     return await generate_policy(ctx.tenant_id, payload)
+
+
+@router.post("/generate/stream")
+async def generate_stream(
+    payload: PolicyGenerateRequest,
+    request: Request,
+    ctx: CurrentContext = Depends(current_context),
+):
+    """Stream the policy draft as server-sent events; the "result" event matches ``/generate``."""
+    _assert_policy_role(ctx)
+    events = completion_events(
+        policy_messages(payload), tenant_id=ctx.tenant_id, user_id=ctx.user.id, endpoint=request.url.path, finalize=policy_result
+    )
+    return event_stream_response(events)
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import CurrentContext, current_context
 from app.db.database import get_db
 from app.schemas.ai_qa import AiAnswerRequest, AiAnswerResponse
-from app.services.ai_qa_service import answer_question, rag_search
+from app.services.ai_qa_service import cached_answer, prepare_answer
+from app.services.ai_stream import completion_events, event_stream_response, replay_events
+from app.services.answer_cache import get_answer_cache
 
 router = APIRouter(prefix="/api/ai", tags=["AI Q&A"])
 
@@ -12,12 +14,61 @@ router = APIRouter(prefix="/api/ai", tags=["AI Q&A"])
 @router.post("/answer", response_model=AiAnswerResponse)
 async def answer(
     payload: AiAnswerRequest,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     ctx: CurrentContext = Depends(current_context),
 ):
     if not payload.question.strip():
         raise HTTPException(status_code=400, detail="Question is required")
 
-    sources = await rag_search(ctx.tenant_id, payload.question, limit=5, db=db)
-    answer_text = await answer_question(ctx.tenant_id, payload.question, sources)
-    return AiAnswerResponse(answer=answer_text, sources=sources)
+    result, status = await cached_answer(
+        ctx.tenant_id,
+        payload.question,
+        limit=5,
+        db=db,
+        diversity=payload.diversity,
+        max_per_document=payload.max_per_document,
+    )
+    response.headers["X-Answer-Cache"] = status
+    return result
+
+
+@router.post("/answer/stream")
+async def answer_stream(
+    payload: AiAnswerRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    ctx: CurrentContext = Depends(current_context),
+):
+    """Stream the answer as server-sent events: "sources", "delta"s, then "result" (the ``/answer`` body) and "done"."""
+    if not payload.question.strip():
+        raise HTTPException(status_code=400, detail="Question is required")
+
+    prepared = await prepare_answer(
+        ctx.tenant_id,
+        payload.question,
+        limit=5,
+        db=db,
+        diversity=payload.diversity,
+        max_per_document=payload.max_per_document,
+    )
+    if prepared.cached is not None:
+        events = replay_events(prepared.cached.answer, prepared.cached, prelude=[("sources", prepared.sources)])
+        return event_stream_response(events, headers={"X-Answer-Cache": "hit"})
+
+    events = completion_events(
+        prepared.messages,
+        tenant_id=ctx.tenant_id,
+        user_id=ctx.user.id,
+        endpoint=request.url.path,
+        finalize=lambda text: AiAnswerResponse(answer=text, sources=prepared.sources),
+        prelude=[("sources", prepared.sources)],
+        on_result=lambda result: get_answer_cache().put(prepared.key, result),
+    )
+    return event_stream_response(events, headers={"X-Answer-Cache": "miss"})
+
+
+@router.get("/answer/cache/metrics")
+async def answer_cache_metrics(ctx: CurrentContext = Depends(current_context)):
+    """Answer cache hit/miss counters for this process."""
+    return get_answer_cache().metrics()
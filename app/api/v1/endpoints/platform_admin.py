@@ -1,4 +1,4 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import func, select, text
@@ -20,6 +20,7 @@ from app.schemas.platform_admin import (
     PlatformBillingStatus,
     PayPalConfig,
     PayPalWebhookEvent,
+    AIUsageItem,
     AIUsageSummary,
     LogItem,
     JobStatus,
@@ -28,6 +29,7 @@ from app.schemas.platform_admin import (
     FeatureFlagItem,
     GlobalConfig,
 )
+from app.services import ai_response_cache, ai_router, ai_usage
 
 router = APIRouter(prefix="/api/admin/platform", tags=["Platform Admin"])
 
@@ -42,9 +44,10 @@ async def platform_overview(db: AsyncSession = Depends(get_db)) -> PlatformOverv
     # Active subscriptions/MRR placeholders until billing is wired
     active_subscriptions = total_tenants
     mrr_eur = float(total_tenants * 100)  # placeholder
-    ai_tokens_30d = 0
+    since_30d = (datetime.now(timezone.utc) - timedelta(days=29)).date()
+    ai_tokens_30d = sum(row["tokens"] for row in await ai_usage.daily_totals(db, since_30d))
     new_tenants_by_month: list[dict] = []
-    ai_tokens_by_month: list[dict] = []
+    ai_tokens_by_month = await ai_usage.monthly_tokens(db)
     try:
         result = await db.execute(
             text(
@@ -372,26 +375,70 @@ async def paypal_webhook_events() -> list[PayPalWebhookEvent]:
     ]
 
 
-@router.get("/ai/usage", response_model=AIUsageSummary, dependencies=[Depends(require_platform_owner)])
-async def ai_usage_summary() -> AIUsageSummary:
+async def _ai_usage(db: AsyncSession, tenant_id: int | None = None) -> AIUsageSummary:
+    """Token, cost and latency totals (all tenants, or one) from the AI usage events and daily rollups, plus response cache hits."""
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    prompt_24h, completion_24h = await ai_usage.tokens_since(db, now - timedelta(hours=24), tenant_id)
+    week = await ai_usage.daily_totals(db, today - timedelta(days=6), tenant_id)
+    month = await ai_usage.daily_totals(db, today - timedelta(days=29), tenant_id)
+    per_tenant = await ai_usage.daily_totals(db, today - timedelta(days=29), tenant_id, group_by=("tenant_id",))
+    breakdown = await ai_usage.daily_totals(db, today - timedelta(days=29), tenant_id, group_by=("provider", "model", "endpoint"))
+
+    included = {plan.id: plan.included_ai_tokens for plan in await list_plans()}
+    tenant_ids = [row["tenant_id"] for row in per_tenant if row["tenant_id"] is not None]
+    tenants = {t.id: t for t in (await db.execute(select(Tenant).where(Tenant.id.in_(tenant_ids)))).scalars()} if tenant_ids else {}
+    items = []
+    for row in sorted(per_tenant, key=lambda r: r["tokens"], reverse=True):
+        tenant = tenants.get(row["tenant_id"])
+        if tenant is None:
+            continue
+        plan = getattr(tenant, "plan", "free") or "free"
+        limit = included.get(plan)
+        overage = max(0, row["tokens"] - limit) if limit is not None else 0
+        items.append(
+            AIUsageItem(
+                tenant_id=tenant.id,
+                tenant_name=tenant.name,
+                plan=plan,
+                ai_tokens_30d=row["tokens"],
+                ai_calls_30d=row["calls"],
+                overage_tokens=overage,
+                status="over_limit" if overage else "ok",
+                limits={"included_ai_tokens": limit} if limit is not None else None,
+                errors_30d=row["errors"],
+                avg_latency_ms=row["avg_latency_ms"],
+                max_latency_ms=row["max_latency_ms"],
+                cost_eur_estimate=ai_usage.cost_eur(row["prompt_tokens"], row["completion_tokens"]),
+            )
+        )
+    month_totals = month[0] if month else {"tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
     return AIUsageSummary(
-        tokens_24h=0,
-        tokens_7d=0,
-        tokens_30d=0,
-        cost_eur_estimate=0.0,
-        items=[],
+        tokens_24h=prompt_24h + completion_24h,
+        tokens_7d=week[0]["tokens"] if week else 0,
+        tokens_30d=month_totals["tokens"],
+        cost_eur_estimate=ai_usage.cost_eur(month_totals["prompt_tokens"], month_totals["completion_tokens"]),
+        items=items,
+        breakdown=breakdown,
+        response_cache=ai_response_cache.cache_stats(tenant_id),
     )
 
 
+@router.get("/ai/usage", response_model=AIUsageSummary, dependencies=[Depends(require_platform_owner)])
+async def ai_usage_summary(db: AsyncSession = Depends(get_db)) -> AIUsageSummary:
+    return await _ai_usage(db)
+
+
 @router.get("/ai/usage/{tenant_id}", response_model=AIUsageSummary, dependencies=[Depends(require_platform_owner)])
-async def ai_usage_tenant(tenant_id: int) -> AIUsageSummary:
-    return AIUsageSummary(
-        tokens_24h=0,
-        tokens_7d=0,
-        tokens_30d=0,
-        cost_eur_estimate=0.0,
-        items=[],
-    )
+async def ai_usage_tenant(tenant_id: int, db: AsyncSession = Depends(get_db)) -> AIUsageSummary:
+    if not await db.get(Tenant, tenant_id):
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return await _ai_usage(db, tenant_id)
+
+
+@router.get("/ai/routing", dependencies=[Depends(require_platform_owner)])
+async def ai_routing() -> dict:
+    return ai_router.routing_status()
 
 
 @router.post("/ai/limits/{tenant_id}", dependencies=[Depends(require_platform_owner)])
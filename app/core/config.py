@@ -20,8 +20,8 @@ class Settings(BaseSettings):
     CORS_ORIGINS: Optional[str] = "*"
     PUBLIC_FRONTEND_URL: Optional[str] = None
 
-    # AI configuration
-    AI_PROVIDER: str = "ollama"
+    # AI configuration. AI_PROVIDER (openai | local | ollama) serves operations without an AI_ROUTES route.
+    AI_PROVIDER: str = "openai"
     AI_BASE_URL: Optional[str] = "http://127.0.0.1:11434"
     AI_MODEL: Optional[str] = "gemma:2b"
     AI_API_KEY: Optional[str] = None
@@ -38,27 +38,154 @@ class Settings(BaseSettings):
     AI_AUDIT_STORE_INPUT: bool = False
     AI_AUDIT_INPUT_MAX_LENGTH: int = 512
 
-    # Circuit breaker for Ollama
+    # Per-provider circuit breaker for AI calls: opens after AI_CB_FAILURE_THRESHOLD failed
+    # calls; after the cooldown, AI_CB_HALF_OPEN_PROBES trial calls decide whether it closes.
     AI_CB_FAILURE_THRESHOLD: int = 5
     AI_CB_COOLDOWN_SECONDS: int = 30
     AI_CB_HISTORY_MAX: int = 50
+    AI_CB_HALF_OPEN_PROBES: int = 1
+
+    # AI retries (AI_RETRY_ATTEMPTS per call, full-jitter exponential backoff) share a budget:
+    # at most AI_RETRY_BUDGET_RATIO retries per call over the last AI_RETRY_BUDGET_WINDOW_SECONDS,
+    # but always AI_RETRY_BUDGET_MIN_RETRIES. Hedged requests (a second attempt once a call
+    # outlives the provider's AI_HEDGE_PERCENTILE latency) spend from the same budget.
+    AI_RETRY_BACKOFF_MAX_SECONDS: float = 8.0
+    AI_RETRY_BUDGET_RATIO: float = 0.2
+    AI_RETRY_BUDGET_MIN_RETRIES: int = 10
+    AI_RETRY_BUDGET_WINDOW_SECONDS: int = 60
+    AI_HEDGE_ENABLED: bool = False
+    AI_HEDGE_PERCENTILE: float = 95.0
+    AI_HEDGE_MIN_SAMPLES: int = 20
+
+    # AI call bulkheads: concurrent provider calls overall and per tenant (0 = unbounded), with a
+    # bounded wait queue; AI_PLAN_WEIGHTS (e.g. "free:1,pro:2,enterprise:4") turns on weighted
+    # fair queuing by Tenant.plan. POST /api/ai/batch fans out at most AI_BATCH_CONCURRENCY items.
+    AI_MAX_CONCURRENCY: int = 16
+    AI_TENANT_MAX_CONCURRENCY: int = 4
+    AI_QUEUE_MAX_DEPTH: int = 64
+    AI_TENANT_QUEUE_MAX_DEPTH: int = 32
+    AI_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    AI_PLAN_WEIGHTS: Optional[str] = None
+    AI_BATCH_MAX_ITEMS: int = 50
+    AI_BATCH_CONCURRENCY: int = 8
+
+    # AI provider routing: AI_ROUTES maps operations (analyze, qa, policies, suite, suite/<op>
+    # such as suite/summarize or suite/dpia/generate, default) to provider pools, e.g.
+    # "suite/summarize=fastest:ollama,local,openai;suite/dpia/generate=openai,ollama;qa=local:3,openai:1".
+    # Strategies: ordered (default), fastest (latency EWMA), weighted (provider:weight). A failed
+    # call fails over to the next provider; providers with an open circuit or an error-rate
+    # EWMA above AI_ROUTER_MAX_ERROR_RATE go last until the rate decays (half-life below).
+    AI_ROUTES: Optional[str] = None
+    AI_ROUTER_EWMA_ALPHA: float = 0.2
+    AI_ROUTER_MAX_ERROR_RATE: float = 0.5
+    AI_ROUTER_ERROR_HALF_LIFE_SECONDS: float = 60.0
+
+    # AI usage accounting: every provider call's tokens (from the provider's usage block, else
+    # estimated) and latency are buffered in memory and written every AI_USAGE_FLUSH_SECONDS or
+    # AI_USAGE_BATCH_SIZE records, as events (kept AI_USAGE_RETENTION_DAYS) and daily rollups.
+    # Beyond AI_USAGE_BUFFER_MAX unwritten records the oldest are dropped. The AI_COST_* rates
+    # (EUR per 1,000 tokens) price the platform admin usage summary.
+    AI_USAGE_ENABLED: bool = True
+    AI_USAGE_FLUSH_SECONDS: float = 2.0
+    AI_USAGE_BATCH_SIZE: int = 500
+    AI_USAGE_BUFFER_MAX: int = 10000
+    AI_USAGE_RETENTION_DAYS: int = 35
+    AI_COST_EUR_PER_1K_PROMPT_TOKENS: float = 0.0004
+    AI_COST_EUR_PER_1K_COMPLETION_TOKENS: float = 0.0016
 
     # Optional admin override header/token (e.g., for circuit reset)
     ADMIN_OVERRIDE_TOKEN: Optional[str] = None
 
     # AI provider config
-    AI_PROVIDER: str = "openai"  # openai | local
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4.1-mini"
     LOCAL_AI_ENDPOINT: Optional[str] = None
     AI_MAX_TOKENS: int = 1200
     AI_TEMPERATURE: float = 0.3
 
+    # AI provider HTTP transport: one pooled keep-alive client per provider (openai | local | ollama)
+    # for the lifetime of the app. Per-provider timeouts fall back to AI_REQUEST_TIMEOUT_SECONDS;
+    # AI_HTTP2 needs the h2 package (pip install httpx[http2]) and is ignored without it.
+    AI_HTTP_MAX_CONNECTIONS: int = 100
+    AI_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    AI_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    AI_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    AI_HTTP2: bool = False
+    OPENAI_TIMEOUT_SECONDS: Optional[float] = None
+    LOCAL_AI_TIMEOUT_SECONDS: Optional[float] = None
+    OLLAMA_TIMEOUT_SECONDS: Optional[float] = None
+
     # AI safety/logging knobs
     AI_LOGGING_LEVEL: str = "hash"  # none|hash|truncated|full
     AI_MAX_INPUT_CHARS: int = 50000
     AI_MAX_OUTPUT_CHARS: int = 20000
     AI_DISABLE_PROMPT_STORAGE: bool = True
+    # /api/ai/answer cache per (tenant, corpus version, question); 0 entries disables it
+    AI_ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    AI_ANSWER_CACHE_TTL_SECONDS: int = 900
+    # AI suite response cache (opt-in): completions keyed by a hash of (operation, model, temperature,
+    # normalized messages) per tenant, in a memory LRU of AI_RESPONSE_CACHE_MAX_ENTRIES and, with
+    # AI_RESPONSE_CACHE_DB, the ai_response_cache table. AI_RESPONSE_CACHE_TTLS overrides the TTL per
+    # suite operation, e.g. "explain=604800;toms/recommend=86400;risk/evaluate=0" (0 = not cached).
+    AI_RESPONSE_CACHE_ENABLED: bool = False
+    AI_RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    AI_RESPONSE_CACHE_TTL_SECONDS: int = 86400
+    AI_RESPONSE_CACHE_TTLS: Optional[str] = None
+    AI_RESPONSE_CACHE_DB: bool = True
+    # /api/ai/gdpr/analyze long-document mode: text longer than one chunk of AI_ANALYZE_CHUNK_TOKENS
+    # (estimated model tokens) is split with the RAG chunker, analyzed AI_ANALYZE_CONCURRENCY chunks at
+    # a time and merged; inputs up to AI_ANALYZE_LONG_INPUT_MAX_CHARS are accepted instead of AI_MAX_INPUT_CHARS
+    AI_ANALYZE_LONG_INPUT: bool = False
+    AI_ANALYZE_LONG_INPUT_MAX_CHARS: int = 1000000
+    AI_ANALYZE_CHUNK_TOKENS: int = 2000
+    AI_ANALYZE_CONCURRENCY: int = 4
+    # MMR diversity (0 disables) and per-document cap (0 = none) for /api/ai/answer context
+    AI_ANSWER_DIVERSITY: float = 0.0
+    AI_ANSWER_MAX_PER_DOCUMENT: int = 0
+    # /api/ai/answer context: retrieved chunks are packed into this many estimated prompt tokens
+    AI_CONTEXT_TOKEN_BUDGET: int = 1500
+
+    # RAG embeddings: hash (offline pseudo-embedding) | local (HTTP embedding server)
+    EMBEDDING_PROVIDER: str = "hash"
+    EMBEDDING_MODEL: Optional[str] = None
+    LOCAL_EMBEDDING_ENDPOINT: Optional[str] = None
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_TIMEOUT_SECONDS: int = 30
+
+    # RAG chunking: token counting per word, whitespace | subword (~4 chars per token)
+    RAG_CHUNK_TOKENIZER: str = "whitespace"
+
+    # RAG ingestion jobs: async workers (DB + embedding I/O) and processes for chunking/hashing.
+    # A worker claims a job with a lease of RAG_INGEST_LEASE_SECONDS, renewed while it runs; running
+    # jobs whose lease ran out (their worker died) are taken over by the next sweep.
+    RAG_INGEST_WORKERS: int = 2
+    RAG_INGEST_PROCESSES: int = 2
+    RAG_INGEST_MAX_ATTEMPTS: int = 3
+    RAG_INGEST_LEASE_SECONDS: float = 300.0
+
+    # RAG approximate nearest-neighbour search: exact | ivf | lsh.
+    # Per-tenant override: tenant_settings key "rag_ann", e.g. {"type": "ivf", "nlist": 256, "nprobe": 8}
+    RAG_ANN_INDEX: str = "exact"
+    RAG_ANN_MIN_VECTORS: int = 20000
+
+    # RAG near-duplicate detection (MinHash + LSH bands): off | flag | skip. flag records
+    # near-duplicate documents/chunks and collapses them in search; skip does not embed them.
+    # A match needs an estimated Jaccard similarity of at least RAG_DEDUPE_THRESHOLD.
+    RAG_DEDUPE_MODE: str = "off"
+    RAG_DEDUPE_THRESHOLD: float = 0.9
+
+    # RAG in-memory vector storage: none (float32) | float16 | int8 (per-vector scale).
+    # Quantized scans keep RAG_RERANK_FACTOR x the requested candidates and re-score them
+    # with the stored full-precision vectors. Per-tenant override: "quantization" in "rag_ann".
+    RAG_VECTOR_QUANTIZATION: str = "none"
+    RAG_RERANK_FACTOR: int = 4
+
+    # RAG index snapshots: per-tenant memory-mapped files shared by all workers (unset disables).
+    # A snapshot is rewritten once the index has moved RAG_SNAPSHOT_DELTA_ROWS rows past it.
+    RAG_SNAPSHOT_DIR: Optional[str] = None
+    RAG_SNAPSHOT_DELTA_ROWS: int = 2000
 
     # Retention (days)
     RETENTION_DAYS_LOGS: int = 365
@@ -42,3 +42,8 @@ from app.db.models.knowledge_document import KnowledgeDocument  # noqa: F401
 from app.db.models.knowledge_chunk import KnowledgeChunk  # noqa: F401
 from app.db.models.knowledge_embedding import KnowledgeEmbedding  # noqa: F401
 from app.db.models.password_reset_token import PasswordResetToken  # noqa: F401
+from app.db.models.embedding_cache import EmbeddingCache  # noqa: F401
+from app.db.models.rag_ingest_job import RagIngestJob  # noqa: F401
+from app.db.models.knowledge_minhash_band import KnowledgeMinHashBand  # noqa: F401
+from app.db.models.ai_usage import AIUsageDaily, AIUsageEvent  # noqa: F401
+from app.db.models.ai_response_cache import AIResponseCacheEntry  # noqa: F401
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class AIResponseCacheEntry(Base):
+    """A cached AI suite completion: the model's raw text for one prompt, per tenant."""
+
+    __tablename__ = "ai_response_cache"
+    __table_args__ = (Index("ix_ai_response_cache_tenant_key", "tenant_id", "key", unique=True),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
+    # sha256 of (operation, model, temperature, normalized messages)
+    key = Column(String(64), nullable=False)
+    operation = Column(String(100), nullable=False)
+    model = Column(String(100), nullable=False, default="")
+    response = Column(Text, nullable=False)
+    # latency of the completion that produced the response; a hit saves this much
+    latency_ms = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,50 @@
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class AIUsageEvent(Base):
+    """One AI provider call: tokens (as reported by the provider, or estimated) and latency."""
+
+    __tablename__ = "ai_usage_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # null for calls made outside a tenant request (scripts, background jobs)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=True, index=True)
+    provider = Column(String(20), nullable=False)
+    model = Column(String(100), nullable=False, default="")
+    endpoint = Column(String(100), nullable=False, default="")
+    # success | error | cancelled
+    status = Column(String(16), nullable=False, default="success")
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    # the provider sent no usage block; tokens were estimated from the text
+    estimated = Column(Boolean, nullable=False, default=False)
+    latency_ms = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+
+class AIUsageDaily(Base):
+    """Per-day totals of AIUsageEvent by tenant, provider, model and endpoint.
+
+    Rows are only ever incremented; concurrent writers may add more than one row per
+    key, so readers sum over the key.
+    """
+
+    __tablename__ = "ai_usage_daily"
+    __table_args__ = (Index("ix_ai_usage_daily_day_tenant", "day", "tenant_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=True)
+    provider = Column(String(20), nullable=False)
+    model = Column(String(100), nullable=False, default="")
+    endpoint = Column(String(100), nullable=False, default="")
+    calls = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    estimated_calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Float, nullable=False, default=0.0)
+    latency_ms_max = Column(Float, nullable=False, default=0.0)
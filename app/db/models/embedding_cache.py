@@ -0,0 +1,19 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class EmbeddingCache(Base):
+    """Embedding vectors keyed by (model, sha256 of the chunk text); holds no chunk text."""
+
+    __tablename__ = "embedding_cache"
+    __table_args__ = (UniqueConstraint("model", "checksum", name="uq_embedding_cache_model_checksum"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    model = Column(String(100), nullable=False)
+    checksum = Column(String(64), nullable=False)
+    vector_data = Column(LargeBinary, nullable=False)
+    dim = Column(Integer, nullable=False)
+    dtype = Column(String(16), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,5 +1,4 @@
-from sqlalchemy import Column, DateTime, Integer, String, Text, JSON, ForeignKey
-from sqlalchemy.dialects import postgresql
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, Text, ForeignKey
 from sqlalchemy.sql import func
 
 from app.db.base import Base, TenantBoundMixin
@@ -12,7 +11,12 @@ class KnowledgeChunk(TenantBoundMixin, Base):
     document_id = Column(Integer, ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True)
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
-    embedding = Column(postgresql.JSONB().with_variant(JSON, 'sqlite'), nullable=True)
     section_title = Column(String(255), nullable=True)
     checksum = Column(String(64), nullable=True, index=True)
+    # character span of the chunk in KnowledgeDocument.content (null for chunks ingested before 0014)
+    start_offset = Column(Integer, nullable=True)
+    end_offset = Column(Integer, nullable=True)
+    # MinHash signature and, when flagged as a near-duplicate, the canonical chunk it repeats
+    minhash = Column(LargeBinary, nullable=True)
+    duplicate_of = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
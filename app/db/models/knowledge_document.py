@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, Integer, String, Text, JSON
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, Text, JSON
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.sql import func
 
@@ -14,5 +14,10 @@ class KnowledgeDocument(TenantBoundMixin, Base):
     source = Column(String(100), nullable=True)
     language = Column(String(8), nullable=True)
     tags = Column(postgresql.JSONB().with_variant(JSON, 'sqlite'), nullable=True)
+    # near-duplicate detection (RAG_DEDUPE_MODE): MinHash signature, the document this one
+    # nearly duplicates, and how many of its chunks were skipped as near-duplicates
+    minhash = Column(LargeBinary, nullable=True)
+    duplicate_of = Column(Integer, nullable=True)
+    chunks_deduplicated = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
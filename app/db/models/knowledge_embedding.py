@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Float, JSON, DateTime, String
+from sqlalchemy import Column, Integer, ForeignKey, JSON, DateTime, LargeBinary, String
 from sqlalchemy.sql import func
 
 from app.db.base import Base, TenantBoundMixin
@@ -11,6 +11,10 @@ class KnowledgeEmbedding(TenantBoundMixin, Base):
     chunk_id = Column(Integer, ForeignKey("knowledge_chunks.id", ondelete="CASCADE"), nullable=False, index=True)
     document_id = Column(Integer, ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True)
     checksum = Column(String(64), nullable=False, index=True)
-    vector = Column(JSON, nullable=False)
+    # legacy JSON float list; new rows only populate vector_data (little-endian packed floats)
+    vector = Column(JSON, nullable=True)
+    vector_data = Column(LargeBinary, nullable=True)
+    dim = Column(Integer, nullable=True)
+    dtype = Column(String(16), nullable=True)
     model = Column(String(100), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
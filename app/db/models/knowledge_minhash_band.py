@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer
+
+from app.db.base import Base, TenantBoundMixin
+
+
+class KnowledgeMinHashBand(TenantBoundMixin, Base):
+    """LSH band bucket of a document (``chunk_id`` null) or chunk MinHash signature."""
+
+    __tablename__ = "knowledge_minhash_bands"
+    __table_args__ = (Index("ix_knowledge_minhash_bands_tenant_bucket", "tenant_id", "bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_id = Column(Integer, ForeignKey("knowledge_chunks.id", ondelete="CASCADE"), nullable=True, index=True)
+    # 64-bit hash of (band number, signature rows in the band)
+    bucket = Column(BigInteger, nullable=False)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.db.base import Base, TenantBoundMixin
+
+
+class RagIngestJob(TenantBoundMixin, Base):
+    __tablename__ = "rag_ingest_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    # queued -> running -> completed | failed
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    # queued -> chunking -> embedding -> indexing -> done
+    stage = Column(String(20), nullable=False, default="queued")
+    chunks_total = Column(Integer, nullable=True)
+    chunks_stored = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # a running job belongs to the worker that claimed it until this time; the worker renews it
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
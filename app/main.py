@@ -1,5 +1,6 @@
 import logging
 import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -56,14 +57,31 @@ from app.core.errors import register_error_handlers
 from app.core.logging import configure_logging, request_logging_middleware
 from app.core.security_headers import SecurityHeadersMiddleware
 from app.middleware.rate_limit import rate_limit_dependency
+from app.services import ai_transport, ai_usage, rag_jobs
 
 configure_logging()
 PROCESS_START_TIME = time.time()
 global_rate_limiter = rate_limit_dependency("global", limit=100, window_seconds=60)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # RAG ingest workers run for the lifetime of the process and pick up jobs left by a previous one
+    await rag_jobs.start()
+    # pooled keep-alive clients for AI provider calls, closed on shutdown
+    await ai_transport.start()
+    # buffered AI usage records; whatever is still buffered is written on shutdown
+    await ai_usage.start()
+    try:
+        yield
+    finally:
+        await ai_usage.stop()
+        await ai_transport.stop()
+        await rag_jobs.stop()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     origins = [o.strip() for o in (settings.CORS_ORIGINS or "*").split(",")] if settings.CORS_ORIGINS else ["*"]
 
@@ -2,8 +2,8 @@ from pydantic import BaseModel, Field
 from typing import List
 
 class GDPRAnalyzeRequest(BaseModel):
-    # Limit input text to 50,000 characters to avoid large model prompts
-    text: str = Field(..., max_length=50000)
+    # Hard ceiling; the route enforces AI_MAX_INPUT_CHARS (or AI_ANALYZE_LONG_INPUT_MAX_CHARS in long-document mode)
+    text: str = Field(..., max_length=1000000)
 
 class GDPRAnalyzeResponse(BaseModel):
     summary: str
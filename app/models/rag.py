@@ -9,6 +9,13 @@ class CreateKnowledgeDocumentRequest(BaseModel):
     language: Optional[str] = None
     tags: Optional[List[str]] = None
 
+class UpdateKnowledgeDocumentRequest(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    source: Optional[str] = None
+    language: Optional[str] = None
+    tags: Optional[List[str]] = None
+
 class KnowledgeDocumentResponse(BaseModel):
     id: int
     tenant_id: Optional[int]
@@ -17,7 +24,38 @@ class KnowledgeDocumentResponse(BaseModel):
     source: Optional[str]
     language: Optional[str]
     tags: Optional[List[str]]
+    # set when near-duplicate detection matched an earlier document
+    duplicate_of: Optional[int] = None
+    chunks_deduplicated: int = 0
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
     model_config = {"from_attributes": True}
+
+
+class KnowledgeDocumentUpdateResponse(BaseModel):
+    document: KnowledgeDocumentResponse
+    chunks_added: int
+    chunks_removed: int
+    chunks_kept: int
+
+
+class IngestJobAccepted(BaseModel):
+    job_id: int
+    document_id: int
+    status: str
+
+class IngestJobResponse(BaseModel):
+    id: int
+    document_id: int
+    status: str
+    stage: str
+    chunks_total: Optional[int]
+    chunks_stored: int
+    attempts: int
+    error: Optional[str]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    model_config = {"from_attributes": True}
@@ -1,10 +1,24 @@
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import List, Literal, Optional, Union
+from pydantic import BaseModel, Field
+
+
+class RAGSearchFilters(BaseModel):
+    """Metadata predicates applied before scoring: any listed value matches, fields combine with AND."""
+
+    tags: Optional[List[str]] = None
+    language: Optional[Union[str, List[str]]] = None
+    source: Optional[Union[str, List[str]]] = None
+    document_ids: Optional[List[int]] = None
 
 
 class RAGSearchRequest(BaseModel):
     query: str
     top_k: int = 5
+    mode: Literal["hybrid", "lexical", "vector"] = "hybrid"
+    filters: Optional[RAGSearchFilters] = None
+    # MMR re-ranking: 0 keeps relevance order, 1 favours the most dissimilar chunks
+    diversity: float = Field(0.0, ge=0.0, le=1.0)
+    max_per_document: Optional[int] = Field(None, ge=1)
 
 
 class RAGSearchResult(BaseModel):
@@ -15,6 +29,9 @@ class RAGSearchResult(BaseModel):
     chunk_index: int
     model: str
     section_title: str | None = None
+    # span of the chunk in the source document's content, when known
+    start_offset: int | None = None
+    end_offset: int | None = None
 
 
 class RAGAnswer(BaseModel):
@@ -1,8 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class AiAnswerRequest(BaseModel):
     question: str
+    # MMR re-ranking of the context; unset uses AI_ANSWER_DIVERSITY / AI_ANSWER_MAX_PER_DOCUMENT
+    diversity: float | None = Field(None, ge=0.0, le=1.0)
+    max_per_document: int | None = Field(None, ge=1)
 
 
 class AiAnswerSource(BaseModel):
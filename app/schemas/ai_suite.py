@@ -155,3 +155,14 @@ class AISummarizeRequest(BaseModel):
 
 class AISummarizeResponse(BaseModel):
     summary: str
+
+
+class AIBatchItem(BaseModel):
+    # operation name: the suite endpoint path under /api/ai, e.g. "summarize" or "dpia/generate"
+    op: str
+    id: Optional[str] = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+
+
+class AIBatchRequest(BaseModel):
+    items: List[AIBatchItem] = Field(min_length=1)
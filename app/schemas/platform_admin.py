@@ -9,6 +9,8 @@ class PlatformOverviewResponse(BaseModel):
     total_users: int
     total_dsrs: int
     total_dpias: int
+    ai_tokens_30d: int = 0
+    ai_tokens_by_month: list[dict] = []
 
 
 class PlatformTenantListItem(BaseModel):
@@ -92,6 +94,10 @@ class AIUsageItem(BaseModel):
     overage_tokens: int
     status: str
     limits: Optional[dict] = None
+    errors_30d: int = 0
+    avg_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+    cost_eur_estimate: float = 0.0
 
 
 class AIUsageSummary(BaseModel):
@@ -100,6 +106,10 @@ class AIUsageSummary(BaseModel):
     tokens_30d: int
     cost_eur_estimate: float
     items: list[AIUsageItem] = []
+    # 30-day totals per provider, model and endpoint
+    breakdown: list[dict] = []
+    # AI suite response cache hits, misses and latency saved, since this worker started
+    response_cache: dict = {}
 
 
 class LogItem(BaseModel):
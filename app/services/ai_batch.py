@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.schemas.ai_suite import AIBatchItem
+from app.services import ai_bulkhead
+from app.services.ai_stream import audit
+from app.services.ai_suite_service import SUITE_OPERATIONS
+
+logger = logging.getLogger(__name__)
+
+# POST /api/ai/batch: many suite operations in one request. Items run concurrently
+# (at most AI_BATCH_CONCURRENCY, and no more than the tenant's bulkhead admits at once)
+# and each result is sent as one NDJSON line as soon as it finishes:
+#   {"index": 3, "id": "...", "op": "summarize", "status": 200, "result": {...}}
+#   {"index": 4, "id": "...", "op": "explain", "status": 502, "error": "..."}
+# followed by a final {"done": true, ...} line. Authentication, rate limiting and the
+# audit record happen once per batch; each provider call still takes a bulkhead slot.
+
+
+def ndjson_line(data: Any) -> str:
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False) + "\n"
+
+
+def ndjson_response(lines: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _error(index: int, item: AIBatchItem, status_code: int, detail: Any) -> Dict[str, Any]:
+    return {"index": index, "id": item.id, "op": item.op, "status": status_code, "error": detail}
+
+
+async def _run(index: int, item: AIBatchItem, tenant_id: int, payload: Any, gate: asyncio.Semaphore) -> Dict[str, Any]:
+    _, operation = SUITE_OPERATIONS[item.op]
+    async with gate:
+        try:
+            result = await operation(tenant_id, payload)
+        except HTTPException as exc:
+            return _error(index, item, exc.status_code, exc.detail)
+        except Exception:
+            logger.exception("AI batch item %d (%s) failed", index, item.op)
+            return _error(index, item, 500, "Internal error during AI processing")
+    return {"index": index, "id": item.id, "op": item.op, "status": 200, "result": result}
+
+
+async def batch_lines(items: List[AIBatchItem], *, tenant_id: int, user_id: Optional[int], endpoint: str) -> AsyncIterator[str]:
+    """NDJSON lines for ``items``, in completion order; invalid items are answered first, without a provider call."""
+    started = time.perf_counter()
+    gate = asyncio.Semaphore(ai_bulkhead.fan_out(int(settings.AI_BATCH_CONCURRENCY or 1)))
+    tasks: List[asyncio.Future] = []
+    invalid: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        if item.op not in SUITE_OPERATIONS:
+            invalid.append(_error(index, item, 400, f"Unknown operation {item.op!r}"))
+            continue
+        model, _ = SUITE_OPERATIONS[item.op]
+        try:
+            payload = model.model_validate(item.payload)
+        except ValidationError as exc:
+            invalid.append(_error(index, item, 422, jsonable_encoder(exc.errors(include_url=False))))
+            continue
+        tasks.append(asyncio.ensure_future(_run(index, item, tenant_id, payload, gate)))
+
+    succeeded = failed = 0
+    status = "cancelled"
+    try:
+        for line in invalid:
+            failed += 1
+            yield ndjson_line(line)
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            if line["status"] == 200:
+                succeeded += 1
+            else:
+                failed += 1
+            yield ndjson_line(line)
+        status = "error" if failed else "success"
+        yield ndjson_line(
+            {
+                "done": True,
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": failed,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+        )
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        input_text = "\n".join(f"{item.op}: {json.dumps(item.payload, ensure_ascii=False, default=str)}" for item in items)
+        error = f"{failed} of {len(items)} items failed" if failed else None
+        await audit(tenant_id, user_id, input_text, endpoint, status, error)
@@ -0,0 +1,257 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models.tenant import Tenant
+
+logger = logging.getLogger(__name__)
+
+# Admission control for AI provider calls: at most AI_MAX_CONCURRENCY calls in flight
+# overall and AI_TENANT_MAX_CONCURRENCY per tenant (0 = unbounded). Calls over a limit
+# wait in a bounded queue (AI_QUEUE_MAX_DEPTH overall, AI_TENANT_QUEUE_MAX_DEPTH per
+# tenant) for at most AI_QUEUE_TIMEOUT_SECONDS; a full tenant queue is a 429, a full
+# global queue or an expired wait a 503, both with Retry-After. The queue is FIFO unless
+# AI_PLAN_WEIGHTS ("free:1,pro:2,...") is set: then waiters are ordered by weighted fair
+# queuing on Tenant.plan, so a tenant with weight 2 gets twice the freed slots of a
+# tenant with weight 1 while both are waiting.
+_PLAN_TTL_SECONDS = 300
+_WAIT_SAMPLES = 1000
+_session_factory: async_sessionmaker = AsyncSessionLocal
+
+
+class _Waiter:
+    __slots__ = ("key", "tenant_id", "future", "enqueued")
+
+    def __init__(self, key: Tuple[float, int], tenant_id: Optional[int], future: asyncio.Future):
+        self.key = key
+        self.tenant_id = tenant_id
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class Bulkhead:
+    def __init__(self):
+        self.in_flight = 0
+        self.tenant_in_flight: Dict[Optional[int], int] = {}
+        self.tenant_queued: Dict[Optional[int], int] = {}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        # weighted fair queuing: virtual time and each tenant's last finish tag
+        self._virtual = 0.0
+        self._finish: Dict[Optional[int], float] = {}
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._hold_ewma: Optional[float] = None
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = {"tenant_queue_full": 0, "queue_full": 0, "timeout": 0}
+
+    @staticmethod
+    def _limit(name: str) -> int:
+        return max(0, int(getattr(settings, name) or 0))
+
+    def _has_slot(self, tenant_id: Optional[int]) -> bool:
+        global_limit = self._limit("AI_MAX_CONCURRENCY")
+        tenant_limit = self._limit("AI_TENANT_MAX_CONCURRENCY")
+        if global_limit and self.in_flight >= global_limit:
+            return False
+        return not tenant_limit or self.tenant_in_flight.get(tenant_id, 0) < tenant_limit
+
+    def _take(self, tenant_id: Optional[int]) -> None:
+        self.in_flight += 1
+        self.tenant_in_flight[tenant_id] = self.tenant_in_flight.get(tenant_id, 0) + 1
+        self.admitted += 1
+
+    def _retry_after(self) -> int:
+        # time for the calls ahead to drain at the current concurrency
+        hold = self._hold_ewma if self._hold_ewma is not None else 1.0
+        width = self._limit("AI_MAX_CONCURRENCY") or max(1, self.in_flight)
+        return max(1, math.ceil(hold * (len(self._waiters) + 1) / width))
+
+    def _reject(self, status_code: int, reason: str, detail: str) -> HTTPException:
+        self.rejected[reason] += 1
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self._retry_after())})
+
+    def _enqueue(self, tenant_id: Optional[int], weight: Optional[float]) -> _Waiter:
+        if weight is None:
+            key = (0.0, next(self._seq))
+        else:
+            start = max(self._virtual, self._finish.get(tenant_id, 0.0))
+            self._finish[tenant_id] = start + 1.0 / weight
+            key = (self._finish[tenant_id], next(self._seq))
+        waiter = _Waiter(key, tenant_id, asyncio.get_running_loop().create_future())
+        bisect.insort(self._waiters, waiter, key=lambda w: w.key)
+        self.tenant_queued[tenant_id] = self.tenant_queued.get(tenant_id, 0) + 1
+        return waiter
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        self._waiters.remove(waiter)
+        self.tenant_queued[waiter.tenant_id] -= 1
+        if not self.tenant_queued[waiter.tenant_id]:
+            del self.tenant_queued[waiter.tenant_id]
+        if not self._waiters:
+            self._virtual = 0.0
+            self._finish.clear()
+
+    def _dispatch(self) -> None:
+        # grant freed slots to waiters in queue order, skipping tenants at their own limit
+        for waiter in list(self._waiters):
+            if self._limit("AI_MAX_CONCURRENCY") and self.in_flight >= self._limit("AI_MAX_CONCURRENCY"):
+                return
+            if waiter.future.done() or not self._has_slot(waiter.tenant_id):
+                continue
+            self._virtual = max(self._virtual, waiter.key[0])
+            self._dequeue(waiter)
+            self._take(waiter.tenant_id)
+            self._waits.append(time.perf_counter() - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    async def acquire(self, tenant_id: Optional[int], weight: Optional[float] = None) -> None:
+        if not self._waiters and self._has_slot(tenant_id):
+            self._take(tenant_id)
+            self._waits.append(0.0)
+            return
+        tenant_depth = self._limit("AI_TENANT_QUEUE_MAX_DEPTH")
+        if tenant_depth and self.tenant_queued.get(tenant_id, 0) >= tenant_depth:
+            raise self._reject(429, "tenant_queue_full", "Too many concurrent AI requests for this tenant; retry later")
+        if len(self._waiters) >= self._limit("AI_QUEUE_MAX_DEPTH"):
+            raise self._reject(503, "queue_full", "AI capacity exhausted; retry later")
+        waiter = self._enqueue(tenant_id, weight)
+        self._dispatch()
+        if waiter.future.done():
+            return
+        self.queued_total += 1
+        timeout = float(settings.AI_QUEUE_TIMEOUT_SECONDS or 0) or None
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except BaseException as exc:
+            if waiter.future.done():
+                # granted while timing out or being cancelled: hand the slot back
+                self.release(tenant_id)
+            else:
+                waiter.future.cancel()
+                self._dequeue(waiter)
+                self._dispatch()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject(503, "timeout", "AI capacity exhausted; queued request timed out")
+            raise
+
+    def release(self, tenant_id: Optional[int], held: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        self.tenant_in_flight[tenant_id] -= 1
+        if not self.tenant_in_flight[tenant_id]:
+            del self.tenant_in_flight[tenant_id]
+        if held is not None:
+            self._hold_ewma = held if self._hold_ewma is None else 0.8 * self._hold_ewma + 0.2 * held
+        self._dispatch()
+
+    def status(self, tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> Optional[float]:
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1) if waits else None
+
+        status = {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "limits": {
+                "max_concurrency": self._limit("AI_MAX_CONCURRENCY"),
+                "tenant_max_concurrency": self._limit("AI_TENANT_MAX_CONCURRENCY"),
+                "queue_max_depth": self._limit("AI_QUEUE_MAX_DEPTH"),
+                "tenant_queue_max_depth": self._limit("AI_TENANT_QUEUE_MAX_DEPTH"),
+                "queue_timeout_seconds": float(settings.AI_QUEUE_TIMEOUT_SECONDS or 0),
+            },
+            "fair_queuing": bool(plan_weights()),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": dict(self.rejected),
+            "wait_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+        if tenant_id is not None:
+            status["tenant"] = {
+                "in_flight": self.tenant_in_flight.get(tenant_id, 0),
+                "queued": self.tenant_queued.get(tenant_id, 0),
+            }
+        return status
+
+
+_bulkhead = Bulkhead()
+_plans: Dict[int, Tuple[float, str]] = {}
+
+
+def plan_weights() -> Dict[str, float]:
+    weights = {}
+    for part in (settings.AI_PLAN_WEIGHTS or "").split(","):
+        plan, _, weight = part.partition(":")
+        try:
+            if plan.strip() and float(weight) > 0:
+                weights[plan.strip().lower()] = float(weight)
+        except ValueError:
+            logger.warning("Ignoring invalid AI_PLAN_WEIGHTS entry %r", part)
+    return weights
+
+
+async def _tenant_plan(tenant_id: int) -> str:
+    now = time.monotonic()
+    cached = _plans.get(tenant_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    plan = "free"
+    try:
+        async with _session_factory() as db:
+            plan = (await db.scalar(select(Tenant.plan).where(Tenant.id == tenant_id))) or plan
+    except Exception:
+        logger.exception("Could not load plan of tenant %s for AI fair queuing", tenant_id)
+    _plans[tenant_id] = (now + _PLAN_TTL_SECONDS, plan)
+    return plan
+
+
+async def _weight(tenant_id: Optional[int]) -> Optional[float]:
+    weights = plan_weights()
+    if not weights:
+        return None
+    plan = await _tenant_plan(tenant_id) if tenant_id is not None else "free"
+    return weights.get(str(plan).lower(), 1.0)
+
+
+@asynccontextmanager
+async def admit(tenant_id: Optional[int]) -> AsyncIterator[None]:
+    """Hold one AI call slot for ``tenant_id`` (waiting in the queue if needed) for the ``with`` body."""
+    await _bulkhead.acquire(tenant_id, await _weight(tenant_id))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _bulkhead.release(tenant_id, time.perf_counter() - start)
+
+
+def fan_out(width: int) -> int:
+    """Concurrent AI calls worth starting for one request: ``width``, capped at the per-tenant limit (more would only queue)."""
+    tenant_limit = int(settings.AI_TENANT_MAX_CONCURRENCY or 0)
+    width = max(1, width)
+    return min(width, tenant_limit) if tenant_limit > 0 else width
+
+
+def bulkhead() -> Bulkhead:
+    return _bulkhead
+
+
+def bulkhead_status(tenant_id: Optional[int] = None) -> Dict[str, Any]:
+    return _bulkhead.status(tenant_id)
+
+
+def reset_bulkhead() -> None:
+    global _bulkhead
+    _bulkhead = Bulkhead()
+    _plans.clear()
@@ -1,35 +1,176 @@
 from __future__ import annotations
 
-import httpx
+import asyncio
+import json
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.services import ai_bulkhead, ai_resilience, ai_router, ai_transport, ai_usage
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
 
 
-async def ai_chat_completion(messages: list[dict], *, tenant_id: int | None = None) -> str:
+async def ai_chat_completion(messages: list[dict], *, tenant_id: int | None = None, endpoint: str | None = None) -> str:
     """Centralized AI chat completion entrypoint.
 
-    For now this is a thin abstraction with graceful fallback to a stubbed response
-    if no provider credentials are configured. All network calls to AI providers
-    should flow through this function.
+    The provider comes from ``ai_router`` (the AI_ROUTES pool of the operation behind
+    ``endpoint``, else AI_PROVIDER); a provider call that fails moves on to the next
+    provider of the pool. Providers without credentials are skipped, and with none
+    left the call falls back to a stubbed response.
+    Provider calls first take a slot in the tenant's bulkhead (``ai_bulkhead``), then
+    go through ``ai_resilience`` (per-provider circuit breaker, budgeted retries,
+    optional hedging); a rejected or failed call raises 429/503/502. Each provider call's
+    tokens and latency are recorded for ``tenant_id`` and ``endpoint`` (``ai_usage``).
+    All network calls to AI providers should flow through this function.
     """
+    op = ai_router.operation(endpoint)
+    calls = [(provider, call) for provider in ai_router.plan(op) if (call := _provider_call(provider)) is not None]
+    if not calls:
+        return _stub_response(messages)
 
-    provider = (settings.AI_PROVIDER or "openai").lower()
+    def attempt(provider: str, call: Callable[[list[dict], dict], Awaitable[str]]) -> Callable[[], Awaitable[str]]:
+        async def run() -> str:
+            with ai_usage.track(provider, messages, tenant_id=tenant_id, endpoint=endpoint, model=model_name(provider)) as usage:
+                return await call(messages, usage)
 
-    if provider == "openai":
-        if not settings.OPENAI_API_KEY:
-            return _stub_response(messages)
-        return await _call_openai(messages)
+        return run
 
-    if provider == "local":
-        if not settings.LOCAL_AI_ENDPOINT:
-            return _stub_response(messages)
-        return await _call_local(messages)
+    async with ai_bulkhead.admit(tenant_id):
+        return await ai_router.call(op, [(provider, attempt(provider, call)) for provider, call in calls])
+
+
+async def ai_chat_completion_stream(
+    messages: list[dict], *, tenant_id: int | None = None, endpoint: str | None = None
+) -> AsyncIterator[str]:
+    """Streaming variant of ``ai_chat_completion``: yields text deltas as the provider produces them.
+
+    The stream holds a bulkhead slot until it ends. Opening it (up to its first
+    delta) is retried behind the provider's circuit breaker like a non-streaming
+    call, without hedging, and fails over to the next provider of the route. Output
+    stops at AI_MAX_OUTPUT_CHARS; a stream that breaks after output was sent raises a
+    502. Usage is recorded when the stream ends, from the provider's final usage chunk
+    or estimated from the text sent.
+    """
+    op = ai_router.operation(endpoint)
+    factories = [(provider, factory) for provider in ai_router.plan(op) if (factory := _provider_stream(provider)) is not None]
+    if not factories:
+        provider = (settings.AI_PROVIDER or "openai").lower()
+        async with aclosing(_capped(provider, "", _stub_stream(messages))) as deltas:
+            async for delta in deltas:
+                yield delta
+        return
 
+    async with ai_bulkhead.admit(tenant_id):
+        for index, (provider, factory) in enumerate(factories):
+
+            async def open_stream():
+                stream = factory(messages, usage)
+                try:
+                    return await stream.__anext__(), stream
+                except StopAsyncIteration:
+                    return "", stream
+                except BaseException:
+                    await stream.aclose()
+                    raise
+
+            opened = False
+            try:
+                with ai_usage.track(provider, messages, tenant_id=tenant_id, endpoint=endpoint, model=model_name(provider)) as usage:
+                    first, source = await _resilient(provider, open_stream, hedge=False)
+                    opened = True
+                    # time to first delta is not comparable with completion latency: only the outcome counts
+                    ai_router.succeeded(provider)
+                    async with aclosing(_capped(provider, first, source)) as deltas:
+                        async for delta in deltas:
+                            usage["output"].append(delta)
+                            yield delta
+                return
+            except HTTPException as exc:
+                if opened or exc.status_code not in (502, 503):
+                    raise
+                ai_router.failed(provider, str(exc.detail))
+                if index == len(factories) - 1:
+                    raise
+                ai_router.failover(op, provider, factories[index + 1][0])
+
+
+def _provider_call(provider: str) -> Callable[[list[dict], dict], Awaitable[str]] | None:
+    # None: the provider has no credentials/endpoint configured
+    if provider == "openai":
+        return _call_openai if settings.OPENAI_API_KEY else None
+    if provider == "local":
+        return _call_local if settings.LOCAL_AI_ENDPOINT else None
+    if provider == "ollama":
+        return _call_ollama
     # Unknown provider: fail fast to avoid silent misconfiguration.
     raise HTTPException(status_code=500, detail="Unsupported AI provider")
 
 
+def configured(provider: str) -> bool:
+    """Whether ``provider`` has the credentials/endpoint it needs; unknown providers raise a 500."""
+    return _provider_call(provider) is not None
+
+
+def _provider_stream(provider: str) -> Callable[[list[dict], dict], AsyncIterator[str]] | None:
+    if provider == "openai":
+        return _stream_openai if settings.OPENAI_API_KEY else None
+    if provider == "local":
+        return _stream_local if settings.LOCAL_AI_ENDPOINT else None
+    if provider == "ollama":
+        return _stream_ollama
+    raise HTTPException(status_code=500, detail="Unsupported AI provider")
+
+
+async def _capped(provider: str, first: str, source: AsyncIterator[str]) -> AsyncIterator[str]:
+    remaining = int(settings.AI_MAX_OUTPUT_CHARS or 20000)
+    async with aclosing(source):
+        try:
+            async for delta in _prepend(first, source):
+                if len(delta) >= remaining:
+                    yield delta[:remaining]
+                    return
+                remaining -= len(delta)
+                yield delta
+        except Exception as exc:
+            logger.warning("AI provider stream interrupted: %s", exc)
+            ai_resilience.record_failure(provider, f"stream interrupted: {exc}")
+            raise HTTPException(status_code=502, detail="AI provider stream interrupted")
+
+
+async def _prepend(first: str, source: AsyncIterator[str]) -> AsyncIterator[str]:
+    if first:
+        yield first
+    async for delta in source:
+        yield delta
+
+
+async def _resilient(provider: str, send: Callable[[], Awaitable[T]], *, hedge: bool = True) -> T:
+    try:
+        return await ai_resilience.call(provider, send, hedge=hedge)
+    except ai_resilience.CircuitOpenError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"AI provider {provider} is temporarily unavailable (circuit open)",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.warning("AI provider %s request failed: %s", provider, exc)
+        raise HTTPException(status_code=502, detail=f"AI provider {provider} request failed")
+
+
+def model_name(provider: str | None = None) -> str:
+    provider = provider or (settings.AI_PROVIDER or "openai").lower()
+    return settings.OPENAI_MODEL if provider == "openai" else (settings.AI_MODEL or "")
+
+
 def _stub_response(messages: list[dict]) -> str:
     # Minimal deterministic stub for tests/offline mode
     user_parts = []
@@ -40,7 +181,15 @@ def _stub_response(messages: list[dict]) -> str:
     return f"Stubbed response:\n{joined}"
 
 
-async def _call_openai(messages: list[dict]) -> str:
+async def _stub_stream(messages: list[dict]) -> AsyncIterator[str]:
+    # the stub response, a few words per delta
+    words = _stub_response(messages).split(" ")
+    for i in range(0, len(words), 8):
+        yield " ".join(words[i : i + 8]) + (" " if i + 8 < len(words) else "")
+        await asyncio.sleep(0)
+
+
+async def _call_openai(messages: list[dict], usage: dict) -> str:
     payload = {
         "model": settings.OPENAI_MODEL,
         "messages": messages,
@@ -48,31 +197,148 @@ async def _call_openai(messages: list[dict]) -> str:
         "temperature": settings.AI_TEMPERATURE,
     }
     headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
-    try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post("https://api.openai.com/v1/chat/completions", json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
-    except Exception:
-        # fall back gracefully so tests do not require real API
-        return _stub_response(messages)
+    client = await ai_transport.get_client("openai")
+
+    async def send() -> str:
+        resp = await client.post("chat/completions", json=payload, headers=headers)
+        ai_resilience.check_status(resp)
+        data = resp.json()
+        content = data["choices"][0]["message"]["content"]
+        ai_usage.fill(usage, data, content)
+        return content
+
+    return await _resilient("openai", send)
 
 
-async def _call_local(messages: list[dict]) -> str:
+async def _call_local(messages: list[dict], usage: dict) -> str:
     payload = {
         "messages": messages,
         "max_tokens": settings.AI_MAX_TOKENS,
         "temperature": settings.AI_TEMPERATURE,
     }
+    client = await ai_transport.get_client("local")
+
+    async def send() -> str:
+        resp = await client.post(settings.LOCAL_AI_ENDPOINT, json=payload)
+        ai_resilience.check_status(resp)
+        data = resp.json()
+        # accept either openai-like or simple {"content": "..."} response
+        if "choices" in data:
+            content = data["choices"][0]["message"]["content"]
+        else:
+            content = data.get("content") or _stub_response(messages)
+        ai_usage.fill(usage, data, content)
+        return content
+
+    return await _resilient("local", send)
+
+
+def _ollama_payload(messages: list[dict], stream: bool) -> dict:
+    return {
+        "model": settings.AI_MODEL,
+        "messages": messages,
+        "stream": stream,
+        "options": {"num_predict": settings.AI_MAX_TOKENS, "temperature": settings.AI_TEMPERATURE},
+    }
+
+
+async def _call_ollama(messages: list[dict], usage: dict) -> str:
+    client = await ai_transport.get_client("ollama")
+
+    async def send() -> str:
+        resp = await client.post("api/chat", json=_ollama_payload(messages, stream=False))
+        ai_resilience.check_status(resp)
+        data = resp.json()
+        content = data["message"]["content"]
+        ai_usage.fill(usage, data, content)
+        return content
+
+    return await _resilient("ollama", send)
+
+
+def _stream_delta(line: str) -> tuple[str | None, bool]:
+    """Parse one line of a streamed completion into ``(text, done)``.
+
+    Understands OpenAI-style server-sent events (``data: {...}`` chunks with
+    ``choices[0].delta.content``, ended by ``data: [DONE]``) and newline-delimited
+    JSON from Ollama (``/api/chat`` ``message.content`` or ``/api/generate``
+    ``response``, ended by ``"done": true``), plus plain ``{"content": ...}`` lines.
+    """
+    line = line.strip()
+    if line.startswith("data:"):
+        line = line[5:].strip()
+        if line == "[DONE]":
+            return None, True
+    if not line.startswith("{"):
+        return None, False
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(settings.LOCAL_AI_ENDPOINT, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            # accept either openai-like or simple {"content": "..."} response
-            if "choices" in data:
-                return data["choices"][0]["message"]["content"]
-            return data.get("content") or _stub_response(messages)
-    except Exception:
-        return _stub_response(messages)
+        data = json.loads(line)
+    except ValueError:
+        return None, False
+    if "choices" in data:
+        choice = (data.get("choices") or [{}])[0]
+        text = (choice.get("delta") or {}).get("content") or (choice.get("message") or {}).get("content")
+    elif "message" in data:
+        text = (data.get("message") or {}).get("content")
+    elif "response" in data:
+        text = data.get("response")
+    else:
+        text = data.get("content")
+    return text or None, bool(data.get("done"))
+
+
+def _stream_usage(line: str, usage: dict) -> None:
+    # token counts from the chunk that carries them (OpenAI's last chunk, Ollama's "done" line)
+    line = line.strip()
+    if line.startswith("data:"):
+        line = line[5:].strip()
+    try:
+        ai_usage.fill(usage, json.loads(line))
+    except ValueError:
+        pass
+
+
+async def _stream_lines(
+    provider: str, url: str, payload: dict, usage: dict, headers: dict | None = None
+) -> AsyncIterator[str]:
+    client = await ai_transport.get_client(provider)
+    async with client.stream("POST", url, json=payload, headers=headers) as resp:
+        if resp.status_code >= 400:
+            await resp.aread()
+            ai_resilience.check_status(resp)
+        async for line in resp.aiter_lines():
+            if '"usage"' in line or '"eval_count"' in line:
+                _stream_usage(line, usage)
+            text, done = _stream_delta(line)
+            if text:
+                yield text
+            if done:
+                return
+
+
+def _stream_openai(messages: list[dict], usage: dict) -> AsyncIterator[str]:
+    payload = {
+        "model": settings.OPENAI_MODEL,
+        "messages": messages,
+        "max_tokens": settings.AI_MAX_TOKENS,
+        "temperature": settings.AI_TEMPERATURE,
+        "stream": True,
+        # a last chunk with the token counts
+        "stream_options": {"include_usage": True},
+    }
+    headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
+    return _stream_lines("openai", "chat/completions", payload, usage, headers)
+
+
+def _stream_local(messages: list[dict], usage: dict) -> AsyncIterator[str]:
+    payload = {
+        "messages": messages,
+        "max_tokens": settings.AI_MAX_TOKENS,
+        "temperature": settings.AI_TEMPERATURE,
+        "stream": True,
+    }
+    return _stream_lines("local", settings.LOCAL_AI_ENDPOINT, payload, usage)
+
+
+def _stream_ollama(messages: list[dict], usage: dict) -> AsyncIterator[str]:
+    return _stream_lines("ollama", "api/chat", _ollama_payload(messages, stream=True), usage)
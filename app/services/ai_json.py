@@ -0,0 +1,299 @@
+import json
+import logging
+import re
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Structured answers from model output. Models wrap JSON in prose or code fences, echo
+# example objects, use single quotes, Python literals, trailing or missing commas and
+# unquoted keys, and stop mid-object when they hit the output limit. One pass over the
+# text finds the top-level {...}/[...] spans (string-aware, so brackets inside strings
+# do not count); each span is tried with json.loads and, only if that fails, rewritten
+# once by a tolerant tokenizer that fixes those defects. Spans are disjoint and each is
+# parsed at most twice, so the work is linear in the length of the text.
+_CLOSER = {"{": "}", "[": "]"}
+_OPENER = {"}": "{", "]": "["}
+_VALUE_START = frozenset("{[,:")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.])")
+_ESCAPES = frozenset('"\\/bfnrt')
+_HEX4_RE = re.compile(r"[0-9a-fA-F]{4}")
+_WORD_RE = re.compile(r"[^\s{}\[\]:,\"'/]+")
+_BRACKET_RE = re.compile(r"[{}\[\]]")
+_SPECIAL_RE = re.compile(r"[{}\[\]\"']")
+_DOUBLE_END_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_SINGLE_END_RE = re.compile(r"[^'\\]*(?:\\.[^'\\]*)*'", re.S)
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def _spans(text: str) -> Iterator[Tuple[int, int]]:
+    """(start, end) of each top-level JSON-looking span of ``text``, in order.
+
+    A closer without a matching opener is ignored and one that matches an outer
+    container closes the inner ones too. A span still open at the end of the text is
+    yielded up to the end, followed by the complete spans nested directly in its unclosed
+    containers, so a stray "{" in prose does not hide the JSON after it.
+    """
+    # (opener, start, complete child spans) per open container
+    stack: List[Tuple[str, int, List[Tuple[int, int]]]] = []
+    open_count = {"{": 0, "[": 0}
+    i, n = 0, len(text)
+    while True:
+        match = (_SPECIAL_RE if stack else _BRACKET_RE).search(text, i)
+        if match is None:
+            break
+        ch, i = match.group(), match.start()
+        if ch in _CLOSER:
+            stack.append((ch, i, []))
+            open_count[ch] += 1
+        elif ch in _OPENER:
+            if open_count[_OPENER[ch]]:
+                while True:
+                    opener, start, _ = stack.pop()
+                    open_count[opener] -= 1
+                    if opener == _OPENER[ch]:
+                        break
+                if stack:
+                    stack[-1][2].append((start, i + 1))
+                else:
+                    yield start, i + 1
+        elif ch == '"' or _value_start(text, i):
+            # skip the string; unterminated, it runs to the end of the text
+            end = (_DOUBLE_END_RE if ch == '"' else _SINGLE_END_RE).match(text, i + 1)
+            if end is None:
+                break
+            i = end.end() - 1
+        i += 1
+    if stack:
+        yield stack[0][1], n
+        for _, _, children in stack:
+            yield from children
+
+
+def _escape(span: str, j: int) -> Tuple[str, int]:
+    # the backslash at span[j] as a JSON escape: valid ones are kept, \' becomes ', a
+    # backslash starting anything else (C:\share, a cut-off end) is escaped itself
+    nxt = span[j + 1 : j + 2]
+    if nxt == "'":
+        return "'", j + 2
+    if nxt and nxt in _ESCAPES or (nxt == "u" and _HEX4_RE.match(span, j + 2)):
+        return span[j : j + 2], j + 2
+    return "\\\\", j + 1
+
+
+def _value_start(text: str, i: int) -> bool:
+    # whether the quote at text[i] follows "{", "[", "," or ":" (a single-quoted string, not an apostrophe)
+    j = i - 1
+    while j >= 0 and text[j].isspace():
+        j -= 1
+    return j >= 0 and text[j] in _VALUE_START
+
+
+def _single_quoted(span: str, i: int) -> Tuple[str, int]:
+    # 'text' -> "text"
+    out = ['"']
+    j, n = i + 1, len(span)
+    while j < n:
+        c = span[j]
+        if c == "\\":
+            token, j = _escape(span, j)
+            out.append(token)
+            continue
+        if c == "'":
+            j += 1
+            break
+        out.append('\\"' if c == '"' else c)
+        j += 1
+    out.append('"')
+    return "".join(out), j
+
+
+def _double_quoted(span: str, i: int) -> Tuple[str, int]:
+    # a quote followed by more text on the same line is taken as part of the string
+    # (He said "no" twice)
+    out = ['"']
+    j, n = i + 1, len(span)
+    while j < n:
+        c = span[j]
+        if c == "\\":
+            token, j = _escape(span, j)
+            out.append(token)
+            continue
+        if c == '"':
+            k = j + 1
+            while k < n and span[k] in " \t\r":
+                k += 1
+            if k == n or span[k] in ',:}]"\n':
+                out.append('"')
+                return "".join(out), j + 1
+            out.append('\\"')
+        else:
+            out.append(c)
+        j += 1
+    # cut off mid-string: close it
+    out.append('"')
+    return "".join(out), n
+
+
+def repair(span: str) -> str:
+    """``span`` (starting at "{" or "[") rewritten as valid JSON where the defect is a common one.
+
+    Commas and colons are re-inserted from the structure rather than copied, which
+    drops trailing and doubled commas and adds missing ones. Single-quoted strings,
+    unquoted keys and words, Python literals and comments are converted or dropped,
+    and a span cut off early has its open string and containers closed (a key left
+    without a value is dropped).
+    """
+    out: List[str] = []
+    closers: List[str] = []
+    # per open container: what comes next - "key", "colon", "value" or "comma"
+    states: List[str] = []
+    open_count = {"{": 0, "[": 0}
+
+    def place() -> str:
+        # insert the separator the next token needs; returns "key" or "value"
+        if not states:
+            return "value"
+        state = states[-1]
+        if closers[-1] == "]":
+            if state == "comma":
+                out.append(",")
+            states[-1] = "comma"
+            return "value"
+        if state == "comma":
+            out.append(",")
+            state = "key"
+        elif state == "colon":
+            out.append(":")
+            state = "value"
+        states[-1] = "colon" if state == "key" else "comma"
+        return state
+
+    def close() -> None:
+        if states.pop() == "colon":
+            # a key without a value (cut off, or a bare word): drop it
+            out.pop()
+            if out[-1] == ",":
+                out.pop()
+        out.append(closers.pop())
+        open_count[_OPENER[out[-1]]] -= 1
+
+    i, n = 0, len(span)
+    while i < n:
+        ch = span[i]
+        if ch.isspace() or ch in ",:":
+            i += 1
+        elif ch in _CLOSER:
+            place()
+            out.append(ch)
+            closers.append(_CLOSER[ch])
+            states.append("key" if ch == "{" else "value")
+            open_count[ch] += 1
+            i += 1
+        elif ch in _OPENER:
+            if open_count[_OPENER[ch]]:
+                while closers[-1] != ch:
+                    close()
+                close()
+                if not closers:
+                    break
+            i += 1
+        elif ch == '"' or ch == "'":
+            token, i = _double_quoted(span, i) if ch == '"' else _single_quoted(span, i)
+            place()
+            out.append(token)
+        elif span.startswith("//", i):
+            end = span.find("\n", i)
+            i = n if end < 0 else end + 1
+        elif span.startswith("/*", i):
+            end = span.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        else:
+            match = _NUMBER_RE.match(span, i) or _WORD_RE.match(span, i)
+            if match is None:
+                i += 1
+                continue
+            word = match.group(0)
+            i = match.end()
+            if place() == "key":
+                out.append(json.dumps(word))
+            elif word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif i == n and any(literal.startswith(word) for literal in _LITERALS):
+                # cut off mid-literal ("fals")
+                out.append(next(_LITERALS[literal] for literal in _LITERALS if literal.startswith(word)))
+            elif match.re is _NUMBER_RE:
+                out.append(word)
+            else:
+                out.append(json.dumps(word))
+    while closers:
+        close()
+    return "".join(out)
+
+
+def _load(span: str) -> Optional[Any]:
+    try:
+        return json.loads(span, strict=False)
+    except (ValueError, RecursionError):
+        pass
+    try:
+        return json.loads(repair(span), strict=False)
+    except (ValueError, RecursionError):
+        return None
+
+
+def iter_json(text: str) -> Iterator[Any]:
+    """Every JSON object or array that can be read from ``text``, in order of appearance."""
+    stripped = text.strip()
+    if stripped[:1] in ("{", "["):
+        try:
+            yield json.loads(stripped, strict=False)
+            return
+        except (ValueError, RecursionError):
+            pass
+    for start, end in _spans(text):
+        value = _load(text[start:end])
+        if value is not None:
+            yield value
+
+
+def extract_json(text: str, kind: type = dict) -> Optional[Any]:
+    """The first JSON value of type ``kind`` (``dict`` or ``list``) in ``text``, or None."""
+    return next((value for value in iter_json(text) if isinstance(value, kind)), None)
+
+
+def _objects(value: Any) -> Iterator[Dict[str, Any]]:
+    # the objects in a parsed value, outermost first
+    queue = deque([value])
+    while queue:
+        item = queue.popleft()
+        if isinstance(item, dict):
+            yield item
+            queue.extend(item.values())
+        elif isinstance(item, list):
+            queue.extend(item)
+
+
+def parse_model(text: str, schema: Type[M], *, defaults: Optional[Dict[str, Any]] = None) -> Optional[M]:
+    """The first JSON object in ``text`` that reads as ``schema``, or None.
+
+    Objects nested in a parsed value count too (an answer wrapped in {"result": ...}
+    or in a list); objects sharing no field with ``schema`` (placeholders, echoed
+    examples) are skipped and fields an object leaves out are taken from
+    ``defaults``. Each candidate is validated once.
+    """
+    fields = schema.model_fields.keys()
+    for value in iter_json(text):
+        for obj in _objects(value):
+            if not fields & obj.keys():
+                continue
+            try:
+                return schema.model_validate({**(defaults or {}), **obj})
+            except ValidationError as exc:
+                logger.debug("Model output did not validate as %s: %s", schema.__name__, exc)
+    return None
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Dict, List, Tuple
 
 from app.schemas.ai_policies import PolicyGenerateRequest, PolicyGenerateResponse
 from app.services.ai_client import ai_chat_completion
@@ -22,7 +22,7 @@ def _parse_policy_text(text: str) -> Tuple[str, str, str]:
     return title, summary or "Generated summary not available.", content or "No content generated."
 
 
-async def generate_policy(tenant_id: int, payload: PolicyGenerateRequest) -> PolicyGenerateResponse:
+def policy_messages(payload: PolicyGenerateRequest) -> List[Dict[str, str]]:
     system_prompt = (
         "You are an AI assistant generating GDPR-aligned policies. "
         "Provide concise, clear, and actionable text. Use English. "
@@ -34,11 +34,16 @@ async def generate_policy(tenant_id: int, payload: PolicyGenerateRequest) -> Pol
         "Language: English\n"
         "Please draft a complete policy with headings and sections."
     )
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
-    raw = await ai_chat_completion(messages, tenant_id=tenant_id)
+
+def policy_result(raw: str) -> PolicyGenerateResponse:
     title, summary, content = _parse_policy_text(raw)
     return PolicyGenerateResponse(title=title, summary=summary, content=content)
+
+
+async def generate_policy(tenant_id: int, payload: PolicyGenerateRequest) -> PolicyGenerateResponse:
+    return policy_result(await ai_chat_completion(policy_messages(payload), tenant_id=tenant_id, endpoint="/api/ai/policies/generate"))
@@ -1,13 +1,25 @@
-from typing import List
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-from app.services.ai_client import ai_chat_completion
-from app.services import rag_service
-from app.schemas.ai_qa import AiAnswerSource
+from app.core.config import settings
+from app.services.ai_client import ai_chat_completion, model_name
+from app.services import ai_router, rag_index, rag_service
+from app.services.answer_cache import get_answer_cache, normalize_question
+from app.services.context_packer import Passage, pack_context
+from app.schemas.ai_qa import AiAnswerResponse, AiAnswerSource
 
 
-async def rag_search(tenant_id: int, question: str, limit: int, db) -> List[AiAnswerSource]:
-    results = await rag_service.search(db, tenant_id, question, top_k=limit)
-    sources: List[AiAnswerSource] = []
+async def rag_context(
+    tenant_id: int, question: str, limit: int, db, diversity: float = 0.0, max_per_document: Optional[int] = None
+) -> List[Passage]:
+    """Retrieve up to ``limit`` chunks and pack them into at most AI_CONTEXT_TOKEN_BUDGET estimated tokens."""
+    # only pass the MMR options when used, keeping the plain search call unchanged
+    options = {}
+    if diversity:
+        options["diversity"] = diversity
+    if max_per_document:
+        options["max_per_document"] = max_per_document
+    results = await rag_service.search(db, tenant_id, question, top_k=limit, **options)
+    hits = []
     for item in results:
         if len(item) == 3:
             score, chunk, emb = item
@@ -15,16 +27,27 @@ async def rag_search(tenant_id: int, question: str, limit: int, db) -> List[AiAn
             score, chunk = item
         else:
             continue
-        title = getattr(chunk, "section_title", None) or "Document"
-        snippet = (chunk.content or "")[:400]
-        sources.append(AiAnswerSource(id=chunk.id, title=title, snippet=snippet))
-    return sources
+        hits.append((score, chunk))
+    return pack_context(hits, int(settings.AI_CONTEXT_TOKEN_BUDGET))
 
 
-async def answer_question(tenant_id: int, question: str, sources: List[AiAnswerSource]) -> str:
+def passage_sources(passages: List[Passage]) -> List[AiAnswerSource]:
+    return [AiAnswerSource(id=p.chunk_id, title=p.title, snippet=p.text[:400]) for p in passages]
+
+
+async def rag_search(
+    tenant_id: int, question: str, limit: int, db, diversity: float = 0.0, max_per_document: Optional[int] = None
+) -> List[AiAnswerSource]:
+    passages = await rag_context(tenant_id, question, limit, db, diversity=diversity, max_per_document=max_per_document)
+    return passage_sources(passages)
+
+
+def answer_messages(question: str, sources: List[AiAnswerSource], passages: Optional[List[Passage]] = None) -> List[Dict[str, str]]:
+    """Prompt with numbered context; ``passages`` (aligned with ``sources``) supply the full packed text."""
     context_lines = []
     for idx, src in enumerate(sources, start=1):
-        context_lines.append(f"[{idx}] {src.title}: {src.snippet}")
+        text = passages[idx - 1].text if passages is not None else src.snippet
+        context_lines.append(f"[{idx}] {src.title}: {text}")
     context_blob = "\n".join(context_lines) if context_lines else "No context available."
 
     system_msg = (
@@ -32,5 +55,90 @@ async def answer_question(tenant_id: int, question: str, sources: List[AiAnswerS
         "Answer ONLY using the provided context snippets. If the answer is not present, say you do not know."
     )
     user_msg = f"Question: {question}\nContext:\n{context_blob}"
-    messages = [{"role": "system", "content": system_msg}, {"role": "user", "content": user_msg}]
-    return await ai_chat_completion(messages, tenant_id=tenant_id)
+    return [{"role": "system", "content": system_msg}, {"role": "user", "content": user_msg}]
+
+
+async def answer_question(
+    tenant_id: int, question: str, sources: List[AiAnswerSource], passages: Optional[List[Passage]] = None
+) -> str:
+    return await ai_chat_completion(answer_messages(question, sources, passages), tenant_id=tenant_id, endpoint="/api/ai/answer")
+
+
+async def _answer_key(
+    tenant_id: int, question: str, limit: int, db, diversity: Optional[float], max_per_document: Optional[int]
+) -> Tuple[tuple, float, Optional[int]]:
+    if diversity is None:
+        diversity = float(settings.AI_ANSWER_DIVERSITY or 0.0)
+    if max_per_document is None:
+        max_per_document = int(settings.AI_ANSWER_MAX_PER_DOCUMENT or 0) or None
+    version = await rag_index.corpus_version(db, tenant_id)
+    # any provider of the "qa" route may answer, so the key covers all of them and their models
+    providers = ai_router.route("qa").providers
+    key = (
+        tenant_id,
+        version,
+        providers,
+        tuple(model_name(provider) for provider in providers),
+        limit,
+        diversity,
+        max_per_document,
+        settings.AI_CONTEXT_TOKEN_BUDGET,
+        normalize_question(question),
+    )
+    return key, diversity, max_per_document
+
+
+async def cached_answer(
+    tenant_id: int,
+    question: str,
+    limit: int,
+    db,
+    diversity: Optional[float] = None,
+    max_per_document: Optional[int] = None,
+) -> Tuple[AiAnswerResponse, str]:
+    """Answer ``question`` through the answer cache; returns the response and ``hit``/``coalesced``/``miss``.
+
+    Entries are keyed on the tenant's corpus version, so any ingest, update or
+    delete of knowledge documents makes older answers unreachable. Unset
+    ``diversity``/``max_per_document`` fall back to AI_ANSWER_DIVERSITY and
+    AI_ANSWER_MAX_PER_DOCUMENT.
+    """
+    key, diversity, max_per_document = await _answer_key(tenant_id, question, limit, db, diversity, max_per_document)
+
+    async def compute() -> AiAnswerResponse:
+        passages = await rag_context(tenant_id, question, limit=limit, db=db, diversity=diversity, max_per_document=max_per_document)
+        sources = passage_sources(passages)
+        answer_text = await answer_question(tenant_id, question, sources, passages)
+        return AiAnswerResponse(answer=answer_text, sources=sources)
+
+    return await get_answer_cache().get_or_compute(key, compute)
+
+
+class PreparedAnswer(NamedTuple):
+    key: tuple
+    cached: Optional[AiAnswerResponse]
+    sources: List[AiAnswerSource]
+    messages: List[Dict[str, str]]
+
+
+async def prepare_answer(
+    tenant_id: int,
+    question: str,
+    limit: int,
+    db,
+    diversity: Optional[float] = None,
+    max_per_document: Optional[int] = None,
+) -> PreparedAnswer:
+    """Cache lookup and retrieval for a streamed answer, done while ``db`` is still open.
+
+    A cached answer is returned as is; otherwise the sources and prompt are ready
+    for streaming, and the caller stores the finished answer under ``key``.
+    Streams do not coalesce with concurrent identical questions.
+    """
+    key, diversity, max_per_document = await _answer_key(tenant_id, question, limit, db, diversity, max_per_document)
+    cached = get_answer_cache().lookup(key)
+    if cached is not None:
+        return PreparedAnswer(key, cached, cached.sources, [])
+    passages = await rag_context(tenant_id, question, limit=limit, db=db, diversity=diversity, max_per_document=max_per_document)
+    sources = passage_sources(passages)
+    return PreparedAnswer(key, None, sources, answer_messages(question, sources, passages))
@@ -0,0 +1,340 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.services.ai_transport import PROVIDERS
+
+# Resilience for AI provider calls, shared by ai_client and ai_service:
+# - a circuit breaker per provider (closed -> open after AI_CB_FAILURE_THRESHOLD failed
+#   calls -> half-open after AI_CB_COOLDOWN_SECONDS, admitting AI_CB_HALF_OPEN_PROBES
+#   trial calls whose outcome closes or re-opens it);
+# - retries with full-jitter exponential backoff for connection errors, timeouts, 408,
+#   429 and 5xx, limited per call (AI_RETRY_ATTEMPTS) and globally by a retry budget so
+#   an outage does not multiply provider load;
+# - optional hedging: when a call outlives the provider's recent p95 latency, a second
+#   attempt races it and the first success wins.
+# State is per process and mutated without awaits in between, so it needs no lock.
+
+T = TypeVar("T")
+_LATENCY_SAMPLES = 200
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(f"AI provider {provider} circuit is open")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class ProviderStatusError(Exception):
+    """Error status from a provider; 408, 429 and 5xx are retried."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"status={status_code} text={text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def check_status(response: Any) -> None:
+    if response.status_code >= 400:
+        raise ProviderStatusError(response.status_code, str(response.text)[:256])
+
+
+def retryable(exc: BaseException) -> bool:
+    if isinstance(exc, ProviderStatusError):
+        return exc.status_code in (408, 429) or exc.status_code >= 500
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code in (408, 429) or code >= 500
+    return isinstance(exc, (httpx.RequestError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    def __init__(self, provider: str, clock: Callable[[], float] = time.time):
+        self.provider = provider
+        self.failure_count = 0
+        self.open_since: Optional[float] = None
+        self.last_failure_ts: Optional[float] = None
+        self.probes_in_flight = 0
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=int(settings.AI_CB_HISTORY_MAX or 50))
+        self._clock = clock
+
+    @staticmethod
+    def _cooldown() -> int:
+        return int(settings.AI_CB_COOLDOWN_SECONDS or 30)
+
+    @property
+    def state(self) -> str:
+        if self.open_since is None:
+            return "closed"
+        if self._clock() - self.open_since < self._cooldown():
+            return "open"
+        return "half_open"
+
+    def acquire(self) -> bool:
+        """Admit a call or raise ``CircuitOpenError``; returns whether the call is a half-open probe."""
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and self.probes_in_flight < max(1, int(settings.AI_CB_HALF_OPEN_PROBES or 1)):
+            self.probes_in_flight += 1
+            return True
+        remaining = self._cooldown() - (self._clock() - self.open_since) if state == "open" else 1
+        raise CircuitOpenError(self.provider, max(1, int(remaining + 0.999)))
+
+    def record_success(self, probe: bool = False) -> None:
+        if probe:
+            self.probes_in_flight -= 1
+        self.failure_count = 0
+        self.open_since = None
+
+    def record_failure(self, error: str, probe: bool = False) -> None:
+        if probe:
+            self.probes_in_flight -= 1
+        now = self._clock()
+        self.failure_count += 1
+        self.last_failure_ts = now
+        self.history.append({"provider": self.provider, "timestamp": int(now), "error": error[:256]})
+        if probe or self.failure_count >= int(settings.AI_CB_FAILURE_THRESHOLD or 5):
+            self.open_since = now
+
+    def release(self, probe: bool) -> None:
+        # a probe that ended without an outcome (cancelled) frees its slot
+        if probe:
+            self.probes_in_flight -= 1
+
+    def reset(self) -> None:
+        self.failure_count = 0
+        self.open_since = None
+        self.last_failure_ts = None
+        self.probes_in_flight = 0
+        self.history.clear()
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state
+        remaining = int(max(0, self._cooldown() - (self._clock() - self.open_since))) if state == "open" else 0
+        return {
+            "state": state,
+            "failure_count": int(self.failure_count),
+            "cooldown_seconds_remaining": remaining,
+            "last_failure_timestamp": (
+                time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.last_failure_ts)) if self.last_failure_ts else None
+            ),
+            "threshold": int(settings.AI_CB_FAILURE_THRESHOLD or 5),
+            "cooldown": self._cooldown(),
+            "half_open_probes_in_flight": self.probes_in_flight,
+        }
+
+
+class RetryBudget:
+    """Retries (and hedges) allowed over a sliding window: a share of recent calls, with a floor."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._calls: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self.denied = 0
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - float(settings.AI_RETRY_BUDGET_WINDOW_SECONDS or 60)
+        for window in (self._calls, self._retries):
+            while window and window[0] < cutoff:
+                window.popleft()
+
+    def _allowed(self) -> int:
+        ratio = float(settings.AI_RETRY_BUDGET_RATIO or 0.0)
+        return max(int(settings.AI_RETRY_BUDGET_MIN_RETRIES or 0), int(ratio * len(self._calls)))
+
+    def record_call(self) -> None:
+        now = self._clock()
+        self._trim(now)
+        self._calls.append(now)
+
+    def try_spend(self) -> bool:
+        now = self._clock()
+        self._trim(now)
+        if len(self._retries) >= self._allowed():
+            self.denied += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def reset(self) -> None:
+        self._calls.clear()
+        self._retries.clear()
+        self.denied = 0
+
+    def status(self) -> Dict[str, Any]:
+        self._trim(self._clock())
+        allowed = self._allowed()
+        return {
+            "window_seconds": int(settings.AI_RETRY_BUDGET_WINDOW_SECONDS or 60),
+            "calls": len(self._calls),
+            "retries": len(self._retries),
+            "allowed": allowed,
+            "remaining": max(0, allowed - len(self._retries)),
+            "denied": self.denied,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_budget = RetryBudget()
+_latencies: Dict[str, Deque[float]] = {}
+_hedges: Dict[str, Dict[str, int]] = {}
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(provider)
+    return _breakers[provider]
+
+
+def retry_budget() -> RetryBudget:
+    return _budget
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2 ** (attempt - 1))]."""
+    base = float(settings.AI_RETRY_BACKOFF_SECONDS or 0.0)
+    cap = float(settings.AI_RETRY_BACKOFF_MAX_SECONDS or 8.0)
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempt - 1)))
+
+
+def hedge_delay(provider: str) -> Optional[float]:
+    """Seconds after which a call to ``provider`` is hedged, or ``None`` (disabled or too few samples)."""
+    if not settings.AI_HEDGE_ENABLED:
+        return None
+    samples = _latencies.get(provider)
+    if not samples or len(samples) < max(1, int(settings.AI_HEDGE_MIN_SAMPLES or 20)):
+        return None
+    ordered = sorted(samples)
+    rank = min(len(ordered) - 1, int(len(ordered) * float(settings.AI_HEDGE_PERCENTILE or 95.0) / 100))
+    return ordered[rank]
+
+
+async def _timed(provider: str, send: Callable[[], Awaitable[T]]) -> T:
+    start = time.perf_counter()
+    result = await send()
+    _latencies.setdefault(provider, deque(maxlen=_LATENCY_SAMPLES)).append(time.perf_counter() - start)
+    return result
+
+
+async def _hedged(provider: str, send: Callable[[], Awaitable[T]]) -> T:
+    delay = hedge_delay(provider)
+    if delay is None:
+        return await _timed(provider, send)
+    counters = _hedges.setdefault(provider, {"hedges": 0, "hedge_wins": 0})
+    first = asyncio.ensure_future(_timed(provider, send))
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not _budget.try_spend():
+            return await first
+        counters["hedges"] += 1
+        second = asyncio.ensure_future(_timed(provider, send))
+        tasks.append(second)
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        counters["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call(provider: str, send: Callable[[], Awaitable[T]], *, attempts: Optional[int] = None, hedge: bool = True) -> T:
+    """Run ``send`` for ``provider`` behind its breaker, with budgeted retries and optional hedging.
+
+    Raises ``CircuitOpenError`` when the breaker rejects the call, else the last
+    error once retries are exhausted. Errors that are not retryable (4xx, bad
+    responses) are raised at once and do not count against the breaker.
+    """
+    cb = breaker(provider)
+    probe = cb.acquire()
+    _budget.record_call()
+    attempts = int(settings.AI_RETRY_ATTEMPTS or 0) if attempts is None else attempts
+    settled = False
+    try:
+        last: Optional[BaseException] = None
+        for attempt in range(attempts + 1):
+            if attempt:
+                if not _budget.try_spend():
+                    break
+                await asyncio.sleep(backoff_seconds(attempt))
+            try:
+                # half-open probes go out alone
+                result = await (_hedged(provider, send) if hedge and not probe else _timed(provider, send))
+            except Exception as exc:
+                if not retryable(exc):
+                    cb.record_success(probe)
+                    settled = True
+                    raise
+                last = exc
+                continue
+            cb.record_success(probe)
+            settled = True
+            return result
+        cb.record_failure(str(last), probe)
+        settled = True
+        raise last
+    finally:
+        if not settled:
+            cb.release(probe)
+
+
+def record_failure(provider: str, error: str) -> None:
+    """Count a failure seen outside ``call`` (e.g. a stream broken after its first delta)."""
+    breaker(provider).record_failure(error)
+
+
+def active_provider() -> str:
+    provider = (settings.AI_PROVIDER or "openai").lower()
+    return provider if provider in PROVIDERS else "openai"
+
+
+def circuit_status() -> Dict[str, Any]:
+    """The configured provider's breaker at the top level, plus every provider, the retry budget and hedging."""
+    provider = active_provider()
+    hedging = {}
+    for name in PROVIDERS:
+        counters = _hedges.get(name, {"hedges": 0, "hedge_wins": 0})
+        delay = hedge_delay(name)
+        hedging[name] = {**counters, "delay_ms": round(delay * 1000, 1) if delay is not None else None}
+    return {
+        **breaker(provider).status(),
+        "provider": provider,
+        "providers": {name: breaker(name).status() for name in PROVIDERS},
+        "retry_budget": _budget.status(),
+        "hedging": {"enabled": bool(settings.AI_HEDGE_ENABLED), "providers": hedging},
+    }
+
+
+def failure_history() -> List[Dict[str, Any]]:
+    entries = [entry for cb in _breakers.values() for entry in cb.history]
+    return sorted(entries, key=lambda entry: entry["timestamp"])
+
+
+def reset(provider: Optional[str] = None) -> None:
+    for name, cb in _breakers.items():
+        if provider is None or name == provider:
+            cb.reset()
+
+
+def reset_resilience() -> None:
+    _breakers.clear()
+    _budget.reset()
+    _latencies.clear()
+    _hedges.clear()
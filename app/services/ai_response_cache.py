@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models.ai_response_cache import AIResponseCacheEntry
+from app.services import ai_client, ai_router
+from app.services.answer_cache import AnswerCache
+
+logger = logging.getLogger(__name__)
+
+# Opt-in cache of AI suite completions (AI_RESPONSE_CACHE_ENABLED). Repeated suite calls
+# with the same prompt (explain on one GDPR article, TOMs for one system type) return the
+# stored completion instead of paying for a new one. The key is a sha256 of the operation,
+# the model, the temperature and the messages with whitespace normalized, and entries are
+# per tenant. A memory LRU (``AnswerCache``, so concurrent identical misses share one
+# completion) sits in front of the ai_response_cache table, which survives restarts and is
+# shared by workers. TTLs are per operation (AI_RESPONSE_CACHE_TTLS, 0 = not cached). Hit
+# and saved-latency counters are per process.
+_memory: Optional[AnswerCache] = None
+_parsed_ttls: Tuple[Optional[str], Dict[str, int]] = (None, {})
+_stats: Dict[Tuple[int, str], Dict[str, float]] = {}
+_last_prune = 0.0
+_session_factory: async_sessionmaker = AsyncSessionLocal
+
+_PRUNE_INTERVAL_SECONDS = 3600.0
+_COUNTERS = ("memory_hits", "db_hits", "coalesced", "misses", "saved_ms")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _memory_cache() -> AnswerCache:
+    global _memory
+    if _memory is None:
+        _memory = AnswerCache(
+            max_entries=int(settings.AI_RESPONSE_CACHE_MAX_ENTRIES or 0),
+            ttl_seconds=float(settings.AI_RESPONSE_CACHE_TTL_SECONDS or 0),
+        )
+    return _memory
+
+
+def ttls() -> Dict[str, int]:
+    """AI_RESPONSE_CACHE_TTLS parsed: suite operation -> TTL in seconds (invalid entries are skipped with a warning)."""
+    global _parsed_ttls
+    raw = settings.AI_RESPONSE_CACHE_TTLS or ""
+    if _parsed_ttls[0] == raw:
+        return _parsed_ttls[1]
+    parsed = {}
+    for entry in raw.split(";"):
+        if not entry.strip():
+            continue
+        operation, _, value = entry.partition("=")
+        try:
+            parsed[operation.strip().strip("/").lower()] = max(0, int(value))
+        except ValueError:
+            logger.warning("Ignoring invalid AI_RESPONSE_CACHE_TTLS entry %r", entry)
+    _parsed_ttls = (raw, parsed)
+    return parsed
+
+
+def operation(endpoint: str) -> str:
+    """The suite operation of an endpoint path: "/api/ai/toms/recommend" -> "toms/recommend"."""
+    path = (endpoint or "").strip("/")
+    return path[len("api/ai/") :] if path.startswith("api/ai/") else path
+
+
+def ttl_for(op: str) -> int:
+    return ttls().get(op, int(settings.AI_RESPONSE_CACHE_TTL_SECONDS or 0))
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Role and content of each message, with runs of whitespace collapsed to one space."""
+    return [{"role": str(m.get("role") or "").strip().lower(), "content": " ".join(str(m.get("content") or "").split())} for m in messages]
+
+
+def cache_key(op: str, model: str, temperature: float, messages: List[Dict[str, Any]]) -> str:
+    material = json.dumps([op, model, float(temperature), normalize_messages(messages)], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _count(tenant_id: int, op: str, counter: str, amount: float = 1) -> None:
+    stats = _stats.setdefault((tenant_id, op), dict.fromkeys(_COUNTERS, 0))
+    stats[counter] += amount
+
+
+async def _db_get(tenant_id: int, key: str) -> Optional[Tuple[Tuple[str, float], float]]:
+    # ((response, latency_ms), seconds left) of a live entry
+    try:
+        async with _session_factory() as session:
+            row = (
+                await session.execute(
+                    select(AIResponseCacheEntry.response, AIResponseCacheEntry.latency_ms, AIResponseCacheEntry.expires_at).where(
+                        AIResponseCacheEntry.tenant_id == tenant_id, AIResponseCacheEntry.key == key
+                    )
+                )
+            ).first()
+    except Exception:
+        logger.warning("AI response cache read failed", exc_info=True)
+        return None
+    if row is None:
+        return None
+    expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+    remaining = (expires_at - _now()).total_seconds()
+    if remaining <= 0:
+        return None
+    return (row.response, float(row.latency_ms)), remaining
+
+
+async def _db_put(tenant_id: int, key: str, op: str, model: str, response: str, latency_ms: float, ttl: int) -> None:
+    global _last_prune
+    now = _now()
+    try:
+        async with _session_factory() as session:
+            # an expired row, or one written meanwhile by another worker, is replaced
+            await session.execute(delete(AIResponseCacheEntry).where(AIResponseCacheEntry.tenant_id == tenant_id, AIResponseCacheEntry.key == key))
+            session.add(
+                AIResponseCacheEntry(
+                    tenant_id=tenant_id,
+                    key=key,
+                    operation=op[:100],
+                    model=(model or "")[:100],
+                    response=response,
+                    latency_ms=round(latency_ms, 3),
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=ttl),
+                )
+            )
+            if time.monotonic() - _last_prune >= _PRUNE_INTERVAL_SECONDS:
+                _last_prune = time.monotonic()
+                await session.execute(delete(AIResponseCacheEntry).where(AIResponseCacheEntry.expires_at < now))
+            await session.commit()
+    except Exception:
+        logger.warning("AI response cache write failed", exc_info=True)
+
+
+async def cached_completion(messages: List[Dict[str, Any]], *, tenant_id: Optional[int], endpoint: str) -> str:
+    """``ai_client.ai_chat_completion`` for a suite operation, answered from the cache when it can be.
+
+    Failed completions are not cached. The model in the key is the one of the first
+    provider of the operation's route, so changing AI_ROUTES or the model starts afresh.
+    """
+    op = operation(endpoint)
+    ttl = ttl_for(op)
+    if not settings.AI_RESPONSE_CACHE_ENABLED or ttl <= 0 or tenant_id is None:
+        return await ai_client.ai_chat_completion(messages, tenant_id=tenant_id, endpoint=endpoint)
+    model = ai_client.model_name(ai_router.route(ai_router.operation(endpoint)).providers[0])
+    key = cache_key(op, model, settings.AI_TEMPERATURE, messages)
+    stored: Dict[str, float] = {}
+
+    async def compute() -> Tuple[str, float]:
+        if settings.AI_RESPONSE_CACHE_DB:
+            found = await _db_get(tenant_id, key)
+            if found is not None:
+                value, stored["remaining"] = found
+                return value
+        start = time.perf_counter()
+        response = await ai_client.ai_chat_completion(messages, tenant_id=tenant_id, endpoint=endpoint)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if settings.AI_RESPONSE_CACHE_DB:
+            await _db_put(tenant_id, key, op, model, response, latency_ms, ttl)
+        return response, latency_ms
+
+    cache = _memory_cache()
+    (response, latency_ms), status = await cache.get_or_compute((tenant_id, key), compute, ttl)
+    if status == "miss" and "remaining" in stored:
+        # loaded from the table: keep it in memory no longer than it lives there
+        cache.put((tenant_id, key), (response, latency_ms), stored["remaining"])
+        status = "db_hit"
+    if status == "miss":
+        _count(tenant_id, op, "misses")
+    else:
+        _count(tenant_id, op, {"hit": "memory_hits", "db_hit": "db_hits", "coalesced": "coalesced"}[status])
+        _count(tenant_id, op, "saved_ms", latency_ms)
+    return response
+
+
+def _summary(counters: Dict[str, float]) -> Dict[str, Any]:
+    hits = counters["memory_hits"] + counters["db_hits"] + counters["coalesced"]
+    lookups = hits + counters["misses"]
+    return {
+        "lookups": int(lookups),
+        "hits": int(hits),
+        "memory_hits": int(counters["memory_hits"]),
+        "db_hits": int(counters["db_hits"]),
+        "coalesced": int(counters["coalesced"]),
+        "misses": int(counters["misses"]),
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        "saved_latency_ms": round(counters["saved_ms"], 1),
+    }
+
+
+def cache_stats(tenant_id: Optional[int] = None) -> Dict[str, Any]:
+    """Hit ratio and latency saved by this process, in total and per operation (all tenants, or one)."""
+    per_operation: Dict[str, Dict[str, float]] = {}
+    for (tenant, op), counters in _stats.items():
+        if tenant_id is not None and tenant != tenant_id:
+            continue
+        totals = per_operation.setdefault(op, dict.fromkeys(_COUNTERS, 0))
+        for name in _COUNTERS:
+            totals[name] += counters[name]
+    overall = dict.fromkeys(_COUNTERS, 0)
+    for counters in per_operation.values():
+        for name in _COUNTERS:
+            overall[name] += counters[name]
+    return {
+        "enabled": bool(settings.AI_RESPONSE_CACHE_ENABLED),
+        "memory_entries": len(_memory) if _memory is not None else 0,
+        **_summary(overall),
+        "operations": [{"operation": op, **_summary(counters)} for op, counters in sorted(per_operation.items())],
+    }
+
+
+def reset_response_cache() -> None:
+    global _memory, _parsed_ttls, _last_prune
+    _memory = None
+    _parsed_ttls = (None, {})
+    _stats.clear()
+    _last_prune = 0.0
@@ -0,0 +1,251 @@
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services import ai_resilience
+from app.services.ai_transport import PROVIDERS
+
+logger = logging.getLogger(__name__)
+
+# Provider choice for AI calls, shared by ai_client and ai_service. AI_ROUTES maps an
+# operation to a pool of providers ("suite/summarize=fastest:ollama,local,openai;
+# suite=openai,ollama"); an operation without a route of its own uses its family's
+# ("suite/summarize" -> "suite"), then "default", then AI_PROVIDER alone. A pool is
+# tried in order of its strategy: "ordered" as listed, "fastest" by the latency EWMA of
+# each provider, "weighted" starting from a provider drawn by weight ("local:3,openai:1"),
+# and a call that fails (502/503: an error, exhausted retries or an open circuit) goes to
+# the next provider. Providers whose breaker is open or whose error-rate EWMA is above
+# AI_ROUTER_MAX_ERROR_RATE are tried last; the error rate decays with
+# AI_ROUTER_ERROR_HALF_LIFE_SECONDS, so a demoted provider is preferred again once it
+# has been quiet for a while.
+STRATEGIES = ("ordered", "fastest", "weighted")
+_FAILOVER_STATUS = (502, 503)
+
+T = TypeVar("T")
+
+
+class Route(NamedTuple):
+    strategy: str
+    providers: Tuple[str, ...]
+    weights: Tuple[float, ...]
+
+
+class ProviderHealth:
+    def __init__(self, provider: str, clock: Callable[[], float] = time.monotonic):
+        self.provider = provider
+        self.latency_ewma: Optional[float] = None
+        self._error_ewma = 0.0
+        self._error_at = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.failovers = 0
+        self.last_error: Optional[str] = None
+        self._clock = clock
+
+    def error_rate(self) -> float:
+        half_life = float(settings.AI_ROUTER_ERROR_HALF_LIFE_SECONDS or 0)
+        if not half_life:
+            return self._error_ewma
+        return self._error_ewma * 0.5 ** ((self._clock() - self._error_at) / half_life)
+
+    def observe(self, ok: bool, latency: Optional[float] = None, error: Optional[str] = None) -> None:
+        alpha = min(1.0, max(0.01, float(settings.AI_ROUTER_EWMA_ALPHA or 0.2)))
+        self._error_ewma = (1 - alpha) * self.error_rate() + alpha * (0.0 if ok else 1.0)
+        self._error_at = self._clock()
+        self.calls += 1
+        if ok:
+            if latency is not None:
+                self.latency_ewma = latency if self.latency_ewma is None else (1 - alpha) * self.latency_ewma + alpha * latency
+        else:
+            self.failures += 1
+            self.last_error = error
+
+    def healthy(self) -> bool:
+        if ai_resilience.breaker(self.provider).state == "open":
+            return False
+        return self.error_rate() <= float(settings.AI_ROUTER_MAX_ERROR_RATE or 1.0)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy(),
+            "circuit": ai_resilience.breaker(self.provider).state,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "failovers": self.failovers,
+            "last_error": self.last_error,
+        }
+
+
+_health: Dict[str, ProviderHealth] = {}
+_parsed: Tuple[Optional[str], Dict[str, Route]] = (None, {})
+
+
+def health(provider: str) -> ProviderHealth:
+    if provider not in _health:
+        _health[provider] = ProviderHealth(provider)
+    return _health[provider]
+
+
+def _parse_route(spec: str) -> Optional[Route]:
+    strategy, _, rest = spec.partition(":")
+    if strategy.strip().lower() in STRATEGIES:
+        strategy, spec = strategy.strip().lower(), rest
+    else:
+        strategy = ""
+    providers, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.partition(":")
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in PROVIDERS:
+            logger.warning("Ignoring unknown AI provider %r in AI_ROUTES", name)
+            continue
+        try:
+            value = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            logger.warning("Ignoring invalid AI_ROUTES weight %r for %s", weight, name)
+            value = 1.0
+        if name not in providers:
+            providers.append(name)
+            weights.append(max(0.0, value))
+    if not providers:
+        return None
+    if not strategy:
+        strategy = "weighted" if any(":" in part for part in spec.split(",")) else "ordered"
+    return Route(strategy, tuple(providers), tuple(weights))
+
+
+def routes() -> Dict[str, Route]:
+    """AI_ROUTES parsed: operation -> Route (invalid entries are skipped with a warning)."""
+    global _parsed
+    raw = settings.AI_ROUTES or ""
+    if _parsed[0] == raw:
+        return _parsed[1]
+    parsed = {}
+    for entry in raw.split(";"):
+        operation, sep, spec = entry.partition("=")
+        if not entry.strip():
+            continue
+        route = _parse_route(spec) if sep else None
+        if route is None:
+            logger.warning("Ignoring invalid AI_ROUTES entry %r", entry)
+            continue
+        parsed[operation.strip().lower()] = route
+    _parsed = (raw, parsed)
+    return parsed
+
+
+def operation(endpoint: Optional[str]) -> str:
+    """The routing operation of an API endpoint path: "analyze", "qa", "policies" or "suite/<op>"."""
+    path = (endpoint or "").strip("/")
+    if path.startswith("api/ai/"):
+        path = path[len("api/ai/") :]
+    if path.endswith("/stream"):
+        path = path[: -len("/stream")]
+    if path == "gdpr/analyze":
+        return "analyze"
+    if path.startswith("answer"):
+        return "qa"
+    if path.startswith("policies"):
+        return "policies"
+    return f"suite/{path}" if path else "default"
+
+
+def route(op: str) -> Route:
+    """The route configured for ``op``: its own, its family's, "default", else AI_PROVIDER alone."""
+    configured = routes()
+    key = op
+    while key:
+        if key in configured:
+            return configured[key]
+        key = key.rpartition("/")[0]
+    if "default" in configured:
+        return configured["default"]
+    provider = (settings.AI_PROVIDER or "openai").lower()
+    return Route("ordered", (provider,), (1.0,))
+
+
+def plan(op: str) -> List[str]:
+    """Providers for one ``op`` call, in the order to try them."""
+    current = route(op)
+    healthy = [p for p in current.providers if health(p).healthy()]
+    demoted = [p for p in current.providers if p not in healthy]
+    if current.strategy == "fastest":
+        # providers without a latency sample yet go first, so every one gets measured
+        position = {p: i for i, p in enumerate(current.providers)}
+        healthy.sort(key=lambda p: (health(p).latency_ewma is not None, health(p).latency_ewma or 0.0, position[p]))
+    elif current.strategy == "weighted" and len(healthy) > 1:
+        weights = [current.weights[current.providers.index(p)] for p in healthy]
+        if sum(weights) > 0:
+            first = random.choices(healthy, weights=weights)[0]
+            healthy.remove(first)
+            healthy.insert(0, first)
+    return healthy + demoted
+
+
+async def call(op: str, attempts: Sequence[Tuple[str, Callable[[], Awaitable[T]]]]) -> T:
+    """Run the first of ``attempts`` ((provider, call) in ``plan`` order) that succeeds.
+
+    A call failing with 502/503 moves on to the next provider; the last failure, or
+    any other error, is raised. Outcomes and latencies feed each provider's EWMAs.
+    """
+    for index, (provider, attempt) in enumerate(attempts):
+        start = time.perf_counter()
+        try:
+            result = await attempt()
+        except HTTPException as exc:
+            if exc.status_code not in _FAILOVER_STATUS:
+                raise
+            failed(provider, str(exc.detail))
+            if index == len(attempts) - 1:
+                raise
+            failover(op, provider, attempts[index + 1][0])
+            continue
+        succeeded(provider, time.perf_counter() - start)
+        return result
+    raise HTTPException(status_code=503, detail="No AI provider available")
+
+
+def succeeded(provider: str, latency: Optional[float] = None) -> None:
+    health(provider).observe(True, latency)
+
+
+def failed(provider: str, error: str) -> None:
+    health(provider).observe(False, error=error[:256])
+
+
+def failover(op: str, provider: str, to: str) -> None:
+    health(provider).failovers += 1
+    logger.warning("AI %s call failed on %s; failing over to %s", op, provider, to)
+
+
+def routing_status() -> Dict[str, Any]:
+    """Routes (configured and effective order per operation) and the health of every provider."""
+    configured = routes()
+    operations = sorted(set(configured) | {"default"})
+    return {
+        "default_provider": (settings.AI_PROVIDER or "openai").lower(),
+        "routes": {
+            op: {
+                "strategy": route(op).strategy,
+                "providers": list(route(op).providers),
+                "weights": list(route(op).weights) if route(op).strategy == "weighted" else None,
+                "order": plan(op),
+            }
+            for op in operations
+        },
+        "providers": {name: health(name).status() for name in PROVIDERS},
+    }
+
+
+def reset_router() -> None:
+    global _parsed
+    _health.clear()
+    _parsed = (None, {})
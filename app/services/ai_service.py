@@ -1,61 +1,55 @@
-import json
-import os
+import asyncio
+import functools
 import re
 import time
-import asyncio
-from collections import deque
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import httpx
 from fastapi import HTTPException
-from pydantic import ValidationError
 
 from app.core.config import settings
 from app.models.ai import GDPRAnalyzeResponse
+from app.services import ai_bulkhead, ai_client, ai_json, ai_resilience, ai_router, ai_transport, ai_usage
+from app.services.rag_pipeline import TOKENIZERS, iter_chunks
 
 logger = logging.getLogger(__name__)
 
-# Circuit breaker state (in-memory)
-_cb_failure_count: int = 0
-_cb_open_since: float | None = None
-_cb_last_failure_ts: float | None = None
-_cb_lock: asyncio.Lock = asyncio.Lock()
-_cb_history_max = int(settings.AI_CB_HISTORY_MAX or 50)
-_cb_failure_history: deque = deque(maxlen=_cb_history_max)
-
-
-def _provider() -> str:
-    return (settings.AI_PROVIDER or "ollama").lower()
+# long-document mode: overlap between chunks, so a finding spanning a boundary is seen whole once
+_CHUNK_OVERLAP = 0.05
 
 
 def _base_url(provider: str) -> str:
     if provider == "ollama":
-        base = os.environ.get("OLLAMA_BASE_URL") or settings.AI_BASE_URL or settings.OLLAMA_BASE_URL or "http://127.0.0.1:11434"
-    else:
-        base = settings.AI_BASE_URL or "https://api.openai.com"
-    return base.rstrip("/")
+        return ai_transport.ollama_base_url()
+    if provider == "local":
+        # a full chat completions URL, used as is
+        return settings.LOCAL_AI_ENDPOINT
+    return settings.OPENAI_BASE_URL.rstrip("/")
+
+
+def _api_key(provider: str) -> Optional[str]:
+    if provider == "openai":
+        return settings.OPENAI_API_KEY
+    # AI_API_KEY authenticates a self-hosted OpenAI-compatible LOCAL_AI_ENDPOINT
+    return settings.AI_API_KEY if provider == "local" else None
 
 
 def _build_request(provider: str, prompt: str, base_url: str):
-    model = _model()
+    model = _model(provider)
     if provider == "ollama":
         url = f"{base_url}/api/generate"
         payload = {"model": model, "prompt": prompt, "stream": False}
         headers = None
     else:
-        api_base = base_url
-        if not api_base.endswith("/v1"):
-            api_base = f"{api_base}/v1"
-        url = f"{api_base}/chat/completions"
+        url = base_url if provider == "local" else f"{base_url}/chat/completions"
         payload = {
             "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "stream": False,
         }
-        headers = {"Content-Type": "application/json"} if settings.AI_API_KEY else None
-        if headers is not None and settings.AI_API_KEY:
-            headers["Authorization"] = f"Bearer {settings.AI_API_KEY}"
+        api_key = _api_key(provider)
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"} if api_key else None
     return url, payload, headers
 
 
@@ -69,54 +63,31 @@ def _extract_text(provider: str, response: httpx.Response) -> str:
         return response.text
 
 
-def _model() -> str:
-    return settings.AI_MODEL
+def _model(provider: Optional[str] = None) -> str:
+    """Model ``provider`` is called with; the analyze route's first provider by default."""
+    return ai_client.model_name(provider or ai_router.route("analyze").providers[0])
 
 
 async def get_circuit_breaker_status() -> Dict:
-    async with _cb_lock:
-        failure_count = _cb_failure_count
-        open_since = _cb_open_since
-        last_failure_ts = _cb_last_failure_ts
-    threshold = int(settings.AI_CB_FAILURE_THRESHOLD or 5)
-    cooldown = int(settings.AI_CB_COOLDOWN_SECONDS or 30)
-    now = time.time()
-    if open_since is not None:
-        remaining = int(max(0, cooldown - (now - open_since)))
-        state = "open"
-    else:
-        remaining = 0
-        state = "closed"
-    return {
-        "state": state,
-        "failure_count": int(failure_count),
-        "cooldown_seconds_remaining": remaining,
-        "last_failure_timestamp": (time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(last_failure_ts)) if last_failure_ts else None),
-        "threshold": threshold,
-        "cooldown": cooldown,
-    }
+    return ai_resilience.circuit_status()
 
 
 async def get_circuit_breaker_history() -> List[Dict]:
-    async with _cb_lock:
-        return list(_cb_failure_history)
+    return ai_resilience.failure_history()
 
 
-async def reset_circuit_breaker() -> None:
-    global _cb_failure_count, _cb_open_since, _cb_last_failure_ts
-    async with _cb_lock:
-        _cb_failure_count = 0
-        _cb_open_since = None
-        _cb_last_failure_ts = None
-        _cb_failure_history.clear()
+async def reset_circuit_breaker(provider: Optional[str] = None) -> None:
+    ai_resilience.reset(provider)
 
 
-async def analyze_gdpr_text(text: str) -> Dict:
+def _analysis_prompt(text: str, part: Optional[Tuple[int, int]] = None) -> str:
     max_chars = int(settings.AI_MAX_INPUT_CHARS or 50000)
     trimmed_text = text[:max_chars]
-    prompt = (
+    part_note = f"Texten ar del {part[0]} av {part[1]} av ett langre dokument; analysera bara denna del.\n" if part else ""
+    return (
         "Du ar en expertradgivare (DPO) som hjalper till med GDPR-analys. "
         "Las foljande text och gor foljande och returnera ENDAST giltig JSON med foljande format: \n\n"
+        f"{part_note}"
         f"TEXT:\n{trimmed_text}\n\n"
         "Uppdrag:\n"
         "1) Returnera JSON-objekt med foljande nycklar: summary (string), risks (lista av strangar), recommendations (lista av strangar), high_risk (boolean), model (string).\n"
@@ -124,74 +95,82 @@ async def analyze_gdpr_text(text: str) -> Dict:
         "3) Svar ska inte innehalla nagot annat an JSON.\n\n"
     )
 
-    provider = _provider()
+
+async def _complete(prompt: str, tenant_id: Optional[int]) -> Tuple[str, float, str]:
+    """Send one analysis prompt (holding a bulkhead slot) and return the model's text, the call latency and the model.
+
+    The provider comes from the "analyze" route of ``ai_router``; a failed call moves
+    on to the next provider of the route. Providers without credentials are skipped,
+    and with none left the prompt gets the stubbed response of ``ai_client``.
+    """
+    providers = [provider for provider in ai_router.plan("analyze") if ai_client.configured(provider)]
+    if not providers:
+        return ai_client._stub_response([{"role": "user", "content": prompt}]), 0.0, _model()
+    attempts = [(provider, functools.partial(_complete_with, provider, prompt, tenant_id)) for provider in providers]
+    async with ai_bulkhead.admit(tenant_id):
+        return await ai_router.call("analyze", attempts)
+
+
+async def _complete_with(provider: str, prompt: str, tenant_id: Optional[int]) -> Tuple[str, float, str]:
     base_url = _base_url(provider)
     url, payload, headers = _build_request(provider, prompt, base_url)
-    max_retries = int(settings.AI_RETRY_ATTEMPTS or 2)
-    backoff = float(settings.AI_RETRY_BACKOFF_SECONDS or 0.5)
-    resp = None
-    latency = 0.0
-    global _cb_failure_count, _cb_open_since, _cb_last_failure_ts
-    cb_threshold = int(settings.AI_CB_FAILURE_THRESHOLD or 5)
-    cb_cooldown = int(settings.AI_CB_COOLDOWN_SECONDS or 30)
-    now = time.time()
-    if _cb_open_since is not None and now - _cb_open_since < cb_cooldown:
-        logger.warning("AI circuit is OPEN; rejecting call")
-        raise HTTPException(status_code=503, detail="AI circuit is open; service temporarily unavailable")
-
-    async with httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT_SECONDS) as client:
-        for attempt in range(max_retries + 1):
-            try:
-                start = time.perf_counter()
-                post_kwargs = {"json": payload}
-                if headers:
-                    post_kwargs["headers"] = headers
-                resp = await client.post(url, **post_kwargs)
-                latency = time.perf_counter() - start
-                break
-            except httpx.RequestError as exc:
-                if attempt < max_retries:
-                    await asyncio.sleep(backoff * (attempt + 1))
-                    continue
-                async with _cb_lock:
-                    _cb_failure_count += 1
-                    _cb_last_failure_ts = time.time()
-                    if _cb_failure_count >= cb_threshold:
-                        _cb_open_since = time.time()
-                    _cb_failure_history.append({"timestamp": int(_cb_last_failure_ts), "error": str(exc)[:256]})
-                raise HTTPException(status_code=502, detail=f"Could not reach {provider} at {base_url}: {exc}")
-
-    if resp is None:
-        raise HTTPException(status_code=502, detail="AI provider did not respond")
-    if resp.status_code != 200:
-        async with _cb_lock:
-            _cb_failure_count += 1
-            _cb_last_failure_ts = time.time()
-            if _cb_failure_count >= cb_threshold:
-                _cb_open_since = time.time()
-            _cb_failure_history.append({"timestamp": int(_cb_last_failure_ts), "error": f"status={resp.status_code} text={str(resp.text)[:256]}"})
-        raise HTTPException(status_code=502, detail=f"{provider} returned status {resp.status_code}: {resp.text}")
-
-    text_out = _extract_text(provider, resp)
-    parsed = None
-    try:
-        parsed = json.loads(text_out)
-    except Exception:
+    # every provider other than ollama speaks the OpenAI-compatible API; "local" has its own pool and breaker
+    transport_provider = provider if provider in ("ollama", "local") else "openai"
+    client = await ai_transport.get_client(transport_provider)
+    post_kwargs = {"json": payload}
+    if headers:
+        post_kwargs["headers"] = headers
+
+    async def send() -> httpx.Response:
+        resp = await client.post(url, **post_kwargs)
+        ai_resilience.check_status(resp)
+        return resp
+
+    messages = [{"role": "user", "content": prompt}]
+    model = _model(provider)
+    with ai_usage.track(provider, messages, tenant_id=tenant_id, endpoint="/api/ai/gdpr/analyze", model=model) as usage:
+        start = time.perf_counter()
         try:
-            m = re.search(r"\{(?:.|\n)*\}", text_out)
-            if m:
-                parsed = json.loads(m.group(0))
-        except Exception:
-            parsed = None
-
-    if parsed is None:
+            resp = await ai_resilience.call(transport_provider, send)
+        except ai_resilience.CircuitOpenError as exc:
+            logger.warning("AI circuit is OPEN; rejecting call")
+            raise HTTPException(
+                status_code=503,
+                detail="AI circuit is open; service temporarily unavailable",
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+        except ai_resilience.ProviderStatusError as exc:
+            raise HTTPException(status_code=502, detail=f"{provider} returned status {exc.status_code}: {exc.text}")
+        except (httpx.RequestError, TimeoutError) as exc:
+            raise HTTPException(status_code=502, detail=f"Could not reach {provider} at {base_url}: {exc}")
+        latency = time.perf_counter() - start
+        if resp.status_code != 200:
+            raise HTTPException(status_code=502, detail=f"{provider} returned status {resp.status_code}: {resp.text}")
+        text_out = _extract_text(provider, resp)
         try:
-            fixed = text_out.replace("'", '"')
-            fixed = re.sub(r",\s*([\]}])", r"\1", fixed)
-            parsed = json.loads(fixed)
+            data = resp.json()
         except Exception:
-            parsed = None
+            data = None
+        ai_usage.fill(usage, data, text_out)
+    return text_out, latency, model
+
+
+def _parse_analysis(text_out: str, model: Optional[str] = None) -> Dict:
+    """Turn a model answer (JSON, or SUMMARY:/RISKS:/... sections) from ``model`` into the analysis fields."""
+    model = model or _model()
+    parsed = ai_json.parse_model(
+        text_out,
+        GDPRAnalyzeResponse,
+        defaults={"summary": "", "risks": [], "recommendations": [], "high_risk": False, "model": model},
+    )
+    if parsed is not None:
+        summary, risks, recommendations, high_risk = parsed.summary, parsed.risks, parsed.recommendations, parsed.high_risk
+    else:
+        summary, risks, recommendations, high_risk = _parse_sections(text_out)
+    return _analysis_result(summary, risks, recommendations, high_risk, model)
 
+
+def _parse_sections(text_out: str) -> Tuple[str, List[str], List[str], bool]:
     def _strip_prefix(prefix: str, s: str) -> str:
         if s.lower().startswith(prefix.lower()):
             return s[len(prefix):].strip()
@@ -248,29 +227,11 @@ async def analyze_gdpr_text(text: str) -> Dict:
                 high_risk = v.startswith("y") or v in ("ja", "yes", "true")
 
     if not summary:
-        summary = text_out.strip().splitlines()[0][:200]
-    if parsed is not None and isinstance(parsed, dict):
-        try:
-            GDPRAnalyzeResponse.model_validate(parsed)
-        except ValidationError as ve:
-            logger.warning("Parsed JSON did not validate against GDPRAnalyzeResponse model: %s", ve)
-            parsed = None
-        except Exception as ve:
-            logger.warning("Error validating parsed JSON: %s", ve)
-            parsed = None
-        try:
-            summary = parsed.get("summary", summary)
-            risks = parsed.get("risks", risks)
-            recommendations = parsed.get("recommendations", recommendations)
-            high_risk = parsed.get("high_risk", parsed.get("HIGH_RISK", high_risk))
-        except Exception:
-            pass
+        summary = next(iter(text_out.strip().splitlines()), "")[:200]
+    return summary, risks, recommendations, high_risk
 
-    if not isinstance(risks, list):
-        risks = [str(risks)] if risks else []
-    if not isinstance(recommendations, list):
-        recommendations = [str(recommendations)] if recommendations else []
 
+def _analysis_result(summary: str, risks: List[str], recommendations: List[str], high_risk: bool, model: str) -> Dict:
     max_output = int(settings.AI_MAX_OUTPUT_CHARS or 20000)
     summary = summary[:max_output]
     risks = [r[:1024] for r in risks][:50]
@@ -281,12 +242,109 @@ async def analyze_gdpr_text(text: str) -> Dict:
         "risks": [r for r in risks if r],
         "recommendations": [r for r in recommendations if r],
         "high_risk": bool(high_risk),
-        "model": _model(),
+        "model": model,
     }
+    return result
+
+
+def _long_input_chunks(text: str) -> List[str]:
+    """The parts of ``text`` to analyze separately in long-document mode (one part when it fits one prompt).
+
+    The RAG chunker splits at headings; consecutive chunks are packed back together
+    up to AI_ANALYZE_CHUNK_TOKENS so short sections do not each cost a model call.
+    A single word longer than that is split by characters.
+    """
+    max_tokens = max(100, int(settings.AI_ANALYZE_CHUNK_TOKENS or 2000))
+    # cheap upper bound (~4 characters per token) before running the chunker
+    if len(text) <= max_tokens * 4:
+        return [text]
+    count = TOKENIZERS["subword"]
+    spans: List[List] = []  # [start, end, section_title, tokens]
+    for chunk in iter_chunks(text, overlap_ratio=_CHUNK_OVERLAP, tokenizer=count, max_tokens=max_tokens, min_tokens=max_tokens // 3):
+        tokens = sum(map(count, chunk.text.split()))
+        if tokens > max_tokens:
+            # one word longer than a chunk (a base64 blob, a run of characters): cut it into prompt-sized pieces
+            step = max_tokens * 4
+            spans.extend([pos, min(pos + step, chunk.end), chunk.section_title, max_tokens] for pos in range(chunk.start, chunk.end, step))
+            continue
+        if spans and spans[-1][3] + tokens <= max_tokens:
+            spans[-1][1] = chunk.end
+            spans[-1][3] += tokens
+        else:
+            spans.append([chunk.start, chunk.end, chunk.section_title, tokens])
+    return [f"{title}\n{text[start:end]}" if title else text[start:end] for start, end, title, _ in spans]
+
+
+def _dedupe_key(item: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", item.casefold()).split())
+
+
+def _merge_items(groups: List[List[str]], limit: int = 50) -> List[str]:
+    """Items of all groups without near-verbatim repeats, most often mentioned first (ties: first seen)."""
+    counts: Dict[str, int] = {}
+    first: Dict[str, str] = {}
+    for group in groups:
+        for item in group:
+            key = _dedupe_key(item)
+            if key and key not in first:
+                first[key] = item
+        for key in {_dedupe_key(item) for item in group} - {""}:
+            counts[key] = counts.get(key, 0) + 1
+    # dicts keep insertion order and sorted() is stable, so ties stay in first-seen order
+    ranked = sorted(first, key=lambda key: -counts[key])
+    return [first[key] for key in ranked][:limit]
 
-    async with _cb_lock:
-        _cb_failure_count = 0
-        _cb_open_since = None
-        _cb_last_failure_ts = None
-    logger.info("AI analyze result: model=%s latency=%.3f summary_len=%d risks=%d recs=%d high_risk=%s", _model(), latency, len(result["summary"]), len(result["risks"]), len(result["recommendations"]), result["high_risk"])
+
+def merge_analyses(parts: List[Dict]) -> Dict:
+    """Reduce step of long-document analysis: one result from the analyses of consecutive parts."""
+    max_output = int(settings.AI_MAX_OUTPUT_CHARS or 20000)
+    summaries: List[str] = []
+    seen = set()
+    for part in parts:
+        key = _dedupe_key(part["summary"])
+        if key and key not in seen:
+            seen.add(key)
+            summaries.append(part["summary"].strip())
+    return {
+        "summary": " ".join(summaries)[:max_output],
+        "risks": _merge_items([part["risks"] for part in parts]),
+        "recommendations": _merge_items([part["recommendations"] for part in parts]),
+        "high_risk": any(part["high_risk"] for part in parts),
+        # parts answered by different providers after a failover name every model once
+        "model": ", ".join(dict.fromkeys(part.get("model") or _model() for part in parts)),
+    }
+
+
+async def analyze_gdpr_text(text: str, *, tenant_id: Optional[int] = None) -> Dict:
+    """GDPR analysis of ``text``: summary, risks, recommendations and a high-risk flag.
+
+    Text goes to the model as one prompt, truncated at AI_MAX_INPUT_CHARS. In
+    long-document mode (AI_ANALYZE_LONG_INPUT) text longer than one chunk of
+    AI_ANALYZE_CHUNK_TOKENS is split with the RAG chunker instead, the chunks are
+    analyzed concurrently (AI_ANALYZE_CONCURRENCY, within the tenant's bulkhead) and
+    their risks and recommendations merged without duplicates. Every provider call
+    takes a bulkhead slot for ``tenant_id``.
+    """
+    chunks = await asyncio.to_thread(_long_input_chunks, text) if settings.AI_ANALYZE_LONG_INPUT else [text]
+    if len(chunks) == 1:
+        text_out, latency, model = await _complete(_analysis_prompt(chunks[0]), tenant_id)
+        result = _parse_analysis(text_out, model)
+    else:
+        start = time.perf_counter()
+        gate = asyncio.Semaphore(ai_bulkhead.fan_out(int(settings.AI_ANALYZE_CONCURRENCY or 1)))
+
+        async def analyze_part(number: int, chunk: str) -> Dict:
+            async with gate:
+                text_out, _, model = await _complete(_analysis_prompt(chunk, (number, len(chunks))), tenant_id)
+            return _parse_analysis(text_out, model)
+
+        tasks = [asyncio.ensure_future(analyze_part(i + 1, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            result = merge_analyses(await asyncio.gather(*tasks))
+        finally:
+            # the first failure fails the analysis; stop the parts still running
+            for task in tasks:
+                task.cancel()
+        latency = time.perf_counter() - start
+    logger.info("AI analyze result: model=%s latency=%.3f parts=%d summary_len=%d risks=%d recs=%d high_risk=%s", result["model"], latency, len(chunks), len(result["summary"]), len(result["risks"]), len(result["recommendations"]), result["high_risk"])
     return result
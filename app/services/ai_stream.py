@@ -0,0 +1,111 @@
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.ai_audit import log_ai_call
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.services import ai_client
+
+logger = logging.getLogger(__name__)
+
+# Server-sent events for streamed AI completions. A stream is a sequence of
+# events: optional prelude events (e.g. Q&A sources), "delta" ({"text": ...}) per
+# provider delta, then "result" with the same body the non-streaming endpoint
+# returns and "done" with output size and time to first token; failures end
+# the stream with an "error" event instead. The request's database session is
+# closed before the body is sent, so the audit record uses its own session.
+_session_factory: async_sessionmaker = AsyncSessionLocal
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+def event_stream_response(events: AsyncIterator[str], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    # X-Accel-Buffering stops nginx from holding the events until the response ends
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+
+async def audit(tenant_id: Optional[int], user_id: Optional[int], input_text: str, endpoint: str, status: str, error: Optional[str]) -> None:
+    """Write the AI audit record of a streamed response from its own session; failures are only logged."""
+    try:
+        async with _session_factory() as db:
+            await log_ai_call(db, tenant_id, user_id, input_text, ai_client.model_name(), endpoint, False, status, error)
+    except Exception:
+        logger.exception("Failed to write AI audit log for %s", endpoint)
+
+
+def _done(text: str, first_delta: Optional[float]) -> Dict[str, Any]:
+    return {
+        "output_chars": len(text),
+        "truncated": len(text) >= int(settings.AI_MAX_OUTPUT_CHARS or 20000),
+        "first_delta_ms": round(first_delta * 1000, 1) if first_delta is not None else None,
+    }
+
+
+async def replay_events(text: str, result: Any, prelude: Sequence[Tuple[str, Any]] = ()) -> AsyncIterator[str]:
+    """The events of an already finished completion (e.g. a cached answer) as a single delta."""
+    for event, data in prelude:
+        yield sse_event(event, data)
+    yield sse_event("delta", {"text": text})
+    yield sse_event("result", result)
+    yield sse_event("done", _done(text, 0.0))
+
+
+async def completion_events(
+    messages: List[Dict[str, str]],
+    *,
+    tenant_id: Optional[int],
+    user_id: Optional[int],
+    endpoint: str,
+    finalize: Callable[[str], Any],
+    prelude: Sequence[Tuple[str, Any]] = (),
+    on_result: Optional[Callable[[Any], None]] = None,
+) -> AsyncIterator[str]:
+    """SSE events for a streamed completion of ``messages``; ``finalize`` turns the full text into the result.
+
+    Every stream is audited once it ends: ``success``, ``error`` or ``cancelled``
+    (client disconnected). The audited input is the user messages' content.
+    """
+    input_text = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    started = time.perf_counter()
+    first_delta: Optional[float] = None
+    parts: List[str] = []
+    status, error = "cancelled", None
+    try:
+        for event, data in prelude:
+            yield sse_event(event, data)
+        async with aclosing(ai_client.ai_chat_completion_stream(messages, tenant_id=tenant_id, endpoint=endpoint)) as deltas:
+            async for delta in deltas:
+                if first_delta is None:
+                    first_delta = time.perf_counter() - started
+                parts.append(delta)
+                yield sse_event("delta", {"text": delta})
+        text = "".join(parts)
+        result = finalize(text)
+        if on_result is not None:
+            on_result(result)
+        status = "success"
+        yield sse_event("result", result)
+        yield sse_event("done", _done(text, first_delta))
+    except HTTPException as exc:
+        status, error = "error", str(exc.detail)
+        yield sse_event("error", {"status_code": exc.status_code, "detail": exc.detail})
+    except Exception as exc:
+        logger.exception("AI stream failed for %s", endpoint)
+        status, error = "error", str(exc)
+        yield sse_event("error", {"status_code": 500, "detail": "Internal error during AI streaming"})
+    finally:
+        await audit(tenant_id, user_id, input_text, endpoint, status, error)
@@ -1,8 +1,9 @@
 import json
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Type
 
 from fastapi import HTTPException
+from pydantic import BaseModel
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -33,20 +34,11 @@ from app.schemas.ai_suite import (
     AITomsRecommendResponse,
     AITomsRecommendItem,
 )
-from app.services.ai_client import ai_chat_completion
+from app.services.ai_response_cache import cached_completion
+from app.services.ai_json import extract_json, parse_model
 
 
-def _safe_json_parse(text: str, fallback: dict) -> dict:
-    try:
-        loaded = json.loads(text)
-        if isinstance(loaded, dict):
-            return loaded
-    except Exception:
-        pass
-    return fallback
-
-
-async def generate_dpia(tenant_id: int, payload: AIDPIAGenerateRequest) -> AIDPIAGenerateResponse:
+def dpia_messages(payload: AIDPIAGenerateRequest) -> List[Dict[str, str]]:
     system_prompt = (
         "You are an expert GDPR privacy consultant. Generate a concise DPIA summary in English. "
         "Return JSON with keys: title, purpose, processing_description, data_subjects, data_categories, "
@@ -60,10 +52,10 @@ async def generate_dpia(tenant_id: int, payload: AIDPIAGenerateRequest) -> AIDPI
         "Language: English\n"
         "Return short, actionable statements."
     )
-    raw = await ai_chat_completion(
-        [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-        tenant_id=tenant_id,
-    )
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+
+
+def dpia_result(payload: AIDPIAGenerateRequest, raw: str) -> AIDPIAGenerateResponse:
     fallback = {
         "title": f"DPIA for {payload.system_name}",
         "purpose": payload.processing_activity,
@@ -74,8 +66,11 @@ async def generate_dpia(tenant_id: int, payload: AIDPIAGenerateRequest) -> AIDPI
         "risks": "Risks were not detailed; perform deeper assessment.",
         "mitigation_measures": "Implement access control, encryption, and review data minimization.",
     }
-    data = _safe_json_parse(raw, fallback)
-    return AIDPIAGenerateResponse(**{**fallback, **data})
+    return parse_model(raw, AIDPIAGenerateResponse, defaults=fallback) or AIDPIAGenerateResponse(**fallback)
+
+
+async def generate_dpia(tenant_id: int, payload: AIDPIAGenerateRequest) -> AIDPIAGenerateResponse:
+    return dpia_result(payload, await cached_completion(dpia_messages(payload), tenant_id=tenant_id, endpoint="/api/ai/dpia/generate"))
 
 
 async def classify_incident(tenant_id: int, payload: AIIncidentClassifyRequest) -> AIIncidentClassifyResponse:
@@ -91,9 +86,10 @@ async def classify_incident(tenant_id: int, payload: AIIncidentClassifyRequest)
         f"Impact: {payload.impact or 'Not specified'}\n"
         f"Context: {payload.context or 'Not provided'}"
     )
-    raw = await ai_chat_completion(
+    raw = await cached_completion(
         [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
         tenant_id=tenant_id,
+        endpoint="/api/ai/incidents/classify",
     )
     fallback = {
         "severity": "medium",
@@ -101,11 +97,10 @@ async def classify_incident(tenant_id: int, payload: AIIncidentClassifyRequest)
         "recommended_actions": ["Contain the incident", "Notify stakeholders", "Investigate root cause"],
         "regulatory_obligations": "Assess if personal data was impacted and notify DPA/individuals if required.",
     }
-    data = _safe_json_parse(raw, fallback)
-    return AIIncidentClassifyResponse(**{**fallback, **data})
+    return parse_model(raw, AIIncidentClassifyResponse, defaults=fallback) or AIIncidentClassifyResponse(**fallback)
 
 
-async def suggest_ropa(tenant_id: int, payload: AIRopaSuggestRequest) -> AIRopaSuggestResponse:
+def ropa_messages(payload: AIRopaSuggestRequest) -> List[Dict[str, str]]:
     system_prompt = (
         "You assist with Records of Processing Activities (ROPA). "
         "Provide concise English suggestions. Return JSON with suggested_legal_basis, "
@@ -120,10 +115,10 @@ async def suggest_ropa(tenant_id: int, payload: AIRopaSuggestRequest) -> AIRopaS
         f"Transfers: {payload.transfers or 'Unknown'}\n"
         f"Security measures: {payload.security_measures or 'Unknown'}"
     )
-    raw = await ai_chat_completion(
-        [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-        tenant_id=tenant_id,
-    )
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+
+
+def ropa_result(payload: AIRopaSuggestRequest, raw: str) -> AIRopaSuggestResponse:
     fallback = {
         "suggested_legal_basis": "Legitimate interests (confirm with DPO).",
         "retention_period": "12-24 months based on business need.",
@@ -131,8 +126,11 @@ async def suggest_ropa(tenant_id: int, payload: AIRopaSuggestRequest) -> AIRopaS
         "risks": "Potential over-retention and unauthorized access.",
         "notes": "Validate DPIA requirements and update ROPA once finalized.",
     }
-    data = _safe_json_parse(raw, fallback)
-    return AIRopaSuggestResponse(**{**fallback, **data})
+    return parse_model(raw, AIRopaSuggestResponse, defaults=fallback) or AIRopaSuggestResponse(**fallback)
+
+
+async def suggest_ropa(tenant_id: int, payload: AIRopaSuggestRequest) -> AIRopaSuggestResponse:
+    return ropa_result(payload, await cached_completion(ropa_messages(payload), tenant_id=tenant_id, endpoint="/api/ai/ropa/suggest"))
 
 
 async def recommend_toms(tenant_id: int, payload: AITomsRecommendRequest) -> AITomsRecommendResponse:
@@ -145,15 +143,16 @@ async def recommend_toms(tenant_id: int, payload: AITomsRecommendRequest) -> AIT
         f"Systems: {', '.join(payload.systems) if payload.systems else 'Unknown'}\n"
         f"Risk profile: {payload.risk_profile or 'Not provided'}"
     )
-    raw = await ai_chat_completion(
+    raw = await cached_completion(
         [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
         tenant_id=tenant_id,
+        endpoint="/api/ai/toms/recommend",
     )
     fallback_items = [
         {"name": "Access Control", "description": "Role-based access with MFA.", "category": "identity", "effectiveness": "high"},
         {"name": "Encryption", "description": "Encrypt data at rest and in transit.", "category": "encryption", "effectiveness": "high"},
     ]
-    parsed = _safe_json_parse(raw, {"recommended_measures": fallback_items})
+    parsed = extract_json(raw) or {}
     measures_raw = parsed.get("recommended_measures") or fallback_items
     measures: List[AITomsRecommendItem] = []
     for item in measures_raw:
@@ -174,12 +173,12 @@ async def autofill_document(tenant_id: int, payload: AIDocumentAutofillRequest)
         f"Document type: {payload.document_type}\n"
         f"Fields: {json.dumps(payload.fields, ensure_ascii=False)}"
     )
-    raw = await ai_chat_completion(
+    raw = await cached_completion(
         [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
         tenant_id=tenant_id,
+        endpoint="/api/ai/autofill",
     )
-    fallback = {"completed_fields": payload.fields}
-    parsed = _safe_json_parse(raw, fallback)
+    parsed = extract_json(raw) or {}
     completed = parsed.get("completed_fields") or payload.fields
     if not isinstance(completed, dict):
         completed = payload.fields
@@ -200,9 +199,10 @@ async def evaluate_risk(tenant_id: int, payload: AIRiskEvaluateRequest) -> AIRis
         f"History: {payload.history}\nIncidents: {payload.incidents}\nDPIAs: {payload.dpias}\n"
         f"TOMs: {payload.toms}\nPolicies: {payload.policies}\nLanguage: English"
     )
-    raw = await ai_chat_completion(
+    raw = await cached_completion(
         [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
         tenant_id=tenant_id,
+        endpoint="/api/ai/risk/evaluate",
     )
     fallback = {
         "likelihood": 3,
@@ -211,8 +211,7 @@ async def evaluate_risk(tenant_id: int, payload: AIRiskEvaluateRequest) -> AIRis
         "explanation": "Risk could not be fully determined; more data needed.",
         "recommendations": ["Add encryption", "Review access control", "Perform DPIA"],
     }
-    parsed = _safe_json_parse(raw, fallback)
-    return AIRiskEvaluateResponse(**{**fallback, **parsed})
+    return parse_model(raw, AIRiskEvaluateResponse, defaults=fallback) or AIRiskEvaluateResponse(**fallback)
 
 
 async def _count(db: AsyncSession, model, tenant_id: int) -> int:
@@ -244,9 +243,10 @@ async def run_audit_v2(db: AsyncSession, tenant_id: int, payload: AIAuditV2Reque
         "Processor management, Security measures, DPIA, Incident handling. "
         f"Data snapshot: {context_summary}"
     )
-    raw = await ai_chat_completion(
+    raw = await cached_completion(
         [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
         tenant_id=tenant_id,
+        endpoint="/api/ai/audit/run-v2",
     )
     fallback = {
         "overall_score": 60,
@@ -256,8 +256,8 @@ async def run_audit_v2(db: AsyncSession, tenant_id: int, payload: AIAuditV2Reque
         ],
         "global_recommendations": ["Prioritize DPIA for high-risk systems", "Refresh incident response playbooks"],
     }
-    parsed = _safe_json_parse(raw, fallback)
-    merged = {**fallback, **parsed}
+    parsed = parse_model(raw, AIAuditV2Response, defaults=fallback)
+    merged = parsed.model_dump() if parsed is not None else fallback
     # Persist audit run
     audit_run = AuditRun(
         tenant_id=tenant_id,
@@ -287,15 +287,16 @@ async def map_modules(tenant_id: int, payload: AIMappingRequest) -> AIMappingRes
         f"ROPA: {payload.ropa or 'None'}\n"
         f"Context: {payload.context or 'None'}"
     )
-    raw = await ai_chat_completion(
+    raw = await cached_completion(
         [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
         tenant_id=tenant_id,
+        endpoint="/api/ai/mapping",
     )
     fallback = {
         "mentions": [],
         "gaps": ["No cross-module references detected; align DPIA and ROPA entries."],
     }
-    parsed = _safe_json_parse(raw, fallback)
+    parsed = extract_json(raw) or {}
     mentions_raw = parsed.get("mentions") or []
     mentions = []
     for item in mentions_raw:
@@ -314,21 +315,42 @@ async def map_modules(tenant_id: int, payload: AIMappingRequest) -> AIMappingRes
     return AIMappingResponse(mentions=mentions, gaps=parsed.get("gaps") or fallback["gaps"])
 
 
-async def explain_text(tenant_id: int, payload: AIExplainRequest) -> AIExplainResponse:
+def explain_messages(payload: AIExplainRequest) -> List[Dict[str, str]]:
     system_prompt = "Explain GDPR content in plain English. Return JSON with key 'explanation'."
-    raw = await ai_chat_completion(
-        [{"role": "system", "content": system_prompt}, {"role": "user", "content": payload.text}],
-        tenant_id=tenant_id,
-    )
-    parsed = _safe_json_parse(raw, {"explanation": raw})
-    return AIExplainResponse(**{"explanation": parsed.get("explanation", raw)})
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": payload.text}]
 
 
-async def summarize_text(tenant_id: int, payload: AISummarizeRequest) -> AISummarizeResponse:
+def explain_result(raw: str) -> AIExplainResponse:
+    return parse_model(raw, AIExplainResponse) or AIExplainResponse(explanation=raw)
+
+
+async def explain_text(tenant_id: int, payload: AIExplainRequest) -> AIExplainResponse:
+    return explain_result(await cached_completion(explain_messages(payload), tenant_id=tenant_id, endpoint="/api/ai/explain"))
+
+
+def summarize_messages(payload: AISummarizeRequest) -> List[Dict[str, str]]:
     system_prompt = "Summarize the provided text in concise English. Return JSON with key 'summary'."
-    raw = await ai_chat_completion(
-        [{"role": "system", "content": system_prompt}, {"role": "user", "content": payload.text}],
-        tenant_id=tenant_id,
-    )
-    parsed = _safe_json_parse(raw, {"summary": raw})
-    return AISummarizeResponse(**{"summary": parsed.get("summary", raw)})
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": payload.text}]
+
+
+def summarize_result(raw: str) -> AISummarizeResponse:
+    return parse_model(raw, AISummarizeResponse) or AISummarizeResponse(summary=raw)
+
+
+async def summarize_text(tenant_id: int, payload: AISummarizeRequest) -> AISummarizeResponse:
+    return summarize_result(await cached_completion(summarize_messages(payload), tenant_id=tenant_id, endpoint="/api/ai/summarize"))
+
+
+# Suite operations that take (tenant_id, payload) and can run in a POST /api/ai/batch,
+# keyed by their endpoint path under /api/ai.
+SUITE_OPERATIONS: Dict[str, Tuple[Type[BaseModel], Callable[[int, Any], Awaitable[BaseModel]]]] = {
+    "dpia/generate": (AIDPIAGenerateRequest, generate_dpia),
+    "incidents/classify": (AIIncidentClassifyRequest, classify_incident),
+    "ropa/suggest": (AIRopaSuggestRequest, suggest_ropa),
+    "toms/recommend": (AITomsRecommendRequest, recommend_toms),
+    "autofill": (AIDocumentAutofillRequest, autofill_document),
+    "risk/evaluate": (AIRiskEvaluateRequest, evaluate_risk),
+    "mapping": (AIMappingRequest, map_modules),
+    "explain": (AIExplainRequest, explain_text),
+    "summarize": (AISummarizeRequest, summarize_text),
+}
@@ -0,0 +1,137 @@
+import asyncio
+import importlib.util
+import logging
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Application-scoped HTTP clients for AI provider traffic: one pooled keep-alive
+# httpx.AsyncClient per provider, created by start() in the app lifespan hook and
+# closed by stop(), so repeated calls reuse TCP/TLS connections instead of paying a
+# handshake each. get_client() also creates a client lazily (scripts, tests without
+# the lifespan hook) and replaces it when the provider's settings change or when it
+# is called from a different event loop than the one the client was opened on.
+PROVIDERS = ("openai", "local", "ollama")
+
+
+class ProviderSpec(NamedTuple):
+    base_url: Optional[str]
+    timeout: float
+    http2: bool
+    limits: Tuple[int, int, float]
+
+
+# provider -> (spec, loop, client)
+_clients: Dict[str, Tuple[ProviderSpec, asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_metrics = {"clients_created": 0}
+_h2_warned = False
+
+
+def ollama_base_url() -> str:
+    base = os.environ.get("OLLAMA_BASE_URL") or settings.AI_BASE_URL or settings.OLLAMA_BASE_URL or "http://127.0.0.1:11434"
+    return base.rstrip("/")
+
+
+def _http2() -> bool:
+    global _h2_warned
+    if not settings.AI_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        if not _h2_warned:
+            logger.warning("AI_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+            _h2_warned = True
+        return False
+    return True
+
+
+def provider_spec(provider: str) -> ProviderSpec:
+    if provider == "openai":
+        base_url, timeout = settings.OPENAI_BASE_URL.rstrip("/"), settings.OPENAI_TIMEOUT_SECONDS
+    elif provider == "local":
+        # LOCAL_AI_ENDPOINT is a full URL, not a base
+        base_url, timeout = None, settings.LOCAL_AI_TIMEOUT_SECONDS
+    elif provider == "ollama":
+        base_url, timeout = ollama_base_url(), settings.OLLAMA_TIMEOUT_SECONDS
+    else:
+        raise ValueError(f"Unknown AI provider: {provider}")
+    return ProviderSpec(
+        base_url=base_url,
+        timeout=float(timeout or settings.AI_REQUEST_TIMEOUT_SECONDS or 30),
+        http2=_http2(),
+        limits=(
+            int(settings.AI_HTTP_MAX_CONNECTIONS),
+            int(settings.AI_HTTP_MAX_KEEPALIVE_CONNECTIONS),
+            float(settings.AI_HTTP_KEEPALIVE_EXPIRY_SECONDS),
+        ),
+    )
+
+
+def create_client(spec: ProviderSpec, **kwargs) -> httpx.AsyncClient:
+    """A new pooled client for ``spec``; extra keyword arguments go to ``httpx.AsyncClient``."""
+    max_connections, max_keepalive, keepalive_expiry = spec.limits
+    if spec.base_url:
+        kwargs.setdefault("base_url", spec.base_url)
+    _metrics["clients_created"] += 1
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(spec.timeout, connect=min(spec.timeout, float(settings.AI_HTTP_CONNECT_TIMEOUT_SECONDS))),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        http2=spec.http2,
+        **kwargs,
+    )
+
+
+async def get_client(provider: str) -> httpx.AsyncClient:
+    """The shared client for ``provider``. Callers must not close it."""
+    spec = provider_spec(provider)
+    loop = asyncio.get_running_loop()
+    current = _clients.get(provider)
+    if current is not None and current[0] == spec and current[1] is loop:
+        return current[2]
+    client = create_client(spec)
+    _clients[provider] = (spec, loop, client)
+    if current is not None:
+        await _close(*current[1:])
+    return client
+
+
+async def _close(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+    # connections belong to the loop that opened them; a client from a finished loop is just dropped
+    if loop is not asyncio.get_running_loop():
+        return
+    try:
+        await client.aclose()
+    except Exception:
+        logger.exception("Failed to close AI provider client")
+
+
+async def start() -> None:
+    """Open the provider clients; connections are made on first use."""
+    for provider in PROVIDERS:
+        await get_client(provider)
+
+
+async def stop() -> None:
+    """Close every provider client and its pooled connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for _, loop, client in clients:
+        await _close(loop, client)
+
+
+def transport_stats() -> Dict:
+    return {
+        "clients_created": _metrics["clients_created"],
+        "providers": {
+            provider: {"base_url": spec.base_url, "timeout": spec.timeout, "http2": spec.http2}
+            for provider, (spec, _, _) in _clients.items()
+        },
+    }
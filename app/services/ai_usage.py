@@ -0,0 +1,384 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models.ai_usage import AIUsageDaily, AIUsageEvent
+from app.services.context_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Token and latency accounting for AI provider calls. ``track`` wraps one call and
+# ``record`` appends its result to an in-memory buffer, so the request path never waits
+# on the database; a flusher task per event loop writes the buffer in batches (one
+# executemany for the events, one update-or-insert per daily rollup key) and exits once
+# the buffer is empty. A batch whose write fails goes back to the front of the buffer and
+# the flusher backs off before retrying. Records written by several processes add up:
+# readers sum the rollups per key.
+_buffer: Deque[Dict[str, Any]] = deque()
+_wake: Optional[asyncio.Event] = None
+_flusher: Optional[asyncio.Task] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_last_prune = 0.0
+_stats = {"recorded": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+_session_factory: async_sessionmaker = AsyncSessionLocal
+
+_PRUNE_INTERVAL_SECONDS = 3600.0
+_MAX_BACKOFF_SECONDS = 60.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def record(
+    provider: str,
+    *,
+    tenant_id: Optional[int] = None,
+    model: str = "",
+    endpoint: Optional[str] = None,
+    status: str = "success",
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    estimated: bool = False,
+    latency_ms: float = 0.0,
+) -> None:
+    """Buffer one provider call for the next flush; past AI_USAGE_BUFFER_MAX the oldest record is dropped."""
+    if not settings.AI_USAGE_ENABLED:
+        return
+    if len(_buffer) >= max(1, int(settings.AI_USAGE_BUFFER_MAX or 1)):
+        _buffer.popleft()
+        _stats["dropped"] += 1
+    _buffer.append(
+        {
+            "tenant_id": tenant_id,
+            "provider": provider,
+            "model": (model or "")[:100],
+            "endpoint": (endpoint or "")[:100],
+            "status": status,
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "estimated": estimated,
+            "latency_ms": round(float(latency_ms), 3),
+            "created_at": _now(),
+        }
+    )
+    _stats["recorded"] += 1
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # no loop (scripts, sync tests): the record waits for the next flush
+        return
+    _ensure_flusher()
+    if len(_buffer) >= int(settings.AI_USAGE_BATCH_SIZE or 1) and _wake is not None:
+        _wake.set()
+
+
+def fill(usage: Dict[str, Any], data: Any, output: Optional[str] = None) -> None:
+    """Copy the token counts and model a provider reported in ``data`` into ``usage``.
+
+    Reads an OpenAI-style ``usage`` block (also the last chunk of a stream opened with
+    ``stream_options.include_usage``) or Ollama's ``prompt_eval_count``/``eval_count``.
+    ``output`` is the completion text, used to estimate tokens the provider did not report.
+    """
+    if output is not None:
+        usage["output"] = [output]
+    if not isinstance(data, dict):
+        return
+    counts = data.get("usage") if isinstance(data.get("usage"), dict) else {}
+    prompt = counts.get("prompt_tokens", data.get("prompt_eval_count"))
+    completion = counts.get("completion_tokens", data.get("eval_count"))
+    if isinstance(prompt, int):
+        usage["prompt_tokens"] = prompt
+    if isinstance(completion, int):
+        usage["completion_tokens"] = completion
+    if isinstance(data.get("model"), str) and data["model"]:
+        usage["model"] = data["model"]
+
+
+@contextmanager
+def track(
+    provider: str,
+    messages: List[Dict[str, Any]],
+    *,
+    tenant_id: Optional[int] = None,
+    endpoint: Optional[str] = None,
+    model: str = "",
+) -> Iterator[Dict[str, Any]]:
+    """Time the provider call made in the block and record it.
+
+    The block fills the yielded dict through ``fill`` (or appends streamed text to its
+    "output" list). Counts the provider did not report are estimated from the messages
+    and the output (``context_packer.estimate_tokens``) and the record is marked
+    estimated; failed calls are recorded without tokens.
+    """
+    usage: Dict[str, Any] = {"model": model, "prompt_tokens": None, "completion_tokens": None, "output": []}
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield usage
+        status = "success"
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    finally:
+        latency_ms = (time.perf_counter() - start) * 1000
+        prompt, completion = usage["prompt_tokens"], usage["completion_tokens"]
+        estimated = False
+        if status == "error":
+            prompt, completion = prompt or 0, completion or 0
+        else:
+            if prompt is None:
+                prompt = sum(estimate_tokens(str(m.get("content") or "")) for m in messages)
+                estimated = True
+            if completion is None:
+                completion = estimate_tokens("".join(usage["output"]))
+                estimated = True
+        record(
+            provider,
+            tenant_id=tenant_id,
+            model=usage["model"],
+            endpoint=endpoint,
+            status=status,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            estimated=estimated,
+            latency_ms=latency_ms,
+        )
+
+
+def _ensure_flusher() -> None:
+    global _wake, _flusher, _loop
+    loop = asyncio.get_running_loop()
+    if _loop is not loop or _wake is None:
+        _loop, _wake, _flusher = loop, asyncio.Event(), None
+    if _flusher is None or _flusher.done():
+        _flusher = loop.create_task(_flush_loop(_wake))
+
+
+async def _flush_loop(wake: asyncio.Event) -> None:
+    failures = 0
+    while _buffer:
+        interval = max(0.01, float(settings.AI_USAGE_FLUSH_SECONDS or 0))
+        if failures:
+            # the database is failing: retry with exponential backoff, not on every full batch
+            await asyncio.sleep(min(interval * 2**failures, _MAX_BACKOFF_SECONDS))
+        else:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+        wake.clear()
+        try:
+            await flush()
+            failures = 0
+        except Exception:
+            failures += 1
+            logger.exception("AI usage flush failed")
+
+
+def _rollup_key(row: Dict[str, Any]) -> Tuple:
+    return (row["created_at"].date(), row["tenant_id"], row["provider"], row["model"], row["endpoint"])
+
+
+def _rollups(batch: List[Dict[str, Any]]) -> Dict[Tuple, Dict[str, Any]]:
+    totals: Dict[Tuple, Dict[str, Any]] = {}
+    for row in batch:
+        entry = totals.setdefault(
+            _rollup_key(row),
+            {"calls": 0, "errors": 0, "estimated_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0},
+        )
+        entry["calls"] += 1
+        entry["errors"] += row["status"] == "error"
+        entry["estimated_calls"] += bool(row["estimated"])
+        entry["prompt_tokens"] += row["prompt_tokens"]
+        entry["completion_tokens"] += row["completion_tokens"]
+        entry["latency_ms_total"] += row["latency_ms"]
+        entry["latency_ms_max"] = max(entry["latency_ms_max"], row["latency_ms"])
+    return totals
+
+
+async def _add_rollup(db: AsyncSession, key: Tuple, totals: Dict[str, Any]) -> None:
+    day, tenant_id, provider, model, endpoint = key
+    match = and_(
+        AIUsageDaily.day == day,
+        AIUsageDaily.tenant_id.is_(None) if tenant_id is None else AIUsageDaily.tenant_id == tenant_id,
+        AIUsageDaily.provider == provider,
+        AIUsageDaily.model == model,
+        AIUsageDaily.endpoint == endpoint,
+    )
+    # increment one row per key; another process may have inserted a second one, which readers sum
+    first = select(func.min(AIUsageDaily.id)).where(match).scalar_subquery()
+    peak = totals["latency_ms_max"]
+    res = await db.execute(
+        update(AIUsageDaily)
+        .where(AIUsageDaily.id == first)
+        .values(
+            calls=AIUsageDaily.calls + totals["calls"],
+            errors=AIUsageDaily.errors + totals["errors"],
+            estimated_calls=AIUsageDaily.estimated_calls + totals["estimated_calls"],
+            prompt_tokens=AIUsageDaily.prompt_tokens + totals["prompt_tokens"],
+            completion_tokens=AIUsageDaily.completion_tokens + totals["completion_tokens"],
+            latency_ms_total=AIUsageDaily.latency_ms_total + totals["latency_ms_total"],
+            latency_ms_max=case((AIUsageDaily.latency_ms_max < peak, peak), else_=AIUsageDaily.latency_ms_max),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if not res.rowcount:
+        db.add(AIUsageDaily(day=day, tenant_id=tenant_id, provider=provider, model=model, endpoint=endpoint, **totals))
+
+
+async def flush() -> int:
+    """Write buffered records (AI_USAGE_BATCH_SIZE per transaction) and return how many were written.
+
+    A batch that cannot be written is put back in front of the buffer (still bounded
+    by AI_USAGE_BUFFER_MAX, oldest dropped first) and the error is raised.
+    """
+    global _last_prune
+    written = 0
+    size = max(1, int(settings.AI_USAGE_BATCH_SIZE or 1))
+    while _buffer:
+        batch = [_buffer.popleft() for _ in range(min(size, len(_buffer)))]
+        try:
+            async with _session_factory() as db:
+                await db.execute(insert(AIUsageEvent), batch)
+                for key, totals in _rollups(batch).items():
+                    await _add_rollup(db, key, totals)
+                await db.commit()
+        except Exception:
+            _stats["failed"] += len(batch)
+            _buffer.extendleft(reversed(batch))
+            overflow = max(0, len(_buffer) - max(1, int(settings.AI_USAGE_BUFFER_MAX or 1)))
+            for _ in range(overflow):
+                _buffer.popleft()
+            _stats["dropped"] += overflow
+            raise
+        written += len(batch)
+        _stats["written"] += len(batch)
+        _stats["flushes"] += 1
+    if written and time.monotonic() - _last_prune >= _PRUNE_INTERVAL_SECONDS:
+        _last_prune = time.monotonic()
+        cutoff = _now() - timedelta(days=int(settings.AI_USAGE_RETENTION_DAYS or 35))
+        async with _session_factory() as db:
+            await db.execute(delete(AIUsageEvent).where(AIUsageEvent.created_at < cutoff))
+            await db.commit()
+    return written
+
+
+async def start() -> None:
+    """Flush anything recorded before the event loop started."""
+    if _buffer:
+        _ensure_flusher()
+
+
+async def stop() -> None:
+    """Stop the flusher and write what is still buffered."""
+    global _wake, _flusher, _loop
+    if _flusher is not None and _loop is asyncio.get_running_loop():
+        _flusher.cancel()
+        await asyncio.gather(_flusher, return_exceptions=True)
+    _wake, _flusher, _loop = None, None, None
+    try:
+        await flush()
+    except Exception:
+        logger.exception("Could not write AI usage records on shutdown")
+
+
+def usage_stats() -> Dict[str, int]:
+    """Writer counters: records buffered now, recorded, written, dropped (buffer full) and failed (write errors)."""
+    return {"buffered": len(_buffer), **_stats}
+
+
+def reset_usage() -> None:
+    global _wake, _flusher, _loop, _last_prune
+    _buffer.clear()
+    if _flusher is not None and not _flusher.done() and _loop is not None and not _loop.is_closed():
+        _flusher.cancel()
+    _wake, _flusher, _loop = None, None, None
+    _last_prune = 0.0
+    for key in _stats:
+        _stats[key] = 0
+
+
+# --- reads for the platform admin -------------------------------------------------------
+
+
+def cost_eur(prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated spend at the configured AI_COST_EUR_PER_1K_* rates."""
+    return round(
+        prompt_tokens / 1000 * float(settings.AI_COST_EUR_PER_1K_PROMPT_TOKENS or 0)
+        + completion_tokens / 1000 * float(settings.AI_COST_EUR_PER_1K_COMPLETION_TOKENS or 0),
+        4,
+    )
+
+
+async def tokens_since(db: AsyncSession, since: datetime, tenant_id: Optional[int] = None) -> Tuple[int, int]:
+    """(prompt, completion) tokens of the calls recorded since ``since``, from the events table."""
+    query = select(func.coalesce(func.sum(AIUsageEvent.prompt_tokens), 0), func.coalesce(func.sum(AIUsageEvent.completion_tokens), 0)).where(
+        AIUsageEvent.created_at >= since
+    )
+    if tenant_id is not None:
+        query = query.where(AIUsageEvent.tenant_id == tenant_id)
+    prompt, completion = (await db.execute(query)).one()
+    return int(prompt), int(completion)
+
+
+async def daily_totals(db: AsyncSession, since: date, tenant_id: Optional[int] = None, group_by: Tuple = ()) -> List[Dict[str, Any]]:
+    """Rollup sums from ``since`` (inclusive), one row per value of the ``group_by`` columns of AIUsageDaily."""
+    columns = [getattr(AIUsageDaily, name) for name in group_by]
+    query = select(
+        *columns,
+        func.sum(AIUsageDaily.calls),
+        func.sum(AIUsageDaily.errors),
+        func.sum(AIUsageDaily.estimated_calls),
+        func.sum(AIUsageDaily.prompt_tokens),
+        func.sum(AIUsageDaily.completion_tokens),
+        func.sum(AIUsageDaily.latency_ms_total),
+        func.max(AIUsageDaily.latency_ms_max),
+    ).where(AIUsageDaily.day >= since)
+    if tenant_id is not None:
+        query = query.where(AIUsageDaily.tenant_id == tenant_id)
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+    rows = []
+    for row in (await db.execute(query)).all():
+        keys = dict(zip(group_by, row[: len(columns)]))
+        calls, errors, estimated, prompt, completion, latency_total, latency_max = row[len(columns) :]
+        calls = int(calls or 0)
+        rows.append(
+            {
+                **keys,
+                "calls": calls,
+                "errors": int(errors or 0),
+                "estimated_calls": int(estimated or 0),
+                "prompt_tokens": int(prompt or 0),
+                "completion_tokens": int(completion or 0),
+                "tokens": int(prompt or 0) + int(completion or 0),
+                "avg_latency_ms": round(float(latency_total or 0) / calls, 1) if calls else 0.0,
+                "max_latency_ms": round(float(latency_max or 0), 1),
+            }
+        )
+    return rows
+
+
+async def monthly_tokens(db: AsyncSession, months: int = 12) -> List[Dict[str, Any]]:
+    """Total tokens per calendar month, oldest first, for the last ``months`` months (including this one)."""
+    today = _now().date()
+    year, month = today.year, today.month - (months - 1)
+    while month < 1:
+        year, month = year - 1, month + 12
+    by_day = await daily_totals(db, date(year, month, 1), group_by=("day",))
+    totals: Dict[str, int] = {}
+    for row in by_day:
+        day = row["day"] if isinstance(row["day"], date) else date.fromisoformat(str(row["day"]))
+        label = f"{day.year:04d}-{day.month:02d}"
+        totals[label] = totals.get(label, 0) + row["tokens"]
+    return [{"month": label, "tokens": tokens} for label, tokens in sorted(totals.items())]
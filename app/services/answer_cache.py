@@ -0,0 +1,156 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+
+
+class _Flight:
+    # one in-flight computation: its task and how many callers await it
+    __slots__ = ("task", "waiters")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+
+
+class AnswerCache:
+    """LRU cache with a TTL and single-flight coalescing of concurrent misses.
+
+    Only one computation runs per missing key; concurrent callers for the same key
+    await its result. Failed computations are not cached and propagate to every
+    waiter.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "_Flight"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store ``value``; ``ttl_seconds`` overrides the cache's TTL for this entry."""
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """``get`` that counts a hit or miss, for callers that compute and ``put`` themselves (streams)."""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Awaitable[Any]], ttl_seconds: Optional[float] = None
+    ) -> Tuple[Any, str]:
+        """Return ``(value, status)`` where status is ``hit``, ``coalesced`` or ``miss``.
+
+        ``compute`` runs in a task of its own that every caller for ``key`` awaits, so a
+        cancelled caller (a dropped client) does not fail the others; the task is only
+        cancelled when its last caller is.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, "hit"
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            status = "coalesced"
+        else:
+            self.misses += 1
+            status = "miss"
+            flight = self._inflight[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._compute(key, flight, compute, ttl_seconds))
+            # mark retrieved so a failure nobody awaits any more is not logged as "never retrieved"
+            flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), status
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    async def _compute(self, key: Hashable, flight: "_Flight", compute: Callable[[], Awaitable[Any]], ttl_seconds: Optional[float]) -> Any:
+        try:
+            value = await compute()
+            self.put(key, value, ttl_seconds)
+            return value
+        finally:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = self.coalesced = self.evictions = self.expirations = 0
+
+
+# Process-wide cache for /api/ai/answer
+_answer_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache(
+            max_entries=int(settings.AI_ANSWER_CACHE_MAX_ENTRIES or 0),
+            ttl_seconds=float(settings.AI_ANSWER_CACHE_TTL_SECONDS or 0),
+        )
+    return _answer_cache
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, ignoring trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip(" ?!.")
+
+
+def reset_answer_cache() -> None:
+    global _answer_cache
+    _answer_cache = None
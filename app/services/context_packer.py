@@ -0,0 +1,139 @@
+import hashlib
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.services.rag_pipeline import TOKENIZERS, normalize_text
+
+# Packs retrieved chunks into an LLM context of at most ``budget`` estimated tokens.
+# Hits from the same document with consecutive chunk_index values are merged into
+# one passage and the ~15% overlap between neighbouring chunks is emitted once
+# (matched by words; character offsets, when both chunks have them, tell whether
+# the chunks overlap at all).
+# Passages are then taken greedily by relevance; one that does not fit is cut at
+# a word boundary when at least MIN_PARTIAL_TOKENS of budget remain.
+
+MIN_PARTIAL_TOKENS = 64
+_count_word = TOKENIZERS["subword"]
+
+
+class Passage(NamedTuple):
+    chunk_id: Any
+    chunk_ids: Tuple[Any, ...]
+    document_id: Optional[int]
+    title: str
+    text: str
+    tokens: int
+    score: float
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM tokens in ``text`` (about four characters per subword token)."""
+    return sum(_count_word(word) for word in text.split())
+
+
+def _overlap_words(left: str, right: str) -> int:
+    """Number of leading words of ``right`` that repeat the trailing words of ``left``."""
+    a, b = left.split(), right.split()
+    if not a or not b:
+        return 0
+    longest = min(len(a), len(b))
+    for start in range(len(a) - longest, len(a)):
+        if a[start] == b[0] and a[start:] == b[: len(a) - start]:
+            return len(a) - start
+    return 0
+
+
+def _join(left: Any, right: Any, text: str) -> str:
+    """Append ``right``'s content to ``text`` (ending with ``left``), skipping the overlap with ``left``."""
+    content = right.content or ""
+    l_end, r_start = getattr(left, "end_offset", None), getattr(right, "start_offset", None)
+    if l_end is not None and r_start is not None and getattr(left, "start_offset", None) is not None:
+        # offsets are into the source text but content is whitespace-normalized, so they only
+        # tell whether the chunks overlap; the overlap itself is matched in words below
+        if l_end <= r_start:
+            return f"{text}\n{content}"
+        r_end = getattr(right, "end_offset", None)
+        if r_end is not None and r_end <= l_end:
+            return text
+    words = content.split()
+    rest = " ".join(words[_overlap_words(left.content or "", content) :])
+    return f"{text} {rest}" if rest else text
+
+
+def _windows(hits: Sequence[Tuple[float, Any]]) -> List[Tuple[float, List[Tuple[float, Any]]]]:
+    """Group hits into runs of consecutive chunks of one document; each run is scored by its best hit."""
+    runs: List[List[Tuple[float, Any]]] = []
+    keyed = []
+    for score, chunk in hits:
+        document_id, index = getattr(chunk, "document_id", None), getattr(chunk, "chunk_index", None)
+        if document_id is None or index is None:
+            runs.append([(score, chunk)])
+        else:
+            keyed.append((document_id, index, score, chunk))
+    keyed.sort(key=lambda item: (item[0], item[1]))
+    for document_id, index, score, chunk in keyed:
+        last = runs[-1][-1][1] if runs else None
+        if (
+            last is not None
+            and getattr(last, "document_id", None) == document_id
+            and getattr(last, "chunk_index", None) is not None
+            and index - last.chunk_index == 1
+        ):
+            runs[-1].append((score, chunk))
+        else:
+            runs.append([(score, chunk)])
+    windows = [(max(score for score, _ in run), run) for run in runs]
+    windows.sort(key=lambda item: item[0], reverse=True)
+    return windows
+
+
+def _truncate(text: str, budget: int) -> str:
+    words, used = [], 0
+    for word in text.split():
+        used += _count_word(word)
+        if used > budget:
+            break
+        words.append(word)
+    return " ".join(words)
+
+
+def pack_context(hits: Iterable[Tuple[float, Any]], budget: int) -> List[Passage]:
+    """Passages for ``(score, chunk)`` hits, best first, whose estimated tokens sum to at most ``budget``.
+
+    Chunks need ``id`` and ``content``; ``document_id``, ``chunk_index``,
+    ``start_offset``/``end_offset`` and ``section_title`` are used when present.
+    Passages whose normalized text was already packed are skipped.
+    """
+    packed: List[Passage] = []
+    seen = set()
+    remaining = budget
+    for score, run in _windows(list(hits)):
+        if remaining < 1:
+            break
+        first = run[0][1]
+        text = first.content or ""
+        for (_, left), (_, right) in zip(run, run[1:]):
+            text = _join(left, right, text)
+        digest = hashlib.sha1(normalize_text(text).lower().encode("utf-8")).digest()
+        if not text.strip() or digest in seen:
+            continue
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                continue
+            text = _truncate(text, remaining)
+            tokens = estimate_tokens(text)
+        seen.add(digest)
+        remaining -= tokens
+        best = max(run, key=lambda hit: hit[0])[1]
+        packed.append(
+            Passage(
+                chunk_id=best.id,
+                chunk_ids=tuple(chunk.id for _, chunk in run),
+                document_id=getattr(first, "document_id", None),
+                title=getattr(first, "section_title", None) or "Document",
+                text=text,
+                tokens=tokens,
+                score=score,
+            )
+        )
+    return packed
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import httpx
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.embedding_cache import EmbeddingCache
+from app.services.rag_pipeline import DEFAULT_VECTOR_DTYPE, decode_vector, embedding_for_text, encode_vector
+
+logger = logging.getLogger(__name__)
+
+HASH_MODEL = "hash-embed"
+
+# process-wide counters, exposed via GET /api/rag/embeddings/metrics
+_metrics: Dict[str, float] = {
+    "cache_hits": 0,
+    "cache_misses": 0,
+    "texts_embedded": 0,
+    "batches": 0,
+    "embed_seconds": 0.0,
+}
+
+
+def _provider() -> str:
+    return (settings.EMBEDDING_PROVIDER or "hash").lower()
+
+
+def embedding_model() -> str:
+    """Model name stored with embeddings and used as the cache key; falls back to the hash embedder offline."""
+    provider = _provider()
+    if provider == "local" and settings.LOCAL_EMBEDDING_ENDPOINT:
+        return settings.EMBEDDING_MODEL or "local-embed"
+    return HASH_MODEL
+
+
+async def embed_texts(texts: Sequence[str]) -> List[np.ndarray]:
+    """Embed texts with the configured provider (``hash`` or ``local``).
+
+    The local provider posts ``EMBEDDING_BATCH_SIZE`` texts per request with at
+    most ``EMBEDDING_MAX_CONCURRENCY`` requests in flight. Without an endpoint
+    configured it degrades to the offline hash embedder, like ai_client.
+    """
+    if not texts:
+        return []
+    provider = _provider()
+    if provider not in ("hash", "local"):
+        # Unknown provider: fail fast to avoid silently mixing embedding spaces.
+        raise HTTPException(status_code=500, detail="Unsupported embedding provider")
+    start = time.perf_counter()
+    if embedding_model() == HASH_MODEL:
+        vectors = [np.asarray(embedding_for_text(t), dtype=np.float32) for t in texts]
+        batches = 1
+    else:
+        vectors, batches = await _embed_local(list(texts))
+    _metrics["embed_seconds"] += time.perf_counter() - start
+    _metrics["texts_embedded"] += len(texts)
+    _metrics["batches"] += batches
+    return vectors
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=settings.EMBEDDING_TIMEOUT_SECONDS)
+
+
+async def _embed_local(texts: List[str]) -> Tuple[List[np.ndarray], int]:
+    size = max(1, int(settings.EMBEDDING_BATCH_SIZE or 64))
+    batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+    semaphore = asyncio.Semaphore(max(1, int(settings.EMBEDDING_MAX_CONCURRENCY or 4)))
+
+    async with _client() as client:
+
+        async def run(batch: List[str]) -> List[np.ndarray]:
+            async with semaphore:
+                return await _post_batch(client, batch)
+
+        try:
+            results = await asyncio.gather(*(run(batch) for batch in batches))
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Embedding provider request failed: %s", exc)
+            raise HTTPException(status_code=502, detail="Embedding provider request failed")
+    return [vec for batch in results for vec in batch], len(batches)
+
+
+async def _post_batch(client: httpx.AsyncClient, batch: List[str]) -> List[np.ndarray]:
+    resp = await client.post(settings.LOCAL_EMBEDDING_ENDPOINT, json={"model": embedding_model(), "input": batch})
+    resp.raise_for_status()
+    data = resp.json()
+    # accept either openai-like {"data": [{"embedding": [...]}]} or simple {"embeddings": [[...]]}
+    if "data" in data:
+        vectors = [item["embedding"] for item in sorted(data["data"], key=lambda item: item.get("index", 0))]
+    else:
+        vectors = data["embeddings"]
+    if len(vectors) != len(batch):
+        raise ValueError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} inputs")
+    return [np.asarray(vec, dtype=np.float32) for vec in vectors]
+
+
+def _insert_ignoring_duplicates(db: AsyncSession):
+    # concurrent ingests may race to cache the same (model, checksum); the first write wins
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(EmbeddingCache).on_conflict_do_nothing(index_elements=["model", "checksum"])
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        return sqlite_insert(EmbeddingCache).on_conflict_do_nothing(index_elements=["model", "checksum"])
+    return insert(EmbeddingCache)
+
+
+async def embed_with_cache(db: AsyncSession, items: Sequence[Tuple[str, str]]) -> List[np.ndarray]:
+    """Return one vector per ``(checksum, text)`` item, embedding only checksums not cached for the current model.
+
+    New vectors are added to the session; the caller commits them together with its own writes.
+    """
+    if not items:
+        return []
+    model = embedding_model()
+    checksums = {checksum for checksum, _ in items}
+    res = await db.execute(
+        select(EmbeddingCache.checksum, EmbeddingCache.vector_data, EmbeddingCache.dtype, EmbeddingCache.dim).where(
+            EmbeddingCache.model == model,
+            EmbeddingCache.checksum.in_(checksums),
+        )
+    )
+    cached: Dict[str, np.ndarray] = {}
+    for checksum, data, dtype, dim in res.all():
+        try:
+            cached[checksum] = decode_vector(data, dtype, dim)
+        except (KeyError, ValueError):
+            continue
+    missing: Dict[str, str] = {}
+    for checksum, text in items:
+        if checksum not in cached:
+            missing.setdefault(checksum, text)
+    _metrics["cache_hits"] += len(checksums) - len(missing)
+    _metrics["cache_misses"] += len(missing)
+
+    if missing:
+        vectors = await embed_texts(list(missing.values()))
+        await db.execute(
+            _insert_ignoring_duplicates(db),
+            [
+                {
+                    "model": model,
+                    "checksum": checksum,
+                    "vector_data": encode_vector(vec),
+                    "dim": int(vec.shape[0]),
+                    "dtype": DEFAULT_VECTOR_DTYPE,
+                }
+                for checksum, vec in zip(missing, vectors)
+            ],
+        )
+        cached.update(zip(missing, vectors))
+    return [cached[checksum] for checksum, _ in items]
+
+
+def get_embedding_metrics() -> Dict:
+    lookups = _metrics["cache_hits"] + _metrics["cache_misses"]
+    seconds = _metrics["embed_seconds"]
+    return {
+        "provider": _provider(),
+        "model": embedding_model(),
+        "cache_hits": int(_metrics["cache_hits"]),
+        "cache_misses": int(_metrics["cache_misses"]),
+        "cache_hit_rate": (_metrics["cache_hits"] / lookups) if lookups else 0.0,
+        "texts_embedded": int(_metrics["texts_embedded"]),
+        "batches": int(_metrics["batches"]),
+        "embed_seconds": round(seconds, 6),
+        "texts_per_second": (_metrics["texts_embedded"] / seconds) if seconds else 0.0,
+    }
+
+
+def reset_embedding_metrics() -> None:
+    for key in _metrics:
+        _metrics[key] = 0.0 if key == "embed_seconds" else 0
@@ -0,0 +1,179 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_NPROBE = 8
+DEFAULT_LSH_BITS = 64
+# refit once the corpus has grown (or shrunk) by this factor since the last fit
+REFIT_GROWTH = 2.0
+_KMEANS_SAMPLE = 10000
+_KMEANS_ITERATIONS = 8
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint16)
+
+
+class AnnIndex:
+    """Approximate candidate generator over a TenantVectorIndex matrix.
+
+    Implementations keep one entry per matrix row (same order as the matrix),
+    so appends and compactions are mirrored with ``add`` and ``compact`` and the
+    exact scores of the returned candidate rows are computed by the caller.
+    """
+
+    kind = "exact"
+
+    def __init__(self, min_rows: int = 0):
+        self.min_rows = min_rows
+        self.fitted_rows = 0
+
+    @property
+    def fitted(self) -> bool:
+        return self.fitted_rows > 0
+
+    def stale(self, rows: int) -> bool:
+        if not self.fitted:
+            return True
+        return rows > self.fitted_rows * REFIT_GROWTH or rows * REFIT_GROWTH < self.fitted_rows
+
+    def fit(self, matrix: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def add(self, block: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def compact(self, keep: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def candidates(self, query: np.ndarray, top_k: int) -> np.ndarray:
+        raise NotImplementedError
+
+
+class IVFIndex(AnnIndex):
+    """Inverted-file index: k-means coarse quantizer, ``nprobe`` nearest lists are scanned."""
+
+    kind = "ivf"
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = DEFAULT_NPROBE, min_rows: int = 0, seed: int = 0):
+        super().__init__(min_rows)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: Optional[tuple] = None
+
+    def fit(self, matrix: np.ndarray) -> None:
+        n = matrix.shape[0]
+        nlist = self.nlist or int(min(4096, max(16, math.sqrt(n))))
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(self._seed)
+        sample = matrix[rng.choice(n, size=min(n, max(_KMEANS_SAMPLE, nlist * 4)), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # spherical k-means: re-normalize means, re-seed empty clusters from random samples
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        self.centroids = centroids
+        self._assign = self._nearest(matrix)
+        self._lists = None
+        self.fitted_rows = n
+
+    def _nearest(self, block: np.ndarray) -> np.ndarray:
+        if not block.shape[0]:
+            return np.zeros(0, dtype=np.int32)
+        return np.argmax(block @ self.centroids.T, axis=1).astype(np.int32)
+
+    def add(self, block: np.ndarray) -> None:
+        self._assign = np.concatenate([self._assign, self._nearest(block)])
+        self._lists = None
+
+    def compact(self, keep: np.ndarray) -> None:
+        self._assign = self._assign[keep]
+        self._lists = None
+
+    def _inverted_lists(self):
+        # CSR layout: rows sorted by list id plus per-list offsets, rebuilt lazily after changes
+        if self._lists is None:
+            order = np.argsort(self._assign, kind="stable")
+            offsets = np.searchsorted(self._assign[order], np.arange(self.centroids.shape[0] + 1))
+            self._lists = (order, offsets)
+        return self._lists
+
+    def candidates(self, query: np.ndarray, top_k: int) -> np.ndarray:
+        order, offsets = self._inverted_lists()
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        probe = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        return np.concatenate([order[offsets[c] : offsets[c + 1]] for c in probe])
+
+
+class LSHIndex(AnnIndex):
+    """Random-hyperplane LSH: rows are ranked by Hamming distance of sign codes, best ``n_candidates`` re-scored.
+
+    Codes are stored as 16-bit words, one contiguous array per word, so the
+    distance scan is a few XOR + popcount-table passes over ``uint16`` columns.
+    """
+
+    kind = "lsh"
+
+    def __init__(self, bits: int = DEFAULT_LSH_BITS, n_candidates: Optional[int] = None, min_rows: int = 0, seed: int = 0):
+        super().__init__(min_rows)
+        self.bits = max(16, bits - bits % 16)
+        self.n_candidates = n_candidates
+        self._seed = seed
+        self.planes: Optional[np.ndarray] = None
+        self._codes = np.zeros((self.bits // 16, 0), dtype=np.uint16)
+
+    def _encode(self, block: np.ndarray) -> np.ndarray:
+        packed = np.packbits(block @ self.planes.T > 0, axis=1)
+        return np.ascontiguousarray(packed.view(np.uint16).T)
+
+    def fit(self, matrix: np.ndarray) -> None:
+        if self.planes is None or self.planes.shape[1] != matrix.shape[1]:
+            rng = np.random.default_rng(self._seed)
+            self.planes = rng.standard_normal((self.bits, matrix.shape[1])).astype(np.float32)
+        self._codes = self._encode(matrix)
+        self.fitted_rows = matrix.shape[0]
+
+    def stale(self, rows: int) -> bool:
+        # hyperplanes are data independent, so codes never need a refit once built
+        return not self.fitted
+
+    def add(self, block: np.ndarray) -> None:
+        self._codes = np.concatenate([self._codes, self._encode(block)], axis=1)
+
+    def compact(self, keep: np.ndarray) -> None:
+        self._codes = np.ascontiguousarray(self._codes[:, keep])
+
+    def candidates(self, query: np.ndarray, top_k: int) -> np.ndarray:
+        code = self._encode(query[None, :])[:, 0]
+        distances = _POPCOUNT16[np.bitwise_xor(self._codes[0], code[0])]
+        for word in range(1, self._codes.shape[0]):
+            distances += _POPCOUNT16[np.bitwise_xor(self._codes[word], code[word])]
+        n = distances.shape[0]
+        want = min(n, self.n_candidates or max(top_k * 64, 512))
+        if want >= n:
+            return np.arange(n)
+        # distances are small integers: pick the radius that covers ``want`` rows from a histogram
+        cumulative = np.cumsum(np.bincount(distances, minlength=self.bits + 1))
+        radius = int(np.searchsorted(cumulative, want))
+        return np.flatnonzero(distances <= radius)
+
+
+def build_ann(config: Optional[dict]) -> Optional[AnnIndex]:
+    """Create an ANN index from a config such as ``{"type": "ivf", "nlist": 256, "nprobe": 8}``."""
+    if not config:
+        return None
+    kind = str(config.get("type") or "exact").lower()
+    min_rows = int(config.get("min_vectors") or 0)
+    if kind == "ivf":
+        return IVFIndex(nlist=config.get("nlist"), nprobe=int(config.get("nprobe") or DEFAULT_NPROBE), min_rows=min_rows)
+    if kind == "lsh":
+        return LSHIndex(bits=int(config.get("bits") or DEFAULT_LSH_BITS), n_candidates=config.get("candidates"), min_rows=min_rows)
+    return None
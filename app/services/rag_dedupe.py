@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.knowledge_chunk import KnowledgeChunk
+from app.db.models.knowledge_document import KnowledgeDocument
+from app.db.models.knowledge_minhash_band import KnowledgeMinHashBand
+
+# Near-duplicate detection with MinHash over word 5-gram shingles. The NUM_PERM
+# signature is split into BANDS bands of ROWS rows; each band is hashed into a bucket
+# stored in knowledge_minhash_bands, so candidates are one indexed IN query. With 16 x 8
+# a pair at Jaccard 0.9 shares a bucket with probability > 0.9999 and a pair at 0.5
+# about 6%; candidates are then confirmed on their signatures (RAG_DEDUPE_THRESHOLD).
+# Signatures are persisted: changing SHINGLE_WORDS, NUM_PERM, BANDS or _SEED
+# invalidates the stored ones.
+MODES = ("off", "flag", "skip")
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = 4294967291  # largest prime below 2**32, so permuted hashes fit in uint32
+_SEED = 20261017
+_rng = np.random.default_rng(_SEED)
+# a < 2**31 and shingle hashes < 2**32 keep a * x + b below 2**64
+_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)[:, None]
+_SHINGLE_BLOCK = 2048
+_WORD_RE = re.compile(r"\w+")
+
+
+def mode() -> str:
+    value = str(settings.RAG_DEDUPE_MODE or "off").lower()
+    return value if value in MODES else "off"
+
+
+def _shingles(text: str) -> np.ndarray:
+    """Distinct 32-bit hashes of the lower-cased word ``SHINGLE_WORDS``-grams of ``text``."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    k = min(SHINGLE_WORDS, len(words))
+    n = len(words) - k + 1
+    combined = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        # polynomial rolling combination; uint64 arithmetic wraps
+        combined = combined * np.uint64(1000003) + hashes[j : j + n]
+    return np.unique((combined >> np.uint64(32)) ^ (combined & np.uint64(0xFFFFFFFF)))
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature (``NUM_PERM`` uint32 values) of ``text``; ``None`` when it has no words."""
+    shingles = _shingles(text)
+    if not shingles.size:
+        return None
+    sig = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, shingles.size, _SHINGLE_BLOCK):
+        block = shingles[start : start + _SHINGLE_BLOCK]
+        np.minimum(sig, ((_A * block + _B) % np.uint64(_PRIME)).min(axis=1), out=sig)
+    return sig.astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def buckets(sig: np.ndarray) -> List[int]:
+    rows = sig.astype("<u4").reshape(BANDS, ROWS)
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + rows[band].tobytes(), digest_size=8).digest(), "little", signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def to_bytes(sig: Optional[np.ndarray]) -> Optional[bytes]:
+    return None if sig is None else sig.astype("<u4").tobytes()
+
+
+def from_bytes(data: Optional[bytes]) -> Optional[np.ndarray]:
+    if not data or len(data) != NUM_PERM * 4:
+        return None
+    return np.frombuffer(data, dtype="<u4")
+
+
+def _threshold() -> float:
+    return float(settings.RAG_DEDUPE_THRESHOLD)
+
+
+async def mark_document(db: AsyncSession, tenant_id: int, doc: KnowledgeDocument) -> Optional[int]:
+    """Sign ``doc``, replace its band buckets and set ``duplicate_of``; returns that canonical document id.
+
+    A match that is itself a duplicate resolves to its canonical document, so
+    repeated uploads all point at the first one. Not committed.
+    """
+    # signing a 200k-character document takes tens of milliseconds; keep it off the event loop
+    sig = await asyncio.to_thread(signature, doc.content or "")
+    await db.execute(
+        delete(KnowledgeMinHashBand).where(KnowledgeMinHashBand.document_id == doc.id, KnowledgeMinHashBand.chunk_id.is_(None))
+    )
+    doc.minhash = to_bytes(sig)
+    doc.duplicate_of = None
+    if sig is None:
+        return None
+    keys = buckets(sig)
+    candidates = await db.execute(
+        select(KnowledgeDocument.id, KnowledgeDocument.minhash, KnowledgeDocument.duplicate_of).where(
+            KnowledgeDocument.tenant_id == tenant_id,
+            KnowledgeDocument.id != doc.id,
+            KnowledgeDocument.id.in_(
+                select(KnowledgeMinHashBand.document_id).where(
+                    KnowledgeMinHashBand.tenant_id == tenant_id,
+                    KnowledgeMinHashBand.chunk_id.is_(None),
+                    KnowledgeMinHashBand.bucket.in_(keys),
+                )
+            ),
+        )
+    )
+    best: Optional[Tuple[float, int]] = None
+    for doc_id, data, duplicate_of in candidates.all():
+        other = from_bytes(data)
+        if other is None:
+            continue
+        score = similarity(sig, other)
+        if score >= _threshold() and (best is None or score > best[0]):
+            best = (score, duplicate_of or doc_id)
+    if best is not None:
+        doc.duplicate_of = best[1]
+    await db.execute(
+        insert(KnowledgeMinHashBand),
+        [{"tenant_id": tenant_id, "document_id": doc.id, "chunk_id": None, "bucket": key} for key in keys],
+    )
+    return doc.duplicate_of
+
+
+async def match_chunks(
+    db: AsyncSession, tenant_id: int, texts: Sequence[str], exclude_chunk_ids: Sequence[int] = ()
+) -> Tuple[List[Optional[np.ndarray]], List[Optional[int]]]:
+    """Signatures for ``texts`` and, per text, the canonical stored chunk it nearly duplicates (or ``None``).
+
+    Only chunks already stored for the tenant are candidates; ``exclude_chunk_ids``
+    (e.g. chunks an update is about to delete) are never matched.
+    """
+    sigs = await asyncio.to_thread(lambda: [signature(text) for text in texts])
+    keys = sorted({key for sig in sigs if sig is not None for key in buckets(sig)})
+    matches: List[Optional[int]] = [None] * len(sigs)
+    if not keys:
+        return sigs, matches
+    query = select(KnowledgeChunk.id, KnowledgeChunk.minhash, KnowledgeChunk.duplicate_of).where(
+        KnowledgeChunk.tenant_id == tenant_id,
+        KnowledgeChunk.id.in_(
+            select(KnowledgeMinHashBand.chunk_id).where(
+                KnowledgeMinHashBand.tenant_id == tenant_id,
+                KnowledgeMinHashBand.chunk_id.is_not(None),
+                KnowledgeMinHashBand.bucket.in_(keys),
+            )
+        ),
+    )
+    if exclude_chunk_ids:
+        query = query.where(KnowledgeChunk.id.not_in(list(exclude_chunk_ids)))
+    rows = [(chunk_id, from_bytes(data), duplicate_of) for chunk_id, data, duplicate_of in (await db.execute(query)).all()]
+    rows = [row for row in rows if row[1] is not None]
+    if not rows:
+        return sigs, matches
+    stored = np.stack([row[1] for row in rows])
+    for i, sig in enumerate(sigs):
+        if sig is None:
+            continue
+        scores = np.count_nonzero(stored == sig, axis=1) / NUM_PERM
+        best = int(np.argmax(scores))
+        if scores[best] >= _threshold():
+            chunk_id, _, duplicate_of = rows[best]
+            matches[i] = duplicate_of or chunk_id
+    return sigs, matches
+
+
+async def store_chunk_bands(db: AsyncSession, tenant_id: int, document_id: int, chunks: Sequence[Tuple[int, Optional[np.ndarray]]]) -> None:
+    """Insert the band buckets of freshly inserted ``(chunk_id, signature)`` pairs; not committed."""
+    values = [
+        {"tenant_id": tenant_id, "document_id": document_id, "chunk_id": chunk_id, "bucket": key}
+        for chunk_id, sig in chunks
+        if sig is not None
+        for key in buckets(sig)
+    ]
+    if values:
+        await db.execute(insert(KnowledgeMinHashBand), values)
+
+
+async def dedupe_stats(db: AsyncSession, tenant_id: int) -> Dict[str, float]:
+    """How much of the tenant's knowledge base is near-duplicate: flagged and skipped documents and chunks."""
+    documents, duplicate_documents, chunks_skipped = (
+        await db.execute(
+            select(
+                func.count(KnowledgeDocument.id),
+                func.count(KnowledgeDocument.duplicate_of),
+                func.coalesce(func.sum(KnowledgeDocument.chunks_deduplicated), 0),
+            ).where(KnowledgeDocument.tenant_id == tenant_id)
+        )
+    ).one()
+    chunks, duplicate_chunks = (
+        await db.execute(
+            select(func.count(KnowledgeChunk.id), func.count(KnowledgeChunk.duplicate_of)).where(KnowledgeChunk.tenant_id == tenant_id)
+        )
+    ).one()
+    seen = chunks + chunks_skipped
+    return {
+        "mode": mode(),
+        "threshold": _threshold(),
+        "documents": documents,
+        "duplicate_documents": duplicate_documents,
+        "chunks": chunks,
+        "duplicate_chunks": duplicate_chunks,
+        "chunks_skipped": int(chunks_skipped),
+        "deduplicated_ratio": round((duplicate_chunks + chunks_skipped) / seen, 4) if seen else 0.0,
+    }
@@ -0,0 +1,740 @@
+import asyncio
+import copy
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.knowledge_chunk import KnowledgeChunk
+from app.db.models.knowledge_document import KnowledgeDocument
+from app.db.models.knowledge_embedding import KnowledgeEmbedding
+from app.db.models.settings import TenantSetting
+from app.services import rag_snapshot
+from app.services.rag_ann import AnnIndex, build_ann
+from app.services.rag_lexical import TenantLexicalIndex
+from app.services.rag_pipeline import decode_vector
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_CAPACITY = 64
+# filtered row selections kept per vector index until its rows change
+_MAX_CACHED_SELECTIONS = 32
+# storage dtype per vector quantization mode; int8 rows also keep a float32 scale
+QUANTIZATION_MODES = {"none": np.float32, "float16": np.float16, "int8": np.int8}
+# rows dequantized at a time when scanning a quantized matrix
+_SCAN_BLOCK_ROWS = 8192
+
+
+class TenantVectorIndex:
+    """Contiguous matrix of L2-normalized vectors with a parallel chunk-id array.
+
+    Rows are appended into an over-allocated buffer so ingest does not copy the
+    whole matrix each time; a query is one matrix-vector product plus an
+    ``np.argpartition`` top-k. With an ANN index attached (and enough rows) only
+    its candidate rows are scored; a document filter scores only the rows of
+    the matching documents. ``search`` never fits the ANN index: ``refit_ann``
+    does that off the event loop, and until it swaps the fit in, searches use
+    the previous fit or score every row.
+
+    ``quantization`` selects the row storage: ``none`` (float32), ``float16``
+    or ``int8`` (codes plus one float32 scale per row). Quantized rows are
+    dequantized block by block while scanning, so their scores are approximate
+    and callers re-rank the top candidates against full-precision vectors.
+    """
+
+    def __init__(self, dim: int, ann: Optional[AnnIndex] = None, quantization: Optional[str] = None):
+        quantization = (quantization or "none").lower()
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown vector quantization {quantization!r}")
+        self.dim = dim
+        self.ann = ann
+        self.quantization = quantization
+        self._matrix = np.zeros((_INITIAL_CAPACITY, dim), dtype=QUANTIZATION_MODES[quantization])
+        self._scales = np.ones(_INITIAL_CAPACITY, dtype=np.float32) if quantization == "int8" else None
+        self._chunk_ids = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._document_ids = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._size = 0
+        self._selections: Dict[bytes, np.ndarray] = {}
+        # bumped by every removal, so a refit that raced one is dropped
+        self._removals = 0
+        self._refitting = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def from_buffers(
+        cls,
+        matrix: np.ndarray,
+        chunk_ids: np.ndarray,
+        document_ids: np.ndarray,
+        size: int,
+        ann: Optional[AnnIndex] = None,
+        quantization: Optional[str] = None,
+        scales: Optional[np.ndarray] = None,
+    ) -> "TenantVectorIndex":
+        """Wrap preallocated (e.g. memory-mapped snapshot) buffers whose first ``size`` rows are filled."""
+        index = cls(matrix.shape[1], ann=ann, quantization=quantization)
+        if matrix.dtype != index._matrix.dtype or (index._scales is not None and scales is None):
+            raise ValueError(f"Buffers do not match {index.quantization} quantization")
+        index._matrix = matrix
+        if index._scales is not None:
+            index._scales = scales
+        index._chunk_ids = chunk_ids
+        index._document_ids = document_ids
+        index._size = size
+        return index
+
+    @property
+    def quantized(self) -> bool:
+        return self.quantization != "none"
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Stored rows in their storage dtype; see ``decoded`` for float32 vectors."""
+        return self._matrix[: self._size]
+
+    @property
+    def scales(self) -> Optional[np.ndarray]:
+        return None if self._scales is None else self._scales[: self._size]
+
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        return self._chunk_ids[: self._size]
+
+    @property
+    def document_ids(self) -> np.ndarray:
+        return self._document_ids[: self._size]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the filled rows (vectors, scales and ids)."""
+        total = self.matrix.nbytes + self.chunk_ids.nbytes + self.document_ids.nbytes
+        return total + (self.scales.nbytes if self._scales is not None else 0)
+
+    def decoded(self, rows=None) -> np.ndarray:
+        """Float32 unit vectors for ``rows`` (all rows by default); a copy unless unquantized."""
+        rows = slice(0, self._size) if rows is None else rows
+        block = self._matrix[rows].astype(np.float32, copy=False)
+        if self._scales is not None:
+            block = block * self._scales[rows][:, None]
+        return block
+
+    def vectors_for(self, chunk_ids: Sequence[int]) -> np.ndarray:
+        """Float32 unit vectors for ``chunk_ids`` in the given order; zero rows for ids not in the index."""
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        out = np.zeros((ids.shape[0], self.dim), dtype=np.float32)
+        rows = np.flatnonzero(np.isin(self.chunk_ids, ids))
+        if rows.size:
+            position = {chunk_id: i for i, chunk_id in enumerate(ids.tolist())}
+            out[[position[c] for c in self.chunk_ids[rows].tolist()]] = self.decoded(rows)
+        return out
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=self._matrix.dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        chunk_ids = np.zeros(capacity, dtype=np.int64)
+        chunk_ids[: self._size] = self._chunk_ids[: self._size]
+        document_ids = np.zeros(capacity, dtype=np.int64)
+        document_ids[: self._size] = self._document_ids[: self._size]
+        if self._scales is not None:
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[: self._size] = self._scales[: self._size]
+            self._scales = scales
+        self._matrix = matrix
+        self._chunk_ids = chunk_ids
+        self._document_ids = document_ids
+
+    def add(
+        self, chunk_ids: Sequence[int], vectors: Sequence[Sequence[float]], document_ids: Optional[Sequence[int]] = None
+    ) -> None:
+        if not len(chunk_ids):
+            return
+        block = np.asarray(vectors, dtype=np.float32)
+        if block.ndim != 2 or block.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}")
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block = block / norms
+        self._reserve(len(chunk_ids))
+        end = self._size + len(chunk_ids)
+        if self._scales is not None:
+            # symmetric per-row scale: the largest component maps to +-127
+            scales = np.abs(block).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._matrix[self._size : end] = np.rint(block / scales[:, None])
+            self._scales[self._size : end] = scales
+        else:
+            self._matrix[self._size : end] = block
+        self._chunk_ids[self._size : end] = np.asarray(chunk_ids, dtype=np.int64)
+        self._document_ids[self._size : end] = 0 if document_ids is None else np.asarray(document_ids, dtype=np.int64)
+        self._selections.clear()
+        if self.ann is not None and self.ann.fitted:
+            self.ann.add(block)
+        self._size = end
+
+    def remove(self, chunk_ids: Iterable[int]) -> int:
+        ids = np.fromiter(chunk_ids, dtype=np.int64)
+        if not ids.size or not self._size:
+            return 0
+        keep = ~np.isin(self.chunk_ids, ids)
+        kept = int(keep.sum())
+        removed = self._size - kept
+        if removed:
+            self._matrix[:kept] = self.matrix[keep]
+            if self._scales is not None:
+                self._scales[:kept] = self.scales[keep]
+            self._chunk_ids[:kept] = self.chunk_ids[keep]
+            self._document_ids[:kept] = self.document_ids[keep]
+            self._size = kept
+            self._removals += 1
+            self._selections.clear()
+            if self.ann is not None and self.ann.fitted:
+                self.ann.compact(keep)
+        return removed
+
+    def ann_stale(self) -> bool:
+        """Whether the ANN index needs a (re)fit that is not already running."""
+        return self.ann is not None and not self._refitting and self._size >= self.ann.min_rows and self.ann.stale(self._size)
+
+    async def refit_ann(self) -> bool:
+        """Fit a fresh copy of the ANN index in a worker thread and swap it in; ``False`` when nothing was swapped.
+
+        Rows appended during the fit are added to the new index before the
+        swap; a removal during the fit drops it and the next sync retries.
+        """
+        if not self.ann_stale():
+            return False
+        self._refitting = True
+        try:
+            size, removals = self._size, self._removals
+            # fit() replaces the fitted state wholesale, so a shallow copy leaves the live index untouched
+            fresh = copy.copy(self.ann)
+            await asyncio.to_thread(lambda: fresh.fit(self.decoded(slice(0, size))))
+            if self._removals != removals:
+                return False
+            if self._size > size:
+                fresh.add(self.decoded(slice(size, self._size)))
+            self.ann = fresh
+            return True
+        finally:
+            self._refitting = False
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is not None:
+            scores = self._matrix[rows].astype(np.float32, copy=False) @ query
+            return scores if self._scales is None else scores * self._scales[rows]
+        if not self.quantized:
+            return self.matrix @ query
+        # dequantize in blocks so a full scan never materializes a float32 copy of the matrix
+        scores = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, _SCAN_BLOCK_ROWS):
+            end = min(start + _SCAN_BLOCK_ROWS, self._size)
+            scores[start:end] = self._matrix[start:end].astype(np.float32) @ query
+        return scores if self._scales is None else scores * self.scales
+
+    def _rows_for(self, documents: np.ndarray) -> np.ndarray:
+        key = documents.tobytes()
+        rows = self._selections.get(key)
+        if rows is None:
+            if len(self._selections) >= _MAX_CACHED_SELECTIONS:
+                self._selections.clear()
+            rows = np.flatnonzero(np.isin(self.document_ids, documents))
+            self._selections[key] = rows
+        return rows
+
+    def search(
+        self, query_vec: Sequence[float], top_k: int, exact: bool = False, documents: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Cosine top-k; ``documents`` (sorted document ids) restricts scoring to those documents' rows."""
+        if not self._size or top_k <= 0:
+            return []
+        query = np.asarray(query_vec, dtype=np.float32)
+        if query.shape != (self.dim,):
+            return []
+        norm = float(np.linalg.norm(query)) or 1.0
+        query = query / norm
+        rows = None
+        if documents is not None:
+            # the filtered subset is scored exactly; only its rows are touched
+            rows = self._rows_for(documents)
+            if not rows.size:
+                return []
+            scores = self._scores(query, rows)
+        elif not exact and self.ann is not None and self.ann.fitted and self._size >= self.ann.min_rows:
+            rows = self.ann.candidates(query, top_k)
+            scores = self._scores(query, rows)
+        else:
+            scores = self._scores(query)
+        k = min(top_k, scores.shape[0])
+        if k < scores.shape[0]:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(scores[top])[::-1]]
+        positions = top if rows is None else rows[top]
+        chunk_ids = self.chunk_ids
+        return [(int(chunk_ids[p]), float(s)) for p, s in zip(positions, scores[top])]
+
+
+class TenantDocumentIndex:
+    """Posting sets of document ids per metadata value, used to pre-filter searches.
+
+    Keys are ``("tag", value)``, ``("language", value)`` and ``("source", value)``;
+    a filter resolves to the sorted document ids whose rows may be scored.
+    ``stamp`` records the documents-table probe the postings were loaded at.
+    """
+
+    FIELDS = ("tags", "language", "source")
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, Any], Set[int]] = {}
+        self._keys: Dict[int, List[Tuple[str, Any]]] = {}
+        self.stamp: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _doc_keys(tags, language, source) -> List[Tuple[str, Any]]:
+        keys = [("tags", tag) for tag in (tags or []) if isinstance(tag, str)]
+        if language:
+            keys.append(("language", language.lower()))
+        if source:
+            keys.append(("source", source))
+        return keys
+
+    def set(self, document_id: int, tags: Optional[List[str]], language: Optional[str], source: Optional[str]) -> None:
+        self.discard(document_id)
+        keys = self._doc_keys(tags, language, source)
+        self._keys[document_id] = keys
+        for key in keys:
+            self._postings.setdefault(key, set()).add(document_id)
+
+    def discard(self, document_id: int) -> None:
+        for key in self._keys.pop(document_id, []):
+            posting = self._postings.get(key)
+            if posting is not None:
+                posting.discard(document_id)
+                if not posting:
+                    del self._postings[key]
+
+    def resolve(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Sorted document ids matching ``filters``, or ``None`` when nothing is filtered.
+
+        Values within a field are OR-ed (a document needs any of the listed
+        tags), fields are AND-ed; ``document_ids`` narrows the result further.
+        """
+        if not filters:
+            return None
+        selected: Optional[Set[int]] = None
+        for field in self.FIELDS:
+            values = filters.get(field)
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            if field == "language":
+                values = [v.lower() for v in values]
+            matched: Set[int] = set()
+            for value in values:
+                matched |= self._postings.get((field, value), set())
+            selected = matched if selected is None else selected & matched
+        document_ids = filters.get("document_ids")
+        if document_ids is not None:
+            wanted = set(document_ids)
+            selected = wanted if selected is None else selected & wanted
+        if selected is None:
+            return None
+        return np.fromiter(sorted(selected), dtype=np.int64, count=len(selected))
+
+
+class TenantIndex:
+    """Search structures for one tenant, kept in step with ``knowledge_embeddings``.
+
+    ``rows`` counts every embedding row replayed into the index (including rows
+    whose vector could not be indexed) so the freshness probe can compare it
+    with the table.
+    """
+
+    def __init__(self, ann_config: Optional[dict] = None):
+        self.ann_config = ann_config
+        self.vectors: Optional[TenantVectorIndex] = None
+        self.lexical = TenantLexicalIndex()
+        self.documents = TenantDocumentIndex()
+        self.max_embedding_id = 0
+        self.rows = 0
+        # rows covered by the last snapshot written or restored
+        self.snapshot_rows = 0
+
+    def add_rows(self, rows: Sequence[Tuple[int, int, Optional[Sequence[float]], str, int]]) -> None:
+        """Add ``(embedding_id, chunk_id, vector, content, document_id)`` rows."""
+        if not rows:
+            return
+        if self.vectors is None:
+            first = next((r for r in rows if _has_vector(r[2])), None)
+            if first is not None:
+                self.vectors = TenantVectorIndex(
+                    len(first[2]), ann=build_ann(self.ann_config), quantization=quantization_mode(self.ann_config)
+                )
+        matching = [r for r in rows if self.vectors is not None and _has_vector(r[2]) and len(r[2]) == self.vectors.dim]
+        if len(matching) != len(rows):
+            logger.warning("Skipping %d embeddings with missing or mismatched vectors", len(rows) - len(matching))
+        if matching:
+            self.vectors.add([r[1] for r in matching], [r[2] for r in matching], [r[4] for r in matching])
+        for emb_id, chunk_id, _, content, document_id in rows:
+            self.lexical.add(chunk_id, content, document_id)
+            if emb_id > self.max_embedding_id:
+                self.max_embedding_id = emb_id
+        self.rows += len(rows)
+
+    def remove_chunks(self, chunk_ids: Sequence[int], rows: int, max_embedding_id: Optional[int] = None) -> None:
+        """Drop ``chunk_ids`` after ``rows`` embedding rows were deleted for them.
+
+        ``max_embedding_id`` is the table's max id after the delete; when the
+        deleted rows included the current high-water mark it is lowered so the
+        freshness probe keeps matching instead of forcing a rebuild.
+        """
+        if self.vectors is not None:
+            self.vectors.remove(chunk_ids)
+        self.lexical.remove(chunk_ids)
+        self.rows -= rows
+        if max_embedding_id is not None and max_embedding_id < self.max_embedding_id:
+            self.max_embedding_id = max_embedding_id
+
+    def to_snapshot(self) -> Tuple[dict, Dict[str, np.ndarray], List[str]]:
+        """Meta, arrays and lexical terms for ``rag_snapshot.write_snapshot``.
+
+        The arrays are copies, so the snapshot can be written while the index
+        keeps taking appends and in-place removals.
+        """
+        terms, arrays = self.lexical.to_arrays()
+        meta = {
+            "rows": self.rows,
+            "max_embedding_id": self.max_embedding_id,
+            # lets a restore detect rows deleted (or ids reused) below max_embedding_id
+            "chunk_sum": int(arrays["chunk_ids"].sum()),
+            "vector_rows": 0,
+            "quantization": quantization_mode(self.ann_config),
+        }
+        if self.vectors is not None and len(self.vectors):
+            meta["vector_rows"] = len(self.vectors)
+            meta["quantization"] = self.vectors.quantization
+            arrays["vectors"] = self.vectors.matrix.copy()
+            if self.vectors.scales is not None:
+                arrays["vector_scales"] = self.vectors.scales.copy()
+            arrays["vector_chunk_ids"] = self.vectors.chunk_ids.copy()
+            arrays["vector_document_ids"] = self.vectors.document_ids.copy()
+        return meta, arrays, terms
+
+    @classmethod
+    def from_snapshot(cls, meta: dict, arrays: Dict[str, np.ndarray], terms: List[str], ann_config: Optional[dict] = None) -> "TenantIndex":
+        index = cls(ann_config)
+        index.lexical = TenantLexicalIndex.from_arrays(terms, {k: v for k, v in arrays.items() if not k.startswith("vector")})
+        if meta["vector_rows"]:
+            index.vectors = TenantVectorIndex.from_buffers(
+                arrays["vectors"],
+                arrays["vector_chunk_ids"],
+                arrays["vector_document_ids"],
+                meta["vector_rows"],
+                ann=build_ann(ann_config),
+                quantization=meta.get("quantization"),
+                scales=arrays.get("vector_scales"),
+            )
+        index.rows = index.snapshot_rows = meta["rows"]
+        index.max_embedding_id = meta["max_embedding_id"]
+        return index
+
+
+# In-process per-tenant indexes: {tenant_id: TenantIndex}
+_indexes: Dict[int, TenantIndex] = {}
+# Bumped on every local ingest/update/delete: {tenant_id: generation}
+_generations: Dict[int, int] = {}
+# One lock per tenant serializes that tenant's sync and in-place updates; the
+# module lock only guards the lookup of those locks, so one tenant's rebuild
+# never stalls another tenant's searches.
+_tenant_locks: Dict[int, asyncio.Lock] = {}
+_lock = asyncio.Lock()
+# Tenants with a snapshot write in flight
+_snapshotting: Set[int] = set()
+# Background ANN refits, referenced until they finish
+_refits: Set[asyncio.Task] = set()
+
+
+def _has_vector(vec) -> bool:
+    return vec is not None and len(vec) > 0
+
+
+def quantization_mode(config: Optional[dict]) -> str:
+    """Vector quantization named by an index config (``"quantization"`` key); ``none`` when unset or unknown."""
+    mode = str((config or {}).get("quantization") or "none").lower()
+    return mode if mode in QUANTIZATION_MODES else "none"
+
+
+async def _tenant_lock(tenant_id: int) -> asyncio.Lock:
+    async with _lock:
+        lock = _tenant_locks.get(tenant_id)
+        if lock is None:
+            lock = _tenant_locks[tenant_id] = asyncio.Lock()
+        return lock
+
+
+async def _embedding_stats(db: AsyncSession, tenant_id: int) -> Tuple[int, int, tuple]:
+    """One aggregate query: embedding count and max id, plus a documents stamp (count, last change)."""
+    documents = select(KnowledgeDocument.id).where(KnowledgeDocument.tenant_id == tenant_id)
+    res = await db.execute(
+        select(
+            func.count(KnowledgeEmbedding.id),
+            func.max(KnowledgeEmbedding.id),
+            select(func.count()).select_from(documents.subquery()).scalar_subquery(),
+            select(func.max(func.coalesce(KnowledgeDocument.updated_at, KnowledgeDocument.created_at)))
+            .where(KnowledgeDocument.tenant_id == tenant_id)
+            .scalar_subquery(),
+        ).where(KnowledgeEmbedding.tenant_id == tenant_id)
+    )
+    count, max_id, doc_count, doc_changed = res.one()
+    return int(count or 0), int(max_id or 0), (doc_count, str(doc_changed))
+
+
+async def _ann_config(db: AsyncSession, tenant_id: int) -> Optional[dict]:
+    """Vector index settings for a tenant: the ``rag_ann`` tenant setting overrides RAG_ANN_INDEX and RAG_VECTOR_QUANTIZATION."""
+    config = {
+        "type": settings.RAG_ANN_INDEX,
+        "min_vectors": settings.RAG_ANN_MIN_VECTORS,
+        "quantization": settings.RAG_VECTOR_QUANTIZATION,
+    }
+    override = (
+        await db.execute(select(TenantSetting.value).where(TenantSetting.tenant_id == tenant_id, TenantSetting.key == "rag_ann"))
+    ).scalar_one_or_none()
+    if isinstance(override, dict):
+        config.update(override)
+    elif isinstance(override, str):
+        config["type"] = override
+    return config
+
+
+async def _load_rows(db: AsyncSession, tenant_id: int, after_id: int = 0):
+    res = await db.execute(
+        select(
+            KnowledgeEmbedding.id,
+            KnowledgeEmbedding.chunk_id,
+            KnowledgeEmbedding.vector_data,
+            KnowledgeEmbedding.dtype,
+            KnowledgeEmbedding.dim,
+            KnowledgeEmbedding.vector,
+            KnowledgeChunk.content,
+            KnowledgeEmbedding.document_id,
+        )
+        .join(KnowledgeChunk, KnowledgeChunk.id == KnowledgeEmbedding.chunk_id)
+        .where(KnowledgeEmbedding.tenant_id == tenant_id, KnowledgeEmbedding.id > after_id)
+        .order_by(KnowledgeEmbedding.id)
+    )
+    rows = []
+    for emb_id, chunk_id, data, dtype, dim, legacy, content, document_id in res.all():
+        vec = legacy
+        if data is not None:
+            try:
+                vec = decode_vector(data, dtype, dim)
+            except (KeyError, ValueError):
+                vec = None
+        rows.append((emb_id, chunk_id, vec, content, document_id))
+    return rows
+
+
+async def _load_documents(db: AsyncSession, tenant_id: int) -> TenantDocumentIndex:
+    res = await db.execute(
+        select(KnowledgeDocument.id, KnowledgeDocument.tags, KnowledgeDocument.language, KnowledgeDocument.source).where(
+            KnowledgeDocument.tenant_id == tenant_id
+        )
+    )
+    documents = TenantDocumentIndex()
+    for document_id, tags, language, source in res.all():
+        documents.set(document_id, tags, language, source)
+    return documents
+
+
+async def get_index(db: AsyncSession, tenant_id: int) -> Optional[TenantIndex]:
+    """Return the tenant's index, building it or replaying new rows when the table moved on.
+
+    The count/max-id probe is a single aggregate query and keeps indexes in
+    different worker processes consistent with the database; document metadata
+    postings are reloaded when the documents stamp in the same probe moves.
+    """
+    count, max_id, documents_stamp = await _embedding_stats(db, tenant_id)
+    async with await _tenant_lock(tenant_id):
+        index = await _sync_rows(db, tenant_id, count, max_id)
+        if index is not None and index.documents.stamp != documents_stamp:
+            index.documents = await _load_documents(db, tenant_id)
+            index.documents.stamp = documents_stamp
+        snapshot = _snapshot_due(tenant_id, index)
+    _schedule_refit(tenant_id, index)
+    if snapshot is not None:
+        # the arrays were copied under the tenant lock; the write itself holds no lock
+        await _write_snapshot(tenant_id, index, snapshot)
+    return index
+
+
+async def _sync_rows(db: AsyncSession, tenant_id: int, count: int, max_id: int) -> Optional[TenantIndex]:
+    index = _indexes.get(tenant_id)
+    if index is not None and index.rows == count and index.max_embedding_id == max_id:
+        return index
+    if index is not None and max_id > index.max_embedding_id:
+        rows = await _load_rows(db, tenant_id, after_id=index.max_embedding_id)
+        if index.rows + len(rows) == count:
+            index.add_rows(rows)
+            return index
+    if not count:
+        _indexes.pop(tenant_id, None)
+        return None
+    index = await _restore(db, tenant_id, count, max_id) if rag_snapshot.enabled() else None
+    if index is None:
+        index = TenantIndex(await _ann_config(db, tenant_id))
+        # a full rebuild is CPU bound; the new index is not shared yet, so build it off the event loop
+        await asyncio.to_thread(index.add_rows, await _load_rows(db, tenant_id))
+    _indexes[tenant_id] = index
+    return index
+
+
+async def _restore(db: AsyncSession, tenant_id: int, count: int, max_id: int) -> Optional[TenantIndex]:
+    """Open the tenant's snapshot and replay embedding rows added since; ``None`` when it cannot be used."""
+    snapshot = await asyncio.to_thread(rag_snapshot.read_snapshot, tenant_id)
+    if snapshot is None:
+        return None
+    meta, arrays, terms = snapshot
+    if meta["max_embedding_id"] > max_id:
+        return None
+    config = await _ann_config(db, tenant_id)
+    if meta.get("quantization", "none") != quantization_mode(config):
+        logger.info("RAG snapshot for tenant %s uses another vector quantization; rebuilding", tenant_id)
+        return None
+    covered, chunk_sum = (
+        await db.execute(
+            select(func.count(KnowledgeEmbedding.id), func.sum(KnowledgeEmbedding.chunk_id)).where(
+                KnowledgeEmbedding.tenant_id == tenant_id, KnowledgeEmbedding.id <= meta["max_embedding_id"]
+            )
+        )
+    ).one()
+    if covered != meta["rows"] or int(chunk_sum or 0) != meta["chunk_sum"]:
+        logger.info("RAG snapshot for tenant %s is stale; rebuilding from the database", tenant_id)
+        return None
+    index = TenantIndex.from_snapshot(meta, arrays, terms, config)
+    rows = await _load_rows(db, tenant_id, after_id=index.max_embedding_id)
+    if index.rows + len(rows) != count:
+        return None
+    index.add_rows(rows)
+    return index
+
+
+def _snapshot_due(tenant_id: int, index: Optional[TenantIndex]) -> Optional[Tuple[dict, Dict[str, np.ndarray], List[str]]]:
+    """``index.to_snapshot()`` when snapshots are enabled and it moved RAG_SNAPSHOT_DELTA_ROWS past the last one.
+
+    A tenant has at most one write in flight; ``_write_snapshot`` clears the mark.
+    """
+    if index is None or not rag_snapshot.enabled() or tenant_id in _snapshotting:
+        return None
+    if index.snapshot_rows and index.rows - index.snapshot_rows < max(1, int(settings.RAG_SNAPSHOT_DELTA_ROWS or 0)):
+        return None
+    snapshot = index.to_snapshot()
+    _snapshotting.add(tenant_id)
+    return snapshot
+
+
+async def _write_snapshot(tenant_id: int, index: TenantIndex, snapshot: Tuple[dict, Dict[str, np.ndarray], List[str]]) -> None:
+    meta, arrays, terms = snapshot
+    # append headroom so restored workers add rows in place (copy-on-write pages) instead of copying the matrix
+    extra = max(_INITIAL_CAPACITY, meta["vector_rows"] // 4)
+    headroom = {name: extra for name in arrays if name.startswith("vector")}
+    try:
+        await asyncio.to_thread(rag_snapshot.write_snapshot, tenant_id, meta, arrays, terms, headroom)
+    except OSError:
+        logger.exception("Could not write RAG snapshot for tenant %s", tenant_id)
+        return
+    finally:
+        _snapshotting.discard(tenant_id)
+    index.snapshot_rows = meta["rows"]
+
+
+async def _refit(tenant_id: int, vectors: TenantVectorIndex) -> None:
+    try:
+        if await vectors.refit_ann():
+            logger.info("Refitted RAG ANN index for tenant %s over %d vectors", tenant_id, len(vectors))
+    except Exception:
+        logger.exception("Could not refit RAG ANN index for tenant %s", tenant_id)
+
+
+def _schedule_refit(tenant_id: int, index: Optional[TenantIndex]) -> None:
+    """Start a background ANN refit when the tenant's vectors outgrew the last fit (or were never fitted)."""
+    vectors = index.vectors if index is not None else None
+    if vectors is None or not vectors.ann_stale():
+        return
+    task = asyncio.create_task(_refit(tenant_id, vectors))
+    _refits.add(task)
+    task.add_done_callback(_refits.discard)
+
+
+def _bump(tenant_id: int) -> None:
+    _generations[tenant_id] = _generations.get(tenant_id, 0) + 1
+
+
+async def corpus_version(db: AsyncSession, tenant_id: int) -> Tuple[int, int, int]:
+    """Version of a tenant's corpus: local change generation plus the embedding count/max-id probe.
+
+    The probe part moves when another process ingests or deletes, the
+    generation part catches in-place edits that leave count and max id equal.
+    """
+    count, max_id, _ = await _embedding_stats(db, tenant_id)
+    return _generations.get(tenant_id, 0), count, max_id
+
+
+async def append(tenant_id: int, rows: Sequence[Tuple[int, int, Sequence[float], str, int]]) -> None:
+    """Append freshly ingested ``(embedding_id, chunk_id, vector, content, document_id)`` rows to an already-loaded tenant index."""
+    async with await _tenant_lock(tenant_id):
+        if rows:
+            _bump(tenant_id)
+        index = _indexes.get(tenant_id)
+        if index is None or not rows:
+            return
+        index.add_rows([r for r in rows if r[0] > index.max_embedding_id])
+    _schedule_refit(tenant_id, index)
+
+
+async def remove(tenant_id: int, chunk_ids: Sequence[int], rows: int, max_embedding_id: Optional[int] = None) -> None:
+    """Remove deleted chunks from an already-loaded tenant index in place."""
+    async with await _tenant_lock(tenant_id):
+        if chunk_ids:
+            _bump(tenant_id)
+        index = _indexes.get(tenant_id)
+        if index is None or not chunk_ids:
+            return
+        index.remove_chunks(chunk_ids, rows, max_embedding_id)
+
+
+async def set_document(tenant_id: int, document_id: int, tags: Optional[List[str]], language: Optional[str], source: Optional[str]) -> None:
+    """Update a document's metadata postings in an already-loaded tenant index."""
+    async with await _tenant_lock(tenant_id):
+        index = _indexes.get(tenant_id)
+        if index is not None:
+            index.documents.set(document_id, tags, language, source)
+
+
+async def invalidate(tenant_id: int) -> None:
+    async with await _tenant_lock(tenant_id):
+        _bump(tenant_id)
+        _indexes.pop(tenant_id, None)
+
+
+def reset_indexes() -> None:
+    _indexes.clear()
+    _generations.clear()
+    _tenant_locks.clear()
+    _snapshotting.clear()
+    _refits.clear()
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models.knowledge_document import KnowledgeDocument
+from app.db.models.rag_ingest_job import RagIngestJob
+from app.services import rag_service
+from app.services.rag_pipeline import chunk_and_hash
+
+logger = logging.getLogger(__name__)
+
+# Worker pool state (in-memory); jobs themselves live in rag_ingest_jobs. Several processes
+# may queue the same job id: a worker first claims the job with a conditional UPDATE (queued,
+# or running with an expired lease), so only one of them runs it, and renews the lease while
+# it runs. A periodic sweep re-queues queued jobs and takes over jobs of dead workers.
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_session_factory: async_sessionmaker = AsyncSessionLocal
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    processes = int(settings.RAG_INGEST_PROCESSES or 0)
+    if processes <= 0:
+        return None
+    if _process_pool is None:
+        # spawn: forking a process that already runs threads (uvicorn, test portals) is unsafe
+        _process_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+async def chunk_document(text: str):
+    """Chunk and hash off the event loop: in the process pool, or a thread when RAG_INGEST_PROCESSES=0."""
+    tokenizer = settings.RAG_CHUNK_TOKENIZER
+    pool = _pool()
+    if pool is None:
+        return await asyncio.to_thread(chunk_and_hash, text, 0.15, tokenizer)
+    return await asyncio.get_running_loop().run_in_executor(pool, chunk_and_hash, text, 0.15, tokenizer)
+
+
+def _lease() -> timedelta:
+    return timedelta(seconds=max(1.0, float(settings.RAG_INGEST_LEASE_SECONDS or 300)))
+
+
+def _claimable(now: datetime):
+    # queued, or running for a worker whose lease ran out
+    expired = or_(RagIngestJob.lease_expires_at.is_(None), RagIngestJob.lease_expires_at < now)
+    return or_(RagIngestJob.status == "queued", and_(RagIngestJob.status == "running", expired))
+
+
+async def _update_job(job_id: int, **values) -> None:
+    async with _session_factory() as db:
+        await db.execute(update(RagIngestJob).where(RagIngestJob.id == job_id).values(**values))
+        await db.commit()
+
+
+async def _claim(job_id: int) -> bool:
+    """Mark the job running for this worker; False when another worker has it or it has finished."""
+    now = _now()
+    async with _session_factory() as db:
+        result = await db.execute(
+            update(RagIngestJob)
+            .where(RagIngestJob.id == job_id, _claimable(now))
+            .values(
+                status="running",
+                stage="chunking",
+                attempts=RagIngestJob.attempts + 1,
+                started_at=now,
+                error=None,
+                lease_expires_at=now + _lease(),
+            )
+        )
+        await db.commit()
+    return result.rowcount == 1
+
+
+async def _renew_lease(job_id: int) -> None:
+    interval = _lease().total_seconds() / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await _update_job(job_id, lease_expires_at=_now() + _lease())
+        except Exception:
+            logger.warning("Could not renew the lease of RAG ingest job %s", job_id, exc_info=True)
+
+
+async def _run_job(job_id: int) -> None:
+    if not await _claim(job_id):
+        return
+    renew = asyncio.ensure_future(_renew_lease(job_id))
+    try:
+        async with _session_factory() as db:
+            job = await db.get(RagIngestJob, job_id)
+            doc = await db.get(KnowledgeDocument, job.document_id) if job is not None else None
+            if doc is None:
+                await _update_job(job_id, status="failed", stage="done", error="Document no longer exists", finished_at=_now(), lease_expires_at=None)
+                return
+            tenant_id = job.tenant_id
+
+            async def on_stage(stage: str, **counts) -> None:
+                await _update_job(job_id, stage=stage, **counts)
+
+            try:
+                pending = await chunk_document(doc.content or "")
+                await _update_job(job_id, chunks_total=len(pending))
+                await rag_service.ingest_document(db, doc, tenant_id, pending=pending, on_stage=on_stage)
+            except Exception as exc:
+                await db.rollback()
+                logger.exception("RAG ingest job %s failed", job_id)
+                await _update_job(job_id, status="failed", stage="done", error=str(exc)[:1000], finished_at=_now(), lease_expires_at=None)
+                return
+        await _update_job(job_id, status="completed", stage="done", finished_at=_now(), lease_expires_at=None)
+    finally:
+        renew.cancel()
+
+
+async def _worker(queue: asyncio.Queue) -> None:
+    while True:
+        job_id = await queue.get()
+        try:
+            await _run_job(job_id)
+        except Exception:
+            logger.exception("RAG ingest worker crashed on job %s", job_id)
+        finally:
+            queue.task_done()
+
+
+def _ensure_workers() -> asyncio.Queue:
+    global _queue, _workers, _loop
+    loop = asyncio.get_running_loop()
+    if _queue is None or _loop is not loop:
+        _loop = loop
+        _queue = asyncio.Queue()
+        size = max(1, int(settings.RAG_INGEST_WORKERS or 1))
+        _workers = [loop.create_task(_worker(_queue)) for _ in range(size)]
+    return _queue
+
+
+async def enqueue_document(db: AsyncSession, doc: KnowledgeDocument, tenant_id: int) -> RagIngestJob:
+    """Persist an ingest job for ``doc`` and hand it to the worker pool."""
+    job = RagIngestJob(tenant_id=tenant_id, document_id=doc.id, status="queued", stage="queued", chunks_stored=0, attempts=0)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    _ensure_workers().put_nowait(job.id)
+    return job
+
+
+async def get_job(db: AsyncSession, tenant_id: int, job_id: int) -> Optional[RagIngestJob]:
+    res = await db.execute(select(RagIngestJob).where(RagIngestJob.id == job_id, RagIngestJob.tenant_id == tenant_id))
+    return res.scalar_one_or_none()
+
+
+async def resume_pending() -> int:
+    """Queue jobs that are queued or whose worker's lease ran out; ingest is idempotent per checksum.
+
+    Jobs already running under a live lease are left to their worker.
+    """
+    max_attempts = int(settings.RAG_INGEST_MAX_ATTEMPTS or 3)
+    now = _now()
+    async with _session_factory() as db:
+        res = await db.execute(select(RagIngestJob.id, RagIngestJob.attempts).where(_claimable(now)).order_by(RagIngestJob.id))
+        rows = res.all()
+        exhausted = [job_id for job_id, attempts in rows if (attempts or 0) >= max_attempts]
+        if exhausted:
+            await db.execute(
+                update(RagIngestJob)
+                .where(RagIngestJob.id.in_(exhausted), _claimable(now))
+                .values(status="failed", stage="done", error="Retry limit reached", finished_at=now, lease_expires_at=None)
+            )
+            await db.commit()
+    queue = _ensure_workers()
+    resumed = [job_id for job_id, attempts in rows if (attempts or 0) < max_attempts]
+    for job_id in resumed:
+        queue.put_nowait(job_id)
+    return len(resumed)
+
+
+async def _sweep() -> None:
+    while True:
+        await asyncio.sleep(_lease().total_seconds())
+        try:
+            await resume_pending()
+        except Exception:
+            logger.exception("Could not sweep RAG ingest jobs")
+
+
+async def start() -> None:
+    _ensure_workers()
+    _workers.append(asyncio.get_running_loop().create_task(_sweep()))
+    try:
+        resumed = await resume_pending()
+        if resumed:
+            logger.info("Resumed %d RAG ingest jobs", resumed)
+    except Exception:
+        logger.exception("Could not resume RAG ingest jobs")
+
+
+async def join() -> None:
+    """Wait until every queued job has been processed."""
+    if _queue is not None:
+        await _queue.join()
+
+
+async def stop() -> None:
+    global _queue, _workers, _loop, _process_pool
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _queue, _workers, _loop = None, [], None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,253 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1]
+
+
+class TenantLexicalIndex:
+    """Incremental inverted index (term -> rows, term frequencies) scored with BM25.
+
+    Postings are appended per chunk and frozen into NumPy arrays on first use,
+    so a query touches only the postings of its own terms and never rescans
+    chunk text. Removed rows are masked out and compacted lazily. An index
+    restored from a snapshot keeps its postings as (memory-mapped) arrays until
+    a term is written to.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Tuple[Sequence[int], Sequence[int]]] = {}
+        self._frozen: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._frozen_avgdl = 0.0
+        self._df: Counter = Counter()
+        # per-row terms for df bookkeeping on remove; rebuilt from postings after a restore
+        self._row_terms: Optional[List[Tuple[str, ...]]] = []
+        self._row_of: Dict[int, int] = {}
+        self._chunk_ids: List[int] = []
+        self._document_ids: List[int] = []
+        self._doc_len: List[int] = []
+        self._alive: List[bool] = []
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        # reusable score buffer; only rows touched by a query are written and reset
+        self._scratch: Optional[np.ndarray] = None
+        self._total_len = 0
+        self._live = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def add(self, chunk_id: int, text: str, document_id: int = 0) -> None:
+        if chunk_id in self._row_of:
+            self.remove([chunk_id])
+        counts = Counter(tokenize(text))
+        row = len(self._chunk_ids)
+        self._row_of[chunk_id] = row
+        self._chunk_ids.append(chunk_id)
+        self._document_ids.append(document_id)
+        length = sum(counts.values())
+        self._doc_len.append(length)
+        self._alive.append(True)
+        if self._row_terms is not None:
+            self._row_terms.append(tuple(counts))
+        self._total_len += length
+        self._live += 1
+        for term, tf in counts.items():
+            rows, tfs = self._postings.setdefault(term, ([], []))
+            if not isinstance(rows, list):
+                rows, tfs = self._postings[term] = (rows.tolist(), tfs.tolist())
+            rows.append(row)
+            tfs.append(tf)
+            self._df[term] += 1
+            self._frozen.pop(term, None)
+        self._arrays = None
+
+    def remove(self, chunk_ids: Iterable[int]) -> int:
+        removed = 0
+        row_terms = None
+        for chunk_id in chunk_ids:
+            row = self._row_of.pop(chunk_id, None)
+            if row is None:
+                continue
+            self._alive[row] = False
+            self._total_len -= self._doc_len[row]
+            self._live -= 1
+            if row_terms is None:
+                row_terms = self._terms_by_row()
+            for term in row_terms[row]:
+                self._df[term] -= 1
+                if self._df[term] <= 0:
+                    del self._df[term]
+            removed += 1
+        if removed:
+            self._arrays = None
+            if len(self._chunk_ids) > 64 and self._live < len(self._chunk_ids) // 2:
+                self._compact()
+        return removed
+
+    def _compact(self) -> None:
+        keep = [row for row, alive in enumerate(self._alive) if alive]
+        remap = {old: new for new, old in enumerate(keep)}
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for term, (rows, tfs) in self._postings.items():
+            pairs = [(remap[r], tf) for r, tf in zip(rows, tfs) if r in remap]
+            if pairs:
+                postings[term] = ([r for r, _ in pairs], [tf for _, tf in pairs])
+        self._postings = postings
+        self._frozen = {}
+        self._chunk_ids = [self._chunk_ids[r] for r in keep]
+        self._document_ids = [self._document_ids[r] for r in keep]
+        self._doc_len = [self._doc_len[r] for r in keep]
+        row_terms = self._terms_by_row()
+        self._row_terms = [row_terms[r] for r in keep]
+        self._alive = [True] * len(keep)
+        self._row_of = {cid: row for row, cid in enumerate(self._chunk_ids)}
+        self._arrays = None
+
+    def _terms_by_row(self) -> List[Tuple[str, ...]]:
+        if self._row_terms is None:
+            terms: List[List[str]] = [[] for _ in self._chunk_ids]
+            for term, (rows, _) in self._postings.items():
+                for row in rows:
+                    terms[row].append(term)
+            self._row_terms = [tuple(t) for t in terms]
+        return self._row_terms
+
+    def to_arrays(self) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Live rows as CSR arrays (terms, term offsets, posting rows/tfs) for a snapshot; rows are renumbered densely."""
+        keep = np.flatnonzero(np.asarray(self._alive, dtype=bool))
+        remap = np.full(len(self._alive), -1, dtype=np.int64)
+        remap[keep] = np.arange(keep.size)
+        terms: List[str] = []
+        offsets = [0]
+        rows_parts: List[np.ndarray] = []
+        tfs_parts: List[np.ndarray] = []
+        for term, (rows, tfs) in self._postings.items():
+            mapped = remap[np.asarray(rows, dtype=np.int64)]
+            live = mapped >= 0
+            if not live.any():
+                continue
+            terms.append(term)
+            rows_parts.append(mapped[live].astype(np.int32))
+            tfs_parts.append(np.asarray(tfs, dtype=np.int32)[live])
+            offsets.append(offsets[-1] + int(live.sum()))
+        arrays = {
+            "chunk_ids": np.asarray(self._chunk_ids, dtype=np.int64)[keep],
+            "document_ids": np.asarray(self._document_ids, dtype=np.int64)[keep],
+            "doc_len": np.asarray(self._doc_len, dtype=np.int32)[keep],
+            "term_offsets": np.asarray(offsets, dtype=np.int64),
+            "posting_rows": np.concatenate(rows_parts) if rows_parts else np.zeros(0, dtype=np.int32),
+            "posting_tfs": np.concatenate(tfs_parts) if tfs_parts else np.zeros(0, dtype=np.int32),
+        }
+        return terms, arrays
+
+    @classmethod
+    def from_arrays(cls, terms: List[str], arrays: Dict[str, np.ndarray]) -> "TenantLexicalIndex":
+        """Restore an index written by ``to_arrays``; posting arrays are used in place (they may be memory-mapped)."""
+        index = cls()
+        offsets = arrays["term_offsets"]
+        # plain ndarray views over the same buffers: slicing np.memmap objects is ~10x slower
+        rows = arrays["posting_rows"].view(np.ndarray)
+        tfs = arrays["posting_tfs"].view(np.ndarray)
+        bounds = offsets.tolist()
+        index._postings = {term: (rows[bounds[i] : bounds[i + 1]], tfs[bounds[i] : bounds[i + 1]]) for i, term in enumerate(terms)}
+        index._df = Counter(dict(zip(terms, np.diff(offsets).tolist())))
+        index._chunk_ids = arrays["chunk_ids"].tolist()
+        index._document_ids = arrays["document_ids"].tolist()
+        index._doc_len = arrays["doc_len"].tolist()
+        index._alive = [True] * len(index._chunk_ids)
+        index._row_of = {chunk_id: row for row, chunk_id in enumerate(index._chunk_ids)}
+        index._row_terms = None
+        index._total_len = int(arrays["doc_len"].sum())
+        index._live = len(index._chunk_ids)
+        return index
+
+    def _doc_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            self._arrays = (
+                np.asarray(self._chunk_ids, dtype=np.int64),
+                np.asarray(self._doc_len, dtype=np.float32),
+                np.asarray(self._alive, dtype=bool),
+                np.asarray(self._document_ids, dtype=np.int64),
+            )
+        return self._arrays
+
+    def _term_postings(self, term: str, doc_len: np.ndarray, avgdl: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return (rows, BM25 tf weights) for a term; weights are cached until avgdl changes."""
+        if avgdl != self._frozen_avgdl:
+            self._frozen = {}
+            self._frozen_avgdl = avgdl
+        frozen = self._frozen.get(term)
+        if frozen is None:
+            raw = self._postings.get(term)
+            if raw is None:
+                return None
+            rows = np.asarray(raw[0], dtype=np.int64)
+            tfs = np.asarray(raw[1], dtype=np.float32)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[rows] / avgdl)
+            frozen = (rows, tfs * (BM25_K1 + 1.0) / (tfs + norm))
+            self._frozen[term] = frozen
+        return frozen
+
+    def search(self, query: str, top_k: int, documents: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """BM25 top-k; ``documents`` (sorted document ids) restricts candidates before ranking."""
+        if not self._live or top_k <= 0:
+            return []
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        chunk_ids, doc_len, alive, document_ids = self._doc_arrays()
+        if self._scratch is None or self._scratch.shape[0] != chunk_ids.shape[0]:
+            self._scratch = np.zeros(chunk_ids.shape[0], dtype=np.float32)
+        scores = self._scratch
+        avgdl = (self._total_len / self._live) or 1.0
+        touched = []
+        for term in terms:
+            df = self._df.get(term, 0)
+            postings = self._term_postings(term, doc_len, avgdl) if df else None
+            if postings is None:
+                continue
+            rows, weights = postings
+            idf = math.log(1.0 + (self._live - df + 0.5) / (df + 0.5))
+            # rows are unique within a term's postings, so fancy-index accumulation is safe
+            scores[rows] += idf * weights
+            touched.append(rows)
+        if not touched:
+            return []
+        # work is proportional to the matched postings, not to the corpus size
+        candidates = np.unique(np.concatenate(touched)) if len(touched) > 1 else touched[0]
+        cand_scores = scores[candidates]
+        scores[candidates] = 0.0
+        live = alive[candidates]
+        if documents is not None:
+            live &= np.isin(document_ids[candidates], documents)
+        candidates = candidates[live]
+        cand_scores = cand_scores[live]
+        if not candidates.size:
+            return []
+        k = min(top_k, candidates.size)
+        if k < candidates.size:
+            top = np.argpartition(cand_scores, -k)[-k:]
+        else:
+            top = np.arange(candidates.size)
+        top = top[np.argsort(cand_scores[top])[::-1]]
+        return [(int(chunk_ids[candidates[i]]), float(cand_scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(*rankings: List[Tuple[int, float]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Fuse ranked (chunk_id, score) lists by summing 1 / (k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,55 @@
+from typing import List, Optional
+
+import numpy as np
+
+# Maximal Marginal Relevance over a small candidate set (tens of rows): each pick
+# maximizes (1 - diversity) * relevance - diversity * max similarity to the picks
+# so far. Candidate-candidate similarities are one matrix product up front and
+# each step is a vectorized update of the running max.
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    vectors: Optional[np.ndarray],
+    top_k: int,
+    diversity: float = 0.5,
+    groups: Optional[np.ndarray] = None,
+    max_per_group: Optional[int] = None,
+) -> List[int]:
+    """Indices of the selected candidates, in pick order.
+
+    ``relevance`` may be on any scale (cosine, BM25, RRF); it is min-max
+    normalized so ``diversity`` (0 = relevance order, 1 = most dissimilar
+    first) means the same for every search mode. ``vectors`` are the
+    candidates' unit vectors (``None`` or zero rows disable the similarity
+    penalty); ``groups`` with ``max_per_group`` caps picks per group, e.g. per
+    document.
+    """
+    n = relevance.shape[0]
+    if not n or top_k <= 0:
+        return []
+    rel = relevance.astype(np.float64)
+    spread = rel.max() - rel.min()
+    rel = (rel - rel.min()) / spread if spread > 0 else np.ones(n)
+    if vectors is not None and diversity > 0:
+        sims = vectors.astype(np.float64) @ vectors.astype(np.float64).T
+    else:
+        sims = None
+    weight = min(max(float(diversity), 0.0), 1.0)
+    penalty = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    counts = {}
+    while len(picked) < top_k and available.any():
+        scores = np.where(available, (1.0 - weight) * rel - weight * penalty, -np.inf)
+        i = int(np.argmax(scores))
+        picked.append(i)
+        available[i] = False
+        if sims is not None:
+            np.maximum(penalty, sims[i], out=penalty)
+        if groups is not None and max_per_group:
+            group = groups[i]
+            counts[group] = counts.get(group, 0) + 1
+            if counts[group] >= max_per_group:
+                available &= groups != group
+    return picked
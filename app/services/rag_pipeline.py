@@ -1,13 +1,24 @@
 import hashlib
 import math
 import re
-from typing import List, Tuple, Optional
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, islice
+from typing import Callable, Dict, Iterator, List, NamedTuple, Sequence, Tuple, Optional, Union
 
 import numpy as np
 
 MIN_TOKENS = 400
 MAX_TOKENS = 1200
 DEFAULT_OVERLAP = 0.15
+DEFAULT_TOKENIZER = "whitespace"
+DEFAULT_VECTOR_DTYPE = "float32"
+# stored vectors are always little-endian regardless of host byte order
+_VECTOR_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+# heading lines ("# Title", "2. Title") start a new section; the newline-prefixed form
+# lets the regex engine skip ahead to line breaks instead of trying every position
+_HEADING_RE = re.compile(r"(?:#+|\d+\.)[^\S\n]")
+_NEXT_HEADING_RE = re.compile(r"\n(?:#+|\d+\.)[^\S\n]")
+_WORD_RE = re.compile(r"\S+")
 
 
 def normalize_text(text: str) -> str:
@@ -16,41 +27,142 @@ def normalize_text(text: str) -> str:
     return text
 
 
+def _whitespace_tokens(word: str) -> int:
+    return 1
+
+
+def _subword_tokens(word: str) -> int:
+    # BPE-style approximation: roughly four characters per subword token
+    return max(1, (len(word) + 3) // 4)
+
+
+TOKENIZERS: Dict[str, Callable[[str], int]] = {"whitespace": _whitespace_tokens, "subword": _subword_tokens}
+
+
+class Chunk(NamedTuple):
+    text: str
+    index: int
+    section_title: Optional[str]
+    # character offsets into the source text: text[start:end] spans the chunk's words
+    start: int
+    end: int
+
+
+def _iter_sections(text: str) -> Iterator[Tuple[Optional[str], int, int]]:
+    """Yield (section_title, content_start, content_end) between heading lines, without splitting the text."""
+    title: Optional[str] = None
+    pos = 0
+    starts = (m.start() + 1 for m in _NEXT_HEADING_RE.finditer(text))
+    if _HEADING_RE.match(text):
+        starts = chain((0,), starts)
+    for heading in starts:
+        yield title, pos, max(pos, heading - 1)
+        line_end = text.find("\n", heading)
+        line_end = len(text) if line_end == -1 else line_end
+        title = text[heading:line_end].strip("# ").strip()
+        pos = line_end + 1
+    yield title, pos, len(text)
+
+
+def _section_chunks(
+    text: str,
+    start: int,
+    end: int,
+    count: Callable[[str], int],
+    max_tokens: int,
+    min_tokens: int,
+    step: int,
+) -> Iterator[Tuple[str, int, int]]:
+    """Yield (chunk, start, end) windows of at most ``max_tokens`` tokens, advancing ``step`` tokens.
+
+    Window bounds are found by bisecting cumulative token counts, so overlap
+    costs nothing extra and each chunk is joined exactly once. Character
+    offsets are resolved by rescanning only the line holding a window's first
+    or last word. A trailing remainder shorter than ``min_tokens`` is covered
+    by one window aligned to the section end instead of being dropped. A word
+    longer than ``max_tokens`` on its own gets a window of its own.
+    """
+    lines = text[start:end].split("\n")
+    line_words = list(map(str.split, lines))
+    words = list(chain.from_iterable(line_words))
+    # per-line word counts and start offsets, computed with C-level maps rather than a Python loop
+    line_first = [0, *accumulate(map(len, line_words))]
+    line_start = list(accumulate((len(line) + 1 for line in lines[:-1]), initial=start))
+    n = len(words)
+    if not n:
+        return
+    if count is _whitespace_tokens:
+        cum: Sequence[int] = range(n + 1)
+    elif count is _subword_tokens:
+        # inlined _subword_tokens; split() never yields empty words
+        cum = [0, *accumulate((size + 3) >> 2 for size in map(len, words))]
+    else:
+        cum = [0, *accumulate(map(count, words))]
+
+    def offset(word: int, word_end: bool = False) -> int:
+        line = bisect_right(line_first, word) - 1
+        matches = _WORD_RE.finditer(text, line_start[line], end)
+        match = next(islice(matches, word - line_first[line], None))
+        return match.end() if word_end else match.start()
+
+    first = 0
+    # an oversize last word would leave the remainder above max_tokens with first stuck at n - 1
+    while first < n - 1 and cum[n] - cum[first] > max_tokens:
+        last = max(first + 1, bisect_right(cum, cum[first] + max_tokens, first + 1) - 1)
+        yield " ".join(words[first:last]), offset(first), offset(last - 1, True)
+        # never past the window's end: a window cut short by an oversize next word must not skip it
+        first = min(bisect_left(cum, cum[first] + step, first + 1), last, n - 1)
+    if first > 0 and cum[n] - cum[first] < min_tokens:
+        first = bisect_left(cum, cum[n] - max_tokens)
+    yield " ".join(words[first:]), offset(first), offset(n - 1, True)
+
+
+def iter_chunks(
+    text: str,
+    overlap_ratio: float = DEFAULT_OVERLAP,
+    tokenizer: Union[str, Callable[[str], int]] = DEFAULT_TOKENIZER,
+    max_tokens: int = MAX_TOKENS,
+    min_tokens: int = MIN_TOKENS,
+) -> Iterator[Chunk]:
+    """Lazily chunk text into ~400-1200 token segments with overlap, per heading section.
+
+    ``tokenizer`` is a name from TOKENIZERS or a callable returning the token
+    count of one whitespace-delimited word.
+    """
+    if isinstance(tokenizer, str):
+        tokenizer = TOKENIZERS[tokenizer.lower()]
+    overlap = int(max_tokens * overlap_ratio)
+    step = max_tokens - overlap if max_tokens > overlap else max_tokens
+    idx = 0
+    for title, section_start, section_end in _iter_sections(text):
+        for chunk, start, end in _section_chunks(text, section_start, section_end, tokenizer, max_tokens, min_tokens, step):
+            yield Chunk(chunk, idx, title, start, end)
+            idx += 1
+
+
 def chunk_text(text: str, overlap_ratio: float = DEFAULT_OVERLAP) -> List[Tuple[str, int, Optional[str]]]:
     """Chunk text into ~400-1200 token segments with overlap. Returns (chunk, index, section_title)."""
-    lines = text.splitlines()
-    sections = []
-    current_section = {"title": None, "content": []}
-    for ln in lines:
-        if re.match(r"^(#+\s|\d+\.\s)", ln):
-            if current_section["content"]:
-                sections.append(current_section)
-            current_section = {"title": ln.strip("# ").strip(), "content": []}
-        else:
-            current_section["content"].append(ln)
-    if current_section["content"]:
-        sections.append(current_section)
-
-    chunks: List[Tuple[str, int, Optional[str]]] = []
-    idx = 0
-    for sec in sections:
-        sec_text = " ".join(sec["content"]).strip()
-        words = sec_text.split()
-        max_tokens = MAX_TOKENS
-        min_tokens = MIN_TOKENS
-        overlap = int(max_tokens * overlap_ratio)
-        i = 0
-        while i < len(words):
-            chunk_tokens = words[i : i + max_tokens]
-            if len(chunk_tokens) < min_tokens and i > 0:
-                break
-            chunk = " ".join(chunk_tokens).strip()
-            if chunk:
-                chunks.append((chunk, idx, sec["title"]))
-                idx += 1
-            step = max_tokens - overlap if max_tokens > overlap else max_tokens
-            i += step
-    return chunks
+    return [(c.text, c.index, c.section_title) for c in iter_chunks(text, overlap_ratio)]
+
+
+def chunk_and_hash(
+    text: str, overlap_ratio: float = DEFAULT_OVERLAP, tokenizer: str = DEFAULT_TOKENIZER
+) -> List[Tuple[str, int, Optional[str], str, int, int]]:
+    """Chunk text and attach SHA-256 checksums, dropping repeated chunks.
+
+    Returns (chunk, index, section_title, checksum, start, end).
+
+    Pure CPU work with picklable input/output, so ingestion jobs can run it in a process pool.
+    """
+    pending = []
+    seen = set()
+    for chunk in iter_chunks(text, overlap_ratio=overlap_ratio, tokenizer=tokenizer):
+        checksum = hashlib.sha256(chunk.text.encode("utf-8")).hexdigest()
+        if checksum in seen:
+            continue
+        seen.add(checksum)
+        pending.append((chunk.text, chunk.index, chunk.section_title, checksum, chunk.start, chunk.end))
+    return pending
 
 
 def embedding_for_text(text: str) -> List[float]:
@@ -66,3 +178,16 @@ def cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
     b = np.array(vec_b)
     denom = (np.linalg.norm(a) * np.linalg.norm(b)) or 1.0
     return float(np.dot(a, b) / denom)
+
+
+def encode_vector(vec, dtype: str = DEFAULT_VECTOR_DTYPE) -> bytes:
+    """Pack a vector as raw little-endian floats for KnowledgeEmbedding.vector_data."""
+    return np.asarray(vec, dtype=_VECTOR_DTYPES[dtype]).tobytes()
+
+
+def decode_vector(data: bytes, dtype: Optional[str] = None, dim: Optional[int] = None) -> np.ndarray:
+    """Read-only view over packed vector bytes (``np.frombuffer``, no copy)."""
+    vec = np.frombuffer(data, dtype=_VECTOR_DTYPES[dtype or DEFAULT_VECTOR_DTYPE])
+    if dim is not None and vec.shape[0] != dim:
+        raise ValueError(f"Stored vector has {vec.shape[0]} values, expected {dim}")
+    return vec
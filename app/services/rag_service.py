@@ -1,16 +1,21 @@
-from typing import List, Optional
-import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select, delete
+import numpy as np
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.models.knowledge_chunk import KnowledgeChunk
 from app.db.models.knowledge_document import KnowledgeDocument
 from app.db.models.knowledge_embedding import KnowledgeEmbedding
-from app.services.rag_pipeline import normalize_text, chunk_text, embedding_for_text, cosine_similarity
+from app.db.models.knowledge_minhash_band import KnowledgeMinHashBand
+from app.services import embedding_client, rag_dedupe, rag_index, rag_snapshot
+from app.services.rag_lexical import reciprocal_rank_fusion
+from app.services.rag_mmr import mmr_select
+from app.services.rag_pipeline import DEFAULT_VECTOR_DTYPE, chunk_and_hash, decode_vector, encode_vector, normalize_text
 
 
-async def create_document(
+async def add_document(
     db: AsyncSession,
     tenant_id: int,
     title: Optional[str],
@@ -18,7 +23,8 @@ async def create_document(
     source: Optional[str],
     language: Optional[str],
     tags: Optional[List[str]] = None,
-):
+) -> KnowledgeDocument:
+    """Store a document without ingesting it (ingestion jobs chunk and embed it later)."""
     doc = KnowledgeDocument(
         tenant_id=tenant_id,
         title=title,
@@ -30,57 +36,243 @@ async def create_document(
     db.add(doc)
     await db.commit()
     await db.refresh(doc)
+    return doc
+
+
+async def create_document(
+    db: AsyncSession,
+    tenant_id: int,
+    title: Optional[str],
+    content: str,
+    source: Optional[str],
+    language: Optional[str],
+    tags: Optional[List[str]] = None,
+):
+    doc = await add_document(db, tenant_id, title, content, source, language, tags)
     # ingest: chunk + embed
     await ingest_document(db, doc, tenant_id)
     return doc
 
 
-async def ingest_document(db: AsyncSession, doc: KnowledgeDocument, tenant_id: int):
-    source_text = doc.content or ""
-    chunks = chunk_text(source_text, overlap_ratio=0.15)
-    created_chunks = []
-    embeddings = []
-    for text, idx, section_title in chunks:
-        checksum = hashlib.sha256(text.encode("utf-8")).hexdigest()
-        # deduplicate by checksum for this document
-        existing = await db.execute(
-            select(KnowledgeChunk).where(
-                KnowledgeChunk.document_id == doc.id,
-                KnowledgeChunk.tenant_id == tenant_id,
-                KnowledgeChunk.checksum == checksum,
-            )
+async def ingest_document(
+    db: AsyncSession,
+    doc: KnowledgeDocument,
+    tenant_id: int,
+    pending: Optional[List[Tuple[str, int, Optional[str], str, int, int]]] = None,
+    on_stage: Optional[Callable[..., Awaitable[None]]] = None,
+):
+    """Chunk, dedupe and embed a document with set-based statements.
+
+    Checksums are computed up front and deduplicated with one ``IN`` query;
+    chunks and embeddings are written with multi-row INSERT ... RETURNING and a
+    single commit, so round trips no longer scale with the number of chunks.
+    Vectors come from the embedding cache; only unseen (model, checksum) pairs
+    are sent to the embedding provider.
+
+    ``pending`` takes precomputed ``chunk_and_hash`` output (ingestion jobs run
+    it in a process pool); ``on_stage(stage, **counts)`` is awaited as the
+    ingest moves through the embedding and indexing stages.
+
+    With RAG_DEDUPE_MODE ``flag`` near-duplicate documents and chunks are
+    recorded (``duplicate_of``) and collapsed at search time; with ``skip`` they
+    are not embedded or indexed at all.
+    """
+    if pending is None:
+        pending = chunk_and_hash(doc.content or "", overlap_ratio=0.15, tokenizer=settings.RAG_CHUNK_TOKENIZER)
+    if not pending:
+        return []
+    seen = {p[3] for p in pending}
+
+    # deduplicate by checksum for this document
+    existing = await db.execute(
+        select(KnowledgeChunk.checksum).where(
+            KnowledgeChunk.document_id == doc.id,
+            KnowledgeChunk.tenant_id == tenant_id,
+            KnowledgeChunk.checksum.in_(seen),
         )
-        if existing.scalars().first():
+    )
+    existing_checksums = set(existing.scalars().all())
+    pending = [p for p in pending if p[3] not in existing_checksums]
+    if not pending:
+        return []
+    dedupe = rag_dedupe.mode()
+    fields = None
+    if dedupe != "off":
+        if await rag_dedupe.mark_document(db, tenant_id, doc) is not None and dedupe == "skip":
+            doc.chunks_deduplicated = len(pending)
+            await db.commit()
+            return []
+        pending, fields, doc.chunks_deduplicated = await _dedupe_chunks(db, tenant_id, pending, skip=dedupe == "skip")
+        if not pending:
+            await db.commit()
+            return []
+    if on_stage is not None:
+        await on_stage("embedding", chunks_total=len(pending))
+
+    created_chunks, vectors, emb_ids = await _insert_chunks(db, doc, tenant_id, pending, fields)
+    await db.commit()
+    if on_stage is not None:
+        await on_stage("indexing", chunks_stored=len(created_chunks))
+    await rag_index.append(tenant_id, _index_rows(created_chunks, vectors, emb_ids))
+    return created_chunks
+
+
+def _index_rows(chunks, vectors, emb_ids):
+    return [(emb_id, kc.id, vec, kc.content, kc.document_id) for emb_id, kc, vec in zip(emb_ids, chunks, vectors)]
+
+
+async def _dedupe_chunks(db: AsyncSession, tenant_id: int, pending, skip: bool, exclude_chunk_ids: Sequence[int] = ()):
+    """Match ``pending`` chunks against the tenant's stored chunks.
+
+    Returns the chunks to insert, their extra column values (signature and
+    ``duplicate_of``) and how many near-duplicates were dropped (``skip`` only).
+    """
+    sigs, matches = await rag_dedupe.match_chunks(db, tenant_id, [p[0] for p in pending], exclude_chunk_ids)
+    kept, fields = [], []
+    for p, sig, match in zip(pending, sigs, matches):
+        if match is not None and skip:
             continue
-        kc = KnowledgeChunk(
-            tenant_id=tenant_id,
-            document_id=doc.id,
-            chunk_index=idx,
-            content=text,
-            embedding=None,
-            section_title=section_title,
-            checksum=checksum,
+        kept.append(p)
+        fields.append({"minhash": rag_dedupe.to_bytes(sig), "duplicate_of": match})
+    return kept, fields, len(pending) - len(kept)
+
+
+async def _insert_chunks(db: AsyncSession, doc: KnowledgeDocument, tenant_id: int, pending, fields: Optional[List[dict]] = None):
+    """Insert chunk and embedding rows for ``pending`` without committing; returns (chunks, vectors, embedding ids).
+
+    ``fields`` holds extra column values per pending chunk (near-duplicate
+    signatures); their LSH band buckets are written alongside.
+    """
+    created_chunks = (
+        await db.scalars(
+            insert(KnowledgeChunk).returning(KnowledgeChunk, sort_by_parameter_order=True),
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "document_id": doc.id,
+                    "chunk_index": idx,
+                    "content": text,
+                    "section_title": section_title,
+                    "checksum": checksum,
+                    "start_offset": start,
+                    "end_offset": end,
+                    **(fields[i] if fields else {}),
+                }
+                for i, (text, idx, section_title, checksum, start, end) in enumerate(pending)
+            ],
         )
-        db.add(kc)
-        created_chunks.append(kc)
-    await db.commit()
-    for kc in created_chunks:
-        await db.refresh(kc)
-        vec = embedding_for_text(kc.content)
-        emb = KnowledgeEmbedding(
-            tenant_id=tenant_id,
-            chunk_id=kc.id,
-            document_id=doc.id,
-            checksum=kc.checksum or hashlib.sha256(kc.content.encode("utf-8")).hexdigest(),
-            vector=vec,
-            model="hash-embed",
+    ).all()
+    if fields:
+        await rag_dedupe.store_chunk_bands(
+            db, tenant_id, doc.id, [(kc.id, rag_dedupe.from_bytes(kc.minhash)) for kc in created_chunks]
+        )
+    vectors = await embedding_client.embed_with_cache(db, [(kc.checksum, kc.content) for kc in created_chunks])
+    model = embedding_client.embedding_model()
+    emb_ids = (
+        await db.scalars(
+            insert(KnowledgeEmbedding).returning(KnowledgeEmbedding.id, sort_by_parameter_order=True),
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "chunk_id": kc.id,
+                    "document_id": doc.id,
+                    "checksum": kc.checksum,
+                    "vector_data": encode_vector(vec),
+                    "dim": len(vec),
+                    "dtype": DEFAULT_VECTOR_DTYPE,
+                    "model": model,
+                }
+                for kc, vec in zip(created_chunks, vectors)
+            ],
+        )
+    ).all()
+    return created_chunks, vectors, emb_ids
+
+
+async def update_document(
+    db: AsyncSession,
+    tenant_id: int,
+    document_id: int,
+    fields: Dict[str, Any],
+    pending: Optional[List[Tuple[str, int, Optional[str], str, int, int]]] = None,
+) -> Optional[Tuple[KnowledgeDocument, Dict[str, int]]]:
+    """Apply ``fields`` to a document and re-ingest only the chunks whose content changed.
+
+    The new ``chunk_and_hash`` output is matched against the stored chunks by
+    checksum: matching chunks keep their rows and embeddings (only position,
+    section title and offsets are rewritten), new checksums are inserted and
+    embedded, and vanished ones are deleted. The tenant index is patched in
+    place rather than rebuilt. Returns ``None`` when the document does not exist.
+    """
+    res = await db.execute(
+        select(KnowledgeDocument).where(KnowledgeDocument.id == document_id, KnowledgeDocument.tenant_id == tenant_id)
+    )
+    doc = res.scalar_one_or_none()
+    if doc is None:
+        return None
+    content_changed = "content" in fields and fields["content"] != doc.content
+    metadata_changed = any(key in fields and fields[key] != getattr(doc, key) for key in ("tags", "language", "source"))
+    for key, value in fields.items():
+        setattr(doc, key, value)
+    stats = {"added": 0, "removed": 0, "kept": 0}
+    if not content_changed:
+        await db.commit()
+        await db.refresh(doc)
+        if metadata_changed:
+            await rag_index.set_document(tenant_id, doc.id, doc.tags, doc.language, doc.source)
+        return doc, stats
+
+    if pending is None:
+        pending = chunk_and_hash(doc.content or "", overlap_ratio=0.15, tokenizer=settings.RAG_CHUNK_TOKENIZER)
+    existing = {
+        checksum: chunk_id
+        for chunk_id, checksum in (
+            await db.execute(
+                select(KnowledgeChunk.id, KnowledgeChunk.checksum).where(
+                    KnowledgeChunk.document_id == doc.id, KnowledgeChunk.tenant_id == tenant_id
+                )
+            )
+        ).all()
+    }
+    kept = [p for p in pending if p[3] in existing]
+    added = [p for p in pending if p[3] not in existing]
+    wanted = {p[3] for p in pending}
+    vanished = [chunk_id for checksum, chunk_id in existing.items() if checksum not in wanted]
+
+    dedupe = rag_dedupe.mode()
+    fields = None
+    if dedupe != "off":
+        # skip mode drops near-duplicate chunks again on every edit, so the count is recomputed
+        await rag_dedupe.mark_document(db, tenant_id, doc)
+        if added:
+            added, fields, doc.chunks_deduplicated = await _dedupe_chunks(db, tenant_id, added, dedupe == "skip", vanished)
+    # insert before deleting so new embedding ids stay above every id the index has seen
+    created_chunks, vectors, emb_ids = await _insert_chunks(db, doc, tenant_id, added, fields) if added else ([], [], [])
+    if kept:
+        await db.execute(
+            update(KnowledgeChunk),
+            [
+                {"id": existing[checksum], "chunk_index": idx, "section_title": title, "start_offset": start, "end_offset": end}
+                for _, idx, title, checksum, start, end in kept
+            ],
         )
-        db.add(emb)
-        embeddings.append(emb)
+    removed_rows = 0
+    max_embedding_id = None
+    if vanished:
+        removed_rows = (await db.execute(delete(KnowledgeEmbedding).where(KnowledgeEmbedding.chunk_id.in_(vanished)))).rowcount
+        await db.execute(delete(KnowledgeMinHashBand).where(KnowledgeMinHashBand.chunk_id.in_(vanished)))
+        await db.execute(delete(KnowledgeChunk).where(KnowledgeChunk.id.in_(vanished)))
+        max_embedding_id = (
+            await db.execute(select(func.max(KnowledgeEmbedding.id)).where(KnowledgeEmbedding.tenant_id == tenant_id))
+        ).scalar() or 0
     await db.commit()
-    for emb in embeddings:
-        await db.refresh(emb)
-    return created_chunks
+    await db.refresh(doc)
+    if metadata_changed:
+        await rag_index.set_document(tenant_id, doc.id, doc.tags, doc.language, doc.source)
+    await rag_index.append(tenant_id, _index_rows(created_chunks, vectors, emb_ids))
+    await rag_index.remove(tenant_id, vanished, removed_rows, max_embedding_id)
+    stats.update(added=len(created_chunks), removed=len(vanished), kept=len(kept))
+    return doc, stats
 
 
 async def list_documents(db: AsyncSession, tenant_id: int):
@@ -98,24 +290,155 @@ async def list_chunks(db: AsyncSession, tenant_id: int, document_id: int):
     return q.scalars().all()
 
 
-async def search(db: AsyncSession, tenant_id: int, query: str, top_k: int = 5):
-    # simple similarity search over stored embeddings
-    query_vec = embedding_for_text(query)
+async def search(
+    db: AsyncSession,
+    tenant_id: int,
+    query: str,
+    top_k: int = 5,
+    mode: str = "hybrid",
+    filters: Optional[Dict[str, Any]] = None,
+    diversity: float = 0.0,
+    max_per_document: Optional[int] = None,
+):
+    """Rank the tenant's chunks by ``mode``: ``vector``, ``lexical`` (BM25) or ``hybrid`` (reciprocal rank fusion).
+
+    Scoring runs against the in-memory tenant index; only the top-k rows are hydrated.
+    A quantized vector index over-fetches candidates that are re-scored with the
+    stored full-precision vectors before ranking.
+    ``filters`` (``tags``, ``language``, ``source``, ``document_ids``) are resolved
+    to a document set first, so only the matching documents' chunks are scored.
+    ``diversity`` > 0 or ``max_per_document`` re-rank a wider candidate pool with
+    Maximal Marginal Relevance, so overlapping chunks do not crowd out the rest.
+    With RAG_DEDUPE_MODE ``flag``, chunks flagged as near-duplicates of one
+    another are collapsed to the best-ranked one.
+    """
+    index = await rag_index.get_index(db, tenant_id)
+    if index is None:
+        return []
+    documents = index.documents.resolve(filters)
+    if documents is not None and not documents.size:
+        return []
+    diversify = diversity > 0 or bool(max_per_document)
+    collapse = rag_dedupe.mode() == "flag"
+    # fuse (diversify, collapse) over a wider candidate pool than top_k so each ranking can promote the other's misses
+    pool = top_k if mode != "hybrid" and not diversify and not collapse else max(top_k * 4, 20)
+    vector_ranked = []
+    lexical_ranked = []
+    if mode in ("vector", "hybrid") and index.vectors is not None:
+        query_vec = (await embedding_client.embed_texts([query]))[0]
+        if index.vectors.quantized:
+            candidates = index.vectors.search(query_vec, pool * max(1, settings.RAG_RERANK_FACTOR), documents=documents)
+            vector_ranked = await _rerank(db, tenant_id, query_vec, candidates, pool)
+        else:
+            vector_ranked = index.vectors.search(query_vec, pool, documents=documents)
+    if mode in ("lexical", "hybrid"):
+        lexical_ranked = index.lexical.search(query, pool, documents=documents)
+    if mode == "hybrid":
+        ranked = reciprocal_rank_fusion(vector_ranked, lexical_ranked)
+    elif mode == "lexical":
+        ranked = lexical_ranked
+    else:
+        ranked = vector_ranked
+    if not diversify and not collapse:
+        ranked = ranked[:top_k]
+    if not ranked:
+        return []
     res = await db.execute(
-        select(KnowledgeEmbedding, KnowledgeChunk).join(KnowledgeChunk, KnowledgeChunk.id == KnowledgeEmbedding.chunk_id).where(
-            KnowledgeEmbedding.tenant_id == tenant_id
+        select(KnowledgeEmbedding, KnowledgeChunk)
+        .join(KnowledgeChunk, KnowledgeChunk.id == KnowledgeEmbedding.chunk_id)
+        .where(
+            KnowledgeEmbedding.tenant_id == tenant_id,
+            KnowledgeEmbedding.chunk_id.in_([chunk_id for chunk_id, _ in ranked]),
         )
     )
+    rows = {chunk.id: (chunk, emb) for emb, chunk in res}
     results = []
-    for emb, chunk in res:
-        score = cosine_similarity(query_vec, emb.vector)
-        results.append((score, chunk, emb))
-    results.sort(key=lambda x: x[0], reverse=True)
+    for chunk_id, score in ranked:
+        if chunk_id in rows:
+            chunk, emb = rows[chunk_id]
+            results.append((score, chunk, emb))
+    if collapse:
+        results = _collapse_duplicates(results)
+    if diversify:
+        results = _diversify(index, results, top_k, diversity, max_per_document)
     return results[:top_k]
 
 
+def _collapse_duplicates(results):
+    """Keep the best-ranked hit of each group of chunks flagged as near-duplicates of one canonical chunk."""
+    seen = set()
+    kept = []
+    for hit in results:
+        chunk = hit[1]
+        key = chunk.duplicate_of or chunk.id
+        if key in seen or chunk.id in seen:
+            continue
+        seen.update((key, chunk.id))
+        kept.append(hit)
+    return kept
+
+
+def _diversify(index: rag_index.TenantIndex, results, top_k: int, diversity: float, max_per_document: Optional[int]):
+    """MMR-select ``top_k`` of the hydrated ``results``, at most ``max_per_document`` per document."""
+    chunk_ids = [chunk.id for _, chunk, _ in results]
+    vectors = index.vectors.vectors_for(chunk_ids) if diversity > 0 and index.vectors is not None else None
+    order = mmr_select(
+        np.array([score for score, _, _ in results], dtype=np.float64),
+        vectors,
+        top_k,
+        diversity=diversity,
+        groups=np.array([chunk.document_id for _, chunk, _ in results], dtype=np.int64),
+        max_per_group=max_per_document,
+    )
+    return [results[i] for i in order]
+
+
+async def _rerank(
+    db: AsyncSession, tenant_id: int, query_vec: List[float], candidates: List[Tuple[int, float]], top_k: int
+) -> List[Tuple[int, float]]:
+    """Re-score quantized-index candidates with the stored full-precision vectors and keep the best ``top_k``."""
+    if not candidates:
+        return []
+    res = await db.execute(
+        select(
+            KnowledgeEmbedding.chunk_id,
+            KnowledgeEmbedding.vector_data,
+            KnowledgeEmbedding.dtype,
+            KnowledgeEmbedding.dim,
+            KnowledgeEmbedding.vector,
+        ).where(
+            KnowledgeEmbedding.tenant_id == tenant_id,
+            KnowledgeEmbedding.chunk_id.in_([chunk_id for chunk_id, _ in candidates]),
+        )
+    )
+    exact = {}
+    for chunk_id, data, dtype, dim, legacy in res.all():
+        vec = legacy
+        if data is not None:
+            try:
+                vec = decode_vector(data, dtype, dim)
+            except (KeyError, ValueError):
+                vec = None
+        if vec is not None and len(vec) == len(query_vec):
+            exact[chunk_id] = vec
+    ids = [chunk_id for chunk_id, _ in candidates if chunk_id in exact]
+    scores = dict(candidates)
+    if ids:
+        matrix = np.asarray([exact[chunk_id] for chunk_id in ids], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        query = np.asarray(query_vec, dtype=np.float32)
+        exact_scores = (matrix @ query) / (norms * (float(np.linalg.norm(query)) or 1.0))
+        # rows without a usable stored vector keep their approximate score
+        scores.update(zip(ids, exact_scores.tolist()))
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
 async def delete_rag_for_tenant(db: AsyncSession, tenant_id: int):
+    await db.execute(delete(KnowledgeMinHashBand).where(KnowledgeMinHashBand.tenant_id == tenant_id))
     await db.execute(delete(KnowledgeEmbedding).where(KnowledgeEmbedding.tenant_id == tenant_id))
     await db.execute(delete(KnowledgeChunk).where(KnowledgeChunk.tenant_id == tenant_id))
     await db.execute(delete(KnowledgeDocument).where(KnowledgeDocument.tenant_id == tenant_id))
     await db.commit()
+    await rag_index.invalidate(tenant_id)
+    rag_snapshot.delete_snapshots(tenant_id)
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Snapshots live in RAG_SNAPSHOT_DIR/tenant_<id>/<version>/ (meta.json plus .npy arrays);
+# tenant_<id>/CURRENT names the live version. Arrays are opened with mmap_mode="c", so
+# workers share one page-cache copy and writes only copy the touched pages privately.
+SNAPSHOT_FORMAT = 1
+_KEEP_VERSIONS = 2
+
+
+def enabled() -> bool:
+    return bool(settings.RAG_SNAPSHOT_DIR)
+
+
+def _tenant_dir(tenant_id: int) -> Path:
+    return Path(settings.RAG_SNAPSHOT_DIR) / f"tenant_{tenant_id}"
+
+
+def write_snapshot(
+    tenant_id: int, meta: Dict, arrays: Dict[str, np.ndarray], terms: List[str], headroom: Optional[Dict[str, int]] = None
+) -> Path:
+    """Write a new version directory and switch CURRENT to it atomically; older versions are pruned.
+
+    ``headroom`` pads the named arrays with zero rows so restored indexes can
+    append in place instead of copying the whole buffer.
+    """
+    headroom = headroom or {}
+    tenant_dir = _tenant_dir(tenant_id)
+    version = f"{meta['max_embedding_id']}-{meta['rows']}-{uuid.uuid4().hex[:8]}"
+    target = tenant_dir / version
+    tmp = tenant_dir / f".{version}.tmp"
+    tmp.mkdir(parents=True)
+    try:
+        for name, array in arrays.items():
+            padded = (array.shape[0] + headroom.get(name, 0),) + array.shape[1:]
+            out = np.lib.format.open_memmap(tmp / f"{name}.npy", mode="w+", dtype=array.dtype, shape=padded)
+            out[: array.shape[0]] = array
+            out.flush()
+            del out
+        with open(tmp / "meta.json", "w", encoding="utf-8") as fh:
+            json.dump({**meta, "format": SNAPSHOT_FORMAT, "arrays": sorted(arrays), "terms": terms}, fh)
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    pointer = tenant_dir / f".CURRENT.{version}"
+    pointer.write_text(version, encoding="utf-8")
+    os.replace(pointer, tenant_dir / "CURRENT")
+    _prune(tenant_dir, version)
+    return target
+
+
+def _prune(tenant_dir: Path, current: str) -> None:
+    versions = sorted((p for p in tenant_dir.iterdir() if p.is_dir() and not p.name.startswith(".")), key=lambda p: p.stat().st_mtime)
+    stale = [p for p in versions if p.name != current][: max(0, len(versions) - _KEEP_VERSIONS)]
+    for path in stale:
+        # workers that still map the old files keep their pages until they reload
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_snapshot(tenant_id: int) -> Optional[Tuple[Dict, Dict[str, np.ndarray], List[str]]]:
+    """Open the current snapshot memory-mapped; ``None`` when there is none or it is unreadable."""
+    tenant_dir = _tenant_dir(tenant_id)
+    try:
+        version = (tenant_dir / "CURRENT").read_text(encoding="utf-8").strip()
+        with open(tenant_dir / version / "meta.json", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return None
+        arrays = {name: _load(tenant_dir / version / f"{name}.npy") for name in meta["arrays"]}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Ignoring unreadable RAG snapshot for tenant %s: %s", tenant_id, exc)
+        return None
+    return meta, arrays, meta.pop("terms")
+
+
+def _load(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="c", allow_pickle=False)
+    except ValueError:
+        # empty arrays cannot be mapped
+        return np.load(path, allow_pickle=False)
+
+
+def delete_snapshots(tenant_id: int) -> None:
+    if enabled():
+        shutil.rmtree(_tenant_dir(tenant_id), ignore_errors=True)
@@ -0,0 +1,73 @@
+"""Convert legacy JSON embedding vectors to packed float32 bytes.
+
+Run after `alembic upgrade head` (revision 0011_binary_embedding_vectors).
+Rows are converted in batches and the JSON column is cleared once the
+binary copy is written, so the script can be interrupted and re-run.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, null, select, update  # noqa: E402
+
+from app.db.models.knowledge_embedding import KnowledgeEmbedding  # noqa: E402
+from app.services.rag_pipeline import DEFAULT_VECTOR_DTYPE, encode_vector  # noqa: E402
+
+
+def _sync_url(url: str) -> str:
+    return url.replace("+asyncpg", "").replace("+aiosqlite", "")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backfill knowledge_embeddings.vector_data from the JSON vector column.")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), help="Database URL (default: DATABASE_URL)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--keep-json", action="store_true", help="Keep the JSON vector after conversion")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        print("DATABASE_URL is required", file=sys.stderr)
+        return 1
+
+    engine = create_engine(_sync_url(args.database_url))
+    converted = 0
+    last_id = 0
+    try:
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(KnowledgeEmbedding.id, KnowledgeEmbedding.vector)
+                    .where(
+                        KnowledgeEmbedding.id > last_id,
+                        KnowledgeEmbedding.vector_data.is_(None),
+                        KnowledgeEmbedding.vector.isnot(None),
+                    )
+                    .order_by(KnowledgeEmbedding.id)
+                    .limit(args.batch_size)
+                ).all()
+                if not rows:
+                    break
+                for emb_id, vector in rows:
+                    values = {
+                        "vector_data": encode_vector(vector),
+                        "dim": len(vector),
+                        "dtype": DEFAULT_VECTOR_DTYPE,
+                    }
+                    if not args.keep_json:
+                        values["vector"] = null()
+                    conn.execute(update(KnowledgeEmbedding).where(KnowledgeEmbedding.id == emb_id).values(**values))
+                last_id = rows[-1][0]
+                converted += len(rows)
+            print(f"Converted {converted} embeddings (last id {last_id})")
+    finally:
+        engine.dispose()
+
+    print(f"Done. {converted} embeddings converted.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+"""GDPR analysis wall-clock time for long inputs: one prompt vs map-reduce over chunks.
+
+Runs ``ai_service.analyze_gdpr_text`` end to end (request building, pooled
+transport, resilience, bulkhead, response parsing) against a local stub of an
+OpenAI-compatible provider. The stub models a local model server: it works on at
+most ``--server-slots`` requests at a time and each takes ``--base-ms`` plus
+``--ms-per-kchar`` per 1,000 prompt characters. It answers with a JSON analysis
+naming a risk per section it was shown plus one risk common to every part, so
+the merged result shows the reduce step's deduplication.
+
+The single-prompt rows send what they always did: the first AI_MAX_INPUT_CHARS
+characters, so "analyzed" is below the input size for long inputs. The stub's
+cost is linear in prompt size; real models also slow down superlinearly with
+context length and reject prompts beyond their context window, which this
+benchmark leaves out.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_SECTION_RE = re.compile(r"(?m)^(?:# )?Section (\d+)\b")
+
+
+def _document(chars: int) -> str:
+    sections = []
+    i = 0
+    while sum(map(len, sections)) < chars:
+        sentences = " ".join(
+            f"Personal data of customers in process {i} is kept in system {i % 7} and shared with vendor {i % 5}."
+            for _ in range(30)
+        )
+        sections.append(f"# Section {i}\n{sentences}\n")
+        i += 1
+    return "".join(sections)[:chars]
+
+
+async def _handle(reader, writer, args, slots, stats):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode().split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            prompt = json.loads(await reader.readexactly(length))["messages"][0]["content"]
+            async with slots:
+                stats["calls"] += 1
+                stats["prompt_chars"] += len(prompt)
+                await asyncio.sleep((args.base_ms + args.ms_per_kchar * len(prompt) / 1000) / 1000)
+            sections = sorted(set(_SECTION_RE.findall(prompt)), key=int)
+            analysis = {
+                "summary": f"Sections {', '.join(sections) or '-'} describe customer data processing.",
+                "risks": ["Vendors receive personal data without a documented DPA"] + [f"No retention period for process {s}" for s in sections],
+                "recommendations": ["Sign data processing agreements with all vendors."],
+                "high_risk": False,
+                "model": "stub",
+            }
+            body = json.dumps({"choices": [{"message": {"content": json.dumps(analysis)}}]}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _run(args) -> int:
+    from app.core.config import settings
+    from app.services import ai_service, ai_transport
+
+    slots = asyncio.Semaphore(args.server_slots)
+    stats = {"calls": 0, "prompt_chars": 0}
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, args, slots, stats), "127.0.0.1", 0)
+    settings.AI_PROVIDER = "openai"
+    settings.AI_BASE_URL = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    settings.AI_API_KEY = None
+    settings.AI_REQUEST_TIMEOUT_SECONDS = 600
+    settings.AI_ANALYZE_CHUNK_TOKENS = args.chunk_tokens
+    settings.AI_MAX_CONCURRENCY = 0
+    settings.AI_TENANT_MAX_CONCURRENCY = 0
+
+    print(f"{'input':>9}{'mode':>16}{'analyzed':>10}{'calls':>7}{'prompt chars':>14}{'wall s':>9}{'risks':>7}")
+    try:
+        for size in args.sizes:
+            text = _document(size)
+            modes = [("single prompt", False, 1), ("map-reduce", True, 1), ("map-reduce", True, args.concurrency)]
+            for label, long_input, concurrency in modes:
+                settings.AI_ANALYZE_LONG_INPUT = long_input
+                settings.AI_ANALYZE_CONCURRENCY = concurrency
+                stats.update(calls=0, prompt_chars=0)
+                start = time.perf_counter()
+                result = await ai_service.analyze_gdpr_text(text)
+                wall = time.perf_counter() - start
+                analyzed = min(size, int(settings.AI_MAX_INPUT_CHARS)) if not long_input else size
+                name = f"{label} x{concurrency}" if long_input else label
+                print(
+                    f"{size:>9}{name:>16}{analyzed:>10}{stats['calls']:>7}{stats['prompt_chars']:>14}"
+                    f"{wall:>9.2f}{len(result['risks']):>7}"
+                )
+    finally:
+        await ai_transport.stop()
+        server.close()
+        await server.wait_closed()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 500_000])
+    parser.add_argument("--chunk-tokens", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--server-slots", type=int, default=4)
+    parser.add_argument("--base-ms", type=float, default=200.0)
+    parser.add_argument("--ms-per-kchar", type=float, default=40.0)
+    args = parser.parse_args()
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+"""Parsing model output: the previous regex/repair chain vs the single-pass ``ai_json`` parser.
+
+Times both on ``--chars``-sized model answers: well-formed JSON, JSON wrapped in
+prose or cut off at the output limit, the usual defects (single quotes, trailing
+commas, unescaped inner quotes), and adversarial text a misbehaving model can
+produce (runs of unbalanced braces, mismatched brackets, escapes, many small
+objects). "ok" means the analysis fields were recovered. The previous chain was
+json.loads, then a greedy ``\\{(?:.|\\n)*\\}`` search, then a quote-replacing repair;
+the search backtracks on every "{" without a closing "}", which is quadratic in the
+length of the answer. ``--legacy-max-chars`` skips the previous chain above that
+size so the run finishes.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _legacy_parse(text_out: str):
+    # the JSON steps of ai_service._parse_analysis before ai_json
+    parsed = None
+    try:
+        parsed = json.loads(text_out)
+    except Exception:
+        try:
+            m = re.search(r"\{(?:.|\n)*\}", text_out)
+            if m:
+                parsed = json.loads(m.group(0))
+        except Exception:
+            parsed = None
+    if parsed is None:
+        try:
+            fixed = text_out.replace("'", '"')
+            fixed = re.sub(r",\s*([\]}])", r"\1", fixed)
+            parsed = json.loads(fixed)
+        except Exception:
+            parsed = None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _answer(chars: int) -> dict:
+    risks = []
+    while sum(map(len, risks)) < chars * 0.8:
+        i = len(risks)
+        risks.append(f"Process {i} keeps personal data in system {i % 7} without a documented retention period.")
+    return {"summary": "Customer data is processed in several systems.", "risks": risks, "recommendations": ["Define retention."], "high_risk": True}
+
+
+def _cases(chars: int):
+    answer = _answer(chars)
+    valid = json.dumps(answer)
+    yield "well-formed", valid
+    yield "in prose + fence", f"Here is the analysis:\n```json\n{valid}\n```\nLet me know if {{anything}} is unclear."
+    yield "cut off", valid[: int(len(valid) * 0.9)]
+    yield "single quotes", repr(answer)
+    yield "trailing commas", valid.replace("]", ",]").replace("}", ",}")
+    yield "inner quotes", valid.replace("system", 'the "legacy" system')
+    yield "open braces", "{" * chars
+    yield "brace per line", "{\n" * (chars // 2)
+    yield "mismatched", "[" * (chars // 2) + "}" * (chars // 2)
+    yield "backslashes", '{"summary": "' + "\\" * chars
+    yield "small objects", '{"x": 1} ' * (chars // 9)
+    yield "prose braces", "{a} " * (chars // 4)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chars", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-max-chars", type=int, default=100_000)
+    args = parser.parse_args()
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+    from app.models.ai import GDPRAnalyzeResponse
+    from app.services.ai_json import parse_model
+
+    defaults = {"summary": "", "risks": [], "recommendations": [], "high_risk": False, "model": "bench"}
+
+    def new_parse(text: str):
+        parsed = parse_model(text, GDPRAnalyzeResponse, defaults=defaults)
+        return parsed.model_dump() if parsed is not None else None
+
+    def timed(parse, text: str):
+        best, result = float("inf"), None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = parse(text)
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, bool(result and result.get("risks"))
+
+    print(f"{'case':<18}{'chars':>8}{'previous ms':>13}{'ok':>4}{'ai_json ms':>12}{'ok':>4}")
+    for name, text in _cases(args.chars):
+        new_ms, new_ok = timed(new_parse, text)
+        if len(text) <= args.legacy_max_chars:
+            old_ms, old_ok = timed(_legacy_parse, text)
+            old = f"{old_ms:>13.2f}{'y' if old_ok else 'n':>4}"
+        else:
+            old = f"{'skipped':>13}{'':>4}"
+        print(f"{name:<18}{len(text):>8}{old}{new_ms:>12.2f}{'y' if new_ok else 'n':>4}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,148 @@
+"""AI provider call latency: a new httpx client per call vs the pooled keep-alive transport.
+
+Starts a local stub provider (HTTP and HTTPS with a throwaway self-signed
+certificate) that answers every request with a small chat completion, then times
+``--requests`` calls each way: sequentially, and ``--concurrency`` at a time.
+The per-call client pays a TCP (and TLS) handshake on every request, as
+``ai_client`` and ``ai_service`` did before ``ai_transport``; the pooled client
+reuses its connections. Each new httpx client also builds an SSL context; with
+the default ``verify=True`` that loads the certifi CA bundle even for plain HTTP,
+which the ``http`` rows include. Loopback has no network round trip, so on a real
+link the saving grows by about one RTT (plain) or two RTTs (TLS 1.3) per call.
+"""
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_BODY = json.dumps({"choices": [{"message": {"content": "pong"}}]}).encode()
+_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(_BODY), _BODY)
+
+
+def _self_signed(directory: str):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as fh:
+        fh.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as fh:
+        fh.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+async def _handle(reader, writer, stats):
+    stats["connections"] += 1
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode().split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            await reader.readexactly(length)
+            writer.write(_RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _timed(call, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+            resp.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+async def _run(args) -> int:
+    import httpx
+
+    from app.services import ai_transport
+
+    payload = {"messages": [{"role": "user", "content": "ping"}], "max_tokens": 16}
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path, key_path = _self_signed(tmp)
+        server_tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_tls.load_cert_chain(cert_path, key_path)
+
+        print(f"{'scheme':<7}{'client':<10}{'conc':>5}{'connections':>13}{'total s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+        for scheme, tls in (("http", None), ("https", server_tls)):
+            stats = {"connections": 0}
+            server = await asyncio.start_server(lambda r, w: _handle(r, w, stats), "127.0.0.1", 0, ssl=tls)
+            url = f"{scheme}://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/chat/completions"
+            verify = cert_path if tls else True
+            spec = ai_transport.provider_spec("local")
+            for concurrency in (1, args.concurrency):
+                async def per_call():
+                    async with httpx.AsyncClient(timeout=spec.timeout, verify=verify) as client:
+                        return await client.post(url, json=payload)
+
+                pooled_client = ai_transport.create_client(spec, verify=verify)
+
+                async def pooled():
+                    return await pooled_client.post(url, json=payload)
+
+                for label, call in (("per-call", per_call), ("pooled", pooled)):
+                    await call()  # warm up (imports, first pooled connection)
+                    stats["connections"] = 0
+                    total, latencies = await _timed(call, args.requests, concurrency)
+                    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+                    print(
+                        f"{scheme:<7}{label:<10}{concurrency:>5}{stats['connections']:>13}{total:>10.3f}"
+                        f"{statistics.median(latencies):>9.2f}{p95:>9.2f}"
+                    )
+                await pooled_client.aclose()
+            server.close()
+            await server.wait_closed()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+"""Recall@k vs latency for the approximate vector indexes against the exact path.
+
+Generates a clustered synthetic corpus (unit vectors around random topic
+centres), computes exact top-k with TenantVectorIndex, then sweeps IVF probe
+counts and LSH candidate budgets. Use the output to pick per-tenant
+``rag_ann`` settings.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.rag_ann import IVFIndex, LSHIndex  # noqa: E402
+from app.services.rag_index import TenantVectorIndex  # noqa: E402
+
+
+def _clustered(n: int, dim: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, size=n)
+    return centres[labels] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def _measure(index: TenantVectorIndex, queries: np.ndarray, truth, top_k: int, exact: bool = False):
+    hits = 0
+    start = time.perf_counter()
+    results = [index.search(q, top_k, exact=exact) for q in queries]
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    for res, expected in zip(results, truth):
+        hits += len({cid for cid, _ in res} & expected)
+    return hits / (len(queries) * top_k), elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall@k vs latency.")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    data = _clustered(args.vectors, args.dim, args.topics, rng)
+    queries = data[rng.choice(args.vectors, size=args.queries, replace=False)] + 0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    chunk_ids = np.arange(1, args.vectors + 1)
+
+    exact = TenantVectorIndex(args.dim)
+    exact.add(chunk_ids, data)
+    truth = [{cid for cid, _ in exact.search(q, args.top_k, exact=True)} for q in queries]
+    _, exact_ms = _measure(exact, queries, truth, args.top_k, exact=True)
+    print(f"vectors={args.vectors} dim={args.dim} k={args.top_k} queries={args.queries}")
+    print(f"{'index':<28}{'recall@k':>10}{'ms/query':>12}{'build s':>10}")
+    print(f"{'exact':<28}{1.0:>10.3f}{exact_ms:>12.3f}{0.0:>10.2f}")
+
+    configs = [("ivf", {"nprobe": p}) for p in (1, 4, 8, 16, 32)]
+    configs += [("lsh", {"bits": b, "n_candidates": c}) for b in (64, 128) for c in (1000, 4000)]
+    for kind, params in configs:
+        ann = IVFIndex(**params) if kind == "ivf" else LSHIndex(**params)
+        index = TenantVectorIndex(args.dim, ann=ann)
+        index.add(chunk_ids, data)
+        start = time.perf_counter()
+        ann.fit(index.matrix)
+        build = time.perf_counter() - start
+        recall, ms = _measure(index, queries, truth, args.top_k)
+        label = kind + " " + " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{label:<28}{recall:>10.3f}{ms:>12.3f}{build:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
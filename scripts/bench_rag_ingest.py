@@ -0,0 +1,102 @@
+"""Measure RAG ingestion throughput (chunks/sec) for rag_service.ingest_document.
+
+Runs against a throwaway SQLite file by default; pass --database-url with a
+Postgres URL (postgresql+asyncpg://...) to benchmark against Postgres. The
+schema is created with SQLAlchemy metadata if it is missing and all rows
+written by the benchmark are removed afterwards.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_WORDS = (
+    "personal data controller processor consent retention erasure access portability "
+    "breach notification safeguards encryption pseudonymisation lawful basis purpose "
+    "limitation minimisation accuracy integrity confidentiality accountability transfer"
+).split()
+
+
+def _make_document(chars: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    section = 1
+    while size < chars:
+        heading = f"# Section {section}\n"
+        body = " ".join(rng.choice(_WORDS) for _ in range(1500)) + "\n"
+        parts.append(heading + body)
+        size += len(heading) + len(body)
+        section += 1
+    return "".join(parts)[:chars]
+
+
+async def _run(database_url: str, chars: int, documents: int) -> int:
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+    from sqlalchemy import delete
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.db.base import Base
+    import app.db.models  # noqa: F401  # register models
+    from app.db.models.tenant import Tenant
+    from app.services import rag_service
+
+    engine = create_async_engine(database_url, echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        tenant = Tenant(name=f"bench-ingest-{int(time.time())}")
+        db.add(tenant)
+        await db.commit()
+        await db.refresh(tenant)
+        tenant_id = tenant.id
+
+        total_chunks = 0
+        elapsed = 0.0
+        try:
+            for i in range(documents):
+                content = _make_document(chars, seed=i)
+                start = time.perf_counter()
+                doc = await rag_service.create_document(db, tenant_id, f"bench-{i}", content, "bench", "en")
+                elapsed += time.perf_counter() - start
+                chunks = await rag_service.list_chunks(db, tenant_id, doc.id)
+                total_chunks += len(chunks)
+        finally:
+            await rag_service.delete_rag_for_tenant(db, tenant_id)
+            await db.execute(delete(Tenant).where(Tenant.id == tenant_id))
+            await db.commit()
+    await engine.dispose()
+
+    backend = database_url.split(":", 1)[0]
+    rate = total_chunks / elapsed if elapsed else 0.0
+    print(f"backend={backend} documents={documents} chars={chars} chunks={total_chunks}")
+    print(f"elapsed={elapsed:.3f}s throughput={rate:.1f} chunks/sec per_document={elapsed / documents * 1000:.1f}ms")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark RAG ingestion throughput.")
+    parser.add_argument("--database-url", default=None, help="Async SQLAlchemy URL (default: temporary SQLite file)")
+    parser.add_argument("--chars", type=int, default=200000, help="Characters per document")
+    parser.add_argument("--documents", type=int, default=5, help="Number of documents to ingest")
+    args = parser.parse_args()
+
+    if args.database_url:
+        return asyncio.run(_run(args.database_url, args.chars, args.documents))
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        return asyncio.run(_run(url, args.chars, args.documents))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
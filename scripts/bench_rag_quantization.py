@@ -0,0 +1,95 @@
+"""Memory, latency and recall@k of quantized vector storage (float16, int8) against exact search.
+
+Generates a clustered synthetic corpus, takes the exact top-k from
+``cosine_similarity`` semantics (float64 over the raw vectors) as ground truth,
+and for each storage mode reports bytes per million vectors, full-scan latency
+and recall@k both for the quantized scores alone and after re-ranking
+``--rerank-factor`` x k candidates with full-precision vectors (as
+``rag_service.search`` does from ``knowledge_embeddings``; the database fetch
+is not timed here). The ``python lists`` row is the legacy path: one list of
+floats per vector scored with ``cosine_similarity``, timed on a sample and
+extrapolated.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.rag_index import TenantVectorIndex  # noqa: E402
+from app.services.rag_pipeline import cosine_similarity  # noqa: E402
+
+_PY_SAMPLE = 2000
+
+
+def _clustered(n: int, dim: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, size=n)
+    return centres[labels] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def _list_bytes(dim: int) -> int:
+    # list header + pointer per item + one float object per item
+    return sys.getsizeof([0.0] * dim) + dim * sys.getsizeof(1.0)
+
+
+def _rerank(full: np.ndarray, query: np.ndarray, candidates, top_k: int):
+    ids = np.fromiter((cid for cid, _ in candidates), dtype=np.int64)
+    scores = full[ids - 1] @ query
+    return ids[np.argsort(scores)[::-1][:top_k]].tolist()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(13)
+    data = _clustered(args.vectors, args.dim, args.topics, rng)
+    queries = data[rng.choice(args.vectors, size=args.queries, replace=False)] + 0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    chunk_ids = np.arange(1, args.vectors + 1)
+    unit = data.astype(np.float64)
+    unit /= np.linalg.norm(unit, axis=1, keepdims=True)
+    truth = [set((np.argsort(unit @ q)[::-1][: args.top_k] + 1).tolist()) for q in queries.astype(np.float64)]
+    full = unit.astype(np.float32)
+
+    sample = [v.tolist() for v in data[:_PY_SAMPLE]]
+    start = time.perf_counter()
+    for q in queries[:5].tolist():
+        sorted((cosine_similarity(q, v) for v in sample), reverse=True)
+    py_ms = (time.perf_counter() - start) / 5 * 1000 * args.vectors / _PY_SAMPLE
+
+    print(f"vectors={args.vectors} dim={args.dim} k={args.top_k} queries={args.queries} rerank x{args.rerank_factor}")
+    print(f"{'storage':<14}{'MiB/1M vec':>12}{'ms/query':>10}{'recall@k':>10}{'+rerank ms':>12}{'recall@k':>10}")
+    print(f"{'python lists':<14}{_list_bytes(args.dim) * 1e6 / 2**20:>12.0f}{py_ms:>10.1f}{1.0:>10.3f}{'-':>12}{'-':>10}")
+    for mode in ("none", "float16", "int8"):
+        index = TenantVectorIndex(args.dim, quantization=mode)
+        index.add(chunk_ids, data)
+        per_million = index.nbytes / args.vectors * 1e6 / 2**20
+        start = time.perf_counter()
+        results = [index.search(q, args.top_k) for q in queries]
+        scan_ms = (time.perf_counter() - start) / args.queries * 1000
+        recall = sum(len({c for c, _ in r} & t) for r, t in zip(results, truth)) / (args.queries * args.top_k)
+        if mode == "none":
+            print(f"{'float32':<14}{per_million:>12.0f}{scan_ms:>10.2f}{recall:>10.3f}{'-':>12}{'-':>10}")
+            continue
+        pool = args.top_k * args.rerank_factor
+        start = time.perf_counter()
+        reranked = [_rerank(full, q / np.linalg.norm(q), index.search(q, pool), args.top_k) for q in queries]
+        rerank_ms = (time.perf_counter() - start) / args.queries * 1000
+        rerank_recall = sum(len(set(r) & t) for r, t in zip(reranked, truth)) / (args.queries * args.top_k)
+        print(f"{mode:<14}{per_million:>12.0f}{scan_ms:>10.2f}{recall:>10.3f}{rerank_ms:>12.2f}{rerank_recall:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""Measure in-memory RAG search latency per tenant index size.
+
+Builds a synthetic tenant corpus (Zipf-distributed vocabulary) directly into
+the in-process vector and BM25 indexes used by rag_service.search, without a
+database, and reports per-query latency for each retrieval path.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.rag_index import TenantVectorIndex  # noqa: E402
+from app.services.rag_lexical import TenantLexicalIndex, reciprocal_rank_fusion  # noqa: E402
+
+
+def _corpus(chunks: int, words: int, vocab: int, rng: np.random.Generator):
+    ranks = rng.zipf(1.3, size=(chunks, words)) % vocab
+    return [" ".join(f"t{w}" for w in row) for row in ranks]
+
+
+def _timed(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark in-memory RAG search paths.")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=120, help="Tokens per synthetic chunk")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    texts = _corpus(args.chunks, args.words, args.vocab, rng)
+    chunk_ids = list(range(1, args.chunks + 1))
+
+    start = time.perf_counter()
+    vectors = TenantVectorIndex(args.dim)
+    vectors.add(chunk_ids, rng.standard_normal((args.chunks, args.dim), dtype=np.float32))
+    vector_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lexical = TenantLexicalIndex()
+    for chunk_id, text in zip(chunk_ids, texts):
+        lexical.add(chunk_id, text)
+    lexical_build = time.perf_counter() - start
+
+    query_vecs = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    # realistic questions mix a few mid-frequency terms with rarer ones
+    query_texts = [" ".join(f"t{w}" for w in rng.integers(20, 5000, size=4)) for _ in range(args.queries)]
+    lexical.search(query_texts[0], args.top_k)  # freeze postings once, as the first live query would
+
+    vector_ms = _timed(lambda q: vectors.search(q, args.top_k), query_vecs)
+    lexical_ms = _timed(lambda q: lexical.search(q, args.top_k), query_texts)
+    hybrid_ms = _timed(
+        lambda i: reciprocal_rank_fusion(vectors.search(query_vecs[i], 20), lexical.search(query_texts[i], 20))[: args.top_k],
+        range(args.queries),
+    )
+
+    print(f"chunks={args.chunks} words/chunk={args.words} vocab={args.vocab} dim={args.dim}")
+    print(f"build: vector={vector_build:.2f}s lexical={lexical_build:.2f}s")
+    print(f"query: vector={vector_ms:.3f}ms lexical={lexical_ms:.3f}ms hybrid={hybrid_ms:.3f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+"""Cold-start time and per-worker memory: tenant index from the database vs a memory-mapped snapshot.
+
+Seeds a throwaway SQLite database with one tenant's chunks and embeddings,
+writes a snapshot, then starts ``--workers`` processes twice: once loading the
+index from ``knowledge_embeddings`` and once from the snapshot. Each worker
+reports its load time and RSS/PSS/private memory (Linux /proc/self/smaps_rollup)
+while all workers hold their index, so PSS shows how much is shared.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_WORDS = (
+    "personal data controller processor consent retention erasure access portability "
+    "breach notification safeguards encryption pseudonymisation lawful basis purpose "
+    "limitation minimisation accuracy integrity confidentiality accountability transfer"
+).split()
+
+
+def _memory_mb() -> dict:
+    values = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {"rss": values["Rss"], "pss": values["Pss"], "private": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+async def _seed(database_url: str, chunks: int, dim: int) -> int:
+    import numpy as np
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.db.base import Base
+    import app.db.models  # noqa: F401  # register models
+    from app.db.models.knowledge_chunk import KnowledgeChunk
+    from app.db.models.knowledge_document import KnowledgeDocument
+    from app.db.models.knowledge_embedding import KnowledgeEmbedding
+    from app.db.models.settings import TenantSetting
+    from app.db.models.tenant import Tenant
+    from app.services.rag_pipeline import DEFAULT_VECTOR_DTYPE, encode_vector
+
+    rng = random.Random(7)
+    vectors = np.random.default_rng(7).standard_normal((chunks, dim)).astype(np.float32)
+    engine = create_async_engine(database_url, echo=False)
+    tables = [m.__table__ for m in (Tenant, TenantSetting, KnowledgeDocument, KnowledgeChunk, KnowledgeEmbedding)]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=tables)
+        tenant_id = (await conn.execute(insert(Tenant).values(name="bench-snapshot").returning(Tenant.id))).scalar_one()
+        per_doc = 50
+        for doc_start in range(0, chunks, per_doc):
+            doc_id = (
+                await conn.execute(
+                    insert(KnowledgeDocument)
+                    .values(tenant_id=tenant_id, title=f"doc-{doc_start}", content="-", language="en")
+                    .returning(KnowledgeDocument.id)
+                )
+            ).scalar_one()
+            ids = range(doc_start, min(doc_start + per_doc, chunks))
+            await conn.execute(
+                insert(KnowledgeChunk),
+                [
+                    {
+                        "id": i + 1,
+                        "tenant_id": tenant_id,
+                        "document_id": doc_id,
+                        "chunk_index": i - doc_start,
+                        "content": " ".join(rng.choice(_WORDS) if rng.random() < 0.8 else f"term{rng.randrange(50000)}" for _ in range(250)),
+                        "checksum": f"{i:064d}",
+                    }
+                    for i in ids
+                ],
+            )
+            await conn.execute(
+                insert(KnowledgeEmbedding),
+                [
+                    {
+                        "tenant_id": tenant_id,
+                        "chunk_id": i + 1,
+                        "document_id": doc_id,
+                        "checksum": f"{i:064d}",
+                        "vector_data": encode_vector(vectors[i]),
+                        "dim": dim,
+                        "dtype": DEFAULT_VECTOR_DTYPE,
+                        "model": "bench",
+                    }
+                    for i in ids
+                ],
+            )
+    await engine.dispose()
+    return tenant_id
+
+
+async def _load(database_url: str, tenant_id: int) -> float:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.services import rag_index
+
+    engine = create_async_engine(database_url, echo=False)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        start = time.perf_counter()
+        index = await rag_index.get_index(db, tenant_id)
+        elapsed = time.perf_counter() - start
+        # touch every vector row, as the first exact query would
+        index.vectors.search(index.vectors.matrix[0], 5, exact=True)
+    await engine.dispose()
+    return elapsed
+
+
+def _worker(database_url: str, tenant_id: int, snapshot_dir, barrier, results) -> None:
+    from app.core.config import settings
+
+    settings.RAG_SNAPSHOT_DIR = snapshot_dir
+    elapsed = asyncio.run(_load(database_url, tenant_id))
+    barrier.wait()
+    results.put({"seconds": elapsed, **_memory_mb()})
+    barrier.wait()
+
+
+def _run_workers(database_url: str, tenant_id: int, snapshot_dir, workers: int) -> list:
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(database_url, tenant_id, snapshot_dir, barrier, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    out = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return out
+
+
+def _report(label: str, rows: list) -> None:
+    mean = {key: sum(r.get(key, 0.0) for r in rows) / len(rows) for key in ("seconds", "rss", "pss", "private")}
+    print(
+        f"{label:<10} startup {mean['seconds'] * 1000:8.1f} ms   RSS {mean['rss']:7.1f} MiB   "
+        f"PSS {mean['pss']:7.1f} MiB   private {mean['private']:7.1f} MiB   (mean of {len(rows)} workers)"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        snapshot_dir = os.path.join(tmp, "snapshots")
+        os.environ.setdefault("SECRET_KEY", "bench-secret")
+        tenant_id = asyncio.run(_seed(database_url, args.chunks, args.dim))
+
+        from app.core.config import settings
+
+        settings.RAG_SNAPSHOT_DIR = snapshot_dir
+        start = time.perf_counter()
+        asyncio.run(_load(database_url, tenant_id))
+        print(f"{args.chunks} chunks x {args.dim} dims; built and wrote snapshot in {time.perf_counter() - start:.2f}s")
+
+        _report("database", _run_workers(database_url, tenant_id, None, args.workers))
+        _report("snapshot", _run_workers(database_url, tenant_id, snapshot_dir, args.workers))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
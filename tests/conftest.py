@@ -141,6 +141,19 @@ def setup_test_db_override(request):
         ai_module._rate_limit_state.clear()
     except Exception:
         pass
+    try:
+        from app.services import ai_bulkhead, ai_resilience, ai_response_cache, ai_router, ai_usage, answer_cache, embedding_client, rag_index
+
+        rag_index.reset_indexes()
+        embedding_client.reset_embedding_metrics()
+        answer_cache.reset_answer_cache()
+        ai_resilience.reset_resilience()
+        ai_bulkhead.reset_bulkhead()
+        ai_usage.reset_usage()
+        ai_router.reset_router()
+        ai_response_cache.reset_response_cache()
+    except Exception:
+        pass
 
     async def test_get_db():
         async with TestAsyncSession() as session:
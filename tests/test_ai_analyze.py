@@ -9,7 +9,7 @@ client = TestClient(app)
 @pytest.fixture(autouse=True)
 def patch_ai_service(monkeypatch):
     # monkeypatch the analyze_gdpr_text service to avoid calling the real Ollama instance in tests
-    async def fake_analyze(text: str):
+    async def fake_analyze(text: str, tenant_id=None):
         return {
             "summary": "Kort sammanfattning",
             "risks": ["Risk 1", "Risk 2"],
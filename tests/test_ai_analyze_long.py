@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services import ai_service
+from main import app
+from tests.utils import create_tenant_and_user
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, body: dict):
+        self.text = json.dumps({"choices": [{"message": {"content": json.dumps(body)}}]})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+@pytest.fixture(autouse=True)
+def openai_configured(monkeypatch):
+    # the analyze route skips providers without credentials
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+
+
+def _document(sections: int) -> str:
+    return "\n".join(
+        f"# Section {i}\n" + " ".join(f"Customer records of section {i} are stored in the CRM system." for _ in range(60))
+        for i in range(sections)
+    )
+
+
+def test_merge_analyses_dedupes_and_ranks_by_mentions():
+    parts = [
+        {"summary": "Part one.", "risks": ["No DPA with vendor", "Excessive retention"], "recommendations": ["Sign a DPA."], "high_risk": False},
+        {"summary": "Part two.", "risks": ["Excessive retention.", "Unencrypted backups"], "recommendations": ["sign a DPA"], "high_risk": True},
+        {"summary": "part one", "risks": ["excessive  RETENTION"], "recommendations": [], "high_risk": False},
+    ]
+    merged = ai_service.merge_analyses(parts)
+    assert merged["summary"] == "Part one. Part two."
+    assert merged["risks"] == ["Excessive retention", "No DPA with vendor", "Unencrypted backups"]
+    assert merged["recommendations"] == ["Sign a DPA."]
+    assert merged["high_risk"] is True
+
+
+@pytest.mark.asyncio
+async def test_long_input_is_analyzed_in_concurrent_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ANALYZE_LONG_INPUT", True)
+    monkeypatch.setattr(settings, "AI_ANALYZE_CHUNK_TOKENS", 400)
+    monkeypatch.setattr(settings, "AI_ANALYZE_CONCURRENCY", 3)
+    prompts = []
+    running = {"now": 0, "max": 0}
+
+    async def fake_post(self, url, json=None, headers=None):
+        prompt = json["messages"][0]["content"]
+        prompts.append(prompt)
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        section = prompt.split("TEXT:\n", 1)[1].split("\n", 1)[0]
+        return _Resp(
+            {
+                "summary": f"About {section}.",
+                "risks": ["CRM retention is undefined", f"Risk in {section}"],
+                "recommendations": ["Define a retention period."],
+                "high_risk": section == "Section 3",
+                "model": "stub",
+            }
+        )
+
+    monkeypatch.setattr("httpx.AsyncClient.post", fake_post)
+    text = _document(6)
+    assert len(text) > 6 * 400 * 4
+    result = await ai_service.analyze_gdpr_text(text, tenant_id=1)
+
+    assert len(prompts) >= 6 and running["max"] == 3
+    assert all("del " in prompt and "TEXT:\nSection " in prompt for prompt in prompts)
+    assert result["risks"][0] == "CRM retention is undefined"
+    assert {f"Risk in Section {i}" for i in range(6)} <= set(result["risks"])
+    assert result["recommendations"] == ["Define a retention period."]
+    assert result["high_risk"] is True
+    assert result["summary"].startswith("About Section 0. About Section 1.")
+
+
+@pytest.mark.asyncio
+async def test_long_input_with_an_oversize_word_finishes(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ANALYZE_LONG_INPUT", True)
+    monkeypatch.setattr(settings, "AI_ANALYZE_CHUNK_TOKENS", 2000)
+    prompts = []
+
+    async def fake_post(self, url, json=None, headers=None):
+        prompts.append(json["messages"][0]["content"])
+        return _Resp({"summary": "ok", "risks": [], "recommendations": [], "high_risk": False, "model": "stub"})
+
+    monkeypatch.setattr("httpx.AsyncClient.post", fake_post)
+    text = "Attachment: " + "x" * 9000 + " ends here."
+    await asyncio.wait_for(ai_service.analyze_gdpr_text(text), timeout=10)
+    parts = [prompt.split("TEXT:\n", 1)[1].split("\n\nUppdrag:", 1)[0] for prompt in prompts]
+    assert len(parts) == 4 and "".join(parts).count("x") == 9000
+    assert all(len(part) <= 2000 * 4 for part in parts)
+
+    chunks = ai_service._long_input_chunks("x" * 20000)
+    assert [len(chunk) for chunk in chunks] == [8000, 8000, 4000]
+
+
+@pytest.mark.asyncio
+async def test_long_input_mode_off_sends_one_truncated_prompt(monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_INPUT_CHARS", 2000)
+    prompts = []
+
+    async def fake_post(self, url, json=None, headers=None):
+        prompts.append(json["messages"][0]["content"])
+        return _Resp({"summary": "ok", "risks": [], "recommendations": [], "high_risk": False, "model": "stub"})
+
+    monkeypatch.setattr("httpx.AsyncClient.post", fake_post)
+    await ai_service.analyze_gdpr_text(_document(6))
+    assert len(prompts) == 1 and "Section 1 are stored" not in prompts[0]
+
+
+def test_route_accepts_long_input_only_in_long_document_mode(monkeypatch):
+    seen = {}
+
+    async def fake_analyze(text: str, tenant_id=None):
+        seen["chars"], seen["tenant_id"] = len(text), tenant_id
+        return {"summary": "ok", "risks": [], "recommendations": [], "high_risk": False, "model": "m"}
+
+    monkeypatch.setattr("app.api.routes.ai.analyze_gdpr_text", fake_analyze)
+    tenant_id, user_id, _ = create_tenant_and_user()
+    headers = {"x-tenant-id": str(tenant_id), "x-user-id": str(user_id)}
+    text = "x " * 40000
+    with TestClient(app) as client:
+        assert client.post("/api/ai/gdpr/analyze", json={"text": text}, headers=headers).status_code == 400
+        monkeypatch.setattr(settings, "AI_ANALYZE_LONG_INPUT", True)
+        assert client.post("/api/ai/gdpr/analyze", json={"text": text}, headers=headers).status_code == 200
+    assert seen == {"chars": len(text), "tenant_id": tenant_id}
@@ -77,3 +77,17 @@ def test_audit_tenant_isolation():
     history = client.get("/api/ai/audit/history")
     assert history.status_code == 200
     assert history.json()["total"] == 0
+
+
+def test_audit_run_v2_returns_assessment_and_persists_run():
+    tenant_id, user_id = create_tenant_user(role="owner")
+    headers = {"x-tenant-id": str(tenant_id), "x-user-id": str(user_id)}
+
+    resp = client.post("/api/ai/audit/run-v2", json={"context": "CRM and payroll systems"}, headers=headers)
+    assert resp.status_code == 200
+    assert 0 <= resp.json()["overall_score"] <= 100 and resp.json()["areas"]
+
+    conn = sqlite3.connect("dev.db", timeout=5)
+    rows = conn.execute("SELECT overall_score FROM audit_runs WHERE tenant_id = ?", (tenant_id,)).fetchall()
+    conn.close()
+    assert rows == [(resp.json()["overall_score"],)]
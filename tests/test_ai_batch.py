@@ -0,0 +1,82 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services import ai_client
+from main import app
+from tests.utils import create_tenant_and_user
+
+
+def _lines(body: str):
+    return [json.loads(line) for line in body.strip().split("\n")]
+
+
+def _audit_rows(tenant_id):
+    conn = sqlite3.connect("dev.db", timeout=5)
+    rows = conn.execute("SELECT meta FROM audit_logs WHERE tenant_id = ? AND entity_type = 'ai_call'", (tenant_id,)).fetchall()
+    conn.close()
+    return [json.loads(meta) for (meta,) in rows]
+
+
+def test_batch_streams_heterogeneous_results_and_audits_once():
+    tenant_id, user_id, _ = create_tenant_and_user()
+    headers = {"x-tenant-id": str(tenant_id), "x-user-id": str(user_id)}
+    items = [
+        {"op": "summarize", "id": "a", "payload": {"text": "Access logs are kept for 90 days."}},
+        {"op": "explain", "id": "b", "payload": {"text": "Article 30 records."}},
+        {"op": "risk/evaluate", "id": "c", "payload": {"processing_description": "CCTV in the lobby"}},
+        {"op": "dpia/generate", "id": "d", "payload": {"system_name": "CRM"}},
+        {"op": "audit/run-v2", "id": "e", "payload": {}},
+    ]
+    with TestClient(app) as client:
+        resp = client.post("/api/ai/batch", json={"items": items}, headers=headers)
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(resp.text)
+    done = lines.pop()
+    assert done["done"] is True and (done["total"], done["succeeded"], done["failed"]) == (5, 3, 2)
+    by_id = {line["id"]: line for line in lines}
+    assert sorted(by_id) == ["a", "b", "c", "d", "e"]
+    assert by_id["a"]["status"] == 200 and by_id["a"]["result"]["summary"].startswith("Stubbed response")
+    assert by_id["c"]["result"]["overall_risk"] and by_id["c"]["index"] == 2
+    # invalid payloads and unknown operations fail on their own, without a provider call
+    assert by_id["d"]["status"] == 422 and by_id["d"]["error"][0]["loc"] == ["processing_activity"]
+    assert by_id["e"]["status"] == 400
+
+    audits = _audit_rows(tenant_id)
+    assert [(a["endpoint"], a["status"]) for a in audits] == [("/api/ai/batch", "error")]
+
+
+def test_batch_fans_out_items_concurrently(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER", "ollama")
+    monkeypatch.setattr(settings, "AI_TENANT_MAX_CONCURRENCY", 8)
+    monkeypatch.setattr(settings, "AI_BATCH_CONCURRENCY", 8)
+    peak = {"now": 0, "max": 0}
+
+    async def slow_call(messages, usage):
+        peak["now"] += 1
+        peak["max"] = max(peak["max"], peak["now"])
+        await asyncio.sleep(0.2)
+        peak["now"] -= 1
+        return json.dumps({"summary": messages[-1]["content"].upper()})
+
+    monkeypatch.setattr(ai_client, "_call_ollama", slow_call)
+    tenant_id, user_id, _ = create_tenant_and_user()
+    headers = {"x-tenant-id": str(tenant_id), "x-user-id": str(user_id)}
+    items = [{"op": "summarize", "id": str(i), "payload": {"text": f"item {i}"}} for i in range(12)]
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        resp = client.post("/api/ai/batch", json={"items": items}, headers=headers)
+        elapsed = time.perf_counter() - start
+        too_many = client.post("/api/ai/batch", json={"items": items * 5}, headers=headers)
+
+    lines = _lines(resp.text)
+    assert lines[-1]["succeeded"] == 12
+    assert {line["result"]["summary"] for line in lines[:-1]} == {f"ITEM {i}" for i in range(12)}
+    # 12 items of 200 ms, 8 at a time: two rounds rather than twelve
+    assert peak["max"] == 8
+    assert elapsed < 1.2
+    assert too_many.status_code == 400
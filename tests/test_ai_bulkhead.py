@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services import ai_bulkhead, ai_client
+
+
+async def _hold(tenant_id, release: asyncio.Event, log: list):
+    async with ai_bulkhead.admit(tenant_id):
+        log.append(tenant_id)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_tenant_limit_queues_without_blocking_other_tenants(monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_CONCURRENCY", 10)
+    monkeypatch.setattr(settings, "AI_TENANT_MAX_CONCURRENCY", 2)
+    release, log = asyncio.Event(), []
+    noisy = [asyncio.ensure_future(_hold(1, release, log)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert log == [1, 1]
+
+    other = asyncio.ensure_future(_hold(2, release, log))
+    await asyncio.sleep(0)
+    assert log == [1, 1, 2]
+    status = ai_bulkhead.bulkhead_status(1)
+    assert status["in_flight"] == 3 and status["queued"] == 3
+    assert status["tenant"] == {"in_flight": 2, "queued": 3}
+
+    release.set()
+    await asyncio.wait_for(asyncio.gather(*noisy, other), timeout=1)
+    status = ai_bulkhead.bulkhead_status()
+    assert status["in_flight"] == 0 and status["queued"] == 0
+    assert status["admitted"] == 6 and status["queued_total"] == 3
+    assert status["wait_ms"]["max"] is not None
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_expired_wait_are_rejected_with_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "AI_TENANT_QUEUE_MAX_DEPTH", 1)
+    monkeypatch.setattr(settings, "AI_QUEUE_MAX_DEPTH", 2)
+    monkeypatch.setattr(settings, "AI_QUEUE_TIMEOUT_SECONDS", 0.05)
+    release, log = asyncio.Event(), []
+    holder = asyncio.ensure_future(_hold(1, release, log))
+    await asyncio.sleep(0)
+    waiting = asyncio.ensure_future(_hold(1, release, log))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc:
+        await _hold(1, release, log)
+    assert exc.value.status_code == 429 and int(exc.value.headers["Retry-After"]) >= 1
+
+    with pytest.raises(HTTPException) as exc:
+        await _hold(2, release, log)
+    assert exc.value.status_code == 503
+
+    with pytest.raises(HTTPException) as exc:
+        await waiting
+    assert exc.value.status_code == 503 and "timed out" in exc.value.detail
+    release.set()
+    await asyncio.wait_for(holder, timeout=1)
+    status = ai_bulkhead.bulkhead_status()
+    assert status["rejected"] == {"tenant_queue_full": 1, "queue_full": 0, "timeout": 2}
+    assert status["in_flight"] == 0 and status["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_plan_weights_share_freed_slots(monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "AI_TENANT_MAX_CONCURRENCY", 0)
+    monkeypatch.setattr(settings, "AI_PLAN_WEIGHTS", "free:1,pro:3")
+    plans = {1: "free", 2: "pro", 3: "free"}
+
+    async def tenant_plan(tenant_id):
+        return plans[tenant_id]
+
+    monkeypatch.setattr(ai_bulkhead, "_tenant_plan", tenant_plan)
+    gate, log = asyncio.Event(), []
+    holder = asyncio.ensure_future(_hold(3, gate, log))
+    await asyncio.sleep(0)
+    # queued behind the holder; each releases its slot as soon as it gets one
+    released = asyncio.Event()
+    released.set()
+    waiters = []
+    for tenant_id in (1, 1, 1, 1, 2, 2, 2, 2):
+        waiters.append(asyncio.ensure_future(_hold(tenant_id, released, log)))
+        await asyncio.sleep(0)
+    gate.set()
+    await asyncio.wait_for(asyncio.gather(holder, *waiters), timeout=1)
+    # pro (weight 3) gets three slots for every free one while both wait
+    assert log[1:6] == [2, 2, 1, 2, 2]
+
+
+@pytest.mark.asyncio
+async def test_provider_calls_take_a_bulkhead_slot(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER", "ollama")
+    monkeypatch.setattr(settings, "AI_TENANT_MAX_CONCURRENCY", 1)
+    running = []
+
+    async def fake_call(messages, usage):
+        running.append(ai_bulkhead.bulkhead_status(7)["tenant"]["in_flight"])
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    monkeypatch.setattr(ai_client, "_call_ollama", fake_call)
+    messages = [{"role": "user", "content": "hi"}]
+    results = await asyncio.gather(*(ai_client.ai_chat_completion(messages, tenant_id=7) for _ in range(3)))
+    assert results == ["ok"] * 3 and running == [1, 1, 1]
+    status = ai_bulkhead.bulkhead_status()
+    assert status["admitted"] == 3 and status["queued_total"] == 2
+
+    # the offline stub needs no slot
+    monkeypatch.setattr(settings, "AI_PROVIDER", "openai")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    await ai_client.ai_chat_completion(messages, tenant_id=7)
+    assert ai_bulkhead.bulkhead_status()["admitted"] == 3
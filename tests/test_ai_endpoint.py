@@ -21,7 +21,7 @@ def test_ollama_health_real():
 
 def test_analyze_rate_limit_and_input(monkeypatch):
     # monkeypatch analyze_gdpr_text to avoid real model and to speed up
-    async def fake_analyze(text: str):
+    async def fake_analyze(text: str, tenant_id=None):
         return {
             "summary": "Kort",
             "risks": ["R1"],
@@ -95,7 +95,7 @@ def test_ai_audit_input_privacy(monkeypatch):
     conn.commit()
     conn.close()
 
-    async def fake_analyze(text: str):
+    async def fake_analyze(text: str, tenant_id=None):
         return {
             "summary": "Kort",
             "risks": ["R1"],
@@ -147,7 +147,7 @@ def test_ai_audit_input_privacy(monkeypatch):
     assert len(meta['input_text']) <= 10
     conn.close()
 
-    async def fake_analyze(text: str):
+    async def fake_analyze(text: str, tenant_id=None):
         return {
             "summary": "Kort",
             "risks": ["R1"],
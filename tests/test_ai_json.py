@@ -0,0 +1,144 @@
+import json
+import random
+import time
+
+import pytest
+
+from app.models.ai import GDPRAnalyzeResponse
+from app.schemas.ai_suite import AIIncidentClassifyResponse
+from app.services import ai_service, ai_suite_service
+from app.services.ai_json import extract_json, iter_json, parse_model
+
+_ANSWER = {
+    "summary": "Customer data is kept in the CRM.",
+    "risks": ["No retention period", "Vendor without a DPA"],
+    "recommendations": ["Define retention.", "Sign a DPA."],
+    "high_risk": False,
+}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('Here you go:\n```json\n{"a": 1, "b": [1, 2]}\n```\nAnything else?', {"a": 1, "b": [1, 2]}),
+        ('{"a": [1, 2,], "b": "x",}', {"a": [1, 2], "b": "x"}),
+        ("{'a': 'it\\'s', 'b': True, 'c': None}", {"a": "it's", "b": True, "c": None}),
+        ('{a: "x", b: ["y" "z"] c: high}', {"a": "x", "b": ["y", "z"], "c": "high"}),
+        ('{"a": "x"\n "b": 1 "c": 2}', {"a": "x", "b": 1, "c": 2}),
+        ('{"a": // note\n 1, /* gone */ "b": 2}', {"a": 1, "b": 2}),
+        ('{"a": [1, 2}', {"a": [1, 2]}),
+        ('{"a": "line one\nline two"}', {"a": "line one\nline two"}),
+        ('{"a": "x {not} [a] bracket", "b": "\\"q\\""}', {"a": "x {not} [a] bracket", "b": '"q"'}),
+        ('{"a": "He said "no" twice", "b": "C:\\Users \\d"}', {"a": 'He said "no" twice', "b": "C:\\Users \\d"}),
+        ('{"a": "cut off', {"a": "cut off"}),
+        ('{"a": ["one", "tw', {"a": ["one", "tw"]}),
+        ('{"a": 1, "b"', {"a": 1}),
+    ],
+)
+def test_extract_json_repairs_common_defects(text, expected):
+    assert extract_json(text) == expected
+
+
+def test_stray_brackets_do_not_hide_the_answer():
+    text = "Use {placeholders] like {this and then:\n" + json.dumps(_ANSWER) + "\nDone }"
+    assert parse_model(text, GDPRAnalyzeResponse, defaults={"model": "m"}).risks == _ANSWER["risks"]
+    assert list(iter_json("] } no json here")) == []
+
+
+def test_parse_model_skips_unrelated_and_invalid_objects():
+    text = 'Example: {"name": "x"}. Draft: {"severity": "severe"}. Final: {"severity": "high", "likely_causes": ["phishing"]}'
+    fallback = {"severity": "medium", "likely_causes": [], "recommended_actions": ["Contain"], "regulatory_obligations": "Notify"}
+    parsed = parse_model(text, AIIncidentClassifyResponse, defaults=fallback)
+    assert (parsed.severity, parsed.likely_causes, parsed.recommended_actions) == ("high", ["phishing"], ["Contain"])
+    assert parse_model('{"severity": "severe"}', AIIncidentClassifyResponse, defaults=fallback) is None
+
+
+def test_analysis_uses_json_without_model_field():
+    text = "Analysis follows.\n" + json.dumps({**_ANSWER, "high_risk": "yes"})[:-1] + ",}"
+    result = ai_service._parse_analysis(text)
+    assert result["summary"] == _ANSWER["summary"] and result["risks"] == _ANSWER["risks"]
+    assert result["high_risk"] is True and result["model"]
+    sections = ai_service._parse_analysis("SUMMARY: Plain text.\nRISKS:\n- One\nHIGH_RISK: no")
+    assert (sections["summary"], sections["risks"], sections["high_risk"]) == ("Plain text.", ["One"], False)
+
+
+def test_suite_results_fall_back_on_invalid_output():
+    assert ai_suite_service.summarize_result('Sure. {"summary": "Short."} Hope it helps').summary == "Short."
+    assert ai_suite_service.summarize_result("Plain {text} answer").summary == "Plain {text} answer"
+
+
+def _mutate(rng: random.Random, text: str) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        pos = rng.randrange(len(chars) + 1)
+        op = rng.random()
+        if op < 0.4 and pos < len(chars):
+            del chars[pos]
+        elif op < 0.8:
+            chars.insert(pos, rng.choice('{}[]",:\'\\ \nax1'))
+        else:
+            del chars[pos:]
+    return "".join(chars)
+
+
+def test_fuzzed_outputs_never_raise():
+    rng = random.Random(22)
+    base = "Result:\n" + json.dumps(_ANSWER, indent=2)
+    for _ in range(2000):
+        text = _mutate(rng, base)
+        list(iter_json(text))
+        assert set(ai_service._parse_analysis(text)) == {"summary", "risks", "recommendations", "high_risk", "model"}
+
+
+def _defective_answer(rng: random.Random) -> tuple:
+    words = ["data", "vendor", "retention", "backup", "consent", "CRM", "it's", 'the "legacy" system', "C:\\share"]
+    answer = {
+        "summary": " ".join(rng.choices(words, k=rng.randint(3, 12))),
+        "risks": [" ".join(rng.choices(words, k=rng.randint(2, 6))) for _ in range(rng.randint(1, 6))],
+        "recommendations": [" ".join(rng.choices(words, k=3)) for _ in range(rng.randint(0, 4))],
+        "high_risk": rng.random() < 0.5,
+    }
+    text = repr(answer) if rng.random() < 0.3 else json.dumps(answer, indent=rng.choice([None, 2]))
+    if rng.random() < 0.3:
+        text = text.replace('\\"', '"')  # unescaped inner quotes
+    if rng.random() < 0.3:
+        text = text.replace("]", ",]").replace("}", ",}")
+    if rng.random() < 0.3:
+        text = text.replace('"recommendations"', "recommendations").replace('"high_risk"', "high_risk")
+    if rng.random() < 0.3:
+        # cut off after the risks, in the middle of whatever follows
+        end = text.index("]", text.index("risks")) + 1
+        text = "Here is the analysis:\n```json\n" + text[: rng.randint(end, len(text) - 1)]
+    elif rng.random() < 0.5:
+        text = rng.choice(["Here is the analysis:\n```json\n{}\n```", "Use {{ and }} carefully. {}\nDone.", "{} {{}}"]).format(text)
+    return text, answer["risks"]
+
+
+def test_fuzzed_common_defects_are_repaired():
+    rng = random.Random(2022)
+    for _ in range(2000):
+        text, risks = _defective_answer(rng)
+        assert ai_service._parse_analysis(text)["risks"] == risks, text
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "{" * 20000,
+        "{\n" * 10000,
+        "[" * 10000 + "}" * 10000,
+        "[" * 10000 + "]" * 10000,
+        '{"a": "' + "\\" * 20000,
+        '{"a": ' + "'" * 20000,
+        "{a} " * 5000,
+        '{"x": 1} ' * 2200,
+        "{ " + '{"summary": 1} ' * 1250,
+        "/*" * 10000,
+        '{"summary": "' + "x" * 20000,
+    ],
+)
+def test_adversarial_outputs_parse_in_linear_time(text):
+    start = time.perf_counter()
+    parse_model(text, GDPRAnalyzeResponse, defaults={"model": "m"})
+    # the previous regex took seconds on the first two; linear scanning takes milliseconds
+    assert time.perf_counter() - start < 1.0
@@ -1,7 +1,7 @@
 import json
 import pytest
 
-from app.services import ai_service
+from app.services import ai_resilience, ai_service
 
 
 class _DummyResponse:
@@ -16,8 +16,7 @@ class _DummyResponse:
 @pytest.mark.asyncio
 async def test_analyze_uses_ollama_provider(monkeypatch):
     # reset circuit state
-    ai_service._cb_failure_count = 0
-    ai_service._cb_open_since = None
+    ai_resilience.reset_resilience()
 
     captured = {}
     monkeypatch.setattr(ai_service.settings, "AI_PROVIDER", "ollama")
@@ -46,7 +46,7 @@ def test_generate_policy_returns_content(monkeypatch):
     tenant_id, user_id = create_user(role="admin")
     override_user(user_id, tenant_id, "admin")
 
-    async def fake_chat(messages, tenant_id=None):
+    async def fake_chat(messages, tenant_id=None, endpoint=None):
         return "Privacy Policy\nThis is a short summary. More details. Thank you.\nFull content section."
 
     monkeypatch.setattr("app.services.ai_client.ai_chat_completion", fake_chat)
@@ -58,7 +58,7 @@ def test_ai_answer_returns_sources(monkeypatch):
             (0.5, Chunk(2, "Another snippet"), None),
         ]
 
-    async def fake_chat(messages, tenant_id=None):
+    async def fake_chat(messages, tenant_id=None, endpoint=None):
         return "Here is your answer based on context."
 
     monkeypatch.setattr("app.services.rag_service.search", fake_search)
@@ -0,0 +1,142 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services import ai_client, ai_resilience
+from main import app
+from tests.utils import FakeClock
+
+
+def test_breaker_half_open_admits_one_probe(monkeypatch):
+    monkeypatch.setattr(settings, "AI_CB_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "AI_CB_COOLDOWN_SECONDS", 10)
+    clock = FakeClock()
+    cb = ai_resilience.CircuitBreaker("openai", clock=clock)
+    cb.record_failure("boom")
+    assert cb.state == "closed"
+    cb.record_failure("boom")
+    assert cb.state == "open"
+    with pytest.raises(ai_resilience.CircuitOpenError) as exc:
+        cb.acquire()
+    assert exc.value.retry_after == 10
+
+    clock.now += 10
+    assert cb.state == "half_open"
+    assert cb.acquire() is True
+    # a second caller is rejected while the probe is out
+    with pytest.raises(ai_resilience.CircuitOpenError):
+        cb.acquire()
+    cb.record_failure("still down", probe=True)
+    assert cb.state == "open" and cb.probes_in_flight == 0
+
+    clock.now += 10
+    assert cb.acquire() is True
+    cb.record_success(probe=True)
+    assert cb.state == "closed" and cb.failure_count == 0
+    assert cb.acquire() is False
+
+
+@pytest.mark.asyncio
+async def test_call_retries_transient_errors_only(monkeypatch):
+    monkeypatch.setattr(settings, "AI_RETRY_BACKOFF_SECONDS", 0.0)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ai_resilience.ProviderStatusError(503, "busy")
+        return "ok"
+
+    assert await ai_resilience.call("openai", flaky, attempts=2) == "ok"
+    assert len(calls) == 3
+
+    async def rejected():
+        calls.append(1)
+        raise ai_resilience.ProviderStatusError(400, "bad request")
+
+    calls.clear()
+    with pytest.raises(ai_resilience.ProviderStatusError):
+        await ai_resilience.call("openai", rejected, attempts=2)
+    assert len(calls) == 1
+    # a rejected request says nothing about provider health
+    assert ai_resilience.breaker("openai").failure_count == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_caps_retries_during_outage(monkeypatch):
+    monkeypatch.setattr(settings, "AI_RETRY_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "AI_RETRY_BUDGET_RATIO", 0.0)
+    monkeypatch.setattr(settings, "AI_RETRY_BUDGET_MIN_RETRIES", 2)
+    monkeypatch.setattr(settings, "AI_CB_FAILURE_THRESHOLD", 100)
+    calls = []
+
+    async def down():
+        calls.append(1)
+        raise httpx.ConnectError("refused")
+
+    for _ in range(3):
+        with pytest.raises(httpx.ConnectError):
+            await ai_resilience.call("ollama", down, attempts=3)
+    # three calls, but only two retries between them
+    assert len(calls) == 5
+    budget = ai_resilience.retry_budget().status()
+    assert budget["retries"] == 2 and budget["remaining"] == 0 and budget["denied"] == 3
+    assert ai_resilience.breaker("ollama").failure_count == 3
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_second_attempt_wins(monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_SAMPLES", 5)
+    for _ in range(5):
+        await ai_resilience.call("openai", lambda: asyncio.sleep(0.01, result="warm"))
+    delay = ai_resilience.hedge_delay("openai")
+    assert delay is not None and delay < 0.5
+
+    calls = []
+
+    async def send():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+            return "slow"
+        return "fast"
+
+    assert await asyncio.wait_for(ai_resilience.call("openai", send), timeout=2) == "fast"
+    hedging = ai_resilience.circuit_status()["hedging"]["providers"]["openai"]
+    assert hedging["hedges"] == 1 and hedging["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_client_open_circuit_is_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER", "ollama")
+    monkeypatch.setattr(settings, "AI_CB_FAILURE_THRESHOLD", 1)
+    ai_resilience.record_failure("ollama", "down")
+    with pytest.raises(HTTPException) as exc:
+        await ai_client.ai_chat_completion([{"role": "user", "content": "hi"}])
+    assert exc.value.status_code == 503
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+
+def test_circuit_endpoint_lists_providers_and_resets_one(monkeypatch):
+    monkeypatch.setattr(settings, "AI_CB_FAILURE_THRESHOLD", 1)
+    ai_resilience.record_failure("ollama", "down")
+    ai_resilience.record_failure("openai", "down")
+    token = create_access_token({"sub": "3", "tenant_id": 1, "role": "admin"})
+    with TestClient(app) as client:
+        status = client.get("/api/ai/circuit").json()
+        assert set(status["providers"]) == {"openai", "local", "ollama"}
+        assert status["providers"]["ollama"]["state"] == "open"
+        assert "retry_budget" in status and status["hedging"]["enabled"] is False
+        assert len(client.get("/api/ai/circuit/history").json()["history"]) == 2
+
+        reset = client.post("/api/ai/circuit/reset", params={"provider": "ollama"}, headers={"Authorization": f"Bearer {token}"})
+        assert reset.status_code == 200
+        status = client.get("/api/ai/circuit").json()
+    assert status["providers"]["ollama"]["state"] == "closed"
+    assert status["providers"]["openai"]["state"] == "open"
@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.schemas.ai_suite import AIExplainRequest, AITomsRecommendRequest
+from app.services import ai_client, ai_response_cache, ai_suite_service
+from main import app
+from tests.utils import create_tenant_and_user
+
+
+def _fake_provider(monkeypatch, delay: float = 0.0):
+    calls = []
+
+    async def fake_chat(messages, tenant_id=None, endpoint=None):
+        calls.append((tenant_id, endpoint))
+        await asyncio.sleep(delay)
+        return '{"explanation": "Article 17 is the right to erasure."}'
+
+    monkeypatch.setattr(ai_client, "ai_chat_completion", fake_chat)
+    monkeypatch.setattr(settings, "AI_RESPONSE_CACHE_ENABLED", True)
+    return calls
+
+
+def test_key_ignores_whitespace_but_not_operation_model_or_temperature():
+    messages = [{"role": "user", "content": "Explain  Article 17\n"}]
+    key = ai_response_cache.cache_key("explain", "gpt", 0.3, messages)
+    assert key == ai_response_cache.cache_key("explain", "gpt", 0.3, [{"role": "User", "content": " Explain Article 17"}])
+    assert key != ai_response_cache.cache_key("summarize", "gpt", 0.3, messages)
+    assert key != ai_response_cache.cache_key("explain", "llama", 0.3, messages)
+    assert key != ai_response_cache.cache_key("explain", "gpt", 0.7, messages)
+    assert key != ai_response_cache.cache_key("explain", "gpt", 0.3, [{"role": "user", "content": "Explain Article 18"}])
+
+
+def test_ttls_per_operation(monkeypatch):
+    monkeypatch.setattr(settings, "AI_RESPONSE_CACHE_TTL_SECONDS", 600)
+    monkeypatch.setattr(settings, "AI_RESPONSE_CACHE_TTLS", "explain=604800; /risk/evaluate=0;mapping=soon")
+    assert ai_response_cache.ttls() == {"explain": 604800, "risk/evaluate": 0}
+    assert ai_response_cache.ttl_for(ai_response_cache.operation("/api/ai/explain")) == 604800
+    assert ai_response_cache.ttl_for("mapping") == 600
+
+
+@pytest.mark.asyncio
+async def test_repeats_are_served_from_memory_then_table_per_tenant(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    other_id, _, _ = create_tenant_and_user()
+    calls = _fake_provider(monkeypatch, delay=0.01)
+    payload = AIExplainRequest(text="Article 17")
+
+    first = await ai_suite_service.explain_text(tenant_id, payload)
+    second = await ai_suite_service.explain_text(tenant_id, AIExplainRequest(text="Article  17 "))
+    assert first == second and len(calls) == 1
+    await ai_suite_service.explain_text(other_id, payload)
+    assert calls == [(tenant_id, "/api/ai/explain"), (other_id, "/api/ai/explain")]
+
+    # a new process: the memory tier is empty, the table still has the entry
+    ai_response_cache._memory = None
+    assert await ai_suite_service.explain_text(tenant_id, payload) == first
+    assert len(calls) == 2
+
+    stats = ai_response_cache.cache_stats(tenant_id)
+    assert (stats["lookups"], stats["memory_hits"], stats["db_hits"], stats["misses"]) == (3, 1, 1, 1)
+    assert stats["hit_ratio"] == round(2 / 3, 4) and stats["saved_latency_ms"] >= 20
+    assert [op["operation"] for op in stats["operations"]] == ["explain"]
+    assert ai_response_cache.cache_stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_completion(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    calls = _fake_provider(monkeypatch, delay=0.05)
+    payload = AITomsRecommendRequest(systems=["CRM"])
+    await asyncio.gather(*(ai_suite_service.recommend_toms(tenant_id, payload) for _ in range(5)))
+    assert len(calls) == 1
+    assert ai_response_cache.cache_stats(tenant_id)["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_disabled_operations_and_expired_rows_call_the_provider(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    calls = _fake_provider(monkeypatch)
+    monkeypatch.setattr(settings, "AI_RESPONSE_CACHE_TTLS", "explain=0")
+    payload = AIExplainRequest(text="Article 5")
+    await ai_suite_service.explain_text(tenant_id, payload)
+    await ai_suite_service.explain_text(tenant_id, payload)
+    assert len(calls) == 2 and ai_response_cache.cache_stats(tenant_id)["lookups"] == 0
+
+    monkeypatch.setattr(settings, "AI_RESPONSE_CACHE_TTLS", None)
+    await ai_suite_service.explain_text(tenant_id, payload)
+    conn = sqlite3.connect("dev.db", timeout=5)
+    conn.execute("UPDATE ai_response_cache SET expires_at = '2000-01-01 00:00:00' WHERE tenant_id = ?", (tenant_id,))
+    conn.commit()
+    conn.close()
+    ai_response_cache._memory = None
+    await ai_suite_service.explain_text(tenant_id, payload)
+    assert len(calls) == 4
+
+    monkeypatch.setattr(settings, "AI_RESPONSE_CACHE_ENABLED", False)
+    await ai_suite_service.explain_text(tenant_id, payload)
+    assert len(calls) == 5
+
+
+def test_admin_usage_reports_cache_hits(monkeypatch):
+    calls = _fake_provider(monkeypatch)
+    tenant_id, _, _ = create_tenant_and_user()
+    conn = sqlite3.connect("dev.db", timeout=5)
+    admin_id = conn.execute(
+        "INSERT INTO users (email, hashed_password, tenant_id, role, status, is_active) VALUES (?, 'x', ?, 'owner', 'active', 1)",
+        (settings.PLATFORM_ADMIN_EMAIL, tenant_id),
+    ).lastrowid
+    conn.commit()
+    conn.close()
+    token = create_access_token({"sub": str(admin_id), "tenant_id": tenant_id, "role": "owner"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def explain_twice():
+        for _ in range(2):
+            await ai_suite_service.explain_text(tenant_id, AIExplainRequest(text="Article 30"))
+
+    asyncio.run(explain_twice())
+    assert len(calls) == 1
+    with TestClient(app) as client:
+        summary = client.get("/api/admin/platform/ai/usage", headers=headers).json()
+        tenant = client.get(f"/api/admin/platform/ai/usage/{tenant_id}", headers=headers).json()
+    for cache in (summary["response_cache"], tenant["response_cache"]):
+        assert (cache["enabled"], cache["hits"], cache["misses"], cache["hit_ratio"]) == (True, 1, 1, 0.5)
+        assert cache["operations"][0]["operation"] == "explain"
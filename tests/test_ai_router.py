@@ -0,0 +1,222 @@
+import json
+import sqlite3
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services import ai_client, ai_resilience, ai_router, ai_service, ai_transport, ai_usage
+from main import app
+from tests.utils import FakeClock, create_tenant_and_user, mock_ai_provider
+
+
+def _openai_down(monkeypatch):
+    # openai answers 503, ollama answers; no retries so the failover is immediate
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if request.url.host == "api.openai.com":
+            return httpx.Response(503, text="overloaded")
+        if request.url.path.endswith("/api/generate"):
+            return httpx.Response(200, text='{"summary": "ok", "risks": [], "recommendations": [], "high_risk": false}')
+        if json.loads(request.content).get("stream"):
+            return httpx.Response(200, content=b'{"message": {"content": "from ollama"}, "done": true}\n')
+        return httpx.Response(200, json={"message": {"content": "from ollama"}})
+
+    mock_ai_provider(monkeypatch, handler)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "AI_BASE_URL", None)
+    monkeypatch.setattr(settings, "AI_RETRY_ATTEMPTS", 0)
+    monkeypatch.setattr(settings, "AI_ROUTES", "suite=openai,ollama;analyze=openai,ollama")
+    return seen
+
+
+def test_routes_parse_strategies_and_skip_invalid_entries(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "AI_ROUTES",
+        "suite/summarize=fastest:ollama,local,openai; qa=local:3,openai:1;policies=openai,nope;bad;default=",
+    )
+    routes = ai_router.routes()
+    assert routes["suite/summarize"] == ai_router.Route("fastest", ("ollama", "local", "openai"), (1.0, 1.0, 1.0))
+    assert routes["qa"] == ai_router.Route("weighted", ("local", "openai"), (3.0, 1.0))
+    assert routes["policies"] == ai_router.Route("ordered", ("openai",), (1.0,))
+    assert set(routes) == {"suite/summarize", "qa", "policies"}
+
+
+def test_operations_fall_back_to_family_default_and_provider(monkeypatch):
+    assert ai_router.operation("/api/ai/gdpr/analyze") == "analyze"
+    assert ai_router.operation("/api/ai/answer/stream") == "qa"
+    assert ai_router.operation("/api/ai/policies/generate") == "policies"
+    assert ai_router.operation("/api/ai/dpia/generate/stream") == "suite/dpia/generate"
+    assert ai_router.operation(None) == "default"
+
+    monkeypatch.setattr(settings, "AI_PROVIDER", "ollama")
+    monkeypatch.setattr(settings, "AI_ROUTES", "suite=openai,ollama")
+    assert ai_router.route("suite/dpia/generate").providers == ("openai", "ollama")
+    assert ai_router.route("qa").providers == ("ollama",)
+    monkeypatch.setattr(settings, "AI_ROUTES", "suite=openai,ollama;default=local,ollama")
+    assert ai_router.route("qa").providers == ("local", "ollama")
+
+
+def test_fastest_measures_every_provider_then_prefers_lowest_latency(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTES", "suite=fastest:openai,local,ollama")
+    ai_router.succeeded("openai", 0.8)
+    assert ai_router.plan("suite/explain") == ["local", "ollama", "openai"]
+    ai_router.succeeded("local", 0.3)
+    ai_router.succeeded("ollama", 0.5)
+    assert ai_router.plan("suite/explain") == ["local", "ollama", "openai"]
+    for _ in range(10):
+        ai_router.succeeded("local", 2.0)
+    assert ai_router.plan("suite/explain") == ["ollama", "openai", "local"]
+
+
+def test_weighted_draws_first_provider_by_weight(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTES", "qa=local:3,openai:1,ollama:0")
+    firsts = [ai_router.plan("qa")[0] for _ in range(400)]
+    assert "ollama" not in firsts
+    assert 200 < firsts.count("local") < 380
+    assert sorted(ai_router.plan("qa")) == ["local", "ollama", "openai"]
+
+
+def test_open_circuit_and_error_rate_demote_provider(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTES", "suite=openai,local,ollama")
+    monkeypatch.setattr(settings, "AI_CB_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "AI_ROUTER_MAX_ERROR_RATE", 0.3)
+    monkeypatch.setattr(settings, "AI_ROUTER_ERROR_HALF_LIFE_SECONDS", 60.0)
+    ai_resilience.breaker("openai").record_failure("down")
+    assert ai_router.plan("suite/explain") == ["local", "ollama", "openai"]
+
+    clock = FakeClock()
+    ai_router._health["local"] = ai_router.ProviderHealth("local", clock=clock)
+    ai_router.failed("local", "502")
+    ai_router.failed("local", "502")
+    assert ai_router.health("local").error_rate() > 0.3
+    assert ai_router.plan("suite/explain") == ["ollama", "openai", "local"]
+    # the error rate decays while the provider is not used
+    clock.now += 120
+    assert ai_router.plan("suite/explain") == ["local", "ollama", "openai"]
+
+
+@pytest.mark.asyncio
+async def test_call_fails_over_on_unavailable_only():
+    async def down():
+        raise HTTPException(status_code=503, detail="circuit open")
+
+    async def up():
+        return "ok"
+
+    async def bad_request():
+        raise HTTPException(status_code=400, detail="bad")
+
+    assert await ai_router.call("qa", [("openai", down), ("ollama", up)]) == "ok"
+    assert ai_router.health("openai").failovers == 1 and ai_router.health("ollama").calls == 1
+    with pytest.raises(HTTPException) as exc:
+        await ai_router.call("qa", [("openai", bad_request), ("ollama", up)])
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException) as exc:
+        await ai_router.call("qa", [("openai", down), ("ollama", down)])
+    assert exc.value.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_completion_fails_over_to_next_provider(monkeypatch):
+    seen = _openai_down(monkeypatch)
+    try:
+        text = await ai_client.ai_chat_completion([{"role": "user", "content": "hi"}], endpoint="/api/ai/explain")
+        deltas = [d async for d in ai_client.ai_chat_completion_stream([{"role": "user", "content": "hi"}], endpoint="/api/ai/explain/stream")]
+    finally:
+        await ai_transport.stop()
+    assert text == "from ollama" and "".join(deltas) == "from ollama"
+    assert seen == ["/v1/chat/completions", "/api/chat", "/v1/chat/completions", "/api/chat"]
+    status = ai_router.health("openai").status()
+    assert (status["failures"], status["failovers"]) == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_analysis_uses_analyze_route(monkeypatch):
+    seen = _openai_down(monkeypatch)
+    try:
+        result = await ai_service.analyze_gdpr_text("Vi lagrar personnummer.")
+    finally:
+        await ai_transport.stop()
+    assert result["summary"] == "ok"
+    assert seen == ["/v1/chat/completions", "/api/generate"]
+
+
+@pytest.mark.asyncio
+async def test_analysis_sends_each_provider_its_own_model_and_key(monkeypatch):
+    sent = []
+    tracked = []
+    track = ai_usage.track
+
+    def handler(request):
+        sent.append((request.url.host, request.headers.get("authorization"), json.loads(request.content)["model"]))
+        if request.url.host == "local.test":
+            return httpx.Response(503, text="overloaded")
+        answer = '{"summary": "ok", "risks": [], "recommendations": [], "high_risk": false}'
+        return httpx.Response(200, json={"choices": [{"message": {"content": answer}}]})
+
+    def recording(provider, messages, **kwargs):
+        tracked.append((provider, kwargs["model"]))
+        return track(provider, messages, **kwargs)
+
+    mock_ai_provider(monkeypatch, handler)
+    monkeypatch.setattr(ai_usage, "track", recording)
+    monkeypatch.setattr(settings, "AI_RETRY_ATTEMPTS", 0)
+    monkeypatch.setattr(settings, "AI_ROUTES", "analyze=local,openai")
+    monkeypatch.setattr(settings, "LOCAL_AI_ENDPOINT", "http://local.test/v1/chat/completions")
+    monkeypatch.setattr(settings, "AI_API_KEY", "local-key")
+    monkeypatch.setattr(settings, "AI_MODEL", "llama-test")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "OPENAI_MODEL", "gpt-test")
+    try:
+        result = await ai_service.analyze_gdpr_text("Vi lagrar personnummer.")
+        assert result["model"] == "gpt-test"
+        assert sent == [("local.test", "Bearer local-key", "llama-test"), ("api.openai.com", "Bearer sk-test", "gpt-test")]
+        assert tracked == [("local", "llama-test"), ("openai", "gpt-test")]
+
+        # a provider without its endpoint is not tried at all
+        sent.clear()
+        monkeypatch.setattr(settings, "LOCAL_AI_ENDPOINT", None)
+        await ai_service.analyze_gdpr_text("Vi lagrar personnummer.")
+        assert [host for host, _, _ in sent] == ["api.openai.com"]
+    finally:
+        await ai_transport.stop()
+
+
+@pytest.mark.asyncio
+async def test_unconfigured_providers_are_skipped_and_none_left_is_stubbed(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTES", "default=openai,local")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    monkeypatch.setattr(settings, "LOCAL_AI_ENDPOINT", None)
+    text = await ai_client.ai_chat_completion([{"role": "user", "content": "hi"}], endpoint="/api/ai/explain")
+    assert text.startswith("Stubbed response")
+    monkeypatch.setattr(settings, "AI_ROUTES", "analyze=openai,local")
+    assert (await ai_service.analyze_gdpr_text("Vi lagrar personnummer."))["summary"] == "Stubbed response:"
+
+
+def test_platform_admin_routing_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, "AI_ROUTES", "suite=fastest:ollama,openai")
+    ai_router.succeeded("ollama", 0.25)
+    tenant_id, _, _ = create_tenant_and_user()
+    conn = sqlite3.connect("dev.db", timeout=5)
+    admin_id = conn.execute(
+        "INSERT INTO users (email, hashed_password, tenant_id, role, status, is_active) VALUES (?, 'x', ?, 'owner', 'active', 1)",
+        (settings.PLATFORM_ADMIN_EMAIL, tenant_id),
+    ).lastrowid
+    conn.commit()
+    conn.close()
+    token = create_access_token({"sub": str(admin_id), "tenant_id": tenant_id, "role": "owner"})
+
+    with TestClient(app) as client:
+        resp = client.get("/api/admin/platform/ai/routing", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["routes"]["suite"] == {"strategy": "fastest", "providers": ["ollama", "openai"], "weights": None, "order": ["openai", "ollama"]}
+    assert set(body["routes"]) == {"suite", "default"}
+    assert body["providers"]["ollama"]["latency_ewma_ms"] == 250.0 and body["providers"]["ollama"]["healthy"]
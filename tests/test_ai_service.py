@@ -1,6 +1,7 @@
 import asyncio
 import pytest
 import os
+from app.core.config import settings
 from app.services.ai_service import analyze_gdpr_text
 
 
@@ -18,6 +19,8 @@ async def test_analyze_gdpr_text_fallback(monkeypatch):
         return DummyResp(sample_text, 200)
 
     monkeypatch.setattr("httpx.AsyncClient.post", fake_post)
+    # ollama needs no credentials; an unconfigured provider would be skipped
+    monkeypatch.setattr(settings, "AI_PROVIDER", "ollama")
 
     res = await analyze_gdpr_text("Det här är en testtext")
     assert isinstance(res, dict)
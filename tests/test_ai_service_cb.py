@@ -2,15 +2,14 @@ import asyncio
 import pytest
 import httpx
 import time
-from app.services import ai_service
+from app.services import ai_resilience, ai_service
 from fastapi import HTTPException
 
 
 @pytest.mark.asyncio
 async def test_circuit_breaker_opens_and_rejects_calls(monkeypatch):
     # reset circuit breaker state
-    ai_service._cb_failure_count = 0
-    ai_service._cb_open_since = None
+    ai_resilience.reset_resilience()
 
     async def fake_post_raise(self, url, json=None):
         raise httpx.RequestError("Connection failed")
@@ -19,6 +18,7 @@ async def test_circuit_breaker_opens_and_rejects_calls(monkeypatch):
     monkeypatch.setattr("httpx.AsyncClient.post", fake_post_raise)
     # reduce retries for faster test
     monkeypatch.setattr(ai_service.settings, "AI_RETRY_ATTEMPTS", 0)
+    monkeypatch.setattr(ai_service.settings, "AI_PROVIDER", "ollama")
 
     # perform calls up to threshold
     threshold = int(ai_service.settings.AI_CB_FAILURE_THRESHOLD)
@@ -30,7 +30,7 @@ async def test_circuit_breaker_opens_and_rejects_calls(monkeypatch):
     with pytest.raises(HTTPException) as e:
         await ai_service.analyze_gdpr_text("test")
     assert e.value.status_code == 503
+    assert int(e.value.headers["Retry-After"]) >= 1
 
     # cleanup
-    ai_service._cb_failure_count = 0
-    ai_service._cb_open_since = None
\ No newline at end of file
+    ai_resilience.reset_resilience()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import sqlite3
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.services import ai_client, ai_transport
+from app.services.ai_suite_service import summarize_result
+from main import app
+from tests.utils import create_tenant_and_user, mock_ai_provider, override_user_dependency, wait_for_ingest_job
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _audit_rows(tenant_id):
+    conn = sqlite3.connect("dev.db", timeout=5)
+    rows = conn.execute("SELECT meta FROM audit_logs WHERE tenant_id = ? AND entity_type = 'ai_call'", (tenant_id,)).fetchall()
+    conn.close()
+    return [json.loads(meta) for (meta,) in rows]
+
+
+def test_stream_delta_parses_openai_and_ollama_lines():
+    assert ai_client._stream_delta('data: {"choices": [{"delta": {"content": "Hel"}}]}') == ("Hel", False)
+    assert ai_client._stream_delta('data: {"choices": [{"delta": {"role": "assistant"}}]}') == (None, False)
+    assert ai_client._stream_delta("data: [DONE]") == (None, True)
+    assert ai_client._stream_delta('{"message": {"content": "lo"}, "done": false}') == ("lo", False)
+    assert ai_client._stream_delta('{"response": "", "done": true}') == (None, True)
+    assert ai_client._stream_delta(": keep-alive") == (None, False)
+    assert ai_client._stream_delta("event: ping") == (None, False)
+
+
+@pytest.mark.parametrize("provider", ["openai", "ollama"])
+@pytest.mark.asyncio
+async def test_provider_stream_yields_deltas_and_caps_output(monkeypatch, provider):
+    async def body():
+        for word in ["Data ", "is ", "retained ", "for ", "thirty ", "days."]:
+            if provider == "openai":
+                yield f'data: {json.dumps({"choices": [{"delta": {"content": word}}]})}\n\n'.encode()
+            else:
+                yield (json.dumps({"message": {"content": word}, "done": False}) + "\n").encode()
+            await asyncio.sleep(0)
+        yield b"data: [DONE]\n\n" if provider == "openai" else b'{"done": true}\n'
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=body())
+
+    mock_ai_provider(monkeypatch, handler)
+    monkeypatch.setattr(settings, "AI_PROVIDER", provider)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    messages = [{"role": "user", "content": "How long?"}]
+    try:
+        deltas = [d async for d in ai_client.ai_chat_completion_stream(messages)]
+        assert deltas == ["Data ", "is ", "retained ", "for ", "thirty ", "days."]
+        assert json.loads(requests[0].content)["stream"] is True
+        assert requests[0].url.path == ("/v1/chat/completions" if provider == "openai" else "/api/chat")
+
+        monkeypatch.setattr(settings, "AI_MAX_OUTPUT_CHARS", 10)
+        assert "".join([d async for d in ai_client.ai_chat_completion_stream(messages)]) == "Data is re"
+    finally:
+        await ai_transport.stop()
+
+
+@pytest.mark.asyncio
+async def test_stream_retries_then_fails_before_first_delta(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    mock_ai_provider(monkeypatch, handler)
+    monkeypatch.setattr(settings, "AI_PROVIDER", "openai")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "AI_RETRY_ATTEMPTS", 1)
+    monkeypatch.setattr(settings, "AI_RETRY_BACKOFF_SECONDS", 0.0)
+    messages = [{"role": "user", "content": "ping"}]
+    try:
+        with pytest.raises(HTTPException) as exc:
+            [d async for d in ai_client.ai_chat_completion_stream(messages)]
+    finally:
+        await ai_transport.stop()
+    assert exc.value.status_code == 502
+    assert len(calls) == 2
+
+
+def test_suite_stream_endpoint_emits_deltas_result_and_audit():
+    tenant_id, user_id, _ = create_tenant_and_user()
+    headers = {"x-tenant-id": str(tenant_id), "x-user-id": str(user_id)}
+    text = " ".join(f"Clause {i} limits retention of access logs." for i in range(40))
+    with TestClient(app) as client:
+        resp = client.post("/api/ai/summarize/stream", json={"text": text}, headers=headers)
+        plain = client.post("/api/ai/summarize", json={"text": text}, headers=headers)
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp.text)
+    deltas = [data["text"] for event, data in events if event == "delta"]
+    assert len(deltas) > 1
+    assert [event for event, _ in events[-2:]] == ["result", "done"]
+    streamed = "".join(deltas)
+    assert events[-2][1] == summarize_result(streamed).model_dump() == plain.json()
+    assert events[-1][1]["output_chars"] == len(streamed) and events[-1][1]["truncated"] is False
+
+    audits = _audit_rows(tenant_id)
+    assert [(a["endpoint"], a["status"]) for a in audits] == [("/api/ai/summarize/stream", "success")]
+    assert "input_text" not in audits[0]
+
+
+def test_answer_stream_sends_sources_and_fills_cache(monkeypatch):
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    monkeypatch.setattr(settings, "AI_MAX_OUTPUT_CHARS", 60)
+    try:
+        with TestClient(app) as client:
+            accepted = client.post("/api/rag/documents", json={"title": "Logs", "content": "# Logs\nAccess logs are kept 90 days."})
+            wait_for_ingest_job(client, accepted.json()["job_id"])
+            first = client.post("/api/ai/answer/stream", json={"question": "How long are access logs kept?"})
+            second = client.post("/api/ai/answer/stream", json={"question": "how long are access logs kept"})
+            plain = client.post("/api/ai/answer", json={"question": "How long are access logs kept?"})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert first.headers["x-answer-cache"] == "miss" and second.headers["x-answer-cache"] == "hit"
+    events = _events(first.text)
+    assert events[0][0] == "sources" and events[0][1][0]["title"] == "Logs"
+    answer = "".join(data["text"] for event, data in events if event == "delta")
+    # AI_MAX_OUTPUT_CHARS caps the streamed text, and the done event says so
+    assert len(answer) == 60 and events[-1] == ("done", {"output_chars": 60, "truncated": True, "first_delta_ms": events[-1][1]["first_delta_ms"]})
+    assert _events(second.text)[-2][1] == events[-2][1] == plain.json()
+    assert plain.headers["x-answer-cache"] == "hit"
+
+
+def test_policy_stream_requires_role():
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, role="guest", email=email)
+    try:
+        with TestClient(app) as client:
+            denied = client.post("/api/ai/policies/generate/stream", json={"policy_type": "privacy_policy"})
+            override_user_dependency(app, get_current_user, tenant_id, user_id, role="admin", email=email)
+            resp = client.post("/api/ai/policies/generate/stream", json={"policy_type": "privacy_policy"})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+    assert denied.status_code == 403
+    result = dict(_events(resp.text))["result"]
+    assert result["title"] == "Stubbed response:" and result["content"]
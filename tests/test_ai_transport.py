@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services import ai_client, ai_transport
+from main import app
+
+
+async def _stub_provider(connections):
+    """A keep-alive HTTP/1.1 server answering every request with a chat completion."""
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                break
+            length = 0
+            for line in head.decode().split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            await reader.readexactly(length)
+            body = json.dumps({"choices": [{"message": {"content": "pong"}}]}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+@pytest.mark.asyncio
+async def test_provider_calls_reuse_pooled_connections(monkeypatch):
+    connections = []
+    server = await _stub_provider(connections)
+    port = server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(settings, "AI_PROVIDER", "local")
+    monkeypatch.setattr(settings, "LOCAL_AI_ENDPOINT", f"http://127.0.0.1:{port}/chat")
+    try:
+        for _ in range(5):
+            assert await ai_client.ai_chat_completion([{"role": "user", "content": "ping"}]) == "pong"
+        assert len(connections) == 1
+
+        client = await ai_transport.get_client("local")
+        assert await ai_transport.get_client("local") is client
+        # changed provider settings get a fresh client; the old one is closed
+        monkeypatch.setattr(settings, "LOCAL_AI_TIMEOUT_SECONDS", 3.0)
+        replaced = await ai_transport.get_client("local")
+        assert replaced is not client and client.is_closed and replaced.timeout.read == 3.0
+    finally:
+        await ai_transport.stop()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_provider_specs(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", "https://llm.internal/v1/")
+    monkeypatch.setattr(settings, "OPENAI_TIMEOUT_SECONDS", None)
+    monkeypatch.setattr(settings, "AI_REQUEST_TIMEOUT_SECONDS", 12)
+    monkeypatch.setattr(settings, "AI_HTTP2", True)
+    spec = ai_transport.provider_spec("openai")
+    assert spec.base_url == "https://llm.internal/v1" and spec.timeout == 12.0
+    # HTTP/2 only when the h2 package is importable
+    assert spec.http2 == (ai_transport.importlib.util.find_spec("h2") is not None)
+    client = await ai_transport.get_client("openai")
+    try:
+        assert str(client.base_url) == "https://llm.internal/v1/"
+        assert client.timeout.connect == float(settings.AI_HTTP_CONNECT_TIMEOUT_SECONDS)
+    finally:
+        await ai_transport.stop()
+    with pytest.raises(ValueError):
+        ai_transport.provider_spec("unknown")
+
+
+def test_lifespan_opens_and_closes_provider_clients():
+    with TestClient(app):
+        assert set(ai_transport.transport_stats()["providers"]) == set(ai_transport.PROVIDERS)
+        opened = [entry[2] for entry in ai_transport._clients.values()]
+    assert ai_transport._clients == {} and all(c.is_closed for c in opened)
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services import ai_client, ai_transport, ai_usage
+from main import app
+from tests.utils import create_tenant_and_user, mock_ai_provider
+
+
+def _rows(query: str, *params):
+    conn = sqlite3.connect("dev.db", timeout=5)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+    conn.close()
+    return rows
+
+
+def test_fill_reads_openai_and_ollama_usage():
+    usage = {"model": "m", "prompt_tokens": None, "completion_tokens": None, "output": []}
+    ai_usage.fill(usage, {"model": "gpt-x", "usage": {"prompt_tokens": 12, "completion_tokens": 5}}, "text")
+    assert (usage["model"], usage["prompt_tokens"], usage["completion_tokens"], usage["output"]) == ("gpt-x", 12, 5, ["text"])
+    ai_usage.fill(usage, {"prompt_eval_count": 30, "eval_count": 7, "done": True})
+    assert (usage["prompt_tokens"], usage["completion_tokens"]) == (30, 7)
+    ai_usage.fill(usage, {"choices": [], "usage": None})
+    assert (usage["prompt_tokens"], usage["completion_tokens"]) == (30, 7)
+
+
+@pytest.mark.asyncio
+async def test_completions_record_reported_and_estimated_usage(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    reported = {"flag": True}
+
+    def handler(request):
+        body = {"model": "gpt-test", "choices": [{"message": {"content": "Keep records for five years."}}]}
+        if reported["flag"]:
+            body["usage"] = {"prompt_tokens": 40, "completion_tokens": 9}
+        return httpx.Response(200, json=body)
+
+    mock_ai_provider(monkeypatch, handler)
+    monkeypatch.setattr(settings, "AI_PROVIDER", "openai")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "AI_USAGE_FLUSH_SECONDS", 60.0)
+    messages = [{"role": "user", "content": "How long do we keep invoices?"}]
+    try:
+        await ai_client.ai_chat_completion(messages, tenant_id=tenant_id, endpoint="/api/ai/explain")
+        reported["flag"] = False
+        await ai_client.ai_chat_completion(messages, tenant_id=tenant_id, endpoint="/api/ai/explain")
+        assert ai_usage.usage_stats()["buffered"] == 2
+    finally:
+        await ai_transport.stop()
+        await ai_usage.stop()
+
+    events = _rows("SELECT * FROM ai_usage_events WHERE tenant_id = ? ORDER BY id", tenant_id)
+    assert [(e["prompt_tokens"], e["completion_tokens"], e["estimated"]) for e in events[:1]] == [(40, 9, 0)]
+    assert events[1]["estimated"] == 1 and events[1]["prompt_tokens"] > 0 and events[1]["completion_tokens"] > 0
+    assert all(e["provider"] == "openai" and e["model"] == "gpt-test" and e["endpoint"] == "/api/ai/explain" for e in events)
+    assert all(e["status"] == "success" and e["latency_ms"] > 0 for e in events)
+
+    daily = _rows("SELECT * FROM ai_usage_daily WHERE tenant_id = ?", tenant_id)
+    assert len(daily) == 1 and daily[0]["calls"] == 2 and daily[0]["estimated_calls"] == 1
+    assert daily[0]["prompt_tokens"] == 40 + events[1]["prompt_tokens"]
+
+
+@pytest.mark.asyncio
+async def test_stream_records_usage_from_final_chunk(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    requests = []
+
+    async def body():
+        for word in ["Data ", "is ", "kept."]:
+            yield (json.dumps({"message": {"content": word}, "done": False}) + "\n").encode()
+        yield (json.dumps({"model": "gemma:test", "done": True, "prompt_eval_count": 21, "eval_count": 3}) + "\n").encode()
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=body())
+
+    mock_ai_provider(monkeypatch, handler)
+    monkeypatch.setattr(settings, "AI_PROVIDER", "ollama")
+    monkeypatch.setattr(settings, "AI_USAGE_FLUSH_SECONDS", 60.0)
+    try:
+        deltas = [d async for d in ai_client.ai_chat_completion_stream([{"role": "user", "content": "hi"}], tenant_id=tenant_id, endpoint="/api/ai/explain/stream")]
+        assert "".join(deltas) == "Data is kept."
+    finally:
+        await ai_transport.stop()
+        await ai_usage.stop()
+
+    (event,) = _rows("SELECT * FROM ai_usage_events WHERE tenant_id = ?", tenant_id)
+    assert (event["model"], event["prompt_tokens"], event["completion_tokens"], event["estimated"]) == ("gemma:test", 21, 3, 0)
+    assert event["endpoint"] == "/api/ai/explain/stream"
+
+
+def test_openai_stream_asks_for_usage(monkeypatch):
+    captured = {}
+
+    def fake_lines(provider, url, payload, usage, headers=None):
+        captured.update(payload)
+
+    monkeypatch.setattr(ai_client, "_stream_lines", fake_lines)
+    ai_client._stream_openai([], {})
+    assert captured["stream_options"] == {"include_usage": True}
+
+
+@pytest.mark.asyncio
+async def test_flush_adds_to_daily_rollups_and_bounds_buffer(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    monkeypatch.setattr(settings, "AI_USAGE_FLUSH_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "AI_USAGE_BUFFER_MAX", 3)
+    try:
+        for latency in (10.0, 50.0, 20.0, 30.0):
+            ai_usage.record("ollama", tenant_id=tenant_id, model="m", endpoint="/e", prompt_tokens=10, completion_tokens=1, latency_ms=latency)
+        assert ai_usage.usage_stats()["dropped"] == 1
+        assert await ai_usage.flush() == 3
+        ai_usage.record("ollama", tenant_id=tenant_id, model="m", endpoint="/e", status="error", latency_ms=80.0)
+        assert await ai_usage.flush() == 1
+    finally:
+        await ai_usage.stop()
+
+    (daily,) = _rows("SELECT * FROM ai_usage_daily WHERE tenant_id = ?", tenant_id)
+    assert (daily["calls"], daily["errors"], daily["prompt_tokens"], daily["completion_tokens"]) == (4, 1, 30, 3)
+    assert (daily["latency_ms_total"], daily["latency_ms_max"]) == (180.0, 80.0)
+    assert ai_usage.usage_stats()["written"] == 4
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_requeues_the_batch_and_backs_off(monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    monkeypatch.setattr(settings, "AI_USAGE_FLUSH_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "AI_USAGE_BUFFER_MAX", 3)
+    session_factory = ai_usage._session_factory
+
+    def broken():
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(ai_usage, "_session_factory", broken)
+    try:
+        for latency in (1.0, 2.0, 3.0):
+            ai_usage.record("ollama", tenant_id=tenant_id, model="m", endpoint="/e", latency_ms=latency)
+        with pytest.raises(ConnectionError):
+            await ai_usage.flush()
+        assert [r["latency_ms"] for r in ai_usage._buffer] == [1.0, 2.0, 3.0]
+        # a record arriving while the write fails still fits the bound: the oldest is dropped
+        ai_usage.record("ollama", tenant_id=tenant_id, model="m", endpoint="/e", latency_ms=4.0)
+        with pytest.raises(ConnectionError):
+            await ai_usage.flush()
+        assert [r["latency_ms"] for r in ai_usage._buffer] == [2.0, 3.0, 4.0]
+        assert ai_usage.usage_stats()["dropped"] == 1
+
+        monkeypatch.setattr(ai_usage, "_session_factory", session_factory)
+        assert await ai_usage.flush() == 3
+    finally:
+        await ai_usage.stop()
+    assert [r["latency_ms"] for r in _rows("SELECT latency_ms FROM ai_usage_events WHERE tenant_id = ? ORDER BY id", tenant_id)] == [2.0, 3.0, 4.0]
+
+    # the flusher waits longer after each failed flush
+    attempts = []
+
+    async def failing_flush():
+        attempts.append(time.monotonic())
+        if len(attempts) == 3:
+            ai_usage._buffer.clear()
+            return 0
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(settings, "AI_USAGE_FLUSH_SECONDS", 0.01)
+    monkeypatch.setattr(ai_usage, "flush", failing_flush)
+    ai_usage._buffer.append({"latency_ms": 5.0})
+    await asyncio.wait_for(ai_usage._flush_loop(asyncio.Event()), timeout=5)
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.02 and attempts[2] - attempts[1] >= 0.04
+
+
+def test_platform_admin_usage_endpoints():
+    tenant_id, _, _ = create_tenant_and_user()
+    other_id, _, _ = create_tenant_and_user()
+    conn = sqlite3.connect("dev.db", timeout=5)
+    admin_id = conn.execute(
+        "INSERT INTO users (email, hashed_password, tenant_id, role, status, is_active) VALUES (?, 'x', ?, 'owner', 'active', 1)",
+        (settings.PLATFORM_ADMIN_EMAIL, tenant_id),
+    ).lastrowid
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    daily = [
+        (today, tenant_id, "openai", "gpt", "/api/ai/explain", 3, 1, 1500, 500, 900.0, 600.0),
+        (today - timedelta(days=10), tenant_id, "openai", "gpt", "/api/ai/explain", 1, 0, 100, 50, 100.0, 100.0),
+        (today - timedelta(days=40), tenant_id, "openai", "gpt", "/api/ai/explain", 9, 0, 9000, 900, 900.0, 100.0),
+        (today, other_id, "ollama", "gemma", "/api/ai/answer", 2, 0, 200, 20, 300.0, 200.0),
+    ]
+    conn.executemany(
+        "INSERT INTO ai_usage_daily (day, tenant_id, provider, model, endpoint, calls, errors, estimated_calls, prompt_tokens,"
+        " completion_tokens, latency_ms_total, latency_ms_max) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+        [(d.isoformat(), *rest) for d, *rest in daily],
+    )
+    conn.execute(
+        "INSERT INTO ai_usage_events (tenant_id, provider, model, endpoint, status, prompt_tokens, completion_tokens, estimated,"
+        " latency_ms, created_at) VALUES (?, 'openai', 'gpt', '/api/ai/explain', 'success', 70, 30, 0, 300.0, ?)",
+        (tenant_id, (now - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S.%f")),
+    )
+    conn.commit()
+    conn.close()
+    token = create_access_token({"sub": str(admin_id), "tenant_id": tenant_id, "role": "owner"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with TestClient(app) as client:
+        summary = client.get("/api/admin/platform/ai/usage", headers=headers).json()
+        tenant = client.get(f"/api/admin/platform/ai/usage/{tenant_id}", headers=headers).json()
+        overview = client.get("/api/admin/platform/overview", headers=headers).json()
+        assert client.get("/api/admin/platform/ai/usage/999999", headers=headers).status_code == 404
+
+    assert (summary["tokens_24h"], summary["tokens_7d"], summary["tokens_30d"]) == (100, 2220, 2370)
+    assert summary["cost_eur_estimate"] == round(1800 / 1000 * 0.0004 + 570 / 1000 * 0.0016, 4)
+    first = summary["items"][0]
+    assert (first["tenant_id"], first["ai_tokens_30d"], first["ai_calls_30d"], first["errors_30d"]) == (tenant_id, 2150, 4, 1)
+    assert (first["overage_tokens"], first["status"], first["avg_latency_ms"], first["max_latency_ms"]) == (1150, "over_limit", 250.0, 600.0)
+    assert [item["tenant_id"] for item in summary["items"]] == [tenant_id, other_id]
+    assert {(row["provider"], row["endpoint"], row["tokens"]) for row in summary["breakdown"]} == {
+        ("openai", "/api/ai/explain", 2150),
+        ("ollama", "/api/ai/answer", 220),
+    }
+    assert (tenant["tokens_30d"], len(tenant["items"]), len(tenant["breakdown"])) == (2150, 1, 1)
+    assert overview["ai_tokens_30d"] == 2370
+    assert sum(month["tokens"] for month in overview["ai_tokens_by_month"]) == 2370 + 9900
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.services import ai_qa_service, rag_service
+from app.services.answer_cache import AnswerCache, get_answer_cache
+from main import app
+from tests.utils import FakeClock, create_tenant_and_user, override_user_dependency
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock(0.0)
+    cache = AnswerCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.evictions == 1
+    clock.now = 11
+    assert cache.get("a") is None and cache.expirations == 1 and len(cache) == 1
+
+
+def test_concurrent_misses_are_coalesced_and_failures_not_cached():
+    cache = AnswerCache(max_entries=8, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("q", compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ["coalesced"] * 4 + ["miss"]
+    assert asyncio.run(cache.get_or_compute("q", compute)) == ("answer", "hit")
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def run_broken():
+        return await asyncio.gather(*(cache.get_or_compute("x", broken) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(run_broken()))
+    assert cache.get("x") is None
+    metrics = cache.metrics()
+    assert (metrics["hits"], metrics["coalesced"], metrics["misses"]) == (1, 6, 2)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_fail_coalesced_callers():
+    cache = AnswerCache(max_entries=8, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    leader = asyncio.ensure_future(cache.get_or_compute("q", compute))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(cache.get_or_compute("q", compute))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert await follower == ("answer", "coalesced")
+    assert leader.cancelled() and len(calls) == 1 and cache.get("q") == "answer"
+
+    # with every caller gone the computation is cancelled and nothing is cached
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    callers = [asyncio.ensure_future(cache.get_or_compute("slow", slow)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert cancelled == [1] and cache.get("slow") is None and not cache._inflight
+
+
+@pytest.mark.asyncio
+async def test_answers_are_reused_until_the_corpus_changes(get_test_db, monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    completions = []
+
+    async def fake_chat(messages, tenant_id=None, endpoint=None):
+        completions.append(messages)
+        return f"answer {len(completions)}"
+
+    monkeypatch.setattr(ai_qa_service, "ai_chat_completion", fake_chat)
+    async for db in get_test_db():
+        await rag_service.create_document(db, tenant_id, "Policy", "# Retention\nlogs are kept for 90 days", None, "en")
+        first, status = await ai_qa_service.cached_answer(tenant_id, "How long are logs kept?", limit=5, db=db)
+        assert status == "miss" and first.sources
+        again, status = await ai_qa_service.cached_answer(tenant_id, "  how long are LOGS kept ", limit=5, db=db)
+        assert status == "hit" and again.answer == first.answer and len(completions) == 1
+
+        # other tenants never see the entry
+        _, status = await ai_qa_service.cached_answer(tenant_id + 1000, "How long are logs kept?", limit=5, db=db)
+        assert status == "miss"
+
+        await rag_service.create_document(db, tenant_id, "Update", "# Retention\nlogs are now kept for 30 days", None, "en")
+        fresh, status = await ai_qa_service.cached_answer(tenant_id, "How long are logs kept?", limit=5, db=db)
+        assert status == "miss" and fresh.answer == "answer 3"
+
+        # so does a change of the "qa" route or of one of its models
+        monkeypatch.setattr(settings, "AI_ROUTES", "qa=local,openai")
+        _, status = await ai_qa_service.cached_answer(tenant_id, "How long are logs kept?", limit=5, db=db)
+        assert status == "miss"
+        monkeypatch.setattr(settings, "AI_MODEL", "another-model")
+        _, status = await ai_qa_service.cached_answer(tenant_id, "How long are logs kept?", limit=5, db=db)
+        assert status == "miss" and len(completions) == 5
+        break
+
+
+def test_answer_route_reports_cache_status(monkeypatch):
+    async def fake_chat(messages, tenant_id=None, endpoint=None):
+        return "cached answer"
+
+    monkeypatch.setattr(ai_qa_service, "ai_chat_completion", fake_chat)
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    try:
+        with TestClient(app) as client:
+            statuses = [client.post("/api/ai/answer", json={"question": "What is a DPIA?"}).headers["X-Answer-Cache"] for _ in range(3)]
+            assert statuses == ["miss", "hit", "hit"]
+            metrics = client.get("/api/ai/answer/cache/metrics").json()
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+    assert metrics["hits"] == 2 and metrics["misses"] == 1 and metrics["entries"] == 1
+    assert get_answer_cache().metrics()["hit_rate"] == pytest.approx(2 / 3, abs=1e-3)
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import ai_qa_service, rag_service
+from app.services.context_packer import estimate_tokens, pack_context
+from app.services.rag_pipeline import iter_chunks
+from tests.utils import create_tenant_and_user
+
+_TEXT = " ".join(f"Article {i} requires records of processing activity {i}." for i in range(700))
+
+
+def _chunks(text, document_id=1, offsets=True):
+    return [
+        SimpleNamespace(
+            id=document_id * 100 + c.index,
+            document_id=document_id,
+            chunk_index=c.index,
+            content=c.text,
+            section_title=c.section_title,
+            start_offset=c.start if offsets else None,
+            end_offset=c.end if offsets else None,
+        )
+        for c in iter_chunks(text)
+    ]
+
+
+@pytest.mark.parametrize("offsets", [True, False])
+def test_adjacent_chunks_merge_without_repeating_overlap(offsets):
+    chunks = _chunks(_TEXT, offsets=offsets)
+    assert len(chunks) >= 3
+    passages = pack_context([(0.9 - i / 10, c) for i, c in enumerate(chunks)], budget=100000)
+    assert len(passages) == 1
+    passage = passages[0]
+    assert passage.text.split() == _TEXT.split()
+    assert passage.chunk_ids == tuple(c.id for c in chunks) and passage.chunk_id == chunks[0].id
+    assert passage.tokens == estimate_tokens(_TEXT) < sum(estimate_tokens(c.content) for c in chunks)
+
+
+def test_merging_keeps_words_intact_across_paragraph_breaks():
+    # blank lines and runs of spaces make source offsets drift from the normalized chunk content
+    text = "\n\n".join(" ".join(f"term{p}_{i}" + ("   " if i % 7 == 0 else "") for i in range(40)) for p in range(60))
+    chunks = _chunks(text)
+    assert len(chunks) >= 2
+    (passage,) = pack_context([(0.9, c) for c in chunks], budget=100000)
+    assert passage.text.split() == text.split()
+
+
+def test_greedy_packing_respects_budget_and_skips_duplicates():
+    first, second, third = _chunks(_TEXT)[:3]
+    copy = SimpleNamespace(id=999, document_id=2, chunk_index=0, content=first.content, section_title=None, start_offset=None, end_offset=None)
+    short = SimpleNamespace(id=7, document_id=3, chunk_index=4, content="Controllers keep a register.", section_title="Register")
+
+    # non-adjacent hits stay separate passages, best first; the copy adds nothing
+    passages = pack_context([(0.5, third), (0.9, first), (0.8, copy), (0.7, short)], budget=100000)
+    assert [p.chunk_id for p in passages] == [first.id, short.id, third.id]
+    assert passages[1].title == "Register"
+
+    budget = estimate_tokens(first.content) + 100
+    passages = pack_context([(0.9, first), (0.7, short), (0.5, third)], budget=budget)
+    assert [p.chunk_id for p in passages] == [first.id, short.id, third.id]
+    assert sum(p.tokens for p in passages) <= budget
+    assert third.content.startswith(passages[2].text)
+
+    # a remainder below MIN_PARTIAL_TOKENS is left unused rather than packed as a scrap
+    assert [p.chunk_id for p in pack_context([(0.9, first), (0.5, third)], budget=estimate_tokens(first.content) + 10)] == [first.id]
+
+
+@pytest.mark.asyncio
+async def test_answer_prompt_uses_packed_context(get_test_db, monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    prompts = []
+
+    async def fake_chat(messages, tenant_id=None, endpoint=None):
+        prompts.append(messages[-1]["content"])
+        return "answer"
+
+    monkeypatch.setattr(ai_qa_service, "ai_chat_completion", fake_chat)
+    monkeypatch.setattr(settings, "AI_CONTEXT_TOKEN_BUDGET", 600)
+    async for db in get_test_db():
+        tail = "The breach notification deadline is seventy two hours after awareness."
+        await rag_service.create_document(db, tenant_id, "Breach", "# Breach\n" + "Notification duties apply. " * 60 + tail, None, "en")
+        result, _ = await ai_qa_service.cached_answer(tenant_id, "What is the breach notification deadline?", limit=5, db=db)
+        break
+    # the full chunk reaches the model (not a 400-character prefix), within the budget
+    assert tail in prompts[0]
+    context = prompts[0].split("Context:\n", 1)[1]
+    assert estimate_tokens(context) <= 600 + 5 * len(result.sources)
+    assert len(result.sources) == 1 and len(result.sources[0].snippet) == 400
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.db.models.embedding_cache import EmbeddingCache
+from app.db.models.knowledge_embedding import KnowledgeEmbedding
+from app.services import embedding_client, rag_service
+from app.services.rag_pipeline import embedding_for_text
+from main import app
+from tests.utils import create_tenant_and_user, override_user_dependency, wait_for_ingest_job
+
+
+class _StandInServer:
+    """Local embedding server stand-in: records batch sizes and peak concurrency."""
+
+    def __init__(self, dim=16, openai_format=False):
+        self.dim = dim
+        self.openai_format = openai_format
+        self.batches = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        self.batches.append(len(payload["input"]))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        vectors = [[float(len(text) + i) for i in range(self.dim)] for text in payload["input"]]
+        if self.openai_format:
+            return httpx.Response(200, json={"data": [{"index": i, "embedding": v} for i, v in enumerate(vectors)]})
+        return httpx.Response(200, json={"model": payload["model"], "embeddings": vectors})
+
+
+@pytest.fixture
+def local_provider(monkeypatch):
+    server = _StandInServer()
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(settings, "LOCAL_EMBEDDING_ENDPOINT", "http://embeddings.local/embed")
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", "stand-in-embed")
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 4)
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(embedding_client, "_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(server)))
+    return server
+
+
+def test_hash_provider_matches_pseudo_embedding():
+    vectors = asyncio.run(embedding_client.embed_texts(["a", "b"]))
+    assert embedding_client.embedding_model() == "hash-embed"
+    assert np.allclose(vectors[0], embedding_for_text("a"))
+
+
+def test_local_provider_batches_with_bounded_concurrency(local_provider):
+    texts = [f"text {i}" for i in range(18)]
+    vectors = asyncio.run(embedding_client.embed_texts(texts))
+    assert len(vectors) == 18 and vectors[0].shape == (16,)
+    assert vectors[17][0] == len("text 17")
+    assert sorted(local_provider.batches) == [2, 4, 4, 4, 4]
+    assert local_provider.peak == 2
+    metrics = embedding_client.get_embedding_metrics()
+    assert metrics["texts_embedded"] == 18 and metrics["batches"] == 5 and metrics["texts_per_second"] > 0
+
+
+def test_local_provider_accepts_openai_format_and_reports_failures(local_provider, monkeypatch):
+    local_provider.openai_format = True
+    assert len(asyncio.run(embedding_client.embed_texts(["x", "y"]))) == 2
+
+    failing = httpx.MockTransport(lambda request: httpx.Response(500))
+    monkeypatch.setattr(embedding_client, "_client", lambda: httpx.AsyncClient(transport=failing))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(embedding_client.embed_texts(["x"]))
+    assert exc.value.status_code == 502
+
+
+@pytest.mark.asyncio
+async def test_cache_skips_reembedding_across_documents_and_model_switches(get_test_db, local_provider, monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    content = "# Policy\n" + " ".join(f"term{i}" for i in range(900))
+    async for db in get_test_db():
+        first = await rag_service.create_document(db, tenant_id, "First", content, "internal_policy", "en")
+        embedded = embedding_client.get_embedding_metrics()["texts_embedded"]
+        assert embedded > 0
+
+        # identical text in another document is served from the cache
+        second = await rag_service.create_document(db, tenant_id, "Second", content, "internal_policy", "en")
+        metrics = embedding_client.get_embedding_metrics()
+        assert metrics["texts_embedded"] == embedded
+        assert metrics["cache_hits"] == embedded and metrics["cache_hit_rate"] == 0.5
+        models = (await db.execute(select(KnowledgeEmbedding.model).where(KnowledgeEmbedding.document_id == second.id))).scalars().all()
+        assert set(models) == {"stand-in-embed"}
+
+        # a new model embeds once, switching back hits the original entries
+        monkeypatch.setattr(settings, "EMBEDDING_MODEL", "stand-in-embed-v2")
+        await rag_service.ingest_document(db, first, tenant_id)  # no new chunks: nothing to embed
+        await rag_service.create_document(db, tenant_id, "Third", content, "internal_policy", "en")
+        assert embedding_client.get_embedding_metrics()["texts_embedded"] == embedded * 2
+        monkeypatch.setattr(settings, "EMBEDDING_MODEL", "stand-in-embed")
+        await rag_service.create_document(db, tenant_id, "Fourth", content, "internal_policy", "en")
+        assert embedding_client.get_embedding_metrics()["texts_embedded"] == embedded * 2
+
+        cached = (await db.execute(select(func.count()).where(EmbeddingCache.model.like("stand-in-embed%")))).scalar_one()
+        assert cached == embedded * 2
+        break
+
+
+def test_embedding_metrics_endpoint():
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    with TestClient(app) as client:
+        accepted = client.post("/api/rag/documents", json={"content": "# Title\nretention schedule", "title": "A"}).json()
+        wait_for_ingest_job(client, accepted["job_id"])
+        resp = client.get("/api/rag/embeddings/metrics")
+    app.dependency_overrides.pop(get_current_user, None)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["model"] == "hash-embed" and data["cache_misses"] >= 1
+    assert {"cache_hit_rate", "texts_per_second"} <= set(data)
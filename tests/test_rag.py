@@ -6,8 +6,7 @@ from app.core.security import hash_password
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings as cfg
-
-client = TestClient(app)
+from tests.utils import wait_for_ingest_job
 
 
 @pytest.mark.asyncio
@@ -45,21 +44,24 @@ async def test_rag_create_and_list_documents():
             yield sess_override
     app.dependency_overrides[real_get_db] = override_get_db
 
-    r = client.post("/api/rag/documents", json=payload)
-    assert r.status_code == 200
-    doc = r.json()
-    assert doc["title"] == "Doc1"
+    with TestClient(app) as client:
+        r = client.post("/api/rag/documents", json=payload)
+        assert r.status_code == 202
+        accepted = r.json()
+        job = wait_for_ingest_job(client, accepted["job_id"])
+        assert job["status"] == "completed"
+        assert job["stage"] == "done" and job["chunks_stored"] == job["chunks_total"] == 1
 
-    r2 = client.get("/api/rag/documents")
-    assert r2.status_code == 200
-    docs = r2.json()
-    assert any(d["title"] == "Doc1" for d in docs)
+        r2 = client.get("/api/rag/documents")
+        assert r2.status_code == 200
+        docs = r2.json()
+        assert any(d["title"] == "Doc1" and d["id"] == accepted["document_id"] for d in docs)
 
-    # search
-    r3 = client.post("/api/rag/search", json={"query": "sample"})
-    assert r3.status_code == 200
-    data = r3.json()
-    assert "citations" in data
-    assert data["citations"]
+        # search
+        r3 = client.post("/api/rag/search", json={"query": "sample"})
+        assert r3.status_code == 200
+        data = r3.json()
+        assert "citations" in data
+        assert data["citations"]
 
     app.dependency_overrides.clear()
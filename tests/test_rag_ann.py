@@ -0,0 +1,146 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.db.models.settings import TenantSetting
+from app.services import rag_index, rag_service
+from app.services.rag_ann import IVFIndex, LSHIndex, build_ann
+from app.services.rag_index import TenantVectorIndex
+from tests.utils import create_tenant_and_user
+
+
+def _clustered(n, dim=32, topics=20, seed=3):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    return centres[rng.integers(0, topics, size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def _recall(index, exact, queries, k=10):
+    hits = 0
+    for q in queries:
+        expected = {cid for cid, _ in exact.search(q, k, exact=True)}
+        hits += len({cid for cid, _ in index.search(q, k)} & expected)
+    return hits / (len(queries) * k)
+
+
+def test_ivf_with_all_lists_probed_matches_exact():
+    data = _clustered(2000)
+    index = TenantVectorIndex(32, ann=IVFIndex(nlist=16, nprobe=16))
+    index.add(list(range(1, 2001)), data)
+    assert asyncio.run(index.refit_ann())
+    for q in data[:20]:
+        assert index.search(q, 5) == index.search(q, 5, exact=True)
+    assert index.ann.fitted_rows == 2000
+
+
+def test_ivf_and_lsh_recall_on_clustered_data():
+    data = _clustered(5000)
+    queries = data[:50] + 0.1
+    for ann in (IVFIndex(nprobe=8), LSHIndex(bits=64, n_candidates=1000)):
+        index = TenantVectorIndex(32, ann=ann)
+        index.add(list(range(1, 5001)), data)
+        asyncio.run(index.refit_ann())
+        assert _recall(index, index, queries) >= 0.8
+
+
+def test_ann_tracks_incremental_insert_and_delete():
+    data = _clustered(3000)
+    for ann in (IVFIndex(nlist=8, nprobe=8), LSHIndex(n_candidates=100000)):
+        index = TenantVectorIndex(32, ann=ann)
+        index.add(list(range(1, 2001)), data[:2000])
+        asyncio.run(index.refit_ann())
+        index.add(list(range(2001, 3001)), data[2000:])
+        assert index.remove(list(range(1, 1001))) == 1000
+        assert not index.ann_stale()  # growth/shrink stayed within the refit factor
+        assert index.ann.fitted_rows == 2000
+        result = index.search(data[2500], 5)
+        assert result == index.search(data[2500], 5, exact=True)
+        assert result[0][0] == 2501
+
+
+def test_ivf_refits_after_corpus_doubles():
+    data = _clustered(3000)
+    index = TenantVectorIndex(32, ann=IVFIndex(nlist=8))
+    index.add(list(range(1, 1001)), data[:1000])
+    asyncio.run(index.refit_ann())
+    fitted = index.ann
+    index.add(list(range(1001, 3001)), data[1000:])
+    assert index.ann_stale()
+    # search keeps using the previous fit until a refit is swapped in
+    index.search(data[0], 5)
+    assert index.ann is fitted and fitted.fitted_rows == 1000
+    assert asyncio.run(index.refit_ann())
+    assert index.ann is not fitted and index.ann.fitted_rows == 3000
+
+
+@pytest.mark.asyncio
+async def test_search_never_fits_and_refit_keeps_rows_added_meanwhile():
+    data = _clustered(3000)
+    index = TenantVectorIndex(32, ann=IVFIndex(nlist=8, nprobe=8))
+    index.add(list(range(1, 2001)), data[:2000])
+    # not fitted yet: the query scores every row
+    assert index.search(data[0], 5) == index.search(data[0], 5, exact=True)
+    assert not index.ann.fitted
+
+    refit = asyncio.create_task(index.refit_ann())
+    await asyncio.sleep(0)
+    assert not index.ann_stale()  # one refit at a time
+    index.add(list(range(2001, 3001)), data[2000:])
+    assert await refit
+    assert index.ann.fitted_rows == 2000
+    assert index.search(data[2500], 5) == index.search(data[2500], 5, exact=True)
+
+    # a removal during the fit drops it
+    index = TenantVectorIndex(32, ann=IVFIndex(nlist=8))
+    index.add(list(range(1, 2001)), data[:2000])
+    refit = asyncio.create_task(index.refit_ann())
+    await asyncio.sleep(0)
+    index.remove([1])
+    assert not await refit
+    assert not index.ann.fitted and index.ann_stale()
+
+
+def test_ann_skipped_below_min_rows():
+    ann = build_ann({"type": "ivf", "min_vectors": 500})
+    index = TenantVectorIndex(32, ann=ann)
+    index.add(list(range(1, 101)), _clustered(100))
+    assert not index.ann_stale()
+    assert not asyncio.run(index.refit_ann())
+    assert not index.ann.fitted
+
+
+def test_build_ann_configs():
+    assert build_ann(None) is None
+    assert build_ann({"type": "exact"}) is None
+    ivf = build_ann({"type": "ivf", "nlist": 64, "nprobe": 4})
+    assert isinstance(ivf, IVFIndex) and ivf.nlist == 64 and ivf.nprobe == 4
+    lsh = build_ann({"type": "LSH", "bits": 100, "candidates": 200})
+    assert isinstance(lsh, LSHIndex) and lsh.bits == 96 and lsh.n_candidates == 200
+
+
+@pytest.mark.asyncio
+async def test_tenant_setting_overrides_ann_config(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    other_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        db.add(TenantSetting(tenant_id=tenant_id, key="rag_ann", value={"type": "lsh", "bits": 128}))
+        await db.commit()
+        config = await rag_index._ann_config(db, tenant_id)
+        assert config["type"] == "lsh" and config["bits"] == 128
+        assert (await rag_index._ann_config(db, other_id))["type"] == "exact"
+        break
+
+
+@pytest.mark.asyncio
+async def test_sync_fits_the_ann_index_in_the_background(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        db.add(TenantSetting(tenant_id=tenant_id, key="rag_ann", value={"type": "ivf", "nlist": 1, "min_vectors": 1}))
+        await db.commit()
+        await rag_service.create_document(db, tenant_id, "A", "# A\nretention of access logs\n# B\nbreach duties", None, "en")
+        index = await rag_index.get_index(db, tenant_id)
+        assert rag_index._refits
+        await asyncio.gather(*rag_index._refits)
+        assert index.vectors.ann.fitted and not index.vectors.ann_stale()
+        break
@@ -0,0 +1,67 @@
+import types
+
+from app.services.rag_pipeline import MAX_TOKENS, chunk_and_hash, chunk_text, iter_chunks
+
+
+def _words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_chunks_are_lazy_and_offsets_point_into_source():
+    text = f"intro {_words(10, 'i')}\n# Scope\n{_words(700)}\n  {_words(700, 'x')}\r\n2. Retention\n{_words(50, 'r')}"
+    chunks = iter_chunks(text)
+    assert isinstance(chunks, types.GeneratorType)
+    chunks = list(chunks)
+    assert [c.section_title for c in chunks] == [None, "Scope", "Scope", "2. Retention"]
+    assert [c.index for c in chunks] == [0, 1, 2, 3]
+    for c in chunks:
+        assert " ".join(text[c.start : c.end].split()) == c.text
+    assert text[chunks[1].start : chunks[1].start + 2] == "w0"
+    assert text[: chunks[-1].end].endswith("r49")
+
+
+def test_windows_overlap_and_keep_short_tail():
+    text = "# Section\n" + _words(2400)
+    chunks = list(iter_chunks(text))
+    starts = [c.text.split()[0] for c in chunks]
+    # 1200-token windows stepping 1020 tokens; the 360-token remainder is covered by an end-aligned window
+    assert starts == ["w0", "w1020", "w1200"]
+    assert all(len(c.text.split()) == MAX_TOKENS for c in chunks)
+    assert chunks[-1].text.split()[-1] == "w2399"
+
+    # remainders of at least MIN_TOKENS keep their own window
+    tail = list(iter_chunks("# Section\n" + _words(1500)))[-1]
+    assert tail.text.split()[0] == "w1020" and len(tail.text.split()) == 480
+
+
+def test_subword_tokenizer_counts_long_words():
+    text = " ".join("pseudonymisation" for _ in range(1000))  # 16 chars -> 4 tokens each
+    whitespace = list(iter_chunks(text))
+    subword = list(iter_chunks(text, tokenizer="subword"))
+    assert len(whitespace) == 1
+    assert len(subword) > 1 and all(len(c.text.split()) <= MAX_TOKENS // 4 for c in subword)
+    custom = list(iter_chunks(text, tokenizer=lambda word: 2))
+    assert len(custom[0].text.split()) == MAX_TOKENS // 2
+
+
+def test_word_longer_than_a_window_gets_its_own_chunk():
+    long = "x" * 9000  # 2250 subword tokens
+    (only,) = iter_chunks(long, tokenizer="subword")
+    assert (only.text, only.start, only.end) == (long, 0, 9000)
+
+    text = f"{_words(10)} {long} {_words(10, 'y')} {long}"
+    chunks = list(iter_chunks(text, tokenizer="subword"))
+    assert [c.text for c in chunks] == [_words(10), long, _words(10, "y"), long]
+    for c in chunks:
+        assert " ".join(text[c.start : c.end].split()) == c.text
+    assert list(iter_chunks(long, tokenizer=lambda word: MAX_TOKENS + 1))[0].text == long
+
+
+def test_chunk_text_and_chunk_and_hash_wrap_iter_chunks():
+    text = "# A\n" + _words(500) + "\n# B\n" + _words(500)
+    assert chunk_text(text) == [(c.text, c.index, c.section_title) for c in iter_chunks(text)]
+    # identical sections hash identically and are stored once
+    hashed = chunk_and_hash(text)
+    assert len(hashed) == 1
+    chunk, idx, title, checksum, start, end = hashed[0]
+    assert (idx, title, len(checksum)) == (0, "A", 64) and text[start:end].startswith("w0")
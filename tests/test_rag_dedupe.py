@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.db.models.knowledge_chunk import KnowledgeChunk
+from app.services import rag_dedupe, rag_index, rag_service
+from main import app
+from tests.utils import create_tenant_and_user, override_user_dependency
+
+_SUBJECTS = ["access logs", "backups", "payroll data", "cctv footage", "support tickets", "marketing lists"]
+
+
+def _policy(topic: str, clauses: int = 240) -> str:
+    lines = [f"# {topic.title()} policy"]
+    for i in range(clauses):
+        subject = _SUBJECTS[i % len(_SUBJECTS)]
+        lines.append(f"Clause {i} of the {topic} policy: {subject} are retained for {30 + i} days and reviewed by team {i % 7}.")
+    return "\n".join(lines)
+
+
+def _edited(text: str) -> str:
+    # trivial edits: a renamed owner and one changed number
+    return text.replace("team 3", "team three").replace("for 40 days", "for 45 days")
+
+
+@pytest.fixture
+def dedupe_mode(monkeypatch):
+    def set_mode(mode):
+        monkeypatch.setattr(settings, "RAG_DEDUPE_MODE", mode)
+
+    return set_mode
+
+
+def test_signatures_estimate_jaccard():
+    text = _policy("retention")
+    sig = rag_dedupe.signature(text)
+    assert sig.shape == (rag_dedupe.NUM_PERM,) and sig.dtype == np.uint32
+    assert np.array_equal(rag_dedupe.from_bytes(rag_dedupe.to_bytes(sig)), sig)
+    assert rag_dedupe.similarity(sig, rag_dedupe.signature(text.upper())) == 1.0
+    assert rag_dedupe.similarity(sig, rag_dedupe.signature(_edited(text))) >= 0.9
+    # the shared clause template makes this pair ~0.6 similar: related, but not a near-duplicate
+    assert 0.3 < rag_dedupe.similarity(sig, rag_dedupe.signature(_policy("breach"))) < 0.9
+    unrelated = " ".join(f"Breach {i} is reported to the authority within {i} hours." for i in range(200))
+    assert rag_dedupe.similarity(sig, rag_dedupe.signature(unrelated)) < 0.1
+    assert len(rag_dedupe.buckets(sig)) == rag_dedupe.BANDS
+    assert rag_dedupe.signature("  ... ") is None
+
+
+@pytest.mark.asyncio
+async def test_flag_mode_records_duplicates_and_collapses_search(get_test_db, dedupe_mode):
+    dedupe_mode("flag")
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        original = await rag_service.create_document(db, tenant_id, "Retention", _policy("retention"), None, "en")
+        other = await rag_service.create_document(db, tenant_id, "Breach", _policy("breach"), None, "en")
+        copy = await rag_service.create_document(db, tenant_id, "Retention v2", _edited(_policy("retention")), None, "en")
+        assert copy.duplicate_of == original.id and other.duplicate_of is None
+
+        flagged = (
+            await db.execute(select(func.count()).where(KnowledgeChunk.document_id == copy.id, KnowledgeChunk.duplicate_of.is_not(None)))
+        ).scalar()
+        assert flagged >= 1
+
+        hits = await rag_service.search(db, tenant_id, "retention policy clause 12 backups", top_k=5)
+        keys = [chunk.duplicate_of or chunk.id for _, chunk, _ in hits]
+        assert len(keys) == len(set(keys))
+
+        stats = await rag_dedupe.dedupe_stats(db, tenant_id)
+        assert stats["duplicate_documents"] == 1 and stats["duplicate_chunks"] == flagged and stats["chunks_skipped"] == 0
+        break
+
+
+@pytest.mark.asyncio
+async def test_skip_mode_does_not_embed_near_duplicates(get_test_db, dedupe_mode):
+    dedupe_mode("skip")
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        original = await rag_service.create_document(db, tenant_id, "Retention", _policy("retention"), None, "en")
+        rows = (await rag_index.get_index(db, tenant_id)).rows
+
+        copy = await rag_service.create_document(db, tenant_id, "Retention v2", _edited(_policy("retention")), None, "en")
+        assert copy.duplicate_of == original.id and copy.chunks_deduplicated > 0
+        assert (await rag_index.get_index(db, tenant_id)).rows == rows
+
+        # a document sharing only some sections embeds just its new chunks
+        mixed = await rag_service.create_document(db, tenant_id, "Mixed", _policy("retention") + "\n" + _policy("breach"), None, "en")
+        assert mixed.duplicate_of is None and mixed.chunks_deduplicated >= 1
+        stored = (await db.execute(select(func.count()).where(KnowledgeChunk.document_id == mixed.id))).scalar()
+        assert stored >= 1
+
+        # an edit never matches the document's own chunks it is replacing
+        doc, counts = await rag_service.update_document(db, tenant_id, original.id, {"content": _edited(_policy("retention"))})
+        assert counts["added"] == counts["removed"] >= 1
+        assert await rag_service.search(db, tenant_id, "team three", top_k=1, mode="lexical")
+
+        stats = await rag_dedupe.dedupe_stats(db, tenant_id)
+        assert stats["chunks_skipped"] == copy.chunks_deduplicated + mixed.chunks_deduplicated
+        assert 0 < stats["deduplicated_ratio"] < 1
+        break
+
+
+def test_dedupe_stats_route(dedupe_mode):
+    dedupe_mode("flag")
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    try:
+        with TestClient(app) as client:
+            resp = client.get("/api/rag/dedupe/stats")
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+    assert resp.status_code == 200
+    assert resp.json()["mode"] == "flag" and resp.json()["documents"] == 0
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.auth import get_current_user
+from app.services import rag_index, rag_service
+from app.services.rag_index import TenantDocumentIndex, TenantVectorIndex
+from main import app
+from tests.utils import create_tenant_and_user, override_user_dependency, wait_for_ingest_job
+
+
+def test_document_index_resolves_filters():
+    documents = TenantDocumentIndex()
+    documents.set(1, ["hr", "retention"], "sv", "internal_policy")
+    documents.set(2, ["hr"], "en", "internal_policy")
+    documents.set(3, None, "SV", "guideline")
+    assert documents.resolve(None) is None and documents.resolve({}) is None
+    assert documents.resolve({"language": "sv"}).tolist() == [1, 3]
+    assert documents.resolve({"tags": ["retention", "missing"]}).tolist() == [1]
+    assert documents.resolve({"language": ["sv", "en"], "source": "internal_policy"}).tolist() == [1, 2]
+    assert documents.resolve({"language": "sv", "document_ids": [3, 4]}).tolist() == [3]
+    assert documents.resolve({"tags": ["missing"]}).size == 0
+    documents.set(1, ["archive"], "en", None)
+    assert documents.resolve({"language": "sv"}).tolist() == [3]
+    documents.discard(3)
+    assert documents.resolve({"language": "sv"}).size == 0
+
+
+def test_vector_search_scores_only_selected_documents():
+    rng = np.random.default_rng(3)
+    index = TenantVectorIndex(8)
+    index.add(list(range(1, 101)), rng.normal(size=(100, 8)), [i % 4 for i in range(100)])
+    query = rng.normal(size=8)
+    hits = index.search(query, 10, documents=np.array([2]))
+    assert len(hits) == 10 and all((chunk_id - 1) % 4 == 2 for chunk_id, _ in hits)
+    exact = [h for h in index.search(query, 100) if (h[0] - 1) % 4 == 2][:10]
+    assert [h[0] for h in hits] == [h[0] for h in exact]
+    index.remove([hits[0][0]])
+    assert hits[0][0] not in [c for c, _ in index.search(query, 10, documents=np.array([2]))]
+    assert index.search(query, 10, documents=np.array([9])) == []
+
+
+@pytest.mark.asyncio
+async def test_search_filters_by_metadata(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        sv = await rag_service.create_document(db, tenant_id, "Policy SV", "# Lagring\nretention policy for logs", "internal_policy", "sv", ["hr"])
+        en = await rag_service.create_document(db, tenant_id, "Policy EN", "# Retention\nretention policy for logs", "internal_policy", "en")
+        await rag_service.create_document(db, tenant_id, "Guide", "# Retention\nretention guideline for logs", "guideline", "sv")
+
+        for mode in ("vector", "lexical", "hybrid"):
+            hits = await rag_service.search(db, tenant_id, "retention policy", top_k=5, mode=mode, filters={"language": "sv", "source": "internal_policy"})
+            assert {chunk.document_id for _, chunk, _ in hits} == {sv.id}, mode
+        hits = await rag_service.search(db, tenant_id, "retention", top_k=5, mode="lexical", filters={"tags": ["hr"]})
+        assert {chunk.document_id for _, chunk, _ in hits} == {sv.id}
+        assert await rag_service.search(db, tenant_id, "retention", filters={"document_ids": [en.id], "language": "sv"}) == []
+
+        # metadata edits update the postings without touching chunks
+        await rag_service.update_document(db, tenant_id, en.id, {"language": "sv"})
+        hits = await rag_service.search(db, tenant_id, "retention policy", top_k=5, filters={"language": "sv", "source": "internal_policy"})
+        assert {chunk.document_id for _, chunk, _ in hits} == {sv.id, en.id}
+        assert (await rag_index.get_index(db, tenant_id)).documents.resolve({"language": "en"}).size == 0
+        break
+
+
+def test_search_route_accepts_filters():
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    try:
+        with TestClient(app) as client:
+            for title, language in (("A", "de"), ("B", "en")):
+                accepted = client.post("/api/rag/documents", json={"title": title, "content": "# A\nbreach notification duties", "language": language})
+                wait_for_ingest_job(client, accepted.json()["job_id"])
+            resp = client.post("/api/rag/search", json={"query": "breach notification", "filters": {"language": ["de"]}})
+            assert resp.status_code == 200
+            citations = resp.json()["citations"]
+            assert len(citations) == 1 and "breach" in citations[0]["content"]
+            resp = client.post("/api/rag/search", json={"query": "breach", "filters": {"tags": ["none"]}})
+            assert resp.json()["citations"] == []
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import rag_index, rag_service
+from app.services.rag_index import TenantIndex, TenantVectorIndex
+from app.services.rag_pipeline import cosine_similarity, decode_vector, embedding_for_text, encode_vector
+from tests.utils import create_tenant_and_user
+
+
+def _vectors(n):
+    return [embedding_for_text(f"chunk {i}") for i in range(n)]
+
+
+def test_index_matches_cosine_similarity_ranking():
+    vectors = _vectors(200)
+    index = TenantVectorIndex(len(vectors[0]))
+    index.add(list(range(1, 201)), vectors)
+    assert len(index) == 200
+
+    query = embedding_for_text("what is the retention period")
+    expected = sorted(
+        ((cosine_similarity(query, v), cid) for cid, v in zip(range(1, 201), vectors)),
+        reverse=True,
+    )[:5]
+    ranked = index.search(query, 5)
+    assert [cid for cid, _ in ranked] == [cid for _, cid in expected]
+    assert np.allclose([s for _, s in ranked], [s for s, _ in expected], atol=1e-5)
+
+
+def test_index_grows_and_removes_in_place():
+    index = TenantVectorIndex(8)
+    index.add([1, 2], _vectors(2))
+    index.add(list(range(3, 150)), _vectors(147))
+    assert len(index) == 149
+    assert index.remove([1, 3, 999]) == 2
+    assert len(index) == 147
+    assert 1 not in index.chunk_ids and 3 not in index.chunk_ids
+    assert index.search(embedding_for_text("x"), 500)[0][0] in set(index.chunk_ids.tolist())
+
+
+def test_index_ignores_mismatched_query_dimension():
+    index = TenantVectorIndex(8)
+    index.add([1], _vectors(1))
+    assert index.search([1.0, 0.0], 3) == []
+
+
+def test_vector_codec_round_trip_is_zero_copy():
+    vec = embedding_for_text("packed")
+    data = encode_vector(vec)
+    assert len(data) == 4 * len(vec)
+    decoded = decode_vector(data, "float32", len(vec))
+    assert decoded.dtype == np.dtype("<f4")
+    assert not decoded.flags.owndata
+    assert np.allclose(decoded, vec, atol=1e-7)
+
+
+@pytest.mark.asyncio
+async def test_sync_locks_per_tenant_and_rebuilds_off_the_event_loop(get_test_db, monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    other_id, _, _ = create_tenant_and_user()
+    threads = []
+    add_rows = TenantIndex.add_rows
+
+    def recording(self, rows):
+        threads.append(threading.get_ident())
+        add_rows(self, rows)
+
+    async for db in get_test_db():
+        await rag_service.create_document(db, tenant_id, "A", "# A\nretention of access logs", None, "en")
+        await rag_service.create_document(db, other_id, "B", "# B\nbreach notification duties", None, "en")
+        rag_index.reset_indexes()
+        monkeypatch.setattr(TenantIndex, "add_rows", recording)
+        # a sync in progress for one tenant does not hold up another tenant
+        async with await rag_index._tenant_lock(tenant_id):
+            index = await asyncio.wait_for(rag_index.get_index(db, other_id), 5)
+        assert index is not None and index.rows == 1
+        assert threads and threading.get_ident() not in threads
+        break
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.db.models.knowledge_embedding import KnowledgeEmbedding
+from app.services import rag_index, rag_service
+from app.services.rag_pipeline import embedding_for_text
+from tests.utils import create_tenant_and_user
+
+
+def _long_document(sections: int = 3) -> str:
+    body = " ".join(f"word{i}" for i in range(2500))
+    return "\n".join(f"# Section {s}\n{body}" for s in range(sections))
+
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_dedupes_and_embeds_every_chunk(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        doc = await rag_service.create_document(db, tenant_id, "Policy", _long_document(), "internal_policy", "en")
+        chunks = await rag_service.list_chunks(db, tenant_id, doc.id)
+        # identical sections produce identical chunks, which are stored once
+        assert len(chunks) == len({c.checksum for c in chunks})
+        assert sorted(c.chunk_index for c in chunks) == [c.chunk_index for c in sorted(chunks, key=lambda c: c.id)]
+        content = _long_document()
+        assert all(" ".join(content[c.start_offset : c.end_offset].split()) == c.content for c in chunks)
+
+        embeddings = (await db.execute(select(func.count()).where(KnowledgeEmbedding.document_id == doc.id))).scalar_one()
+        assert embeddings == len(chunks)
+
+        # re-ingesting the same content is a no-op
+        assert await rag_service.ingest_document(db, doc, tenant_id) == []
+
+        results = await rag_service.search(db, tenant_id, "word1 word2", top_k=2)
+        assert len(results) == 2
+        assert all(chunk.document_id == doc.id and emb.chunk_id == chunk.id for _, chunk, emb in results)
+        break
+
+
+@pytest.mark.asyncio
+async def test_search_reads_binary_and_legacy_json_vectors(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        doc = await rag_service.create_document(db, tenant_id, "Doc", "# A\nalpha beta gamma", None, "en")
+        stored = (await db.execute(select(KnowledgeEmbedding).where(KnowledgeEmbedding.document_id == doc.id))).scalars().one()
+        assert stored.vector is None
+        assert stored.dim == len(stored.vector_data) // 4 and stored.dtype == "float32"
+
+        # rows written before the binary format only carry the JSON vector
+        legacy_doc = await rag_service.create_document(db, tenant_id, "Legacy", "# B\ndelta epsilon", None, "en")
+        legacy = (await db.execute(select(KnowledgeEmbedding).where(KnowledgeEmbedding.document_id == legacy_doc.id))).scalars().one()
+        legacy.vector = embedding_for_text("delta epsilon")
+        legacy.vector_data = None
+        legacy.dim = None
+        legacy.dtype = None
+        await db.commit()
+        rag_index.reset_indexes()
+
+        results = await rag_service.search(db, tenant_id, "delta epsilon", top_k=5)
+        assert {chunk.document_id for _, chunk, _ in results} == {doc.id, legacy_doc.id}
+        assert results[0][1].document_id == legacy_doc.id
+        break
+
+
+@pytest.mark.asyncio
+async def test_search_modes_use_incremental_lexical_index(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        await rag_service.create_document(db, tenant_id, "Cookies", "# Cookies\nCookie consent banner rules", None, "en")
+        # load the index, then ingest more content that must be appended, not rescanned
+        assert await rag_service.search(db, tenant_id, "consent", top_k=3, mode="lexical")
+        retention = await rag_service.create_document(db, tenant_id, "Retention", "# Retention\nPayroll retention is seven years", None, "en")
+
+        lexical = await rag_service.search(db, tenant_id, "payroll retention", top_k=3, mode="lexical")
+        assert [chunk.document_id for _, chunk, _ in lexical] == [retention.id]
+        hybrid = await rag_service.search(db, tenant_id, "payroll retention", top_k=3, mode="hybrid")
+        assert hybrid[0][1].document_id == retention.id
+        assert len(await rag_service.search(db, tenant_id, "payroll", top_k=3, mode="vector")) == 2
+        break
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.db.models.knowledge_chunk import KnowledgeChunk
+from app.db.models.rag_ingest_job import RagIngestJob
+from app.services import rag_jobs, rag_service
+from main import app
+from tests.utils import create_tenant_and_user, override_user_dependency, wait_for_ingest_job
+
+
+def _document(sections: int = 2) -> str:
+    return "\n".join(f"# Section {s}\n" + " ".join(f"s{s}w{i}" for i in range(1500)) for s in range(sections))
+
+
+@pytest.mark.asyncio
+async def test_job_runs_stages_off_the_request_path(get_test_db, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INGEST_PROCESSES", 0)
+    tenant_id, _, _ = create_tenant_and_user()
+    stages = []
+    original = rag_jobs._update_job
+
+    async def recording_update(job_id, **values):
+        if "stage" in values:
+            stages.append(values["stage"])
+        await original(job_id, **values)
+
+    original_claim = rag_jobs._claim
+
+    async def recording_claim(job_id):
+        claimed = await original_claim(job_id)
+        if claimed:
+            # the claim moves the job to its first stage
+            stages.append("chunking")
+        return claimed
+
+    monkeypatch.setattr(rag_jobs, "_update_job", recording_update)
+    monkeypatch.setattr(rag_jobs, "_claim", recording_claim)
+    async for db in get_test_db():
+        doc = await rag_service.add_document(db, tenant_id, "Policy", _document(), "internal_policy", "en")
+        job = await rag_jobs.enqueue_document(db, doc, tenant_id)
+        assert job.status == "queued"
+        await rag_jobs.join()
+
+        job = await rag_jobs.get_job(db, tenant_id, job.id)
+        await db.refresh(job)
+        chunks = (await db.execute(select(func.count()).where(KnowledgeChunk.document_id == doc.id))).scalar_one()
+        assert (job.status, job.stage, job.attempts) == ("completed", "done", 1)
+        assert job.chunks_total == job.chunks_stored == chunks > 1
+        assert stages == ["chunking", "embedding", "indexing", "done"]
+        assert await rag_jobs.get_job(db, tenant_id + 1000, job.id) is None
+        break
+    await rag_jobs.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error(get_test_db, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INGEST_PROCESSES", 0)
+    tenant_id, _, _ = create_tenant_and_user()
+
+    async def broken_ingest(*args, **kwargs):
+        raise RuntimeError("embedding backend down")
+
+    monkeypatch.setattr(rag_service, "ingest_document", broken_ingest)
+    async for db in get_test_db():
+        doc = await rag_service.add_document(db, tenant_id, "Policy", _document(1), None, None)
+        job = await rag_jobs.enqueue_document(db, doc, tenant_id)
+        await rag_jobs.join()
+        await db.refresh(job)
+        assert job.status == "failed" and job.error == "embedding backend down"
+        break
+    await rag_jobs.stop()
+
+
+@pytest.mark.asyncio
+async def test_unfinished_jobs_resume_on_startup(get_test_db):
+    tenant_id, user_id, email = create_tenant_and_user()
+    async for db in get_test_db():
+        doc = await rag_service.add_document(db, tenant_id, "Interrupted", _document(1), None, None)
+        # left behind by a process that died mid-ingest, and one that already used its retries
+        interrupted = RagIngestJob(tenant_id=tenant_id, document_id=doc.id, status="running", stage="embedding", chunks_stored=0, attempts=1)
+        exhausted = RagIngestJob(
+            tenant_id=tenant_id, document_id=doc.id, status="running", stage="chunking", chunks_stored=0, attempts=settings.RAG_INGEST_MAX_ATTEMPTS
+        )
+        db.add_all([interrupted, exhausted])
+        await db.commit()
+        interrupted_id, exhausted_id = interrupted.id, exhausted.id
+        break
+
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    try:
+        with TestClient(app) as client:
+            job = wait_for_ingest_job(client, interrupted_id)
+            assert job["status"] == "completed" and job["attempts"] == 2
+            failed = client.get(f"/api/rag/jobs/{exhausted_id}").json()
+            assert failed["status"] == "failed" and failed["error"] == "Retry limit reached"
+            assert client.get("/api/rag/jobs/999999").status_code == 404
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.mark.asyncio
+async def test_job_queued_by_several_workers_runs_once(get_test_db, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INGEST_PROCESSES", 0)
+    tenant_id, _, _ = create_tenant_and_user()
+    runs = []
+    ingest = rag_service.ingest_document
+
+    async def counting_ingest(*args, **kwargs):
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return await ingest(*args, **kwargs)
+
+    monkeypatch.setattr(rag_service, "ingest_document", counting_ingest)
+    async for db in get_test_db():
+        doc = await rag_service.add_document(db, tenant_id, "Policy", _document(1), None, None)
+        job = RagIngestJob(tenant_id=tenant_id, document_id=doc.id, status="queued", stage="queued", chunks_stored=0, attempts=0)
+        db.add(job)
+        await db.commit()
+        await asyncio.gather(*(rag_jobs._run_job(job.id) for _ in range(3)))
+        await db.refresh(job)
+        assert runs == [1] and (job.status, job.attempts, job.lease_expires_at) == ("completed", 1, None)
+        break
+
+
+@pytest.mark.asyncio
+async def test_sweep_takes_over_only_expired_leases(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    now = datetime.now(timezone.utc)
+    async for db in get_test_db():
+        doc = await rag_service.add_document(db, tenant_id, "Policy", _document(1), None, None)
+        live = RagIngestJob(
+            tenant_id=tenant_id, document_id=doc.id, status="running", stage="embedding", chunks_stored=0, attempts=1, lease_expires_at=now + timedelta(minutes=5)
+        )
+        dead = RagIngestJob(
+            tenant_id=tenant_id, document_id=doc.id, status="running", stage="embedding", chunks_stored=0, attempts=1, lease_expires_at=now - timedelta(seconds=1)
+        )
+        db.add_all([live, dead])
+        await db.commit()
+        assert await rag_jobs.resume_pending() == 1
+        await rag_jobs.join()
+        await db.refresh(live)
+        await db.refresh(dead)
+        assert (live.status, live.attempts) == ("running", 1)
+        assert (dead.status, dead.attempts) == ("completed", 2)
+        assert not await rag_jobs._claim(live.id)
+        break
+    await rag_jobs.stop()
@@ -0,0 +1,47 @@
+from app.services.rag_lexical import TenantLexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def _index():
+    index = TenantLexicalIndex()
+    index.add(1, "Retention period for payroll records is seven years")
+    index.add(2, "Cookies require consent before tracking visitors")
+    index.add(3, "Personuppgifter om anställda raderas efter avslutad anställning")
+    index.add(4, "Consent must be freely given; consent records are kept")
+    return index
+
+
+def test_tokenize_lowercases_and_keeps_unicode_words():
+    assert tokenize("Anställda, GDPR & a b") == ["anställda", "gdpr"]
+
+
+def test_bm25_ranks_term_frequency_and_rarity():
+    index = _index()
+    ranked = index.search("consent", 5)
+    assert [cid for cid, _ in ranked] == [4, 2]
+    assert index.search("anställda", 5)[0][0] == 3
+    assert index.search("nothing matches", 5) == []
+
+
+def test_remove_and_readd_update_postings_in_place():
+    index = _index()
+    assert index.remove([4]) == 1
+    assert [cid for cid, _ in index.search("consent", 5)] == [2]
+    index.add(2, "Cookie banner copy")
+    assert index.search("consent", 5) == []
+    assert len(index) == 3
+
+
+def test_compaction_keeps_results():
+    index = TenantLexicalIndex()
+    for i in range(200):
+        index.add(i, f"common term{i}")
+    index.remove(range(150))
+    assert len(index) == 50
+    assert index.search("term175", 3)[0][0] == 175
+    assert len(index.search("common", 100)) == 50
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([(1, 0.9), (2, 0.8)], [(2, 5.0), (3, 4.0)])
+    assert fused[0][0] == 2
+    assert {cid for cid, _ in fused} == {1, 2, 3}
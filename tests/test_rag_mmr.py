@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.auth import get_current_user
+from app.services import rag_index, rag_service
+from app.services.rag_mmr import mmr_select
+from main import app
+from tests.utils import create_tenant_and_user, override_user_dependency, wait_for_ingest_job
+
+_REPEATED = "# Logs\n" + " ".join(f"retention policy for access logs, item {i}." for i in range(1500))
+_OTHER = "# Backups\nretention policy for backups and restore tests"
+
+
+def test_mmr_skips_near_duplicates_and_caps_groups():
+    vectors = np.array([[1.0, 0.0], [0.999, 0.045], [0.6, 0.8], [0.0, 1.0]])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = np.array([0.9, 0.89, 0.85, 0.5])
+    assert mmr_select(relevance, vectors, 3, diversity=0.0) == [0, 1, 2]
+    assert mmr_select(relevance, vectors, 3, diversity=0.5) == [0, 2, 1]
+    # scores on any scale: RRF-sized values rank the same once normalized
+    assert mmr_select(relevance / 30, vectors, 3, diversity=0.5) == [0, 2, 1]
+
+    groups = np.array([7, 7, 7, 8])
+    assert mmr_select(relevance, None, 3, groups=groups, max_per_group=1) == [0, 3]
+    assert mmr_select(relevance, vectors, 4, diversity=0.0, groups=groups, max_per_group=2) == [0, 1, 3]
+    assert mmr_select(np.array([]), None, 3) == []
+
+
+@pytest.mark.asyncio
+async def test_search_diversifies_overlapping_chunks(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        logs = await rag_service.create_document(db, tenant_id, "Logs", _REPEATED, None, "en")
+        backups = await rag_service.create_document(db, tenant_id, "Backups", _OTHER, None, "en")
+        for mode in ("vector", "lexical", "hybrid"):
+            plain = await rag_service.search(db, tenant_id, "retention policy for access logs", top_k=3, mode=mode)
+            assert {c.document_id for _, c, _ in plain} == {logs.id}, mode
+
+            capped = await rag_service.search(db, tenant_id, "retention policy for access logs", top_k=3, mode=mode, max_per_document=1)
+            assert [c.document_id for _, c, _ in capped] == [logs.id, backups.id], mode
+
+        # MMR keeps the best chunk, then prefers chunks least like those already picked
+        plain = await rag_service.search(db, tenant_id, "retention policy for access logs", top_k=3, mode="vector")
+        diverse = await rag_service.search(db, tenant_id, "retention policy for access logs", top_k=3, mode="vector", diversity=0.7)
+        assert diverse[0][1].id == plain[0][1].id
+        index = await rag_index.get_index(db, tenant_id)
+
+        def redundancy(hits):
+            vectors = index.vectors.vectors_for([c.id for _, c, _ in hits])
+            return (vectors @ vectors.T)[np.triu_indices(len(hits), 1)].max()
+
+        assert redundancy(diverse) < redundancy(plain)
+        break
+
+
+def test_search_route_validates_and_applies_diversity():
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    try:
+        with TestClient(app) as client:
+            for title, content in (("Logs", _REPEATED), ("Backups", _OTHER)):
+                accepted = client.post("/api/rag/documents", json={"title": title, "content": content})
+                wait_for_ingest_job(client, accepted.json()["job_id"])
+            resp = client.post("/api/rag/search", json={"query": "retention policy", "top_k": 4, "max_per_document": 1})
+            assert resp.status_code == 200
+            citations = resp.json()["citations"]
+            assert len({c["document_id"] for c in citations}) == len(citations) == 2
+            assert client.post("/api/rag/search", json={"query": "retention", "diversity": 1.5}).status_code == 422
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import rag_index, rag_service, rag_snapshot
+from app.services.rag_index import TenantVectorIndex
+from tests.utils import create_tenant_and_user
+
+
+def _doc(topic: str, n: int = 400) -> str:
+    return f"# {topic}\n" + " ".join(f"{topic}{i % 50}" for i in range(n))
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8"])
+def test_quantized_index_approximates_exact_scores(mode):
+    rng = np.random.default_rng(5)
+    data = rng.normal(size=(500, 32))
+    exact = TenantVectorIndex(32)
+    exact.add(list(range(1, 501)), data, [i % 5 for i in range(500)])
+    index = TenantVectorIndex(32, quantization=mode)
+    index.add(list(range(1, 501)), data, [i % 5 for i in range(500)])
+    assert index.quantized and index.nbytes < exact.nbytes
+    assert np.allclose(index.decoded(), exact.matrix, atol=1e-2)
+
+    query = rng.normal(size=32)
+    truth = {c for c, _ in exact.search(query, 10)}
+    candidates = index.search(query, 40)
+    assert truth <= {c for c, _ in candidates}
+    assert abs(candidates[0][1] - exact.search(query, 1)[0][1]) < 1e-2
+
+    # compaction keeps codes, scales and ids aligned
+    index.remove([candidates[0][0]])
+    exact.remove([candidates[0][0]])
+    assert np.allclose(index.decoded(), exact.matrix, atol=1e-2)
+    filtered = index.search(query, 5, documents=np.array([3]))
+    assert all((c - 1) % 5 == 3 for c, _ in filtered)
+
+
+def test_unknown_quantization_is_rejected():
+    with pytest.raises(ValueError):
+        TenantVectorIndex(8, quantization="int4")
+    assert rag_index.quantization_mode({"quantization": "int4"}) == "none"
+
+
+@pytest.mark.asyncio
+async def test_quantized_search_reranks_with_full_precision(get_test_db, monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        for topic in ("alpha", "beta", "gamma"):
+            await rag_service.create_document(db, tenant_id, topic, _doc(topic), None, "en")
+        exact = await rag_service.search(db, tenant_id, "beta3 beta7", top_k=3, mode="vector")
+
+        monkeypatch.setattr(settings, "RAG_VECTOR_QUANTIZATION", "int8")
+        rag_index.reset_indexes()
+        hits = await rag_service.search(db, tenant_id, "beta3 beta7", top_k=3, mode="vector")
+        assert (await rag_index.get_index(db, tenant_id)).vectors.quantization == "int8"
+        assert [c.id for _, c, _ in hits] == [c.id for _, c, _ in exact]
+        # re-ranked scores are the full-precision cosine, not the quantized approximation
+        assert [round(s, 5) for s, _, _ in hits] == [round(s, 5) for s, _, _ in exact]
+        break
+
+
+@pytest.mark.asyncio
+async def test_snapshot_keeps_quantized_rows(get_test_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RAG_VECTOR_QUANTIZATION", "int8")
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        await rag_service.create_document(db, tenant_id, "A", _doc("alpha"), None, "en")
+        before = await rag_service.search(db, tenant_id, "alpha3", top_k=3, mode="vector")
+        meta, arrays, _ = rag_snapshot.read_snapshot(tenant_id)
+        assert meta["quantization"] == "int8" and arrays["vectors"].dtype == np.int8 and "vector_scales" in arrays
+
+        rag_index.reset_indexes()
+        after = await rag_service.search(db, tenant_id, "alpha3", top_k=3, mode="vector")
+        assert [(c.id, round(s, 6)) for s, c, _ in after] == [(c.id, round(s, 6)) for s, c, _ in before]
+        assert isinstance((await rag_index.get_index(db, tenant_id)).vectors._scales, np.memmap)
+
+        # switching modes ignores the snapshot and rebuilds in the new storage
+        monkeypatch.setattr(settings, "RAG_VECTOR_QUANTIZATION", "float16")
+        rag_index.reset_indexes()
+        index = await rag_index.get_index(db, tenant_id)
+        assert index.vectors.matrix.dtype == np.float16
+        assert rag_snapshot.read_snapshot(tenant_id)[0]["quantization"] == "float16"
+        break
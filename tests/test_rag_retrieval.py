@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 from app.core.auth import get_current_user
 from app.core.security import hash_password
 from main import app
+from tests.utils import wait_for_ingest_job
 
 
 client = TestClient(app)
@@ -41,7 +42,10 @@ def test_rag_isolation_and_retrieval_scoring():
     t1, u1 = _prep_tenant_user()
     _override_user(t1, u1)
     # create doc for tenant1
-    client.post("/api/rag/documents", json={"content": "# Title\nTenant one content about apples", "title": "A"})
+    with TestClient(app) as worker_client:
+        accepted = worker_client.post("/api/rag/documents", json={"content": "# Title\nTenant one content about apples", "title": "A"})
+        assert accepted.status_code == 202
+        assert wait_for_ingest_job(worker_client, accepted.json()["job_id"])["status"] == "completed"
     r = client.post("/api/rag/search", json={"query": "apples"})
     assert r.status_code == 200
     data = r.json()
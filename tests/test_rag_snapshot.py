@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import rag_index, rag_service, rag_snapshot
+from app.services.rag_lexical import TenantLexicalIndex
+from tests.utils import create_tenant_and_user
+
+
+def _doc(topic: str, n: int = 400) -> str:
+    return f"# {topic}\n" + " ".join(f"{topic}{i % 50}" for i in range(n))
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def row_loads(monkeypatch):
+    """Record the ``after_id`` of every embedding-row load."""
+    loads = []
+    original = rag_index._load_rows
+
+    async def recording(db, tenant_id, after_id=0):
+        rows = await original(db, tenant_id, after_id=after_id)
+        loads.append((after_id, len(rows)))
+        return rows
+
+    monkeypatch.setattr(rag_index, "_load_rows", recording)
+    return loads
+
+
+def test_lexical_index_round_trips_through_arrays():
+    index = TenantLexicalIndex()
+    for chunk_id, text in enumerate(["retention of logs", "breach notification duties", "logs retention schedule"], start=1):
+        index.add(chunk_id, text, document_id=chunk_id * 10)
+    index.remove([2])
+    terms, arrays = index.to_arrays()
+    restored = TenantLexicalIndex.from_arrays(terms, arrays)
+    assert restored.search("logs retention", 5) == index.search("logs retention", 5)
+    assert restored.search("breach", 5) == []
+    assert [c for c, _ in restored.search("logs", 5, documents=np.array([30]))] == [3]
+
+    # the restored index stays writable
+    restored.add(4, "breach logs", document_id=40)
+    restored.remove([1])
+    assert {c for c, _ in restored.search("logs", 5)} == {3, 4}
+    assert len(restored) == 2
+
+
+@pytest.mark.asyncio
+async def test_new_worker_restores_snapshot_and_replays_delta(get_test_db, snapshot_dir, row_loads):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        await rag_service.create_document(db, tenant_id, "A", _doc("alpha"), None, "en")
+        await rag_service.create_document(db, tenant_id, "B", _doc("beta"), None, "sv")
+        before = await rag_service.search(db, tenant_id, "alpha3 beta7", top_k=4)
+        assert (snapshot_dir / f"tenant_{tenant_id}" / "CURRENT").exists()
+
+        # a fresh worker maps the snapshot instead of loading every row
+        rag_index.reset_indexes()
+        row_loads.clear()
+        after = await rag_service.search(db, tenant_id, "alpha3 beta7", top_k=4)
+        assert [(c.id, round(s, 6)) for s, c, _ in after] == [(c.id, round(s, 6)) for s, c, _ in before]
+        index = await rag_index.get_index(db, tenant_id)
+        assert isinstance(index.vectors._matrix, np.memmap)
+        assert row_loads == [(index.max_embedding_id, 0)]
+
+        # rows ingested after the snapshot are replayed from the table
+        await rag_service.create_document(db, tenant_id, "C", _doc("gamma"), None, "en")
+        rag_index.reset_indexes()
+        row_loads.clear()
+        hits = await rag_service.search(db, tenant_id, "gamma5", top_k=1, mode="lexical", filters={"language": "en"})
+        assert "gamma5" in hits[0][1].content
+        assert len(row_loads) == 1 and row_loads[0][0] > 0 and row_loads[0][1] >= 1
+        break
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_rebuilt_and_deleted_with_tenant_data(get_test_db, snapshot_dir, row_loads):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        doc = await rag_service.create_document(db, tenant_id, "A", _doc("alpha") + "\n" + _doc("omega"), None, "en")
+        await rag_index.get_index(db, tenant_id)
+        # another worker removes rows below the snapshot's max id
+        await rag_service.update_document(db, tenant_id, doc.id, {"content": _doc("alpha")})
+        rag_index.reset_indexes()
+        row_loads.clear()
+        index = await rag_index.get_index(db, tenant_id)
+        assert row_loads == [(0, index.rows)]
+        assert not await rag_service.search(db, tenant_id, "omega3", mode="lexical")
+
+        meta, _, _ = rag_snapshot.read_snapshot(tenant_id)
+        assert meta["rows"] == index.rows
+
+        await rag_service.delete_rag_for_tenant(db, tenant_id)
+        assert not (snapshot_dir / f"tenant_{tenant_id}").exists()
+        break
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_written_outside_the_tenant_lock(get_test_db, snapshot_dir, monkeypatch):
+    tenant_id, _, _ = create_tenant_and_user()
+    held = []
+    write_snapshot = rag_snapshot.write_snapshot
+
+    def recording(tid, meta, arrays, terms, headroom=None):
+        held.append(rag_index._tenant_locks[tid].locked())
+        # the arrays are copies, not views of the live buffers
+        assert all(array.flags.owndata for array in arrays.values())
+        return write_snapshot(tid, meta, arrays, terms, headroom)
+
+    monkeypatch.setattr(rag_snapshot, "write_snapshot", recording)
+    async for db in get_test_db():
+        await rag_service.create_document(db, tenant_id, "A", _doc("alpha"), None, "en")
+        index = await rag_index.get_index(db, tenant_id)
+        assert held == [False]
+        assert index.snapshot_rows == index.rows
+        # nothing moved: no rewrite
+        await rag_index.get_index(db, tenant_id)
+        assert held == [False]
+        break
@@ -0,0 +1,95 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.db.models.knowledge_chunk import KnowledgeChunk
+from app.services import embedding_client, rag_index, rag_service
+from main import app
+from tests.utils import create_tenant_and_user, override_user_dependency, wait_for_ingest_job
+
+
+def _sections(*bodies: str) -> str:
+    return "\n".join(f"# Section {i}\n{body}" for i, body in enumerate(bodies))
+
+
+def _body(prefix: str, n: int = 300) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+@pytest.mark.asyncio
+async def test_editing_one_section_reembeds_only_that_chunk(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        doc = await rag_service.create_document(db, tenant_id, "Policy", _sections(_body("a"), _body("b"), _body("c")), None, "en")
+        before = {c.checksum: c.id for c in await rag_service.list_chunks(db, tenant_id, doc.id)}
+        index = await rag_index.get_index(db, tenant_id)
+        embedded = embedding_client.get_embedding_metrics()["texts_embedded"]
+
+        doc, stats = await rag_service.update_document(
+            db, tenant_id, doc.id, {"content": _sections(_body("a"), _body("edited"), _body("c")), "title": "Policy v2"}
+        )
+        assert doc.title == "Policy v2"
+        assert stats == {"added": 1, "removed": 1, "kept": 2}
+        assert embedding_client.get_embedding_metrics()["texts_embedded"] == embedded + 1
+
+        after = await rag_service.list_chunks(db, tenant_id, doc.id)
+        kept = [c for c in after if c.checksum in before]
+        assert len(after) == 3 and all(before[c.checksum] == c.id for c in kept)
+
+        # the loaded index was patched in place and still matches the table
+        assert await rag_index.get_index(db, tenant_id) is index
+        hits = [chunk.content for _, chunk, _ in await rag_service.search(db, tenant_id, "edited7", top_k=1, mode="lexical")]
+        assert hits and "edited7" in hits[0]
+        assert not await rag_service.search(db, tenant_id, "b7", top_k=1, mode="lexical")
+
+        # metadata-only edits do not touch chunks
+        _, stats = await rag_service.update_document(db, tenant_id, doc.id, {"tags": ["hr"]})
+        assert stats["added"] == stats["removed"] == 0
+        assert await rag_service.update_document(db, tenant_id + 1000, doc.id, {"title": "x"}) is None
+        break
+
+
+@pytest.mark.asyncio
+async def test_removing_newest_chunk_keeps_index_fresh(get_test_db):
+    tenant_id, _, _ = create_tenant_and_user()
+    async for db in get_test_db():
+        doc = await rag_service.create_document(db, tenant_id, "Policy", _sections(_body("a"), _body("b")), None, "en")
+        index = await rag_index.get_index(db, tenant_id)
+        _, stats = await rag_service.update_document(db, tenant_id, doc.id, {"content": _sections(_body("a"))})
+        assert stats == {"added": 0, "removed": 1, "kept": 1}
+        assert await rag_index.get_index(db, tenant_id) is index and index.rows == 1
+
+        # a later ingest may reuse the deleted id on SQLite; it must still reach the index
+        await rag_service.update_document(db, tenant_id, doc.id, {"content": _sections(_body("a"), _body("z"))})
+        assert await rag_index.get_index(db, tenant_id) is index and index.rows == 2
+        res = await db.execute(select(KnowledgeChunk.id).where(KnowledgeChunk.document_id == doc.id))
+        assert sorted(index.vectors.chunk_ids.tolist()) == sorted(res.scalars().all())
+        break
+
+
+def test_put_and_patch_routes(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INGEST_PROCESSES", 0)
+    tenant_id, user_id, email = create_tenant_and_user()
+    override_user_dependency(app, get_current_user, tenant_id, user_id, email=email)
+    try:
+        with TestClient(app) as client:
+            accepted = client.post("/api/rag/documents", json={"title": "Policy", "content": _sections(_body("a"), _body("b"))}).json()
+            wait_for_ingest_job(client, accepted["job_id"])
+            doc_id = accepted["document_id"]
+
+            resp = client.put(f"/api/rag/documents/{doc_id}", json={"title": "Policy", "content": _sections(_body("a"), _body("n"))})
+            assert resp.status_code == 200
+            data = resp.json()
+            assert (data["chunks_added"], data["chunks_removed"], data["chunks_kept"]) == (1, 1, 1)
+            assert data["document"]["content"].endswith("n299")
+
+            resp = client.patch(f"/api/rag/documents/{doc_id}", json={"language": "de"})
+            assert resp.status_code == 200
+            assert resp.json()["document"]["language"] == "de" and resp.json()["document"]["title"] == "Policy"
+            assert client.patch(f"/api/rag/documents/{doc_id}", json={"content": None}).status_code == 400
+            assert client.patch("/api/rag/documents/999999", json={"title": "x"}).status_code == 404
+            assert client.put(f"/api/rag/documents/{doc_id}", json={"content": "x" * 200001}).status_code == 400
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
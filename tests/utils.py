@@ -1,8 +1,12 @@
 import sqlite3
+import time
 import uuid
 from typing import Tuple
 
+import httpx
+
 from app.core.security import hash_password
+from app.services import ai_transport
 
 
 def create_tenant_and_user(role: str = "owner") -> Tuple[int, int, str]:
@@ -32,3 +36,29 @@ def override_user_dependency(app, get_current_user, tenant_id: int, user_id: int
 
     dummy = DummyUser(user_id, tenant_id, role, email)
     app.dependency_overrides[get_current_user] = lambda: dummy
+
+
+def wait_for_ingest_job(client, job_id: int, timeout: float = 30.0) -> dict:
+    """Poll GET /api/rag/jobs/{id} until the ingest job finishes (client must be entered so workers run)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/rag/jobs/{job_id}").json()
+        if job.get("status") in ("completed", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+class FakeClock:
+    """Callable clock for the ``clock=`` arguments of caches and breakers; tests move ``now`` by hand."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def mock_ai_provider(monkeypatch, handler):
+    """Route every AI provider client through ``httpx.MockTransport(handler)``; call ``ai_transport.stop()`` afterwards."""
+    create_client = ai_transport.create_client
+    monkeypatch.setattr(ai_transport, "create_client", lambda spec: create_client(spec, transport=httpx.MockTransport(handler)))